@@ -0,0 +1,225 @@
+"""
+Batch mode: answer a file of questions with one compiled app and bounded concurrency.
+
+Questions are read from a JSONL file (a {"question": ..., "id": ...} object, a JSON string or a
+plain line per row), a CSV file with a "question" column and an optional "id" column, or stdin
+("-", read like JSONL). Questions that normalize to the same text (see
+graph.cache.normalize_question) are answered once.
+
+Every answer is appended to the output JSONL as soon as it finishes, with the route, node path,
+grade, budget degradation and timing of its run, and flushed, so an interrupted run keeps everything it finished.
+Running again with the same output skips the questions already answered; failed ones are
+retried. Route and path are null for answers served by the answer cache (CACHE_ENABLED), which
+do not run the graph.
+
+    python main.py --batch questions.jsonl --output answers.jsonl --concurrency 8
+"""
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+from graph.cache import normalize_question
+from graph.telemetry import Span, Telemetry, chain_names
+
+
+@dataclass(frozen=True)
+class BatchQuestion:
+    """A question of the batch; id is the caller's identifier, when the input has one."""
+
+    question: str
+    id: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return normalize_question(self.question)
+
+
+@dataclass
+class BatchReport:
+    """
+    Outcome of a batch run.
+
+    Attributes:
+        read: Questions read from the input, duplicates included.
+        duplicates: Questions dropped because an earlier one normalizes to the same text.
+        skipped: Questions already answered in the output by a previous run.
+        answered: Questions answered by this run.
+        failed: Questions whose run raised an error (recorded with status "error").
+        elapsed: Seconds spent answering.
+    """
+
+    read: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    answered: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        done = self.answered + self.failed
+        return done / self.elapsed if self.elapsed else 0.0
+
+
+def _jsonl_rows(lines: Iterable[str]) -> Iterable[Dict[str, Any]]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = line
+        yield row if isinstance(row, dict) else {"question": str(row)}
+
+
+def read_questions(source: str, input_format: Optional[str] = None) -> Tuple[List[BatchQuestion], int]:
+    """
+    Read the questions of source ("-" for stdin), dropping duplicates.
+
+    input_format is "jsonl" or "csv"; by default it follows the file extension (JSONL for stdin).
+
+    Returns:
+        The unique questions in input order and the number of duplicates dropped.
+    """
+    input_format = input_format or ("csv" if source.lower().endswith(".csv") else "jsonl")
+    handle: TextIO = sys.stdin if source == "-" else open(source, encoding="utf-8", newline="")
+    try:
+        rows = csv.DictReader(handle) if input_format == "csv" else _jsonl_rows(handle)
+        questions: List[BatchQuestion] = []
+        seen: Set[str] = set()
+        duplicates = 0
+        for row in rows:
+            text = (row.get("question") or "").strip()
+            if not text:
+                continue
+            question = BatchQuestion(question=text, id=str(row["id"]) if row.get("id") not in (None, "") else None)
+            if question.key in seen:
+                duplicates += 1
+                continue
+            seen.add(question.key)
+            questions.append(question)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+    return questions, duplicates
+
+
+def answered_keys(output: str) -> Set[str]:
+    """Normalized questions answered successfully in output by previous runs."""
+    if not os.path.exists(output):
+        return set()
+    keys: Set[str] = set()
+    # Binary, decoded per line: an interrupted run may have cut the last line inside a multibyte character
+    with open(output, "rb") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line.decode("utf-8", errors="replace"))
+            except json.JSONDecodeError:
+                # The line an interrupted run was writing
+                continue
+            if record.get("status") == "ok":
+                keys.add(normalize_question(record["question"]))
+    return keys
+
+
+def _open_output(output: str) -> TextIO:
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Terminate a line left incomplete by an interrupted run so the next record starts clean; the
+    # check is binary since the line may end inside a multibyte character
+    with open(output, "ab+") as raw:
+        if raw.seek(0, os.SEEK_END) > 0:
+            raw.seek(-1, os.SEEK_END)
+            if raw.read(1) != b"\n":
+                raw.write(b"\n")
+    return open(output, "a", encoding="utf-8")
+
+
+def _record(item: BatchQuestion, result: Optional[Dict[str, Any]], root: Optional[Span], elapsed: float) -> Dict[str, Any]:
+    attributes = root.attributes if root else {}
+    record: Dict[str, Any] = {"id": item.id, "question": item.question}
+    if result is not None:
+        record.update(
+            status="ok",
+            answer=result.get("generation"),
+            grade=result.get("generation_grade"),
+            degraded=bool(result.get("degraded")),
+            degraded_reason=result.get("degraded_reason"),
+        )
+    record.update(
+        route=attributes.get("rag.route"),
+        path=attributes.get("rag.path"),
+        llm_calls=attributes.get("rag.llm_calls"),
+        elapsed_s=round(elapsed, 3),
+    )
+    return record
+
+
+async def _answer(app: Any, item: BatchQuestion) -> Dict[str, Any]:
+    roots: List[Span] = []
+    # A collector per question attributes route, path and LLM calls to it under concurrency
+    telemetry = Telemetry(exporters=(), chain_names=chain_names(), on_request=roots.append)
+    started = time.perf_counter()
+    try:
+        result = await app.ainvoke({"question": item.question}, {"callbacks": [telemetry.handler]})
+    except Exception as exc:
+        record = _record(item, None, roots[0] if roots else None, time.perf_counter() - started)
+        return {**record, "status": "error", "error": f"{type(exc).__name__}: {exc}"}
+    return _record(item, result, roots[0] if roots else None, time.perf_counter() - started)
+
+
+async def answer_questions(app: Any, questions: List[BatchQuestion], output: TextIO, concurrency: int) -> Tuple[int, int]:
+    """
+    Answer questions with at most concurrency runs in flight, writing each record as it finishes.
+
+    Returns:
+        The number of questions answered and failed.
+    """
+    queue: "asyncio.Queue[BatchQuestion]" = asyncio.Queue()
+    for item in questions:
+        queue.put_nowait(item)
+    counts = {"ok": 0, "error": 0}
+
+    async def worker() -> None:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await _answer(app, item)
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            counts[record["status"]] += 1
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(questions))))))
+    return counts["ok"], counts["error"]
+
+
+def run_batch(
+    app: Any,
+    source: str,
+    output: str,
+    concurrency: int,
+    input_format: Optional[str] = None,
+) -> BatchReport:
+    """Answer the questions of source not yet answered in output (see the module docstring)."""
+    questions, duplicates = read_questions(source, input_format)
+    done = answered_keys(output)
+    pending = [item for item in questions if item.key not in done]
+    report = BatchReport(read=len(questions) + duplicates, duplicates=duplicates, skipped=len(questions) - len(pending))
+
+    handle = _open_output(output)
+    started = time.perf_counter()
+    try:
+        report.answered, report.failed = asyncio.run(answer_questions(app, pending, handle, concurrency))
+    finally:
+        report.elapsed = time.perf_counter() - started
+        handle.close()
+    return report
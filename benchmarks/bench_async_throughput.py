@@ -0,0 +1,102 @@
+"""
+Load test of the sync (app.invoke) and async (app.ainvoke) execution paths.
+
+Every external client is replaced by a local stand-in with a fixed latency (see
+benchmarks/fakes.py). The sync path needs one thread per in-flight question while the async
+path runs every question on a single event loop. Run it with:
+
+    python -m benchmarks.bench_async_throughput
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from benchmarks.fakes import install_fakes
+
+QUESTIONS = [
+    "What is agent memory?",
+    "How does prompt engineering work?",
+    "What are adversarial attacks on LLMs?",
+    "How do I make pizza dough?",
+]
+
+
+class ThreadSampler:
+    """Record the peak number of live threads while a run is in progress."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def __enter__(self) -> "ThreadSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def questions_for(total: int) -> List[str]:
+    return [QUESTIONS[i % len(QUESTIONS)] for i in range(total)]
+
+
+def run_sync(app, concurrency: int, total: int) -> Tuple[float, int]:
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        list(executor.map(lambda question: app.invoke({"question": question}), questions_for(total)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, sampler.peak
+
+
+def run_async(app, concurrency: int, total: int) -> Tuple[float, int]:
+    async def run() -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def ask(question: str) -> None:
+            async with semaphore:
+                await app.ainvoke({"question": question})
+
+        started = time.perf_counter()
+        await asyncio.gather(*(ask(question) for question in questions_for(total)))
+        return time.perf_counter() - started
+
+    with ThreadSampler() as sampler:
+        elapsed = asyncio.run(run())
+    return total / elapsed, sampler.peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency of every stand-in client (seconds)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--questions-per-worker", type=int, default=3)
+    args = parser.parse_args()
+
+    install_fakes(args.latency)
+    from graph.graph import app
+
+    print(f"stand-in latency: {args.latency}s per call")
+    print(f"{'concurrency':>11} {'sync q/s':>10} {'sync threads':>13} {'async q/s':>10} {'async threads':>14}")
+    for concurrency in args.concurrency:
+        total = concurrency * args.questions_per_worker
+        # The nodes log every step; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync_qps, sync_threads = run_sync(app, concurrency, total)
+            async_qps, async_threads = run_async(app, concurrency, total)
+        print(f"{concurrency:>11} {sync_qps:>10.1f} {sync_threads:>13} {async_qps:>10.1f} {async_threads:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the grade_documents node latency against the number of retrieved documents (k).
+
+The retrieval grader is replaced by a stub that sleeps a fixed delay per call, so the numbers
+reflect only how the node schedules the grading calls. Run it with:
+
+    python -m benchmarks.bench_grade_documents
+"""
+import argparse
+import importlib
+import time
+from dataclasses import replace
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.retrieval_grader import DocumentVerdict, GradeDocument, GradeDocuments
+from graph.config import get_settings
+
+# graph.nodes re-exports the node function under the module's name, so fetch the module itself
+grade_documents_module = importlib.import_module("graph.nodes.grade_documents")
+
+
+def stub_grader(delay: float) -> RunnableLambda:
+    def grade(inputs: dict) -> GradeDocument:
+        time.sleep(delay)
+        return GradeDocument(binary_score="yes")
+
+    return RunnableLambda(grade)
+
+
+def stub_batch_grader(delay: float) -> RunnableLambda:
+    def grade(inputs: dict) -> GradeDocuments:
+        time.sleep(delay)
+        count = inputs["documents"].count("\n\n[") + 1
+        return GradeDocuments(verdicts=[DocumentVerdict(index=i, binary_score="yes") for i in range(count)])
+
+    return RunnableLambda(grade)
+
+
+def time_node(k: int, mode: str, max_concurrency: int, strategy: str = "per_document") -> float:
+    settings = replace(
+        get_settings(), grading_strategy=strategy, grading_mode=mode, grader_max_concurrency=max_concurrency
+    )
+    documents = [Document(page_content=f"chunk {i}", metadata={"source": f"doc-{i}"}) for i in range(k)]
+    original_get_settings = grade_documents_module.get_settings
+    grade_documents_module.get_settings = lambda: settings
+    try:
+        started = time.perf_counter()
+        grade_documents_module.grade_documents({"question": "agent memory", "documents": documents})
+        return time.perf_counter() - started
+    finally:
+        grade_documents_module.get_settings = original_get_settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.2, help="Injected latency per grading call (seconds)")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    grade_documents_module.retrieval_grader_chain = stub_grader(args.delay)
+    grade_documents_module.batch_retrieval_grader_chain = stub_batch_grader(args.delay)
+
+    print(f"delay per grade: {args.delay}s, max concurrency: {args.max_concurrency}")
+    print(f"{'k':>4} {'sequential (s)':>16} {'concurrent (s)':>16} {'batched (s)':>12} {'speedup':>8}")
+    for k in args.k:
+        sequential = time_node(k, "sequential", args.max_concurrency)
+        concurrent = time_node(k, "concurrent", args.max_concurrency)
+        batched = time_node(k, "concurrent", args.max_concurrency, strategy="batched")
+        print(
+            f"{k:>4} {sequential:>16.3f} {concurrent:>16.3f} {batched:>12.3f} "
+            f"{sequential / concurrent:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of the grade_generation node in sequential and concurrent mode.
+
+Both graders are replaced by stubs that sleep a fixed delay per call, and the per-stage timings
+recorded by the node in state["timings"] are reported for a grounded and a hallucinated answer.
+Run it with:
+
+    python -m benchmarks.bench_grade_generation
+"""
+import argparse
+import importlib
+import time
+from dataclasses import replace
+
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.answer_grader import GradeAnswer
+from graph.chains.hallucination_grader import GradeHallucination
+from graph.config import get_settings
+
+# graph.nodes re-exports the node function under the module's name, so fetch the module itself
+grade_generation_module = importlib.import_module("graph.nodes.grade_generation")
+
+
+def stub_grader(delay: float, verdict: object) -> RunnableLambda:
+    def grade(inputs: dict) -> object:
+        time.sleep(delay)
+        return verdict
+
+    return RunnableLambda(grade)
+
+
+def run_node(mode: str, grounded: bool, delay: float) -> dict:
+    settings = replace(get_settings(), generation_grading_mode=mode)
+    grade_generation_module.hallucination_grader_chain = stub_grader(delay, GradeHallucination(binary_score=grounded))
+    grade_generation_module.answer_grader_chain = stub_grader(delay, GradeAnswer(binary_score=True))
+    original_get_settings = grade_generation_module.get_settings
+    grade_generation_module.get_settings = lambda: settings
+    try:
+        return grade_generation_module.grade_generation(
+            {"question": "What is agent memory?", "documents": [], "generation": "Agents store memories."}
+        )
+    finally:
+        grade_generation_module.get_settings = original_get_settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.3, help="Injected latency per grading call (seconds)")
+    args = parser.parse_args()
+
+    print(f"delay per grade: {args.delay}s")
+    print(f"{'mode':>11} {'answer':>12} {'verdict':>14} {'hallucination (s)':>18} {'answer (s)':>11} {'node (s)':>9}")
+    for grounded in (True, False):
+        for mode in ("sequential", "concurrent"):
+            result = run_node(mode, grounded, args.delay)
+            timings = result["timings"]
+            answer = timings.get(grade_generation_module.ANSWER_STAGE)
+            print(
+                f"{mode:>11} {'grounded' if grounded else 'hallucinated':>12} {result['generation_grade']:>14} "
+                f"{timings[grade_generation_module.HALLUCINATION_STAGE]:>18.3f} "
+                f"{'-' if answer is None else f'{answer:.3f}':>11} "
+                f"{timings[grade_generation_module.TOTAL_STAGE]:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
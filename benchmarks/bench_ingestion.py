@@ -0,0 +1,126 @@
+"""
+Throughput and peak memory of the ingestion pipeline (ingestion.ingest()), offline.
+
+A directory of synthetic Markdown documents is ingested with FakeOpenAIEmbeddings, whose every
+request waits --embed-latency seconds like a remote embedding API, into a NumPy index ("numpy")
+or into a store that drops the vectors ("discard", which measures the pipeline alone). Each
+configuration runs in a fresh process, which reports:
+
+- seconds and chunks/s for the whole run,
+- peak: peak resident memory of the process in MB. With bounded queues the pipeline's does not
+  grow with the number of documents; the NumPy index adds the pages of the memory-mapped files
+  it writes its generation through, which belong to the page cache.
+
+    python -m benchmarks.bench_ingestion --documents 2000,20000 --workers 1x1,8x1,8x4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+WORDS = "agent memory planning tool prompt attack model token vector chunk index query retrieval graph".split()
+
+
+def write_corpus(directory: str, documents: int, paragraphs: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    for number in range(documents):
+        subdirectory = os.path.join(directory, f"{number // 1000:03d}")
+        os.makedirs(subdirectory, exist_ok=True)
+        with open(os.path.join(subdirectory, f"doc-{number}.md"), "w", encoding="utf-8") as document_file:
+            document_file.write(
+                "\n\n".join(" ".join(rng.choices(WORDS, k=60)) + f" {number}-{paragraph}" for paragraph in range(paragraphs))
+            )
+
+
+def split_paragraphs(documents: List[Document]) -> List[Document]:
+    # The tiktoken splitter of ingestion.py downloads its encoding; paragraphs keep the run offline
+    return [
+        Document(page_content=paragraph, metadata=dict(document.metadata))
+        for document in documents
+        for paragraph in document.page_content.split("\n\n")
+    ]
+
+
+class DiscardStore(VectorStore):
+    """Embeds the chunks it is given (in the embed workers) and drops them."""
+
+    def __init__(self, embeddings: Any):
+        self._embeddings = embeddings
+
+    def add_texts(self, texts: Any, metadatas: Any = None, *, ids: Any = None, **kwargs: Any) -> List[str]:
+        self._embeddings.embed_documents(list(texts))
+        return list(ids or [])
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return []
+
+    @classmethod
+    def from_texts(cls, texts: Any, embedding: Any, metadatas: Any = None, **kwargs: Any) -> "DiscardStore":
+        return cls(embedding)
+
+    def close(self) -> None:
+        pass
+
+
+def run(corpus: str, index: str, store_name: str, fetch_workers: int, embed_workers: int, batch_size: int, embed_latency: float) -> Dict[str, Any]:
+    from benchmarks.fakes import FakeOpenAIEmbeddings, LatencyProfile
+    from graph.vector_index import NumpyVectorStore
+    from ingestion import SqliteIngestionManifest, expand_sources, ingest
+
+    embeddings = FakeOpenAIEmbeddings(profile=LatencyProfile(embedding=embed_latency))
+    os.makedirs(index, exist_ok=True)
+    store = NumpyVectorStore(index, embeddings) if store_name == "numpy" else DiscardStore(embeddings)
+    manifest = SqliteIngestionManifest(os.path.join(index, "manifest.sqlite3"))
+    stats = ingest(
+        expand_sources([corpus]),
+        store,
+        manifest,
+        split=split_paragraphs,
+        fetch_workers=fetch_workers,
+        embed_workers=embed_workers,
+        batch_size=batch_size,
+    )
+    manifest.close()
+    store.close()
+    return {"seconds": stats.seconds, "chunks": stats.chunks_added, "peak": stats.peak_memory_mb}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", default="2000,20000", help="Comma separated corpus sizes")
+    parser.add_argument("--paragraphs", type=int, default=10, help="Chunks per document")
+    parser.add_argument("--workers", default="1x1,8x1,8x4", help="Comma separated FETCHxEMBED worker counts")
+    parser.add_argument("--stores", default="numpy,discard", help="Comma separated, among numpy and discard")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding request")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--workdir", default="./.cache/bench_ingestion", help="Directory for the corpus and indexes")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'documents':>10} {'store':>8} {'workers':>8} {'chunks':>8} {'seconds':>8} {'chunks/s':>9} {'peak (MB)':>10}")
+    for documents in (int(size) for size in args.documents.split(",")):
+        shutil.rmtree(args.workdir, ignore_errors=True)
+        corpus = os.path.join(args.workdir, "corpus")
+        write_corpus(corpus, documents, args.paragraphs)
+        for store in args.stores.split(","):
+            for workers in args.workers.split(","):
+                fetch_workers, embed_workers = (int(count) for count in workers.split("x"))
+                index = os.path.join(args.workdir, f"{store}-{workers}")
+                with context.Pool(1) as pool:
+                    result = pool.apply(
+                        run, (corpus, index, store, fetch_workers, embed_workers, args.batch_size, args.embed_latency)
+                    )
+                print(
+                    f"{documents:>10} {store:>8} {workers:>8} {result['chunks']:>8} {result['seconds']:>8.1f} "
+                    f"{result['chunks'] / result['seconds']:>9.0f} {result['peak']:>10.0f}"
+                )
+    shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
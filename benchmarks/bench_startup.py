@@ -0,0 +1,106 @@
+"""
+Startup benchmark: cold `import graph.graph` and time to first answer.
+
+Each measurement runs in a fresh interpreter so module caches do not hide the cost. The first
+answer is produced with the local stand-in clients (see benchmarks/fakes.py), so it measures
+building the app and the chat/search clients plus one pass through the graph, without network
+latency. Run it with:
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_import() -> dict:
+    started = time.perf_counter()
+    import graph.graph  # noqa: F401
+
+    return {"import": time.perf_counter() - started}
+
+
+def child_first_answer() -> dict:
+    # Client construction needs credentials to be present, not valid
+    os.environ.setdefault("OPENAI_API_KEY", "sk-startup-benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "tvly-startup-benchmark")
+    started = time.perf_counter()
+
+    from dataclasses import replace
+
+    from graph.config import get_settings
+    from graph.graph import build_app
+
+    imported = time.perf_counter()
+    app = build_app(replace(get_settings(), rag_prompt_source="local", render_graph_diagram=False, cache_enabled=False))
+    built = time.perf_counter()
+
+    # Build the real clients once, as the first request would, then answer with the stand-ins
+    from graph.chains.answer_grader import answer_grader_chain
+    from graph.chains.generation import generation_chain
+    from graph.chains.hallucination_grader import hallucination_grader_chain
+    from graph.chains.retrieval_grader import retrieval_grader_chain
+    from graph.chains.router import question_router
+    from graph.search import get_search_backend
+
+    for lazy in (question_router, retrieval_grader_chain, generation_chain, hallucination_grader_chain,
+                 answer_grader_chain):
+        lazy.get()
+    get_search_backend()
+    clients = time.perf_counter()
+
+    from benchmarks.fakes import install_fakes
+
+    install_fakes(latency=0.0)
+    app.invoke({"question": "What is agent memory?"})
+    answered = time.perf_counter()
+
+    return {
+        "import": imported - started,
+        "build_app": built - imported,
+        "build_clients": clients - built,
+        "first_answer": answered - started,
+    }
+
+
+def run_child(mode: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", mode],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=["import", "first-answer"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # The nodes log to stdout; the parent only reads the last line
+        result = child_import() if args.child == "import" else child_first_answer()
+        print(json.dumps(result))
+        return
+
+    for mode in ("import", "first-answer"):
+        runs = [run_child(mode) for _ in range(args.runs)]
+        for metric in runs[0]:
+            values = [run[metric] for run in runs]
+            print(
+                f"{mode:>12} {metric:<14} median {statistics.median(values) * 1000:8.1f} ms"
+                f"   min {min(values) * 1000:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark of the graph state size and serialization cost per step.
+
+Runs the real graph against the model-level stand-ins of benchmarks/fakes.py over a collection
+padded with synthetic agent chunks, retrieving a large k, and serializes the state after every
+checkpoint with the checkpointer's serializer (what every step of a checkpointed or streamed run
+pays):
+
+- refs: the state as the graph keeps it, documents as DocumentRefs (graph/document_refs.py),
+- full: the same state with every ref replaced by its Document, text included.
+
+It also times resolving the refs back to Documents, the cost the nodes pay instead. Run it with:
+
+    python -m benchmarks.bench_state_size --k 50 --chunk-chars 1000
+"""
+import argparse
+import contextlib
+import io
+import math
+import statistics
+import time
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Tuple
+
+from langchain_core.documents import Document
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import START
+
+from benchmarks.fakes import LATENCY_PROFILES, model_fakes
+from graph.config import configure, get_settings
+from graph.document_refs import resolve
+
+QUESTIONS = {
+    "vectorstore": "What is agent memory?",
+    "websearch": "How does the latest agent store its memory?",
+}
+
+
+def padding_chunks(count: int, chars: int) -> List[Document]:
+    """Synthetic agent chunks of about chars characters, so retrieval can return a large k."""
+    sentence = "An agent keeps observations in its memory stream and retrieves them by recency. "
+    return [
+        Document(
+            page_content=(f"Agent note {index}. " + sentence * (chars // len(sentence) + 1))[:chars],
+            metadata={"source": f"https://example.com/agents/{index}", "chunk_id": f"padding-{index}"},
+        )
+        for index in range(count)
+    ]
+
+
+def timed(func: Callable[[], Any], repeat: int) -> Tuple[Any, float]:
+    """Result of func and its median time in milliseconds over repeat calls."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def measure_run(question: str, repeat: int) -> List[Dict[str, Any]]:
+    """Size and serialization time of the state saved after each step of the run of question."""
+    from graph.graph import build_workflow
+
+    serde = JsonPlusSerializer()
+    app = build_workflow().compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": question}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.invoke({"question": question}, config)
+    history = list(reversed(list(app.get_state_history(config))))
+
+    steps = []
+    # Each checkpoint holds the state written by the node the previous one was waiting for
+    for previous, snapshot in zip(history, history[1:]):
+        refs = snapshot.values.get("documents") or []
+        state = snapshot.values
+        full = {**state, "documents": resolve(refs)}
+        (_, refs_blob), refs_ms = timed(lambda: serde.dumps_typed(state), repeat)
+        (_, full_blob), full_ms = timed(lambda: serde.dumps_typed(full), repeat)
+        _, resolve_ms = timed(lambda: resolve(refs), repeat)
+        steps.append(
+            {
+                "node": "input" if previous.next == (START,) else previous.next[0],
+                "documents": len(refs),
+                "refs_bytes": len(refs_blob),
+                "full_bytes": len(full_blob),
+                "refs_ms": refs_ms,
+                "full_ms": full_ms,
+                "resolve_ms": resolve_ms,
+            }
+        )
+    return steps
+
+
+def print_steps(route: str, steps: List[Dict[str, Any]]) -> None:
+    print(f"\n{route}")
+    print(f"{'step':>18} {'docs':>5} {'full (B)':>10} {'refs (B)':>10} {'full (ms)':>10} {'refs (ms)':>10} {'resolve (ms)':>13}")
+    for step in steps:
+        print(
+            f"{step['node']:>18} {step['documents']:>5} {step['full_bytes']:>10} {step['refs_bytes']:>10} "
+            f"{step['full_ms']:>10.3f} {step['refs_ms']:>10.3f} {step['resolve_ms']:>13.3f}"
+        )
+    full_bytes = sum(step["full_bytes"] for step in steps)
+    refs_bytes = sum(step["refs_bytes"] for step in steps)
+    full_ms = sum(step["full_ms"] for step in steps)
+    refs_ms = sum(step["refs_ms"] for step in steps)
+    print(
+        f"{'run':>18} {'':>5} {full_bytes:>10} {refs_bytes:>10} {full_ms:>10.3f} {refs_ms:>10.3f}"
+        f"   ({full_bytes / refs_bytes:.1f}x smaller, {full_ms / refs_ms:.1f}x faster)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=50, help="Documents retrieved per question (RETRIEVAL_K)")
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="Characters per synthetic chunk")
+    parser.add_argument("--repeat", type=int, default=20, help="Serializations timed per step (median reported)")
+    args = parser.parse_args()
+
+    previous = get_settings()
+    # Per-document grading of k documents needs a budget that fits k calls
+    configure(
+        replace(
+            previous,
+            retrieval_k=args.k,
+            retrieval_candidates=2 * args.k,
+            budget_max_llm_calls=2 * args.k + 10,
+            budget_deadline=math.inf,
+        )
+    )
+    try:
+        with model_fakes(LATENCY_PROFILES["zero"]) as services:
+            padding = padding_chunks(2 * args.k, args.chunk_chars)
+            ids = [document.metadata["chunk_id"] for document in padding]
+            services.vectorstore.add_documents(padding, ids=ids)
+            services.lexical_index.add(ids, padding)
+            print(f"k={args.k}, {args.chunk_chars} characters per chunk, median of {args.repeat} serializations")
+            for route, question in QUESTIONS.items():
+                print_steps(route, measure_run(question, args.repeat))
+    finally:
+        configure(previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Offline benchmark suite: end-to-end latency, LLM calls, tokens and throughput of the graph.
+
+The graph runs with its real chains, prompts, context builder, Chroma collection and BM25 index;
+only ChatOpenAI, OpenAIEmbeddings and Tavily are replaced by the deterministic stand-ins of
+benchmarks/fakes.py (model_fakes), with the latencies of a LatencyProfile. QUESTIONS take every
+path of graph/graph.py and each run checks the path it took, so a behaviour change shows up
+next to the timings. Run it with:
+
+    python -m benchmarks.bench_suite --profile fast --concurrency 1 4 16
+    python -m benchmarks.bench_suite --compare .cache/benchmarks/<commit>.json
+
+Results are saved as JSON (by default .cache/benchmarks/<commit>.json) so runs of two commits
+can be compared with --compare.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmarks.fakes import LATENCY_PROFILES, model_fakes
+from graph.config import get_settings
+from graph.consts import GENERATE, GRADE_DOCUMENTS, GRADE_GENERATION, RETRIEVE, WEBSEARCH
+from graph.telemetry import Span, Telemetry, chain_names
+
+RESULTS_DIRECTORY = "./.cache/benchmarks"
+
+
+@dataclass(frozen=True)
+class BenchQuestion:
+    """A question of the suite and the route, node path and grade it must produce."""
+
+    question: str
+    route: str
+    path: Sequence[str]
+    grade: str
+
+
+_ANSWER = (GENERATE, GRADE_GENERATION)
+QUESTIONS: List[BenchQuestion] = [
+    # Every retrieved chunk is relevant
+    BenchQuestion("What is agent memory?", "vectorstore", (RETRIEVE, GRADE_DOCUMENTS) + _ANSWER, "useful"),
+    BenchQuestion("Are adversarial attacks a risk for LLMs?", "vectorstore", (RETRIEVE, GRADE_DOCUMENTS) + _ANSWER, "useful"),
+    # Some retrieved chunks are irrelevant, so web results are added before generating
+    BenchQuestion(
+        "How does prompt engineering work?", "vectorstore", (RETRIEVE, GRADE_DOCUMENTS, WEBSEARCH) + _ANSWER, "useful"
+    ),
+    # Off-topic questions go straight to the web
+    BenchQuestion("Who won the 2022 football world cup?", "websearch", (WEBSEARCH,) + _ANSWER, "useful"),
+    # The answer is not grounded in the sources
+    BenchQuestion(
+        "What would an agent speculate about its own memory?", "vectorstore",
+        (RETRIEVE, GRADE_DOCUMENTS) + _ANSWER, "not supported",
+    ),
+    # The first answer does not resolve the question; a web search and a second answer follow
+    BenchQuestion(
+        "How does the latest agent store its memory?", "vectorstore",
+        (RETRIEVE, GRADE_DOCUMENTS) + _ANSWER + (WEBSEARCH,) + _ANSWER, "useful",
+    ),
+]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of values."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), int(-(-q * len(ordered) // 100))))
+    return ordered[rank - 1]
+
+
+def _record(item: BenchQuestion, latency: float, root: Optional[Span]) -> Dict[str, Any]:
+    attributes = root.attributes if root else {}
+    path = attributes.get("rag.path", "")
+    return {
+        "question": item.question,
+        "latency": latency,
+        "route": attributes.get("rag.route"),
+        "path": path,
+        "grade": attributes.get("rag.grade"),
+        "llm_calls": attributes.get("rag.llm_calls", 0),
+        "prompt_tokens": attributes.get("gen_ai.usage.input_tokens", 0),
+        "completion_tokens": attributes.get("gen_ai.usage.output_tokens", 0),
+        "expected": path == ">".join(item.path) and attributes.get("rag.grade") == item.grade,
+    }
+
+
+def _telemetry(roots: List[Span]) -> Telemetry:
+    # One collector per question, so calls and tokens are attributed to it under concurrency
+    return Telemetry(exporters=(), chain_names=chain_names(), on_request=roots.append)
+
+
+def ask(app: Any, item: BenchQuestion) -> Dict[str, Any]:
+    roots: List[Span] = []
+    started = time.perf_counter()
+    app.invoke({"question": item.question}, {"callbacks": [_telemetry(roots).handler]})
+    return _record(item, time.perf_counter() - started, roots[0] if roots else None)
+
+
+async def aask(app: Any, item: BenchQuestion) -> Dict[str, Any]:
+    roots: List[Span] = []
+    started = time.perf_counter()
+    await app.ainvoke({"question": item.question}, {"callbacks": [_telemetry(roots).handler]})
+    return _record(item, time.perf_counter() - started, roots[0] if roots else None)
+
+
+def run_level(app: Any, items: List[BenchQuestion], concurrency: int, mode: str) -> Dict[str, Any]:
+    """Answer items with at most concurrency questions in flight and summarize the run."""
+    started = time.perf_counter()
+    if mode == "sync":
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            records = list(executor.map(lambda item: ask(app, item), items))
+    else:
+
+        async def run() -> List[Dict[str, Any]]:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def bounded(item: BenchQuestion) -> Dict[str, Any]:
+                async with semaphore:
+                    return await aask(app, item)
+
+            return await asyncio.gather(*(bounded(item) for item in items))
+
+        records = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    return summarize(records, elapsed, concurrency)
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float, concurrency: int) -> Dict[str, Any]:
+    latencies = [record["latency"] for record in records]
+    count = len(records) or 1
+    return {
+        "concurrency": concurrency,
+        "questions": len(records),
+        "throughput_qps": len(records) / elapsed if elapsed else 0.0,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / count,
+        },
+        "llm_calls_per_question": sum(record["llm_calls"] for record in records) / count,
+        "prompt_tokens_per_question": sum(record["prompt_tokens"] for record in records) / count,
+        "completion_tokens_per_question": sum(record["completion_tokens"] for record in records) / count,
+        "unexpected_paths": sum(1 for record in records if not record["expected"]),
+    }
+
+
+def _commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return result.stdout.strip()
+
+
+def run_suite(profile: str, concurrency: Sequence[int], rounds: int, mode: str) -> Dict[str, Any]:
+    """Run QUESTIONS once per path check, then rounds times per concurrency level."""
+    with model_fakes(LATENCY_PROFILES[profile]):
+        from graph.graph import build_workflow
+
+        app = build_workflow().compile()
+        settings = get_settings()
+        # The nodes log every step; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            per_question = [ask(app, item) for item in QUESTIONS]
+            levels = [run_level(app, QUESTIONS * rounds, level, mode) for level in concurrency]
+    return {
+        "commit": _commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "profile": {"name": profile, **asdict(LATENCY_PROFILES[profile])},
+        "mode": mode,
+        "rounds": rounds,
+        "settings": {
+            "grading_strategy": settings.grading_strategy,
+            "grading_mode": settings.grading_mode,
+            "generation_grading_mode": settings.generation_grading_mode,
+            "retrieval_mode": settings.retrieval_mode,
+            "context_packing": settings.context_packing,
+        },
+        "questions": [
+            {**record, "expected_path": ">".join(item.path), "expected_grade": item.grade}
+            for item, record in zip(QUESTIONS, per_question)
+        ],
+        "levels": levels,
+    }
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"commit {results['commit']}, profile {results['profile']['name']}, {results['mode']} mode")
+    for question in results["questions"]:
+        status = "ok" if question["expected"] else f"UNEXPECTED (wanted {question['expected_path']} / {question['expected_grade']})"
+        print(
+            f"  {question['question'][:48]:<48} {question['route'] or '-':<11} {question['grade'] or '-':<13} "
+            f"{question['llm_calls']:>2} calls {question['prompt_tokens']:>5}+{question['completion_tokens']:<4} tokens  {status}"
+        )
+    previous = {level["concurrency"]: level for level in (baseline or {}).get("levels", [])}
+    print(f"{'concurrency':>11} {'q/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'calls/q':>8} {'tokens/q':>9}")
+    for level in results["levels"]:
+        latency = level["latency_s"]
+        tokens = level["prompt_tokens_per_question"] + level["completion_tokens_per_question"]
+        print(
+            f"{level['concurrency']:>11} {level['throughput_qps']:>7.1f} {latency['p50']:>7.3f} {latency['p95']:>7.3f} "
+            f"{latency['p99']:>7.3f} {level['llm_calls_per_question']:>8.2f} {tokens:>9.0f}"
+        )
+        before = previous.get(level["concurrency"])
+        if before:
+            print(
+                f"{'vs base':>11} {_delta(level['throughput_qps'], before['throughput_qps']):>7} "
+                + " ".join(f"{_delta(latency[key], before['latency_s'][key]):>7}" for key in ("p50", "p95", "p99"))
+                + f" {_delta(level['llm_calls_per_question'], before['llm_calls_per_question']):>8}"
+            )
+
+
+def _delta(current: float, previous: float) -> str:
+    if not previous:
+        return "-"
+    return f"{(current - previous) / previous:+.0%}"
+
+
+def regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """p95 latencies and LLM calls per question that grew more than tolerance over the baseline."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    found = []
+    for level in results["levels"]:
+        before = previous.get(level["concurrency"])
+        if not before:
+            continue
+        for name, current, old in (
+            ("p95", level["latency_s"]["p95"], before["latency_s"]["p95"]),
+            ("llm_calls_per_question", level["llm_calls_per_question"], before["llm_calls_per_question"]),
+        ):
+            if old and current > old * (1 + tolerance):
+                found.append(f"concurrency {level['concurrency']}: {name} {old:.3f} -> {current:.3f}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(LATENCY_PROFILES), default="fast")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the question set per concurrency level")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--output", help="JSON file for the results (default .cache/benchmarks/<commit>.json)")
+    parser.add_argument("--compare", help="Results JSON of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Tolerated p95 / LLM call growth vs --compare")
+    args = parser.parse_args()
+
+    results = run_suite(args.profile, args.concurrency, args.rounds, args.mode)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"results saved to {output}")
+
+    failures = [f"unexpected path for {q['question']!r}" for q in results["questions"] if not q["expected"]]
+    if baseline is not None:
+        failures += regressions(results, baseline, args.max_regression)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark of the NumPy vector index (graph/vector_index.py) against Chroma.
+
+For each collection size the same synthetic embeddings (unit vectors clustered around topics, like
+the chunks of a corpus) are written into a Chroma collection and into NumPy indexes, flat float32,
+flat int8 and IVF int8 (sqrt(size) lists). Each backend is then opened by --workers processes at
+once, started fresh, which report:
+
+- open: milliseconds from opening the store to the answer of its first query (with --drop-caches
+  the OS page cache is emptied first, so this is a cold open from disk; it needs root),
+- p50 / p95: query latency in milliseconds over --queries queries of k results, text included,
+- rss / pss: resident memory per process in MB after the queries; PSS splits shared pages between
+  the processes mapping them, so it shows what each extra worker really costs,
+- recall: share of the exact k nearest neighbours returned.
+
+    python -m benchmarks.bench_vector_index --sizes 10000,100000,1000000 --dim 1536
+
+The 1M configurations need about 6 GB of disk per float32 copy of the vectors, and building the
+Chroma collection at that size takes a long time; --backends restricts the run.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+COLLECTION_NAME = "bench-vector-index"
+BACKENDS = ("chroma", "numpy-flat", "numpy-int8", "numpy-ivf-int8")
+TOPICS = 100
+_BLOCK_ROWS = 10_000
+
+
+def synthetic_vectors(path: str, count: int, dimension: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit vectors around TOPICS random centers, written to a float32 file; returns them and their topics."""
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).normal(size=(TOPICS, dimension)).astype(np.float32)
+    topics = rng.integers(TOPICS, size=count)
+    vectors = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(count, dimension))
+    for start in range(0, count, _BLOCK_ROWS):
+        block_topics = topics[start:start + _BLOCK_ROWS]
+        block = centers[block_topics] + rng.normal(scale=0.8, size=(len(block_topics), dimension)).astype(np.float32)
+        vectors[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    vectors.flush()
+    return np.load(path, mmap_mode="r"), topics
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Ids of the exact k nearest vectors of each query."""
+    best = np.full((len(queries), k), np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(vectors), _BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _BLOCK_ROWS])
+        distances = np.einsum("ij,ij->i", block, block)[None, :] - 2 * queries @ block.T
+        distances = np.concatenate([best, distances], axis=1)
+        rows = np.concatenate([best_rows, np.arange(start, start + len(block))[None, :].repeat(len(queries), 0)], axis=1)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(distances, nearest, axis=1)
+        best_rows = np.take_along_axis(rows, nearest, axis=1)
+    return [{f"chunk-{row}" for row in rows} for rows in best_rows]
+
+
+def _batches(vectors: np.ndarray, topics: np.ndarray, batch_size: int) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+    for start in range(0, len(vectors), batch_size):
+        rows = range(start, min(start + batch_size, len(vectors)))
+        yield (
+            [f"chunk-{row}" for row in rows],
+            [f"Synthetic chunk {row} about topic {topics[row]}." for row in rows],
+            [{"source": f"https://example.com/topic-{topics[row]}", "chunk_id": f"chunk-{row}"} for row in rows],
+            np.asarray(vectors[start:start + len(rows)]),
+        )
+
+
+def build(backend: str, path: str, vectors: np.ndarray, topics: np.ndarray) -> float:
+    """Write vectors into a new store of backend at path; returns the seconds it took."""
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection(COLLECTION_NAME)
+        for ids, texts, metadatas, block in _batches(vectors, topics, client.get_max_batch_size()):
+            collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=block)
+    else:
+        from graph.vector_index import NumpyVectorStore
+
+        lists = int(np.sqrt(len(vectors))) if "ivf" in backend else 0
+        store = NumpyVectorStore(path, lists=lists, int8="int8" in backend)
+        store.add_batches(_batches(vectors, topics, 5_000))
+        store.close()
+    return time.perf_counter() - started
+
+
+def _memory() -> Dict[str, float]:
+    """Rss and Pss of this process in MB (Pss is only available on Linux)."""
+    memory = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as rollup:
+            for line in rollup:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    memory[name.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+
+        memory["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return memory
+
+
+def worker(backend: str, path: str, queries: np.ndarray, k: int, probes: int, barrier: Any, results: Any) -> None:
+    """Open the store, time the first and every following query, and report memory once all workers are done."""
+    if backend == "chroma":
+        import chromadb
+    else:
+        from graph.vector_index import NumpyVectorStore
+    barrier.wait()
+
+    started = time.perf_counter()
+    if backend == "chroma":
+        collection = chromadb.PersistentClient(path=path).get_collection(COLLECTION_NAME)
+
+        def search(vector: np.ndarray) -> List[str]:
+            return collection.query(query_embeddings=[vector], n_results=k)["ids"][0]
+    else:
+        store = NumpyVectorStore(path, probes=probes)
+
+        def search(vector: np.ndarray) -> List[str]:
+            return [document.metadata["chunk_id"] for document, _ in store.similarity_search_by_vector_with_score(vector, k)]
+
+    found = [search(queries[0])]
+    open_ms = (time.perf_counter() - started) * 1000
+    latencies = []
+    for vector in queries[1:]:
+        started = time.perf_counter()
+        found.append(search(vector))
+        latencies.append((time.perf_counter() - started) * 1000)
+    # Measure memory while every worker still has the index open
+    barrier.wait()
+    results.put({"open_ms": open_ms, "latencies": latencies, "found": found, **_memory()})
+    barrier.wait()
+
+
+def measure(backend: str, path: str, queries: np.ndarray, k: int, probes: int, workers: int, drop_caches: bool) -> List[Dict[str, Any]]:
+    if drop_caches:
+        subprocess.run(["sync"], check=True)
+        with open("/proc/sys/vm/drop_caches", "w", encoding="utf-8") as caches:
+            caches.write("3\n")
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(backend, path, queries, k, probes, barrier, results)) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+
+def _disk_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated collection sizes")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension (1536: OpenAI embeddings)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Comma separated, among {', '.join(BACKENDS)}")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per worker")
+    parser.add_argument("--k", type=int, default=4, help="Results per query (RETRIEVAL_K)")
+    parser.add_argument("--probes", type=int, default=8, help="IVF lists scanned per query")
+    parser.add_argument("--workers", type=int, default=2, help="Processes querying each store at once")
+    parser.add_argument("--drop-caches", action="store_true", help="Empty the page cache before opening (root only)")
+    parser.add_argument("--workdir", default="./.cache/bench_vector_index", help="Directory for the stores")
+    parser.add_argument("--keep", action="store_true", help="Keep the stores after the run")
+    args = parser.parse_args()
+
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    for size in (int(size) for size in args.sizes.split(",")):
+        workdir = os.path.join(args.workdir, f"{size}-{args.dim}")
+        shutil.rmtree(workdir, ignore_errors=True)
+        os.makedirs(workdir)
+        vectors, topics = synthetic_vectors(os.path.join(workdir, "vectors.npy"), size, args.dim, seed=1)
+        queries, _ = synthetic_vectors(os.path.join(workdir, "queries.npy"), args.queries, args.dim, seed=2)
+        queries = np.asarray(queries)
+        expected = exact_neighbours(vectors, queries, args.k)
+
+        print(f"\n{size} chunks, dimension {args.dim}, k={args.k}, {args.workers} workers, {args.queries} queries each")
+        print(
+            f"{'backend':>16} {'build (s)':>10} {'disk (MB)':>10} {'open (ms)':>10} {'p50 (ms)':>9} "
+            f"{'p95 (ms)':>9} {'rss (MB)':>9} {'pss (MB)':>9} {'recall':>7}"
+        )
+        for backend in backends:
+            path = os.path.join(workdir, backend)
+            build_seconds = build(backend, path, vectors, topics)
+            reports = measure(backend, path, queries, args.k, args.probes, args.workers, args.drop_caches)
+            latencies = sorted(latency for report in reports for latency in report["latencies"])
+            recall = statistics.mean(
+                len(set(found) & truth) / args.k for report in reports for found, truth in zip(report["found"], expected)
+            )
+            print(
+                f"{backend:>16} {build_seconds:>10.1f} {_disk_mb(path):>10.1f} "
+                f"{statistics.mean(report['open_ms'] for report in reports):>10.1f} "
+                f"{latencies[len(latencies) // 2]:>9.2f} {latencies[int(len(latencies) * 0.95)]:>9.2f} "
+                f"{statistics.mean(report['rss'] for report in reports):>9.1f} "
+                f"{statistics.mean(report.get('pss', report['rss']) for report in reports):>9.1f} {recall:>7.3f}"
+            )
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
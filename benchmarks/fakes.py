@@ -0,0 +1,468 @@
+"""
+Local stand-ins for the model, vectorstore and Tavily clients used by the graph.
+
+install_fakes() swaps the chains and clients referenced by the graph modules with runnables
+that answer deterministically after a configurable delay, on both the sync (invoke) and the
+async (ainvoke) paths, so benchmarks run offline and only measure the graph itself.
+
+model_fakes() goes one level lower for the benchmark suite: the real chains, prompts, context
+builder, in-memory Chroma collection and BM25 index run unchanged, and only ChatOpenAI,
+OpenAIEmbeddings and the Tavily backend are replaced. FakeChatOpenAI answers every chain
+(structured outputs included) with rules keyed on the prompt and reports token usage, so LLM
+calls and tokens are measured like in production. CORPUS and the rules are chosen so that the
+questions of benchmarks/bench_suite.py take every path of graph/graph.py.
+"""
+import asyncio
+import hashlib
+import importlib
+import json
+import math
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, replace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import ConfigDict, Field
+
+from graph.cache import QuestionCache
+from graph.chains.answer_grader import GradeAnswer
+from graph.chains.hallucination_grader import GradeHallucination
+from graph.chains.retrieval_grader import DocumentVerdict, GradeDocument, GradeDocuments
+from graph.chains.router import RouteQuery
+from graph.search import FakeSearchBackend
+
+# Questions containing one of these words are routed to the vectorstore and graded relevant
+VECTORSTORE_TOPICS = ("agent", "prompt", "adversarial")
+
+
+def _on_topic(text: str) -> bool:
+    return any(topic in text.lower() for topic in VECTORSTORE_TOPICS)
+
+
+def stand_in(func: Callable[[Any], Any], latency: float) -> RunnableLambda:
+    """Wrap func in a runnable that waits latency seconds before answering (sync and async)."""
+
+    def invoke(inputs: Any) -> Any:
+        time.sleep(latency)
+        return func(inputs)
+
+    async def ainvoke(inputs: Any) -> Any:
+        await asyncio.sleep(latency)
+        return func(inputs)
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def _retrieve(question: str, k: int = 4) -> List[Document]:
+    return [
+        Document(page_content=f"{question} chunk {i}", metadata={"source": f"https://example.com/{i}"})
+        for i in range(k)
+    ]
+
+
+class _EmptyLexicalIndex:
+    """BM25 index without chunks, so hybrid retrieval returns the stand-in vector results."""
+
+    def search(self, query: str, k: int = 4) -> List[Any]:
+        return []
+
+
+def _batch_grade(inputs: Dict[str, Any]) -> GradeDocuments:
+    count = inputs["documents"].count("\n\n[") + 1
+    verdict = "yes" if _on_topic(inputs["question"]) else "no"
+    return GradeDocuments(verdicts=[DocumentVerdict(index=i, binary_score=verdict) for i in range(count)])
+
+
+def install_fakes(latency: float = 0.05) -> None:
+    """Replace every external client referenced by the graph with a local stand-in."""
+    graph_module = importlib.import_module("graph.graph")
+    retrieve_module = importlib.import_module("graph.nodes.retrieve")
+    grade_documents_module = importlib.import_module("graph.nodes.grade_documents")
+    generate_module = importlib.import_module("graph.nodes.generate")
+    grade_generation_module = importlib.import_module("graph.nodes.grade_generation")
+    web_search_module = importlib.import_module("graph.nodes.web_search")
+
+    graph_module.question_router = stand_in(
+        lambda inputs: RouteQuery(datasource="vectorstore" if _on_topic(inputs["question"]) else "websearch"),
+        latency,
+    )
+    vector_retriever = stand_in(_retrieve, latency)
+    retrieve_module.shard_retriever = lambda shard: vector_retriever
+    retrieve_module.get_lexical_index = lambda shard: _EmptyLexicalIndex()
+    grade_documents_module.retrieval_grader_chain = stand_in(
+        lambda inputs: GradeDocument(binary_score="yes" if _on_topic(inputs["question"]) else "no"),
+        latency,
+    )
+    grade_documents_module.batch_retrieval_grader_chain = stand_in(_batch_grade, latency)
+    generate_module.generation_chain = stand_in(lambda inputs: f"Answer to: {inputs['question']}", latency)
+    grade_generation_module.hallucination_grader_chain = stand_in(
+        lambda inputs: GradeHallucination(binary_score=True), latency
+    )
+    grade_generation_module.answer_grader_chain = stand_in(lambda inputs: GradeAnswer(binary_score=True), latency)
+    search_backend = FakeSearchBackend(latency=latency)
+    web_search_module.get_search_backend = lambda: search_backend
+    # Keep cached search results in memory so benchmark runs leave no files behind
+    web_search_cache = QuestionCache(":memory:")
+    web_search_module.get_question_cache = lambda: web_search_cache
+
+
+# Model-level stand-ins for the benchmark suite
+
+# Questions containing this word get an answer the hallucination grader rejects ("not supported")
+SPECULATION_MARKER = "speculate"
+# Questions containing this word are only resolved by an answer built from web results ("not useful" first)
+FRESHNESS_MARKER = "latest"
+WEB_MARKER = "Recent web results were included."
+
+# Five agent chunks, four on adversarial attacks and two on prompting: questions about agents or
+# attacks retrieve only relevant chunks, questions about prompting also get unrelated ones
+CORPUS: List[Tuple[str, str]] = [
+    ("https://lilianweng.github.io/posts/2023-06-23-agent/", text)
+    for text in (
+        "An autonomous agent uses an LLM as its brain, with planning, memory and tool use as key components.",
+        "Short-term memory of an agent is in-context learning; long-term memory keeps information over time.",
+        "Agent memory can be stored in an external vector store and retrieved with fast maximum inner product search.",
+        "The agent memory stream records observations, and a retrieval model surfaces them by recency and importance.",
+        "Planning lets an agent break tasks into subgoals and reflect on past actions to refine its memory.",
+    )
+] + [
+    ("https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/", text)
+    for text in (
+        "Adversarial attacks on LLMs craft inputs that trigger the model to output something undesired.",
+        "Jailbreak attacks are adversarial inputs that bypass the safety behaviour built into aligned models.",
+        "Token manipulation is a simple adversarial attack that swaps words for synonyms to fool a classifier.",
+        "Gradient based adversarial attacks search for suffixes that maximise the likelihood of a harmful reply.",
+    )
+] + [
+    ("https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/", text)
+    for text in (
+        "Prompt engineering steers model behaviour through instructions without updating the weights.",
+        "Few-shot prompting adds demonstrations of the task to the prompt before the new input.",
+    )
+]
+
+TOPIC_WORDS = ("agent", "prompt", "adversarial")
+
+
+def _topics(text: str) -> set:
+    lowered = text.lower()
+    return {topic for topic in TOPIC_WORDS if topic in lowered}
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    """
+    Simulated latency of the external services, in seconds.
+
+    Attributes:
+        chat: Time to the first token of a chat completion.
+        chat_per_token: Additional time per completion token.
+        embedding: Time per embeddings request.
+        search: Time per web search.
+    """
+
+    chat: float = 0.05
+    chat_per_token: float = 0.0
+    embedding: float = 0.01
+    search: float = 0.1
+
+    def completion(self, tokens: int) -> float:
+        return self.chat + self.chat_per_token * tokens
+
+
+LATENCY_PROFILES: Dict[str, LatencyProfile] = {
+    "zero": LatencyProfile(chat=0.0, embedding=0.0, search=0.0),
+    "fast": LatencyProfile(),
+    "realistic": LatencyProfile(chat=0.4, chat_per_token=0.01, embedding=0.1, search=0.8),
+}
+
+_profile = LATENCY_PROFILES["fast"]
+
+
+def _last_human(messages: List[BaseMessage]) -> str:
+    return str(messages[-1].content)
+
+
+def _between(text: str, start: str, end: Optional[str] = None) -> str:
+    pattern = re.escape(start) + (r"(.*?)" + re.escape(end) if end else r"(.*)$")
+    match = re.search(pattern, text, re.S)
+    return match.group(1).strip() if match else ""
+
+
+def _numbered(documents: str) -> List[Tuple[int, str]]:
+    parts = re.split(r"(?:^|\n\n)\[(\d+)\] ", documents)
+    return [(int(index), text) for index, text in zip(parts[1::2], parts[2::2])]
+
+
+def _relevant(document: str, question: str) -> str:
+    return "yes" if _topics(document) & _topics(question) else "no"
+
+
+def _reason(payload: Dict[str, Any]) -> str:
+    # About as long as the one-sentence explanations gpt-4o-mini writes for a grade
+    if payload.get("binary_score") in ("yes", True):
+        return "The text covers the key topics and entities the question asks about, so it meets the criterion."
+    return "The text does not cover the key topics or entities the question asks about, so it fails the criterion."
+
+
+def answer_for(schema: Optional[str], messages: List[BaseMessage]) -> str:
+    """
+    The completion FakeChatOpenAI returns: JSON for a structured output schema, else the answer text.
+
+    The "...WithReason(s)" schemas of the explain grading mode get a reason for every verdict.
+    """
+    human = _last_human(messages)
+    explained = bool(schema) and schema.endswith(("WithReason", "WithReasons"))
+    if explained:
+        schema = re.sub(r"WithReasons?$", "", schema)
+    if schema == "RouteQuery":
+        return json.dumps({"datasource": "vectorstore" if _topics(human) else "websearch"})
+    payload: Optional[Dict[str, Any]] = None
+    if schema == "GradeDocument":
+        document, question = _between(human, "Retrieved document:", "\nquestion:"), _between(human, "\nquestion:")
+        payload = {"binary_score": _relevant(document, question)}
+    if schema == "GradeDocuments":
+        documents, question = _between(human, "Retrieved documents:", "\nquestion:"), _between(human, "\nquestion:")
+        verdicts = [{"index": index, "binary_score": _relevant(text, question)} for index, text in _numbered(documents)]
+        if explained:
+            verdicts = [{**verdict, "reason": _reason(verdict)} for verdict in verdicts]
+        return json.dumps({"verdicts": verdicts})
+    if schema == "GradeHallucination":
+        payload = {"binary_score": SPECULATION_MARKER not in _between(human, "LLM generation:")}
+    if schema == "GradeAnswer":
+        question, generation = _between(human, "User question:", "LLM generation:"), _between(human, "LLM generation:")
+        payload = {"binary_score": FRESHNESS_MARKER not in question.lower() or WEB_MARKER in generation}
+    if payload is not None:
+        return json.dumps({**payload, "reason": _reason(payload)} if explained else payload)
+    # The RAG prompt: answer from the numbered passages of the context
+    question, context = _between(human, "Question:", "\n"), _between(human, "Context:", "Answer:")
+    passages = len(re.findall(r"^\[\d+\]", context, re.M))
+    answer = f"{question} is answered by {passages} passages of the context."
+    if "example.com" in context:
+        answer += f" {WEB_MARKER}"
+    if SPECULATION_MARKER in question.lower():
+        answer += f" I {SPECULATION_MARKER} beyond the sources."
+    return answer
+
+
+def _usage(messages: List[BaseMessage], text: str) -> Dict[str, int]:
+    from graph.context import count_tokens
+
+    prompt_tokens = sum(count_tokens(str(message.content)) for message in messages)
+    completion_tokens = count_tokens(text)
+    return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+class FakeChatOpenAI(BaseChatModel):
+    """
+    Deterministic stand-in for langchain_openai.ChatOpenAI.
+
+    Accepts (and ignores) the ChatOpenAI constructor arguments the chains pass, waits as the
+    active LatencyProfile says and returns answer_for() with its token usage.
+    """
+
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+    model_name: str = Field(default="gpt-4o-mini", alias="model")
+    profile: LatencyProfile = Field(default_factory=lambda: _profile)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-openai"
+
+    def _respond(self, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, int], float]:
+        text = answer_for(kwargs.get("structured_output"), messages)
+        usage = _usage(messages, text)
+        return text, usage, self.profile.completion(usage["output_tokens"])
+
+    def _result(self, text: str, usage: Dict[str, int]) -> ChatResult:
+        token_usage = {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"]}
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))],
+            llm_output={"token_usage": token_usage, "model_name": self.model_name},
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text, usage, latency = self._respond(messages, kwargs)
+        time.sleep(latency)
+        return self._result(text, usage)
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        text, usage, latency = self._respond(messages, kwargs)
+        await asyncio.sleep(latency)
+        return self._result(text, usage)
+
+    def _chunks(self, text: str, usage: Dict[str, int]) -> Iterator[ChatGenerationChunk]:
+        for word in re.findall(r"\S+\s*", text):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    def _stream(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text, usage, _ = self._respond(messages, kwargs)
+        time.sleep(self.profile.chat)
+        for chunk in self._chunks(text, usage):
+            time.sleep(self.profile.chat_per_token if chunk.message.content else 0)
+            yield chunk
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text, usage, _ = self._respond(messages, kwargs)
+        await asyncio.sleep(self.profile.chat)
+        for chunk in self._chunks(text, usage):
+            await asyncio.sleep(self.profile.chat_per_token if chunk.message.content else 0)
+            yield chunk
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Runnable:
+        return self.bind(structured_output=schema.__name__) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content), name="parse_structured_output"
+        )
+
+
+class FakeOpenAIEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for langchain_openai.OpenAIEmbeddings: normalized hashed bags of words.
+
+    Texts sharing words get similar vectors, so retrieval over CORPUS behaves like a real
+    (if purely lexical) embedding model. Each request waits the profile's embedding latency.
+    """
+
+    def __init__(self, dimensions: int = 256, profile: Optional[LatencyProfile] = None, **kwargs: Any):
+        self.dimensions = dimensions
+        self.profile = profile or _profile
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimensions] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.profile.embedding)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.profile.embedding)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+@dataclass
+class FakeServices:
+    """The in-memory services the graph runs against inside model_fakes()."""
+
+    vectorstore: Any
+    lexical_index: Any
+    search: FakeSearchBackend
+
+
+def _lazy_runnables() -> List[Any]:
+    from graph.chains import answer_grader, generation, hallucination_grader, retrieval_grader, router
+    from ingestion import retriever_vector
+
+    return [
+        router.question_router,
+        retrieval_grader.retrieval_grader_chain,
+        retrieval_grader.batch_retrieval_grader_chain,
+        generation.generation_chain,
+        hallucination_grader.hallucination_grader_chain,
+        answer_grader.answer_grader_chain,
+        retriever_vector,
+    ]
+
+
+def _reset_clients() -> None:
+    from graph.document_refs import get_document_store
+    from graph.embedding_cache import get_embeddings
+    from graph.shards import _shard_selector
+    from ingestion import shard_retriever
+
+    for lazy in _lazy_runnables():
+        lazy._runnable = None
+    get_embeddings.cache_clear()
+    shard_retriever.cache_clear()
+    # Shard topics embedded with another embeddings client
+    _shard_selector.cache_clear()
+    # Chunk texts of another collection must not resolve the refs of this one
+    get_document_store.cache_clear()
+
+
+@contextmanager
+def model_fakes(profile: LatencyProfile = LATENCY_PROFILES["fast"]) -> Iterator[FakeServices]:
+    """
+    Run the graph against FakeChatOpenAI, FakeOpenAIEmbeddings, an in-memory Chroma collection
+    holding CORPUS, an in-memory BM25 index and a FakeSearchBackend, with latencies from profile.
+
+    Answer caches and the hub prompt are turned off so runs are repeatable; every other setting
+    comes from the environment. Everything is restored on exit.
+    """
+    global _profile
+    import langchain_openai
+    from langchain_community.vectorstores import Chroma
+
+    from graph.bm25 import BM25Index
+    from graph.config import configure, get_settings
+
+    previous_settings, previous_profile = get_settings(), _profile
+    _profile = profile
+    with ExitStack() as stack:
+        configure(
+            replace(
+                previous_settings,
+                rag_prompt_source="local",
+                cache_enabled=False,
+                embedding_cache_enabled=False,
+                web_search_cache_enabled=False,
+                router_mode="llm",
+                telemetry_enabled=False,
+            )
+        )
+        stack.callback(configure, previous_settings)
+        stack.callback(_reset_clients)
+        stack.enter_context(patch.object(langchain_openai, "ChatOpenAI", FakeChatOpenAI))
+        stack.enter_context(patch.object(langchain_openai, "OpenAIEmbeddings", FakeOpenAIEmbeddings))
+        _reset_clients()
+
+        documents = [
+            Document(page_content=text, metadata={"source": source, "chunk_id": f"chunk-{index}"})
+            for index, (source, text) in enumerate(CORPUS)
+        ]
+        ids = [document.metadata["chunk_id"] for document in documents]
+        vectorstore = Chroma(
+            collection_name=f"bench-{time.time_ns()}",
+            embedding_function=FakeOpenAIEmbeddings(profile=LATENCY_PROFILES["zero"]),
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+        vectorstore.add_documents(documents, ids=ids)
+        stack.callback(vectorstore.delete_collection)
+        vectorstore.embeddings.profile = profile
+        lexical_index = BM25Index(":memory:")
+        lexical_index.add(ids, documents)
+        search = FakeSearchBackend(latency=profile.search)
+
+        ingestion_module = importlib.import_module("ingestion")
+        retrieve_module = importlib.import_module("graph.nodes.retrieve")
+        web_search_module = importlib.import_module("graph.nodes.web_search")
+        stack.enter_context(patch.object(ingestion_module, "get_vectorstore", lambda collection=None: vectorstore))
+        stack.enter_context(patch.object(retrieve_module, "get_lexical_index", lambda collection=None: lexical_index))
+        stack.enter_context(patch.object(web_search_module, "get_search_backend", lambda: search))
+        try:
+            yield FakeServices(vectorstore=vectorstore, lexical_index=lexical_index, search=search)
+        finally:
+            _profile = previous_profile
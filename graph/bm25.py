@@ -0,0 +1,160 @@
+"""
+Persistent BM25 index of the ingested chunks.
+
+The index is an inverted index in SQLite stored next to the Chroma collection. Chunks are added
+and deleted by id at ingestion time, so the index is updated incrementally and opening it at
+startup costs nothing; document frequencies and lengths are read at query time.
+"""
+import json
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+# SQLite limits the number of bound parameters per statement
+_BATCH_SIZE = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-cased word tokens."""
+    return re.findall(r"\w+", unicodedata.normalize("NFKC", text).casefold())
+
+
+def _batches(items: Sequence[str]) -> List[Sequence[str]]:
+    return [items[start:start + _BATCH_SIZE] for start in range(0, len(items), _BATCH_SIZE)]
+
+
+def _placeholders(items: Sequence[str]) -> str:
+    return ", ".join("?" * len(items))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of the collection, persisted in SQLite.
+
+    Args:
+        path: SQLite database file; it is created on first use.
+        k1: Term frequency saturation.
+        b: Document length normalization.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL,
+                page_content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                frequency INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id);
+            """
+        )
+        self._connection.commit()
+
+    def add(self, ids: Sequence[str], documents: Sequence[Document]) -> None:
+        """Index documents under ids, replacing chunks that are already indexed."""
+        with self._lock:
+            self._delete(list(ids))
+            for chunk_id, document in zip(ids, documents):
+                terms = Counter(tokenize(document.page_content))
+                self._connection.execute(
+                    "INSERT INTO chunks (id, length, page_content, metadata) VALUES (?, ?, ?, ?)",
+                    (chunk_id, sum(terms.values()), document.page_content, json.dumps(document.metadata)),
+                )
+                self._connection.executemany(
+                    "INSERT INTO postings (term, chunk_id, frequency) VALUES (?, ?, ?)",
+                    [(term, chunk_id, frequency) for term, frequency in terms.items()],
+                )
+            self._connection.commit()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            self._delete(list(ids))
+            self._connection.commit()
+
+    def ids(self) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._connection.execute("SELECT id FROM chunks")}
+
+    def ids_after(self, after: str, limit: int) -> List[str]:
+        """The first limit indexed ids greater than after, in order; pages through the index in bounded memory."""
+        with self._lock:
+            rows = self._connection.execute("SELECT id FROM chunks WHERE id > ? ORDER BY id LIMIT ?", (after, limit))
+            return [row[0] for row in rows]
+
+    def missing(self, ids: Sequence[str]) -> List[str]:
+        """The ids, in order, that are not indexed."""
+        indexed: Set[str] = set()
+        with self._lock:
+            for batch in _batches(list(ids)):
+                indexed.update(
+                    row[0]
+                    for row in self._connection.execute(f"SELECT id FROM chunks WHERE id IN ({_placeholders(batch)})", batch)
+                )
+        return [chunk_id for chunk_id in ids if chunk_id not in indexed]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Return the k best matching chunks with their BM25 scores, best first."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            count, average_length = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(AVG(length), 0) FROM chunks"
+            ).fetchone()
+            if not count:
+                return []
+            rows = self._connection.execute(
+                "SELECT postings.term, postings.chunk_id, postings.frequency, chunks.length "
+                f"FROM postings JOIN chunks ON chunks.id = postings.chunk_id WHERE postings.term IN ({_placeholders(terms)})",
+                terms,
+            ).fetchall()
+
+            document_frequency = Counter(term for term, _, _, _ in rows)
+            scores: Dict[str, float] = {}
+            for term, chunk_id, frequency, length in rows:
+                df = document_frequency[term]
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                norm = frequency + self.k1 * (1 - self.b + self.b * length / (average_length or 1))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            contents = {
+                chunk_id: (page_content, metadata)
+                for chunk_id, page_content, metadata in self._connection.execute(
+                    f"SELECT id, page_content, metadata FROM chunks WHERE id IN ({_placeholders(best)})",
+                    [chunk_id for chunk_id, _ in best],
+                )
+            }
+        return [
+            (Document(page_content=contents[chunk_id][0], metadata=json.loads(contents[chunk_id][1])), score)
+            for chunk_id, score in best
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _delete(self, ids: List[str]) -> None:
+        for batch in _batches(ids):
+            self._connection.execute(f"DELETE FROM postings WHERE chunk_id IN ({_placeholders(batch)})", batch)
+            self._connection.execute(f"DELETE FROM chunks WHERE id IN ({_placeholders(batch)})", batch)
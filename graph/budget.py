@@ -0,0 +1,125 @@
+"""
+Per-request budget: a deadline and caps on the LLM calls and web searches of one run.
+
+Every "not useful" answer sends the graph back through web search and generation, so without a
+bound a single question can keep spending calls. The budget travels in GraphState["budget"]; the
+nodes add the calls they make to the totals in GraphState["llm_calls"] and ["web_searches"]
+(spent()) and check, before starting a step, whether it still fits (exceeded()). When it does
+not, the node skips the step and marks the run degraded (degrade()), and the edges in
+graph/graph.py end the run as soon as it has an answer: the best answer so far, left ungraded,
+with state["degraded"] set and the limit that ran out in state["degraded_reason"].
+
+Callers may pass their own budget in the input ({"question": q, "budget": new_budget(...)}); by
+default the first node creates one from the BUDGET_* settings, so the deadline counts from the
+first node. The routing decision happens before that node and is not counted.
+"""
+import math
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Mapping, Optional, TypedDict
+
+from graph.config import Settings, get_settings
+from graph.telemetry import record_budget_exhausted
+
+from logger import log_warning
+
+DEADLINE = "deadline"
+LLM_CALLS = "llm_calls"
+WEB_SEARCHES = "web_searches"
+
+# Calls of the steps the nodes plan for: one generation, and both generation graders
+GENERATION_CALLS = 1
+GENERATION_GRADING_CALLS = 2
+
+
+class RequestBudget(TypedDict):
+    """
+    Limits of one request.
+
+    Attributes:
+        deadline: Wall-clock time (time.time()) after which no new LLM call or search starts.
+        max_llm_calls: LLM calls the nodes may make.
+        max_web_searches: Web searches (cache misses) the nodes may make.
+    """
+
+    deadline: float
+    max_llm_calls: int
+    max_web_searches: int
+
+
+def new_budget(settings: Optional[Settings] = None, started: Optional[float] = None) -> RequestBudget:
+    """A budget from settings (the shared settings by default) whose deadline counts from started (now)."""
+    settings = settings or get_settings()
+    started = time.time() if started is None else started
+    return RequestBudget(
+        deadline=started + settings.budget_deadline if math.isfinite(settings.budget_deadline) else math.inf,
+        max_llm_calls=settings.budget_max_llm_calls,
+        max_web_searches=settings.budget_max_web_searches,
+    )
+
+
+def request_budget(state: Mapping[str, Any]) -> RequestBudget:
+    """The budget of the run, or a new one when the input did not bring it."""
+    return state.get("budget") or new_budget()
+
+
+def exceeded(state: Mapping[str, Any], llm_calls: int = 0, web_searches: int = 0) -> Optional[str]:
+    """
+    Which limit a step making llm_calls more LLM calls and web_searches more searches would break.
+
+    Returns:
+        DEADLINE, LLM_CALLS or WEB_SEARCHES, or None when the step fits in the budget.
+    """
+    budget = request_budget(state)
+    if time.time() >= budget["deadline"]:
+        return DEADLINE
+    if (state.get("llm_calls") or 0) + llm_calls > budget["max_llm_calls"]:
+        return LLM_CALLS
+    if (state.get("web_searches") or 0) + web_searches > budget["max_web_searches"]:
+        return WEB_SEARCHES
+    return None
+
+
+def spent(state: Mapping[str, Any], llm_calls: int = 0, web_searches: int = 0) -> Dict[str, int]:
+    """State update adding llm_calls and web_searches to the totals of the run."""
+    update = {}
+    if llm_calls:
+        update["llm_calls"] = (state.get("llm_calls") or 0) + llm_calls
+    if web_searches:
+        update["web_searches"] = (state.get("web_searches") or 0) + web_searches
+    return update
+
+
+@dataclass
+class BudgetStats:
+    """Steps skipped because a request ran out of its budget, per exhausted limit."""
+
+    deadline: int = 0
+    llm_calls: int = 0
+    web_searches: int = 0
+
+
+_stats = BudgetStats()
+_stats_lock = threading.Lock()
+
+
+def budget_stats() -> Dict[str, int]:
+    """Return the budget exhaustion counters of this process."""
+    with _stats_lock:
+        return asdict(_stats)
+
+
+def reset_budget_stats() -> None:
+    global _stats
+    with _stats_lock:
+        _stats = BudgetStats()
+
+
+def degrade(reason: str, stage: str) -> Dict[str, Any]:
+    """Record that stage was cut short by reason and return the state update flagging the run."""
+    with _stats_lock:
+        setattr(_stats, reason, getattr(_stats, reason) + 1)
+    record_budget_exhausted(reason, stage)
+    log_warning(f"---PRESUPUESTO AGOTADO ({reason}) EN {stage}: SE ENTREGA LA MEJOR RESPUESTA HASTA AHORA---")
+    return {"degraded": True, "degraded_reason": reason}
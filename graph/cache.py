@@ -0,0 +1,409 @@
+"""
+Persistent question cache backed by SQLite.
+
+Entries are keyed by the normalized question and grouped by namespace (answers, routing
+decisions). Each entry has its own time to live and the least recently used entries are evicted
+once a namespace exceeds its size limit. Lookups can optionally fall back to the closest cached
+question by embedding cosine similarity.
+"""
+import asyncio
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from graph.config import get_settings
+from graph.document_refs import relevant_documents, to_refs
+from graph.telemetry import record_cache
+from logger import log_info
+
+ANSWERS_NAMESPACE = "answers"
+ROUTES_NAMESPACE = "routes"
+WEB_SEARCH_NAMESPACE = "web_search"
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact-match lookups: case, unicode form, punctuation and spacing."""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def pack_embedding(embedding: Sequence[float]) -> bytes:
+    """Serialize an embedding as float32 bytes for a SQLite BLOB column."""
+    return array("f", embedding).tobytes()
+
+
+def unpack_embedding(blob: bytes) -> array:
+    """Read back an embedding written by pack_embedding()."""
+    embedding = array("f")
+    embedding.frombytes(blob)
+    return embedding
+
+
+def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for one cache namespace."""
+
+    hits: int = 0
+    similar_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+
+class QuestionCache:
+    """
+    SQLite-backed cache of JSON values keyed by normalized question.
+
+    Args:
+        path: SQLite database file; it is created on first use and survives restarts.
+        max_entries: Maximum number of entries kept per namespace (least recently used are evicted).
+        default_ttl: Seconds an entry stays valid when set() is not given an explicit ttl.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000, default_ttl: float = 86_400):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._stats: Dict[str, CacheStats] = defaultdict(CacheStats)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS question_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                embedding BLOB,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._connection.commit()
+
+    def get(self, namespace: str, question: str) -> Optional[Any]:
+        """Return the cached value for the normalized question, or None on a miss."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM question_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now),
+            ).fetchone()
+            if row is None:
+                self._stats[namespace].misses += 1
+                record_cache(namespace, misses=1)
+                return None
+            self._touch(namespace, key, now)
+            self._stats[namespace].hits += 1
+        record_cache(namespace, hits=1)
+        return json.loads(row[0])
+
+    def get_similar(self, namespace: str, embedding: Sequence[float], threshold: float) -> Optional[Any]:
+        """Return the value of the most similar cached question if its cosine similarity reaches threshold."""
+        import numpy as np
+
+        now = time.time()
+        query = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, embedding FROM question_cache "
+                "WHERE namespace = ? AND expires_at > ? AND embedding IS NOT NULL AND length(embedding) = ?",
+                (namespace, now, query.nbytes),
+            ).fetchall()
+        # Scored outside the lock with one product over all the cached embeddings
+        best_key = None
+        query_norm = float(np.linalg.norm(query))
+        if rows and query_norm:
+            matrix = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), -1)
+            norms = np.linalg.norm(matrix, axis=1) * query_norm
+            scores = np.divide(matrix @ query, norms, out=np.zeros(len(rows), dtype=np.float32), where=norms > 0)
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                best_key = rows[best][0]
+        with self._lock:
+            row = None
+            if best_key is not None:
+                row = self._connection.execute(
+                    "SELECT value FROM question_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, best_key, now),
+                ).fetchone()
+            if row is None:
+                self._stats[namespace].misses += 1
+                record_cache(f"{namespace}_similar", misses=1)
+                return None
+            self._touch(namespace, best_key, now)
+            self._stats[namespace].similar_hits += 1
+        record_cache(f"{namespace}_similar", hits=1)
+        return json.loads(row[0])
+
+    def set(
+        self,
+        namespace: str,
+        question: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        embedding: Optional[Sequence[float]] = None,
+    ) -> None:
+        """Store value for the normalized question, evicting expired and least recently used entries."""
+        key = normalize_question(question)
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        blob = pack_embedding(embedding) if embedding is not None else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO question_cache (namespace, key, value, embedding, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), blob, expires_at, now),
+            )
+            self._stats[namespace].writes += 1
+            self._evict(namespace, now)
+            self._connection.commit()
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Remove every entry, or only the entries of one namespace."""
+        with self._lock:
+            if namespace is None:
+                self._connection.execute("DELETE FROM question_cache")
+            else:
+                self._connection.execute("DELETE FROM question_cache WHERE namespace = ?", (namespace,))
+            self._connection.commit()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the hit/miss counters of this process, per namespace."""
+        with self._lock:
+            return {namespace: asdict(stats) for namespace, stats in self._stats.items()}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _touch(self, namespace: str, key: str, now: float) -> None:
+        self._connection.execute(
+            "UPDATE question_cache SET last_access = ? WHERE namespace = ? AND key = ?",
+            (now, namespace, key),
+        )
+        self._connection.commit()
+
+    def _evict(self, namespace: str, now: float) -> None:
+        expired = self._connection.execute(
+            "DELETE FROM question_cache WHERE namespace = ? AND expires_at <= ?", (namespace, now)
+        ).rowcount
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM question_cache WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        overflow = max(0, count - self.max_entries)
+        if overflow:
+            self._connection.execute(
+                "DELETE FROM question_cache WHERE namespace = ? AND key IN ("
+                "SELECT key FROM question_cache WHERE namespace = ? ORDER BY last_access LIMIT ?)",
+                (namespace, namespace, overflow),
+            )
+        self._stats[namespace].evictions += expired + overflow
+
+
+@lru_cache(maxsize=1)
+def get_question_cache() -> QuestionCache:
+    """Return the shared cache configured by the settings, opening it on first use."""
+    settings = get_settings()
+    return QuestionCache(settings.cache_path, settings.cache_max_entries, settings.cache_ttl)
+
+
+def _serialize_documents(documents: List[Document]) -> List[Dict[str, Any]]:
+    return [{"page_content": document.page_content, "metadata": document.metadata} for document in documents]
+
+
+def _deserialize_documents(documents: List[Dict[str, Any]]) -> List[Document]:
+    return [Document(page_content=item["page_content"], metadata=item["metadata"]) for item in documents]
+
+
+class CachedGraph:
+    """
+    Answer cache in front of a compiled graph.
+
+    invoke() returns the cached final state for a repeated question instead of running the
+    graph again. Only runs whose generation was graded "useful" are stored; answers built from
+    web search results use web_search_ttl so time-sensitive answers expire sooner. Any other
+    attribute is delegated to the wrapped graph.
+
+    stream() and astream() use the same cache. A hit yields the cached state once, as a "values"
+    chunk (an "updates" chunk from the answer_cache node), and no custom events, since no answer is
+    generated. A miss streams the run and stores its last state, read from the "values" mode
+    that is added to the requested ones and filtered out of the chunks. Runs streamed with
+    subgraphs=True go straight to the wrapped graph.
+
+    Args:
+        app: Compiled LangGraph application.
+        cache: Lazily built QuestionCache (called on first use).
+        ttl: Seconds to keep answers grounded only in the vectorstore.
+        web_search_ttl: Seconds to keep answers that used web search results.
+        embed_query: Optional embedding function enabling similarity lookups on exact misses.
+        similarity_threshold: Minimum cosine similarity for a similarity hit.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        cache: Callable[[], QuestionCache],
+        ttl: float,
+        web_search_ttl: float,
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.app = app
+        self._cache_factory = cache
+        self.ttl = ttl
+        self.web_search_ttl = web_search_ttl
+        self.embed_query = embed_query
+        self.similarity_threshold = similarity_threshold
+
+    @property
+    def cache(self) -> QuestionCache:
+        return self._cache_factory()
+
+    def _lookup(self, question: str) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """The cached value for question (exact, then similar) and its embedding when one was computed."""
+        cached = self.cache.get(ANSWERS_NAMESPACE, question)
+        embedding = None
+        if cached is None and self.embed_query is not None:
+            embedding = self.embed_query(question)
+            cached = self.cache.get_similar(ANSWERS_NAMESPACE, embedding, self.similarity_threshold)
+        return cached, embedding
+
+    async def _alookup(self, question: str) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        cached = self.cache.get(ANSWERS_NAMESPACE, question)
+        embedding = None
+        if cached is None and self.embed_query is not None:
+            embedding = await asyncio.to_thread(self.embed_query, question)
+            cached = self.cache.get_similar(ANSWERS_NAMESPACE, embedding, self.similarity_threshold)
+        return cached, embedding
+
+    def invoke(self, input: Dict[str, Any], config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        question = input["question"]
+        cached, embedding = self._lookup(question)
+        if cached is not None:
+            return self._cached_result(question, cached)
+
+        result = self.app.invoke(input, config, **kwargs)
+        self._store(question, result, embedding)
+        return result
+
+    async def ainvoke(
+        self, input: Dict[str, Any], config: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        question = input["question"]
+        cached, embedding = await self._alookup(question)
+        if cached is not None:
+            return self._cached_result(question, cached)
+
+        result = await self.app.ainvoke(input, config, **kwargs)
+        self._store(question, result, embedding)
+        return result
+
+    def _stream_modes(self, stream_mode: Any) -> Tuple[List[str], List[str], bool]:
+        """The requested modes, the modes to run with ("values" added) and whether chunks are (mode, chunk) pairs."""
+        if stream_mode is None:
+            stream_mode = getattr(self.app, "stream_mode", "values")
+        paired = not isinstance(stream_mode, str)
+        requested = list(stream_mode) if paired else [stream_mode]
+        return requested, list(dict.fromkeys([*requested, "values"])), paired
+
+    @staticmethod
+    def _replayed(result: Dict[str, Any], requested: List[str], paired: bool) -> Iterator[Any]:
+        for mode in requested:
+            chunk = {"values": result, "updates": {"answer_cache": result}}.get(mode)
+            if chunk is not None:
+                yield (mode, chunk) if paired else chunk
+
+    def stream(
+        self, input: Dict[str, Any], config: Optional[Dict[str, Any]] = None, *, stream_mode: Any = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        if kwargs.get("subgraphs"):
+            yield from self.app.stream(input, config, stream_mode=stream_mode, **kwargs)
+            return
+        question = input["question"]
+        requested, modes, paired = self._stream_modes(stream_mode)
+        cached, embedding = self._lookup(question)
+        if cached is not None:
+            yield from self._replayed(self._cached_result(question, cached), requested, paired)
+            return
+
+        result: Dict[str, Any] = {}
+        for mode, chunk in self.app.stream(input, config, stream_mode=modes, **kwargs):
+            if mode == "values":
+                result = chunk
+            if mode in requested:
+                yield (mode, chunk) if paired else chunk
+        self._store(question, result, embedding)
+
+    async def astream(
+        self, input: Dict[str, Any], config: Optional[Dict[str, Any]] = None, *, stream_mode: Any = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        if kwargs.get("subgraphs"):
+            async for chunk in self.app.astream(input, config, stream_mode=stream_mode, **kwargs):
+                yield chunk
+            return
+        question = input["question"]
+        requested, modes, paired = self._stream_modes(stream_mode)
+        cached, embedding = await self._alookup(question)
+        if cached is not None:
+            for chunk in self._replayed(self._cached_result(question, cached), requested, paired):
+                yield chunk
+            return
+
+        result: Dict[str, Any] = {}
+        async for mode, chunk in self.app.astream(input, config, stream_mode=modes, **kwargs):
+            if mode == "values":
+                result = chunk
+            if mode in requested:
+                yield (mode, chunk) if paired else chunk
+        self._store(question, result, embedding)
+
+    @staticmethod
+    def _cached_result(question: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+        log_info("---RESPUESTA RECUPERADA DE CACHE---")
+        return {**cached, "question": question, "documents": to_refs(_deserialize_documents(cached["documents"]))}
+
+    def _store(self, question: str, result: Dict[str, Any], embedding: Optional[List[float]]) -> None:
+        if result.get("generation_grade") == "useful":
+            documents = relevant_documents(result)
+            used_web_search = any(
+                "web_search" in (document.metadata.get("origin"), document.metadata.get("source"))
+                for document in documents
+            )
+            self.cache.set(
+                ANSWERS_NAMESPACE,
+                question,
+                {
+                    "generation": result["generation"],
+                    "generation_grade": result["generation_grade"],
+                    "web_search": result.get("web_search", False),
+                    "documents": _serialize_documents(documents),
+                },
+                ttl=self.web_search_ttl if used_web_search else self.ttl,
+                embedding=embedding,
+            )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.app, name)
@@ -0,0 +1,123 @@
+"""
+Fit the relevance score thresholds used to skip LLM document grading.
+
+The input is a labeled JSONL file, one question/chunk pair per line:
+
+    {"question": "What is agent memory?", "chunk": "...", "relevant": true}
+
+A line may carry a precomputed "score"; otherwise the pair is scored like the retriever does
+(cached embeddings and the relevance function of the Chroma collection). The accept threshold is
+the lowest score above which at least `precision` of the chunks are relevant, and the reject
+threshold the highest score below which at least `precision` are not; chunks in between are
+left to the LLM grader.
+
+Usage:
+
+    python -m graph.calibration labeled.jsonl --precision 0.95
+"""
+import argparse
+import json
+import math
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from logger import log_info, log_success
+
+Sample = Tuple[float, bool]
+
+
+@dataclass
+class Thresholds:
+    """
+    Fitted thresholds and how they perform on the labeled set.
+
+    Attributes:
+        accept: Chunks scoring at least this are accepted (inf when no threshold is precise enough).
+        reject: Chunks scoring below this are rejected (-inf when no threshold is precise enough).
+        skipped: Fraction of the samples settled without an LLM call.
+        accuracy: Fraction of the settled samples whose automatic verdict matches the label.
+    """
+
+    accept: float
+    reject: float
+    skipped: float
+    accuracy: float
+
+
+def _fit_accept(samples: Sequence[Sample], precision: float) -> float:
+    for threshold in sorted({score for score, _ in samples}):
+        accepted = [relevant for score, relevant in samples if score >= threshold]
+        if sum(accepted) >= precision * len(accepted):
+            return threshold
+    return math.inf
+
+
+def _fit_reject(samples: Sequence[Sample], precision: float, accept: float) -> float:
+    for threshold in sorted({score for score, _ in samples if score <= accept}, reverse=True):
+        rejected = [relevant for score, relevant in samples if score < threshold]
+        if rejected and len(rejected) - sum(rejected) >= precision * len(rejected):
+            return threshold
+    return -math.inf
+
+
+def fit_thresholds(samples: Sequence[Sample], precision: float = 0.95) -> Thresholds:
+    """Fit accept/reject thresholds on (relevance score, is relevant) samples."""
+    accept = _fit_accept(samples, precision)
+    reject = _fit_reject(samples, precision, accept)
+
+    settled = [(score >= accept, relevant) for score, relevant in samples if score >= accept or score < reject]
+    correct = sum(1 for verdict, relevant in settled if verdict == relevant)
+    return Thresholds(
+        accept=accept,
+        reject=reject,
+        skipped=len(settled) / len(samples) if samples else 0.0,
+        accuracy=correct / len(settled) if settled else 1.0,
+    )
+
+
+def _retrieval_scorer() -> Callable[[str, str], float]:
+    """Score a question/chunk pair the way the retriever scores its results."""
+    from graph.embedding_cache import get_embeddings
+    from ingestion import get_vectorstore
+
+    embeddings = get_embeddings()
+    relevance = get_vectorstore()._select_relevance_score_fn()
+
+    def score(question: str, chunk: str) -> float:
+        query_vector = embeddings.embed_query(question)
+        (chunk_vector,) = embeddings.embed_documents([chunk])
+        # Chroma's default "l2" space reports squared euclidean distances
+        distance = sum((a - b) ** 2 for a, b in zip(query_vector, chunk_vector))
+        return relevance(distance)
+
+    return score
+
+
+def load_samples(path: str, scorer: Optional[Callable[[str, str], float]] = None) -> List[Sample]:
+    samples = []
+    with open(path, encoding="utf-8") as labeled_file:
+        for line in labeled_file:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "score" not in item:
+                scorer = scorer or _retrieval_scorer()
+                item["score"] = scorer(item["question"], item["chunk"])
+            samples.append((float(item["score"]), bool(item["relevant"])))
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajusta los umbrales de relevancia que evitan llamadas al evaluador")
+    parser.add_argument("labeled", help="JSONL con question, chunk, relevant (y opcionalmente score)")
+    parser.add_argument("--precision", type=float, default=0.95, help="Precisión mínima de cada umbral")
+    args = parser.parse_args()
+
+    samples = load_samples(args.labeled)
+    thresholds = fit_thresholds(samples, args.precision)
+    log_info(f"{len(samples)} pares etiquetados")
+    log_success(
+        f"{thresholds.skipped:.0%} de las evaluaciones se omiten con {thresholds.accuracy:.1%} de aciertos"
+    )
+    print(f"SCORE_ACCEPT_THRESHOLD={thresholds.accept:.4f}")
+    print(f"SCORE_REJECT_THRESHOLD={thresholds.reject:.4f}")
@@ -1,7 +1,9 @@
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
-from langchain_core.runnables import RunnableSequence
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
+
+from graph.chains.grading import EXPLAIN, grader_llm, grader_output, with_grader_metrics
+from graph.lazy import LazyRunnable
 
 
 class GradeAnswer(BaseModel):
@@ -11,8 +13,11 @@ class GradeAnswer(BaseModel):
     )
 
 
-llm = ChatOpenAI(temperature=0)
-structured_llm_grader = llm.with_structured_output(GradeAnswer)
+class GradeAnswerWithReason(GradeAnswer):
+    """Answer grade with its reasoning, asked for in explain mode."""
+
+    reason: str = Field(description="Reasoning for the score")
+
 
 system = """You are a grader assessing whether an answer addresses / resolves a question \n 
      Give a binary score 'yes' or 'no'. Yes' means that the answer resolves the question."""
@@ -23,4 +28,11 @@ answer_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-answer_grader_chain: RunnableSequence = answer_prompt | structured_llm_grader
\ No newline at end of file
+
+def build_answer_grader_chain() -> Runnable:
+    schema = GradeAnswerWithReason if grader_output() == EXPLAIN else GradeAnswer
+    structured_llm_grader = grader_llm("answer_grader").with_structured_output(schema)
+    return with_grader_metrics(answer_prompt | structured_llm_grader, "answer_grader")
+
+
+answer_grader_chain = LazyRunnable(build_answer_grader_chain, name="answer_grader_chain")
\ No newline at end of file
@@ -1,28 +1,54 @@
 """
 This module defines the generation chain for producing answers using a retrieval-augmented generation (RAG) approach.
 It composes a prompt, a language model, and an output parser into a single chain for generating responses.
+The chain is built on first use, so importing this module does not contact OpenAI or the LangChain hub.
 """
 from dotenv import load_dotenv
 
 from langchain import hub
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+
+from graph.config import get_settings
+from graph.lazy import LazyRunnable
+from graph.llm import get_chat_model
+from logger import log_warning
 
 load_dotenv()
 
-# Initialize the language model with the specified parameters
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+# Vendored copy of the "rlm/rag-prompt" template from the LangChain hub, used offline or when the hub is unreachable
+RAG_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "human",
+            "You are an assistant for question-answering tasks. Use the following pieces of retrieved context "
+            "to answer the question. If you don't know the answer, just say that you don't know. Use three "
+            "sentences maximum and keep the answer concise.\n"
+            "Question: {question} \n"
+            "Context: {context} \n"
+            "Answer:",
+        )
+    ]
+)
 
-# Retrieve the RAG prompt template from the LangChain hub
-# Example of prompt get it
-"""
-    human
-    You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.
-    Question: {question} 
-    Context: {context} 
-    Answer:
-    """
-prompt = hub.pull("rlm/rag-prompt")
-
-# Compose the generation chain: prompt -> LLM -> output parser
-generation_chain = prompt | llm | StrOutputParser()
+
+def load_rag_prompt() -> ChatPromptTemplate:
+    """Retrieve the RAG prompt template from the LangChain hub, or the vendored copy."""
+    if get_settings().rag_prompt_source != "hub":
+        return RAG_PROMPT
+    try:
+        return hub.pull("rlm/rag-prompt")
+    except Exception as error:
+        log_warning(f"No se pudo descargar rlm/rag-prompt del hub ({error}), usando la copia local")
+        return RAG_PROMPT
+
+
+def build_generation_chain() -> Runnable:
+    # stream_usage reports the token usage of streamed answers too
+    llm = get_chat_model("generation", stream_usage=True)
+    # Compose the generation chain: prompt -> LLM -> output parser
+    return load_rag_prompt() | llm | StrOutputParser()
+
+
+generation_chain = LazyRunnable(build_generation_chain, name="generation_chain")
@@ -0,0 +1,102 @@
+"""
+Output mode and metrics shared by the retrieval, hallucination and answer graders.
+
+With GRADER_OUTPUT=lean (the default) the graders return the verdict alone under a completion cap
+of GRADER_MAX_TOKENS per verdict: nothing in the graph reads an explanation, and writing one took
+most of each grading call. GRADER_OUTPUT=explain asks every verdict for a free-text reason too,
+uncapped, for debugging and evaluation.
+
+Each grader chain reports its LLM calls to a GraderMetrics callback, which counts them with their
+completion tokens and latency per grader and mode (grader_stats(); rag_grader_* metrics when
+telemetry is enabled), so both modes can be compared on the same traffic.
+"""
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
+
+from graph.config import Settings, get_settings
+from graph.llm import get_chat_model
+from graph.telemetry import record_grader_call, token_usage
+
+LEAN = "lean"
+EXPLAIN = "explain"
+
+
+def grader_output(settings: Optional[Settings] = None) -> str:
+    """The output mode of the graders, "lean" or "explain"."""
+    return EXPLAIN if (settings or get_settings()).grader_output == EXPLAIN else LEAN
+
+
+def grader_llm(chain: str, verdicts: int = 1):
+    """Chat model of a grader; in lean mode its completions are capped to verdicts verdicts."""
+    settings = get_settings()
+    if grader_output(settings) == EXPLAIN:
+        return get_chat_model(chain)
+    return get_chat_model(chain, max_tokens=settings.grader_max_tokens * verdicts)
+
+
+@dataclass
+class GraderStats:
+    """LLM calls of one grader in one output mode."""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    seconds: float = 0.0
+
+
+_stats: Dict[Tuple[str, str], GraderStats] = {}
+_stats_lock = threading.Lock()
+
+
+def grader_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Return the counters of this process as {grader: {mode: counters}}."""
+    with _stats_lock:
+        stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (grader, mode), counters in _stats.items():
+            stats.setdefault(grader, {})[mode] = asdict(counters)
+        return stats
+
+
+def reset_grader_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+class GraderMetrics(BaseCallbackHandler):
+    """Times the LLM calls made under a grader chain and counts their tokens."""
+
+    def __init__(self, grader: str, mode: str):
+        self.grader = grader
+        self.mode = mode
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        prompt_tokens, completion_tokens = token_usage(response)
+        with _stats_lock:
+            stats = _stats.setdefault((self.grader, self.mode), GraderStats())
+            stats.calls += 1
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.seconds += seconds
+        record_grader_call(self.grader, self.mode, seconds, completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+
+def with_grader_metrics(chain: Runnable, grader: str) -> Runnable:
+    """Attach a GraderMetrics callback for grader, in the active output mode, to chain."""
+    return chain.with_config(callbacks=[GraderMetrics(grader, grader_output())])
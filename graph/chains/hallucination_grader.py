@@ -1,15 +1,17 @@
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
-from langchain_core.runnables import RunnableSequence
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+from graph.chains.grading import EXPLAIN, grader_llm, grader_output, with_grader_metrics
+from graph.lazy import LazyRunnable
 
 class GradeHallucination(BaseModel):
     """Binary score for hallucination present in generation answer"""
     binary_score: bool = Field(description="Answer is grounded in the facts, 'yes' or 'no'")
 
-structured_llm_grader = llm.with_structured_output(GradeHallucination)
+class GradeHallucinationWithReason(GradeHallucination):
+    """Binary score for hallucination present in generation answer, with its reasoning (explain mode)"""
+    reason: str = Field(description="Reasoning for the score, citing the unsupported claims if any")
 
 system = """You are a grader assessing whether an LLM generation is grounded in / supported by a set of retrieved facts. \n 
      Give a binary score 'yes' or 'no'. 'Yes' means that the answer is grounded in / supported by the set of facts. \n
@@ -22,4 +24,10 @@ hallucination_grader_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-hallucination_grader_chain: RunnableSequence = hallucination_grader_prompt | structured_llm_grader
\ No newline at end of file
+
+def build_hallucination_grader_chain() -> Runnable:
+    schema = GradeHallucinationWithReason if grader_output() == EXPLAIN else GradeHallucination
+    structured_llm_grader = grader_llm("hallucination_grader").with_structured_output(schema)
+    return with_grader_metrics(hallucination_grader_prompt | structured_llm_grader, "hallucination_grader")
+
+hallucination_grader_chain = LazyRunnable(build_hallucination_grader_chain, name="hallucination_grader_chain")
\ No newline at end of file
@@ -1,14 +1,26 @@
 """
 This module provides a chain for grading the relevance of retrieved documents to a user question.
-It uses a language model to assign a binary relevance score and provide reasoning.
+It uses a language model to assign a binary relevance score, with its reasoning in explain mode
+(see graph/chains/grading.py).
+
+It also provides a batched variant that grades all retrieved documents of a question in a single
+call, returning one verdict per document keyed by its index. Both chains are built on first use.
 """
 
+from typing import List
+
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
 from pydantic import BaseModel, Field
 
-# Initialize the language model for grading
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+from graph.chains.grading import EXPLAIN, grader_llm, grader_output, with_grader_metrics
+from graph.config import get_settings
+from graph.lazy import LazyRunnable
+
+
+def build_grader_llm(verdicts: int = 1):
+    """Initialize the language model for grading, capped to verdicts verdicts in lean mode."""
+    return grader_llm("retrieval_grader", verdicts)
 
 
 class GradeDocument(BaseModel):
@@ -17,17 +29,23 @@ class GradeDocument(BaseModel):
 
     Attributes:
         binary_score: 'yes' if the document is relevant to the question, 'no' otherwise.
-        reason: Explanation for the assigned score.
     """
 
     binary_score: str = Field(
         description="Documents are relevant to the question, 'yes' or 'no'"
     )
-    reason: str = Field(description="Reasoning for the score")
 
 
-# Wrap the LLM with structured output for document grading
-structured_llm_grader = llm.with_structured_output(GradeDocument)
+class GradeDocumentWithReason(GradeDocument):
+    """
+    Binary score for relevance check on retrieved documents, explained (explain mode).
+
+    Attributes:
+        reason: Explanation for the assigned score.
+    """
+
+    reason: str = Field(description="Reasoning for the score")
+
 
 # System prompt for the grader
 system_prompt = (
@@ -44,5 +62,81 @@ grader_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
+
+def build_retrieval_grader_chain() -> Runnable:
+    # Wrap the LLM with structured output for document grading
+    schema = GradeDocumentWithReason if grader_output() == EXPLAIN else GradeDocument
+    structured_llm_grader = build_grader_llm().with_structured_output(schema)
+    return with_grader_metrics(grader_prompt | structured_llm_grader, "retrieval_grader")
+
+
 # The retrieval grader chain: prompt -> LLM with structured output
-retrieval_grader_chain = grader_prompt | structured_llm_grader
+retrieval_grader_chain = LazyRunnable(build_retrieval_grader_chain, name="retrieval_grader_chain")
+
+
+class DocumentVerdict(BaseModel):
+    """Relevance verdict for one document of a batch, identified by its index."""
+
+    index: int = Field(description="Index of the document as given in the numbered list")
+    binary_score: str = Field(
+        description="Document is relevant to the question, 'yes' or 'no'"
+    )
+
+
+class DocumentVerdictWithReason(DocumentVerdict):
+    """Relevance verdict for one document of a batch, with its reasoning (explain mode)."""
+
+    reason: str = Field(description="Reasoning for the score")
+
+
+class GradeDocuments(BaseModel):
+    """
+    Relevance verdicts for a numbered batch of retrieved documents.
+
+    Attributes:
+        verdicts: One verdict per document, keyed by the document index.
+    """
+
+    verdicts: List[DocumentVerdict] = Field(
+        description="Exactly one verdict for every document in the numbered list"
+    )
+
+
+class GradeDocumentsWithReasons(GradeDocuments):
+    """Relevance verdicts for a numbered batch of retrieved documents, each explained (explain mode)."""
+
+    verdicts: List[DocumentVerdictWithReason] = Field(
+        description="Exactly one verdict for every document in the numbered list"
+    )
+
+
+def format_numbered_documents(documents: List[str]) -> str:
+    """Render document texts as a numbered list the batched grader can refer to by index."""
+    return "\n\n".join(f"[{index}] {document}" for index, document in enumerate(documents))
+
+
+batch_system_prompt = (
+    "You are a grader assessing relevance of retrieved documents to a user question.\n"
+    "The documents are given as a numbered list; the number in brackets is the document index.\n"
+    "If a document contains keyword(s) or semantic meaning related to the question, grade it as relevant.\n"
+    "Return exactly one verdict per document with its index and a binary score 'yes' or 'no'."
+)
+
+batch_grader_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", batch_system_prompt),
+        ("human", "Retrieved documents:\n{documents}\nquestion: {question}"),
+    ]
+)
+
+
+def build_batch_retrieval_grader_chain() -> Runnable:
+    # Wrap the LLM with structured output for grading every document in one call; in lean mode the
+    # cap allows one verdict per retrieved document (a truncated batch falls back to per-document grading)
+    schema = GradeDocumentsWithReasons if grader_output() == EXPLAIN else GradeDocuments
+    llm = build_grader_llm(verdicts=get_settings().retrieval_k)
+    return with_grader_metrics(batch_grader_prompt | llm.with_structured_output(schema), "batch_retrieval_grader")
+
+
+# The batched retrieval grader chain: numbered documents -> one verdict per document
+batch_retrieval_grader_chain = LazyRunnable(build_batch_retrieval_grader_chain, name="batch_retrieval_grader_chain")
@@ -2,8 +2,12 @@ from typing import Literal
 from dotenv import load_dotenv
 
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
+
+from graph.lazy import LazyRunnable
+from graph.llm import get_chat_model
+from graph.shards import vectorstore_topics
 
 load_dotenv()
 
@@ -16,11 +20,8 @@ class RouteQuery(BaseModel):
         description="Given a user question choose to route it to web search or a vectorstore",
         )
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-structured_llm_router = llm.with_structured_output(RouteQuery)
-
 system = """You are an expert at routing a user question to a vectorstore or web search.
-The vectorstore contains documents related to agents, prompt engineering, and adversarial attacks.
+The vectorstore contains documents related to {topics}.
 Use the vectorstore for questions on these topics. For all else, use web-search."""
 router_prompt = ChatPromptTemplate.from_messages(
     [
@@ -28,4 +29,12 @@ router_prompt = ChatPromptTemplate.from_messages(
         ("human", "{question}"),
     ]
 )
-question_router = router_prompt | structured_llm_router
+
+def build_question_router() -> Runnable:
+    llm = get_chat_model("router")
+    structured_llm_router = llm.with_structured_output(RouteQuery)
+    # The topics are the descriptors of the shards (graph/shards.py)
+    return router_prompt.partial(topics=vectorstore_topics()) | structured_llm_router
+
+# Built on first use so importing the router does not create the OpenAI client
+question_router = LazyRunnable(build_question_router, name="question_router")
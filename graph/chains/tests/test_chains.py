@@ -1,3 +1,5 @@
+from dataclasses import replace
+
 from dotenv import load_dotenv
 
 from graph.chains.generation import generation_chain
@@ -5,7 +7,13 @@ from graph.chains.hallucination_grader import (
     GradeHallucination,
     hallucination_grader_chain,
 )
-from graph.chains.retrieval_grader import GradeDocument, retrieval_grader_chain
+from graph.chains.retrieval_grader import (
+    GradeDocument,
+    GradeDocumentWithReason,
+    build_retrieval_grader_chain,
+    retrieval_grader_chain,
+)
+from graph.config import configure, get_settings
 from ingestion import retriever_vector
 from graph.chains.router import question_router, RouteQuery
 
@@ -19,7 +27,6 @@ def test_retrieval_grader_answer_yes() -> None:
 
     ressult: GradeDocument = retrieval_grader_chain.invoke({"document": doc_text, "question": question})
     assert ressult.binary_score == "yes"
-    print("Reason: \n", ressult.reason)
 
 
 def test_retrieval_grader_answer_no() -> None:
@@ -29,7 +36,22 @@ def test_retrieval_grader_answer_no() -> None:
 
     ressult: GradeDocument = retrieval_grader_chain.invoke({"document": doc_text, "question": question})
     assert ressult.binary_score == "no"
-    print("Reason: \n", ressult.reason)
+
+
+def test_retrieval_grader_explains_in_explain_mode() -> None:
+    question = "agent memory"
+    documents = retriever_vector.invoke(question)
+    doc_text = documents[1].page_content
+
+    settings = get_settings()
+    configure(replace(settings, grader_output="explain"))
+    try:
+        result = build_retrieval_grader_chain().invoke({"document": doc_text, "question": question})
+    finally:
+        configure(settings)
+    assert isinstance(result, GradeDocumentWithReason)
+    assert result.binary_score == "yes"
+    print("Reason: \n", result.reason)
 
 def test_generation_chain() -> None:
     question = "agent memory"
@@ -0,0 +1,370 @@
+"""
+SQLite checkpointer for the compiled graph.
+
+LangGraph saves a checkpoint of the state after every step of a run, keyed by the thread id in
+config["configurable"]["thread_id"], together with the writes of the tasks of the next step. With
+them a conversation (thread) continues from the state its last question left, and a run that
+failed resumes from its last completed node instead of starting over (see graph/sessions.py).
+
+The database would otherwise grow with every step of every thread, so SqliteCheckpointSaver
+applies a retention policy:
+
+- per thread, only the keep_per_thread most recent checkpoints (and their writes) are kept; the
+  latest one is all a follow-up or a resume needs,
+- threads idle for more than ttl seconds are deleted (prune(), run every PRUNE_EVERY_PUTS saves),
+- compact() prunes and then VACUUMs the file to give the freed pages back to the filesystem.
+
+    python -m graph.checkpoint           # prune + VACUUM the configured database, print its size
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from graph.config import get_settings
+
+# Saves between two sweeps of idle threads
+PRUNE_EVERY_PUTS = 200
+
+
+def _thread_config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver storing checkpoints and pending writes in a SQLite file.
+
+    Args:
+        path: SQLite database file (":memory:" for a throwaway store); created on first use.
+        keep_per_thread: Most recent checkpoints kept per thread (at least 1).
+        ttl: Seconds after its last checkpoint a thread is deleted; inf keeps threads forever.
+    """
+
+    def __init__(self, path: str, keep_per_thread: int = 10, ttl: float = 7 * 86_400, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.path = path
+        self.keep_per_thread = max(1, keep_per_thread)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._puts = 0
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_by_age ON checkpoints (thread_id, created_at);
+            """
+        )
+        self._connection.commit()
+
+    # Reads
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """The checkpoint config points at, or the latest one of its thread when it has no checkpoint_id."""
+        configurable = config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._connection.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._connection.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            writes = self._pending_writes(thread_id, checkpoint_ns, row[0])
+        return self._tuple(thread_id, checkpoint_ns, row, writes)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Checkpoints, newest first, of the thread in config (all threads when config is None)."""
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        conditions: List[str] = []
+        parameters: List[Any] = []
+        if config is not None:
+            configurable = config["configurable"]
+            conditions.append("thread_id = ?")
+            parameters.append(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                conditions.append("checkpoint_ns = ?")
+                parameters.append(configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                parameters.append(get_checkpoint_id(config))
+        if before is not None and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < ?")
+            parameters.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                return
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                writes = self._pending_writes(thread_id, checkpoint_ns, row[0])
+            yield self._tuple(thread_id, checkpoint_ns, tuple(row), writes)
+
+    def _pending_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        rows = self._connection.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((kind, value))) for task_id, channel, kind, value in rows]
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple, writes: List[Tuple[str, str, Any]]) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, kind, checkpoint, metadata_type, metadata = row
+        return CheckpointTuple(
+            config=_thread_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((kind, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=_thread_config(thread_id, checkpoint_ns, parent_checkpoint_id) if parent_checkpoint_id else None,
+            pending_writes=writes,
+        )
+
+    # Writes
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save checkpoint as the newest of its thread and drop the ones beyond keep_per_thread."""
+        configurable = config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        kind, blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                "type, checkpoint, metadata_type, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    configurable.get("checkpoint_id"),
+                    kind,
+                    blob,
+                    metadata_type,
+                    metadata_blob,
+                    time.time(),
+                ),
+            )
+            self._retain(thread_id, checkpoint_ns)
+            self._connection.commit()
+            self._puts += 1
+            sweep = self._puts % PRUNE_EVERY_PUTS == 0
+        if sweep:
+            self.prune()
+        return _thread_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Save the writes of a task against the checkpoint in config."""
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+        # Special channels (errors, interrupts) replace their previous value; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            kind, blob = self.serde.dumps_typed(value)
+            rows.append((*key, task_id, WRITES_IDX_MAP.get(channel, index), channel, kind, blob, task_path))
+        with self._lock:
+            self._connection.executemany(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+                "task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint and write of thread_id."""
+        with self._lock:
+            self._connection.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._connection.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._connection.commit()
+
+    # Retention
+
+    def _retain(self, thread_id: str, checkpoint_ns: str) -> None:
+        removed = self._connection.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT ?)",
+            (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep_per_thread),
+        ).rowcount
+        if removed:
+            self._connection.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+            )
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete the threads idle for more than ttl seconds; returns how many were deleted."""
+        if self.ttl == float("inf"):
+            return 0
+        cutoff = (time.time() if now is None else now) - self.ttl
+        with self._lock:
+            threads = [
+                thread_id
+                for (thread_id,) in self._connection.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?", (cutoff,)
+                )
+            ]
+            for thread_id in threads:
+                self._connection.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                self._connection.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._connection.commit()
+        return len(threads)
+
+    def compact(self) -> Dict[str, int]:
+        """Prune idle threads and VACUUM the database; returns stats() afterwards."""
+        self.prune()
+        with self._lock:
+            self._connection.execute("VACUUM")
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        """Threads, checkpoints and pending writes stored, and the size of the file in bytes."""
+        with self._lock:
+            (threads,) = self._connection.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints").fetchone()
+            (checkpoints,) = self._connection.execute("SELECT COUNT(*) FROM checkpoints").fetchone()
+            (writes,) = self._connection.execute("SELECT COUNT(*) FROM writes").fetchone()
+        size = os.path.getsize(self.path) if self.path != ":memory:" and os.path.exists(self.path) else 0
+        return {"threads": threads, "checkpoints": checkpoints, "writes": writes, "bytes": size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    # Async variants: SQLite calls are short, so they run on a worker thread
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+@lru_cache(maxsize=1)
+def get_checkpointer() -> SqliteCheckpointSaver:
+    """Return the shared checkpointer configured by the settings, opening it on first use."""
+    settings = get_settings()
+    return SqliteCheckpointSaver(
+        settings.checkpoint_path, settings.checkpoint_keep_per_thread, settings.checkpoint_ttl
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune idle threads and compact the checkpoint database")
+    parser.parse_args()
+    before = os.path.getsize(get_settings().checkpoint_path) if os.path.exists(get_settings().checkpoint_path) else 0
+    after = get_checkpointer().compact()
+    print(f"{after['threads']} threads, {after['checkpoints']} checkpoints, {after['writes']} writes")
+    print(f"{before} -> {after['bytes']} bytes")
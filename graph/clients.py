@@ -0,0 +1,122 @@
+"""
+Shared HTTP connection pools for the OpenAI (chat and embeddings) and Tavily clients.
+
+Every client built by the chains, the ingestion module and the web search node reuses the same
+pools, so concurrent questions share keep-alive connections instead of opening new ones per
+call. The chat models of the chains (graph/llm.py) get a pool of their own whose transport goes
+through the shared rate limiter of graph/rate_limit.py. Both pools report retryable responses
+(rate limits, server errors) to the telemetry layer, since the clients retry those internally.
+
+Async connections belong to the event loop that opened them, so the async clients keep one pool
+per running loop (PerLoopTransport): consecutive asyncio.run() calls, or a background loop next
+to the main one, each get their own connections, and the pools of closed loops are dropped.
+"""
+import asyncio
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+import httpx
+
+from graph.config import get_settings
+from graph.rate_limit import AsyncRateLimitedTransport, RateLimitedTransport, get_llm_limiter
+from graph.telemetry import record_http_response
+
+
+def _limits() -> httpx.Limits:
+    settings = get_settings()
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+    )
+
+
+def _on_response(response: httpx.Response) -> None:
+    record_http_response(response.status_code)
+
+
+async def _aon_response(response: httpx.Response) -> None:
+    record_http_response(response.status_code)
+
+
+class PerLoopTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport that sends each request through a pool of the running event loop.
+
+    factory() builds the pool of a loop the first time a request is sent from it; pools of loops
+    that have been closed are forgotten, since their connections cannot be used any more.
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self._factory = factory
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for closed in [other for other in self._transports if other.is_closed()]:
+                del self._transports[closed]
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = self._factory()
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Close the pool of the running loop (the others can only be closed from their own loop)."""
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """Return the process-wide synchronous HTTP client."""
+    return httpx.Client(
+        limits=_limits(), timeout=get_settings().http_timeout, event_hooks={"response": [_on_response]}
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide asynchronous HTTP client, with a connection pool per event loop."""
+    transport = PerLoopTransport(lambda: httpx.AsyncHTTPTransport(limits=_limits()))
+    return httpx.AsyncClient(
+        transport=transport, timeout=get_settings().http_timeout, event_hooks={"response": [_aon_response]}
+    )
+
+
+def openai_http_clients() -> Dict[str, Any]:
+    """Keyword arguments that make ChatOpenAI / OpenAIEmbeddings use the shared pools."""
+    return {"http_client": get_http_client(), "http_async_client": get_async_http_client()}
+
+
+@lru_cache(maxsize=1)
+def get_llm_http_client() -> httpx.Client:
+    """Return the process-wide synchronous HTTP client of the chat models, rate limited."""
+    transport = RateLimitedTransport(httpx.HTTPTransport(limits=_limits()), get_llm_limiter())
+    return httpx.Client(
+        transport=transport, timeout=get_settings().http_timeout, event_hooks={"response": [_on_response]}
+    )
+
+
+@lru_cache(maxsize=1)
+def get_llm_async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide asynchronous HTTP client of the chat models, rate limited, with a pool per event loop."""
+    pools = PerLoopTransport(lambda: httpx.AsyncHTTPTransport(limits=_limits()))
+    transport = AsyncRateLimitedTransport(pools, get_llm_limiter())
+    return httpx.AsyncClient(
+        transport=transport, timeout=get_settings().http_timeout, event_hooks={"response": [_aon_response]}
+    )
+
+
+def llm_http_clients() -> Dict[str, Any]:
+    """Keyword arguments that make ChatOpenAI use the rate limited pools."""
+    return {"http_client": get_llm_http_client(), "http_async_client": get_llm_async_http_client()}
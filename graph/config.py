@@ -0,0 +1,345 @@
+"""
+Runtime settings for the agentic RAG graph.
+
+Values are read from environment variables (see .env_example) so they can be tuned per
+deployment without touching the code. Use get_settings() to obtain the shared instance, or
+configure() to replace it (build_app(config) does this).
+"""
+import math
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name, default).strip()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Settings for the graph nodes and chains.
+
+    Attributes:
+        grading_strategy: "per_document" sends one grading call per document, "batched" grades
+            all documents in a single call and falls back to per_document on malformed output.
+        grading_mode: "sequential" grades one document at a time, "concurrent" grades them in parallel.
+        grader_max_concurrency: Maximum number of grading calls in flight in concurrent mode.
+        grader_timeout: Seconds allowed per document grade; slower grades count as not relevant.
+        grader_parallel_requests: Questions expected to be graded at once; the shared pools of the
+            synchronous concurrent grading have grader_max_concurrency workers (document grading)
+            and two workers (generation grading) for each.
+        grader_output: "lean" makes the retrieval, hallucination and answer graders return only their
+            verdict under a grader_max_tokens cap, "explain" adds an uncapped free-text reason
+            (for debugging and evaluation).
+        grader_max_tokens: Completion token cap per verdict in lean mode (the batched grader gets
+            one per retrieved document).
+        generation_grading_mode: "sequential" runs the answer grader only after the hallucination
+            grader passes, "concurrent" runs both at once and drops the answer grade when the
+            hallucination check fails.
+        score_accept_threshold: Chunks whose retrieval relevance score is at least this value are
+            accepted without an LLM grade (inf disables it; fit it with python -m graph.calibration).
+        score_reject_threshold: Chunks whose relevance score is below this value are rejected
+            without an LLM grade (-inf disables it).
+        cache_enabled: Serve repeated questions and routing decisions from the persistent cache.
+        cache_path: SQLite file of the cache.
+        cache_ttl: Seconds to keep cached answers and routing decisions.
+        cache_web_search_ttl: Seconds to keep cached answers that used web search results.
+        cache_max_entries: Maximum entries per cache namespace before LRU eviction.
+        cache_similarity_threshold: Cosine similarity for embedding matches; 0 disables them.
+        router_mode: "llm" routes every question with the LLM router, "embedding" routes locally by
+            similarity to the topic centroids of the collection and only asks the LLM when unsure.
+        router_vectorstore_threshold: Centroid similarity at or above which a question goes to the vectorstore.
+        router_websearch_threshold: Centroid similarity below which a question goes to web search.
+        vector_store_backend: "chroma" keeps the chunks in the rag-chroma collection, "numpy" in the
+            memory-mapped index of graph/vector_index.py (fill it with python -m graph.vector_index export).
+        vector_index_path: Directory of the NumPy index.
+        vector_index_lists: IVF lists the NumPy index is partitioned into when written; 0 keeps it
+            flat (exact search).
+        vector_index_probes: IVF lists scanned per query.
+        vector_index_int8: Store the NumPy index vectors quantized to int8 (a quarter of the bytes).
+        shards_path: JSON file declaring the shards (named collections with a topic descriptor and
+            their sources, see graph/shards.py); without it the corpus is the single rag-chroma collection.
+        shard_max_fanout: Shards searched at most per question (in parallel).
+        shard_min_similarity: Cosine similarity between the question and a shard's topics below which
+            the shard is not searched; the most similar shard is always searched.
+        ingest_fetch_workers: Threads fetching, parsing and splitting sources during ingestion.
+        ingest_embed_workers: Threads embedding chunk batches during ingestion.
+        ingest_batch_size: Chunks per embedding request and per bulk upsert.
+        ingest_queue_size: Capacity of each queue between ingestion stages; with the worker counts it
+            bounds how many sources and batches are in memory at once.
+        ingest_progress_seconds: Seconds between ingestion progress reports.
+        retrieval_mode: "vector" uses dense search only, "hybrid" fuses dense and BM25 results with
+            reciprocal rank fusion.
+        retrieval_k: Number of chunks handed to the grader.
+        retrieval_candidates: Chunks fetched from each retriever before fusion in hybrid mode.
+        rrf_k: Reciprocal rank fusion smoothing constant.
+        rrf_vector_weight: Weight of the dense ranking in the fusion.
+        rrf_bm25_weight: Weight of the BM25 ranking in the fusion.
+        embedding_cache_enabled: Reuse query and chunk embeddings from the on-disk embedding cache.
+        embedding_cache_path: SQLite file of the embedding cache.
+        embedding_cache_memory_entries: Embeddings kept in the in-memory LRU tier.
+        web_search_backend: Search provider used by the web_search node ("tavily" or "fake").
+        web_search_max_results: Results requested per web search.
+        web_search_timeout: Seconds allowed per web search request.
+        web_search_cache_enabled: Reuse the results of a repeated (normalized) query.
+        web_search_cache_ttl: Seconds to keep cached web search results.
+        context_packing: Build the generation and hallucination grading context with the context
+            builder (merged, deduplicated, budgeted); false passes the raw document list.
+        context_token_budget: Maximum tokens of retrieved context per prompt.
+        context_duplicate_threshold: Word-shingle Jaccard similarity above which a chunk is dropped
+            as a near-duplicate of a more relevant one.
+        telemetry_enabled: Record spans and metrics for every node, chain and LLM call (graph/telemetry.py).
+        telemetry_exporters: Comma separated exporters: "jsonl", "otel" and/or "prometheus".
+        telemetry_spans_path: JSONL file finished spans are appended to.
+        telemetry_metrics_path: File the Prometheus metrics are written to after each run.
+        telemetry_metrics_port: Port of the Prometheus /metrics endpoint; 0 disables it.
+        budget_deadline: Seconds a request may run before it ends with its best answer so far (inf
+            disables the deadline).
+        budget_max_llm_calls: LLM calls the nodes may make per request.
+        budget_max_web_searches: Web searches (cache misses) per request.
+        graph_recursion_limit: LangGraph recursion limit (steps per run) of the app built by build_app.
+        checkpoint_enabled: Checkpoint every step of a run in SQLite, per thread id, so follow-up
+            questions reuse the thread's documents and failed runs resume (graph/sessions.py).
+        checkpoint_path: SQLite file the checkpoints are stored in.
+        checkpoint_keep_per_thread: Most recent checkpoints kept per thread.
+        checkpoint_ttl: Seconds after its last checkpoint an idle thread is deleted (inf keeps them).
+        document_store_max_entries: Documents whose text is kept in memory for the refs in the state
+            (graph/document_refs.py); older ones are fetched from the vectorstore again.
+        session_reuse_threshold: Embedding cosine similarity between a follow-up and the question that
+            produced the thread's documents above which they are reused without retrieving; 0 only
+            reuses them for the same normalized question.
+        batch_concurrency: Questions answered at once by the batch mode of main.py.
+        http_max_connections: Size of the shared HTTP connection pools.
+        http_max_keepalive_connections: Idle connections kept open in the shared pools.
+        http_timeout: Seconds before a request on the shared pools times out.
+        llm_model: Chat model of every chain without its own in llm_chain_models.
+        llm_max_tokens: Completion token cap of every chain without its own; 0 leaves it uncapped.
+        llm_chain_models: Comma separated per-chain overrides "chain=model:max_tokens" (either part
+            may be empty) for router, retrieval_grader, generation, hallucination_grader and
+            answer_grader, e.g. "generation=gpt-4o:512,retrieval_grader=:64".
+        llm_requests_per_minute: Chat completion requests per minute of all chains together (0: unlimited).
+        llm_tokens_per_minute: Prompt plus max_tokens per minute of all chains together (0: unlimited).
+        llm_min_concurrency: Lower bound of the adaptive limit of chat requests in flight.
+        llm_max_concurrency: Upper bound (and starting value) of that limit.
+        llm_latency_target: Seconds per chat request above which the concurrency limit is halved,
+            as after a 429.
+        llm_max_retries: Retries of a chat request after a rate limit, server or connection error.
+        llm_retry_base_delay: Seconds of the first retry backoff, doubled on every attempt (with full jitter).
+        llm_retry_max_delay: Longest retry backoff in seconds.
+        rag_prompt_source: "hub" pulls rlm/rag-prompt (falling back to the vendored copy when the
+            hub is unreachable), "local" always uses the vendored copy.
+        render_graph_diagram: Render the workflow diagram when the app is built.
+        graph_diagram_path: PNG file the diagram is written to.
+    """
+
+    grading_strategy: str = "per_document"
+    grading_mode: str = "concurrent"
+    grader_max_concurrency: int = 4
+    grader_timeout: float = 30.0
+    grader_parallel_requests: int = 8
+    grader_output: str = "lean"
+    grader_max_tokens: int = 32
+    generation_grading_mode: str = "concurrent"
+    score_accept_threshold: float = math.inf
+    score_reject_threshold: float = -math.inf
+    cache_enabled: bool = False
+    cache_path: str = "./.cache/rag_cache.sqlite3"
+    cache_ttl: float = 86_400.0
+    cache_web_search_ttl: float = 3_600.0
+    cache_max_entries: int = 10_000
+    cache_similarity_threshold: float = 0.0
+    router_mode: str = "llm"
+    router_vectorstore_threshold: float = 0.45
+    router_websearch_threshold: float = 0.2
+    vector_store_backend: str = "chroma"
+    vector_index_path: str = "./.vector_index"
+    vector_index_lists: int = 0
+    vector_index_probes: int = 8
+    vector_index_int8: bool = False
+    shards_path: str = "./shards.json"
+    shard_max_fanout: int = 3
+    shard_min_similarity: float = 0.2
+    ingest_fetch_workers: int = 8
+    ingest_embed_workers: int = 2
+    ingest_batch_size: int = 256
+    ingest_queue_size: int = 16
+    ingest_progress_seconds: float = 10.0
+    retrieval_mode: str = "hybrid"
+    retrieval_k: int = 4
+    retrieval_candidates: int = 10
+    rrf_k: int = 60
+    rrf_vector_weight: float = 1.0
+    rrf_bm25_weight: float = 1.0
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "./.cache/embeddings.sqlite3"
+    embedding_cache_memory_entries: int = 4096
+    web_search_backend: str = "tavily"
+    web_search_max_results: int = 3
+    web_search_timeout: float = 15.0
+    web_search_cache_enabled: bool = True
+    web_search_cache_ttl: float = 900.0
+    context_packing: bool = True
+    context_token_budget: int = 2_000
+    context_duplicate_threshold: float = 0.8
+    telemetry_enabled: bool = False
+    telemetry_exporters: str = "jsonl,prometheus"
+    telemetry_spans_path: str = "./.cache/telemetry/spans.jsonl"
+    telemetry_metrics_path: str = "./.cache/telemetry/metrics.prom"
+    telemetry_metrics_port: int = 0
+    budget_deadline: float = 60.0
+    budget_max_llm_calls: int = 20
+    budget_max_web_searches: int = 2
+    graph_recursion_limit: int = 15
+    checkpoint_enabled: bool = False
+    checkpoint_path: str = "./.cache/checkpoints.sqlite3"
+    checkpoint_keep_per_thread: int = 10
+    checkpoint_ttl: float = 604_800.0
+    session_reuse_threshold: float = 0.9
+    document_store_max_entries: int = 10_000
+    batch_concurrency: int = 8
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_timeout: float = 60.0
+    llm_model: str = "gpt-4o-mini"
+    llm_max_tokens: int = 0
+    llm_chain_models: str = ""
+    llm_requests_per_minute: float = 500.0
+    llm_tokens_per_minute: float = 200_000.0
+    llm_min_concurrency: int = 1
+    llm_max_concurrency: int = 32
+    llm_latency_target: float = 20.0
+    llm_max_retries: int = 4
+    llm_retry_base_delay: float = 0.5
+    llm_retry_max_delay: float = 20.0
+    rag_prompt_source: str = "hub"
+    render_graph_diagram: bool = False
+    graph_diagram_path: str = "graph.png"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            grading_strategy=_env_str("GRADING_STRATEGY", cls.grading_strategy),
+            grading_mode=_env_str("GRADING_MODE", cls.grading_mode),
+            grader_max_concurrency=_env_int("GRADER_MAX_CONCURRENCY", cls.grader_max_concurrency),
+            grader_timeout=_env_float("GRADER_TIMEOUT", cls.grader_timeout),
+            grader_parallel_requests=_env_int("GRADER_PARALLEL_REQUESTS", cls.grader_parallel_requests),
+            grader_output=_env_str("GRADER_OUTPUT", cls.grader_output),
+            grader_max_tokens=_env_int("GRADER_MAX_TOKENS", cls.grader_max_tokens),
+            generation_grading_mode=_env_str("GENERATION_GRADING_MODE", cls.generation_grading_mode),
+            score_accept_threshold=_env_float("SCORE_ACCEPT_THRESHOLD", cls.score_accept_threshold),
+            score_reject_threshold=_env_float("SCORE_REJECT_THRESHOLD", cls.score_reject_threshold),
+            cache_enabled=_env_bool("CACHE_ENABLED", cls.cache_enabled),
+            cache_path=_env_str("CACHE_PATH", cls.cache_path),
+            cache_ttl=_env_float("CACHE_TTL", cls.cache_ttl),
+            cache_web_search_ttl=_env_float("CACHE_WEB_SEARCH_TTL", cls.cache_web_search_ttl),
+            cache_max_entries=_env_int("CACHE_MAX_ENTRIES", cls.cache_max_entries),
+            cache_similarity_threshold=_env_float("CACHE_SIMILARITY_THRESHOLD", cls.cache_similarity_threshold),
+            router_mode=_env_str("ROUTER_MODE", cls.router_mode),
+            router_vectorstore_threshold=_env_float("ROUTER_VECTORSTORE_THRESHOLD", cls.router_vectorstore_threshold),
+            router_websearch_threshold=_env_float("ROUTER_WEBSEARCH_THRESHOLD", cls.router_websearch_threshold),
+            vector_store_backend=_env_str("VECTOR_STORE_BACKEND", cls.vector_store_backend),
+            vector_index_path=_env_str("VECTOR_INDEX_PATH", cls.vector_index_path),
+            vector_index_lists=_env_int("VECTOR_INDEX_LISTS", cls.vector_index_lists),
+            vector_index_probes=_env_int("VECTOR_INDEX_PROBES", cls.vector_index_probes),
+            vector_index_int8=_env_bool("VECTOR_INDEX_INT8", cls.vector_index_int8),
+            shards_path=_env_str("SHARDS_PATH", cls.shards_path),
+            shard_max_fanout=_env_int("SHARD_MAX_FANOUT", cls.shard_max_fanout),
+            shard_min_similarity=_env_float("SHARD_MIN_SIMILARITY", cls.shard_min_similarity),
+            ingest_fetch_workers=_env_int("INGEST_FETCH_WORKERS", cls.ingest_fetch_workers),
+            ingest_embed_workers=_env_int("INGEST_EMBED_WORKERS", cls.ingest_embed_workers),
+            ingest_batch_size=_env_int("INGEST_BATCH_SIZE", cls.ingest_batch_size),
+            ingest_queue_size=_env_int("INGEST_QUEUE_SIZE", cls.ingest_queue_size),
+            ingest_progress_seconds=_env_float("INGEST_PROGRESS_SECONDS", cls.ingest_progress_seconds),
+            retrieval_mode=_env_str("RETRIEVAL_MODE", cls.retrieval_mode),
+            retrieval_k=_env_int("RETRIEVAL_K", cls.retrieval_k),
+            retrieval_candidates=_env_int("RETRIEVAL_CANDIDATES", cls.retrieval_candidates),
+            rrf_k=_env_int("RRF_K", cls.rrf_k),
+            rrf_vector_weight=_env_float("RRF_VECTOR_WEIGHT", cls.rrf_vector_weight),
+            rrf_bm25_weight=_env_float("RRF_BM25_WEIGHT", cls.rrf_bm25_weight),
+            embedding_cache_enabled=_env_bool("EMBEDDING_CACHE_ENABLED", cls.embedding_cache_enabled),
+            embedding_cache_path=_env_str("EMBEDDING_CACHE_PATH", cls.embedding_cache_path),
+            embedding_cache_memory_entries=_env_int(
+                "EMBEDDING_CACHE_MEMORY_ENTRIES", cls.embedding_cache_memory_entries
+            ),
+            web_search_backend=_env_str("WEB_SEARCH_BACKEND", cls.web_search_backend),
+            web_search_max_results=_env_int("WEB_SEARCH_MAX_RESULTS", cls.web_search_max_results),
+            web_search_timeout=_env_float("WEB_SEARCH_TIMEOUT", cls.web_search_timeout),
+            web_search_cache_enabled=_env_bool("WEB_SEARCH_CACHE_ENABLED", cls.web_search_cache_enabled),
+            web_search_cache_ttl=_env_float("WEB_SEARCH_CACHE_TTL", cls.web_search_cache_ttl),
+            context_packing=_env_bool("CONTEXT_PACKING", cls.context_packing),
+            context_token_budget=_env_int("CONTEXT_TOKEN_BUDGET", cls.context_token_budget),
+            context_duplicate_threshold=_env_float("CONTEXT_DUPLICATE_THRESHOLD", cls.context_duplicate_threshold),
+            telemetry_enabled=_env_bool("TELEMETRY_ENABLED", cls.telemetry_enabled),
+            telemetry_exporters=_env_str("TELEMETRY_EXPORTERS", cls.telemetry_exporters),
+            telemetry_spans_path=_env_str("TELEMETRY_SPANS_PATH", cls.telemetry_spans_path),
+            telemetry_metrics_path=_env_str("TELEMETRY_METRICS_PATH", cls.telemetry_metrics_path),
+            telemetry_metrics_port=_env_int("TELEMETRY_METRICS_PORT", cls.telemetry_metrics_port),
+            budget_deadline=_env_float("BUDGET_DEADLINE", cls.budget_deadline),
+            budget_max_llm_calls=_env_int("BUDGET_MAX_LLM_CALLS", cls.budget_max_llm_calls),
+            budget_max_web_searches=_env_int("BUDGET_MAX_WEB_SEARCHES", cls.budget_max_web_searches),
+            graph_recursion_limit=_env_int("GRAPH_RECURSION_LIMIT", cls.graph_recursion_limit),
+            checkpoint_enabled=_env_bool("CHECKPOINT_ENABLED", cls.checkpoint_enabled),
+            checkpoint_path=_env_str("CHECKPOINT_PATH", cls.checkpoint_path),
+            checkpoint_keep_per_thread=_env_int("CHECKPOINT_KEEP_PER_THREAD", cls.checkpoint_keep_per_thread),
+            checkpoint_ttl=_env_float("CHECKPOINT_TTL", cls.checkpoint_ttl),
+            session_reuse_threshold=_env_float("SESSION_REUSE_THRESHOLD", cls.session_reuse_threshold),
+            document_store_max_entries=_env_int("DOCUMENT_STORE_MAX_ENTRIES", cls.document_store_max_entries),
+            batch_concurrency=_env_int("BATCH_CONCURRENCY", cls.batch_concurrency),
+            http_max_connections=_env_int("HTTP_MAX_CONNECTIONS", cls.http_max_connections),
+            http_max_keepalive_connections=_env_int(
+                "HTTP_MAX_KEEPALIVE_CONNECTIONS", cls.http_max_keepalive_connections
+            ),
+            http_timeout=_env_float("HTTP_TIMEOUT", cls.http_timeout),
+            llm_model=_env_str("LLM_MODEL", cls.llm_model),
+            llm_max_tokens=_env_int("LLM_MAX_TOKENS", cls.llm_max_tokens),
+            llm_chain_models=_env_str("LLM_CHAIN_MODELS", cls.llm_chain_models),
+            llm_requests_per_minute=_env_float("LLM_REQUESTS_PER_MINUTE", cls.llm_requests_per_minute),
+            llm_tokens_per_minute=_env_float("LLM_TOKENS_PER_MINUTE", cls.llm_tokens_per_minute),
+            llm_min_concurrency=_env_int("LLM_MIN_CONCURRENCY", cls.llm_min_concurrency),
+            llm_max_concurrency=_env_int("LLM_MAX_CONCURRENCY", cls.llm_max_concurrency),
+            llm_latency_target=_env_float("LLM_LATENCY_TARGET", cls.llm_latency_target),
+            llm_max_retries=_env_int("LLM_MAX_RETRIES", cls.llm_max_retries),
+            llm_retry_base_delay=_env_float("LLM_RETRY_BASE_DELAY", cls.llm_retry_base_delay),
+            llm_retry_max_delay=_env_float("LLM_RETRY_MAX_DELAY", cls.llm_retry_max_delay),
+            rag_prompt_source=_env_str("RAG_PROMPT_SOURCE", cls.rag_prompt_source),
+            render_graph_diagram=_env_bool("RENDER_GRAPH_DIAGRAM", cls.render_graph_diagram),
+            graph_diagram_path=_env_str("GRAPH_DIAGRAM_PATH", cls.graph_diagram_path),
+        )
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """Return the active settings, loading them from the environment on the first call."""
+    global _settings
+    if _settings is None:
+        load_dotenv()
+        _settings = Settings.from_env()
+    return _settings
+
+
+def configure(settings: Settings) -> None:
+    """Replace the active settings; clients that were already built keep their configuration."""
+    global _settings
+    _settings = settings
@@ -1,4 +1,5 @@
 RETRIEVE = "retrieve"
 GRADE_DOCUMENTS = "grade_documents"
 GENERATE = "generate"
+GRADE_GENERATION = "grade_generation"
 WEBSEARCH = "websearch"
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+Context builder shared by the generation and hallucination grading prompts.
+
+Passing the document list straight into a prompt renders the repr of every Document, metadata
+included, and repeats the text shared by neighbouring chunks (ingestion splits with a 50 token
+overlap). build_context() instead:
+
+1. merges chunks of the same source that overlap or contain each other into one passage,
+2. drops passages that are near-duplicates of a more relevant one (word-shingle Jaccard),
+3. formats each passage as "[n] <compact source>" followed by its text only,
+4. packs the passages, most relevant first, into a token budget.
+
+Documents are expected best first, as the retrieve, grade_documents and web_search nodes leave
+them. Token counts use the tiktoken encoding of the model when it is available and a four
+characters per token estimate otherwise. The raw document list, which is only reported, is always
+estimated: encoding its whole repr on every build cost more than the packing itself.
+"""
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from langchain_core.documents import Document
+
+from graph.config import get_settings
+
+TOKENIZER_MODEL = "gpt-4o-mini"
+# Shortest shared text accepted as the overlap between two chunks
+MIN_OVERLAP_CHARS = 20
+MAX_SOURCE_CHARS = 60
+SHINGLE_WORDS = 3
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[Any]:
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception:
+        # tiktoken missing, or its encoding file cannot be downloaded (offline)
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Four characters per token estimate of the tokens of text."""
+    return (len(text) + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens of text for the generation model (estimated when tiktoken is unavailable)."""
+    encoding = _encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """The longest prefix of text that fits in tokens."""
+    encoding = _encoding()
+    if encoding is None:
+        return text[: tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+
+
+def compact_source(source: str) -> str:
+    """Short tag for a source: the URL without scheme, "www." and trailing slash, capped in length."""
+    tag = re.sub(r"^[a-z]+://(www\.)?", "", source.strip()).rstrip("/")
+    if len(tag) > MAX_SOURCE_CHARS:
+        tag = tag[: MAX_SOURCE_CHARS - 1] + "…"
+    return tag
+
+
+def overlap(head: str, tail: str, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of head that is a prefix of tail (0 when shorter than min_chars)."""
+    if len(head) < min_chars or len(tail) < min_chars:
+        return 0
+    probe = tail[:min_chars]
+    start = max(0, len(head) - len(tail))
+    position = head.find(probe, start)
+    while position != -1:
+        if tail.startswith(head[position:]):
+            return len(head) - position
+        position = head.find(probe, position + 1)
+    return 0
+
+
+@dataclass
+class Passage:
+    """Merged text of one or more chunks of a source; rank is the best rank of its chunks."""
+
+    source: str
+    text: str
+    rank: int
+    chunks: int = 1
+
+
+def _merge_into(passage: Passage, text: str) -> bool:
+    if text in passage.text:
+        return True
+    if passage.text in text:
+        passage.text = text
+        return True
+    shared = overlap(passage.text, text)
+    if shared:
+        passage.text += text[shared:]
+        return True
+    shared = overlap(text, passage.text)
+    if shared:
+        passage.text = text + passage.text[shared:]
+        return True
+    return False
+
+
+def merge_chunks(documents: Sequence[Document]) -> List[Passage]:
+    """Merge overlapping or nested chunks of the same source into passages, keeping relevance order."""
+    passages: List[Passage] = []
+    for rank, document in enumerate(documents):
+        text = document.page_content.strip()
+        if not text:
+            continue
+        source = str(document.metadata.get("source", ""))
+        target = next(
+            (passage for passage in passages if passage.source == source and _merge_into(passage, text)), None
+        )
+        if target is None:
+            passages.append(Passage(source=source, text=text, rank=rank))
+            continue
+        target.chunks += 1
+        # The grown passage may now bridge two passages of the same source
+        for other in [passage for passage in passages if passage is not target and passage.source == source]:
+            if _merge_into(target, other.text):
+                target.rank = min(target.rank, other.rank)
+                target.chunks += other.chunks
+                passages.remove(other)
+    return sorted(passages, key=lambda passage: passage.rank)
+
+
+def _shingles(text: str) -> Set[tuple]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i : i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def drop_near_duplicates(passages: Sequence[Passage], threshold: float) -> List[Passage]:
+    """Drop passages whose shingle Jaccard similarity with a more relevant kept passage is >= threshold."""
+    kept: List[Passage] = []
+    kept_shingles: List[Set[tuple]] = []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _format(index: int, passage: Passage) -> str:
+    if not passage.source:
+        return f"[{index}]\n{passage.text}"
+    return f"[{index}] {compact_source(passage.source)}\n{passage.text}"
+
+
+@dataclass
+class PackedContext:
+    """
+    Context text for a prompt and what building it saved.
+
+    Attributes:
+        text: Formatted passages, most relevant first.
+        tokens: Tokens of text.
+        raw_tokens: Estimated tokens the raw document list would have taken in the prompt.
+        documents: Chunks received.
+        passages: Passages in text.
+        merged: Chunks folded into another chunk of the same source.
+        duplicates: Passages dropped as near-duplicates.
+        dropped: Passages left out because they did not fit the budget.
+    """
+
+    text: str
+    tokens: int
+    raw_tokens: int
+    documents: int
+    passages: int
+    merged: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1 - self.tokens / self.raw_tokens if self.raw_tokens else 0.0
+
+
+@dataclass
+class ContextStats:
+    builds: int = 0
+    raw_tokens: int = 0
+    packed_tokens: int = 0
+    merged: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+
+
+_stats = ContextStats()
+_stats_lock = threading.Lock()
+
+
+def context_stats() -> Dict[str, int]:
+    """Totals of the contexts built since the last reset."""
+    with _stats_lock:
+        return asdict(_stats)
+
+
+def reset_context_stats() -> None:
+    global _stats
+    with _stats_lock:
+        _stats = ContextStats()
+
+
+def _record(context: PackedContext) -> None:
+    with _stats_lock:
+        _stats.builds += 1
+        _stats.raw_tokens += context.raw_tokens
+        _stats.packed_tokens += context.tokens
+        _stats.merged += context.merged
+        _stats.duplicates += context.duplicates
+        _stats.dropped += context.dropped
+
+
+def build_context(
+    documents: Sequence[Document],
+    token_budget: Optional[int] = None,
+    duplicate_threshold: Optional[float] = None,
+) -> PackedContext:
+    """
+    Merge, deduplicate and pack documents (best first) into at most token_budget tokens.
+
+    Passages that do not fit are skipped in favour of smaller, less relevant ones; when not even
+    the most relevant passage fits, its beginning is kept. Budget and threshold default to the
+    CONTEXT_TOKEN_BUDGET and CONTEXT_DUPLICATE_THRESHOLD settings.
+    """
+    settings = get_settings()
+    budget = settings.context_token_budget if token_budget is None else token_budget
+    threshold = settings.context_duplicate_threshold if duplicate_threshold is None else duplicate_threshold
+
+    merged = merge_chunks(documents)
+    unique = drop_near_duplicates(merged, threshold)
+
+    blocks: List[str] = []
+    used = 0
+    separator = count_tokens("\n\n")
+    for passage in unique:
+        block = _format(len(blocks) + 1, passage)
+        cost = count_tokens(block) + (separator if blocks else 0)
+        if used + cost <= budget:
+            blocks.append(block)
+            used += cost
+        elif not blocks and budget > 0:
+            blocks.append(truncate_to_tokens(block, budget))
+            used = count_tokens(blocks[0])
+
+    text = "\n\n".join(blocks)
+    context = PackedContext(
+        text=text,
+        tokens=count_tokens(text),
+        raw_tokens=estimate_tokens(str(list(documents))),
+        documents=len(documents),
+        passages=len(blocks),
+        merged=sum(passage.chunks - 1 for passage in merged),
+        duplicates=len(merged) - len(unique),
+        dropped=len(unique) - len(blocks),
+    )
+    _record(context)
+    return context
+
+
+@dataclass
+class PromptContext:
+    """What a node puts in the {context}/{documents} prompt variable, with its token report."""
+
+    value: Any
+    report: Dict[str, int] = field(default_factory=dict)
+
+
+def prompt_context(documents: List[Document]) -> PromptContext:
+    """
+    Context for the generation and hallucination grading prompts.
+
+    With CONTEXT_PACKING enabled it is the packed text and report holds the raw and packed token
+    counts; otherwise the document list is passed through as before.
+    """
+    if not get_settings().context_packing:
+        return PromptContext(value=documents)
+    context = build_context(documents)
+    return PromptContext(value=context.text, report={"raw": context.raw_tokens, "packed": context.tokens})
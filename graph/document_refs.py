@@ -0,0 +1,221 @@
+"""
+Lightweight document references for GraphState.
+
+GraphState["documents"] holds DocumentRefs instead of LangChain Documents: the chunk id and the
+(small) metadata, including the retrieval scores, but not the text. Every checkpoint and every
+streamed "values" event serializes the whole state, so keeping chunk text out of it makes each
+step cost a few hundred bytes per document instead of the full chunk.
+
+Text is resolved when a node needs it (resolve()): first from the process-wide DocumentStore,
+which retrieval and web search fill with the Documents they fetched, then from the collection of
+the chunk's shard by chunk id (after a restart, e.g. a thread resumed from its checkpoint). Documents
+that are not in the vectorstore (web results, documents passed by the caller) carry their text
+in the ref, since nothing else could give it back.
+
+The channel is append-only (add_documents): a node returns only the refs it adds, or the refs it
+updates (grade_documents marks irrelevant ones with relevant=False); no node rewrites the list.
+A None update clears it, which is how a new turn of a thread starts (graph/sessions.py).
+
+    documents = relevant_documents(result)     # Documents of a final state, text included
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, TypedDict, Union
+
+from langchain_core.documents import Document
+
+from graph.config import get_settings
+from graph.retrieval import SHARD_KEY
+from logger import log_warning
+
+
+class _RequiredRef(TypedDict):
+    id: str
+    metadata: Dict[str, Any]
+
+
+class DocumentRef(_RequiredRef, total=False):
+    """
+    Reference to a document of the run.
+
+    Attributes:
+        id: Ingestion chunk id, or "sha1:<digest of the text>" for documents outside the vectorstore.
+        metadata: Metadata of the document (source, title, origin, relevance score...).
+        text: The text, only for documents the vectorstore cannot give back.
+        relevant: False once grade_documents judged the document irrelevant to the question.
+    """
+
+    text: str
+    relevant: bool
+
+
+DocumentLike = Union[Document, DocumentRef]
+
+
+def document_id(document: Document) -> str:
+    """Chunk id of a vectorstore document, or a digest of the text for any other document."""
+    chunk_id = document.metadata.get("chunk_id")
+    if chunk_id:
+        return chunk_id
+    return "sha1:" + hashlib.sha1(document.page_content.encode("utf-8")).hexdigest()
+
+
+def add_documents(current: Optional[List[DocumentRef]], update: Optional[List[DocumentRef]]) -> List[DocumentRef]:
+    """
+    Reducer for GraphState.documents: appends the refs of update whose id is new and merges the
+    fields of the ones already present (e.g. relevant=False); a None update clears the list.
+    """
+    if update is None:
+        return []
+    merged = list(current or [])
+    positions = {ref["id"]: position for position, ref in enumerate(merged)}
+    for ref in update:
+        position = positions.get(ref["id"])
+        if position is None:
+            positions[ref["id"]] = len(merged)
+            merged.append(ref)
+        else:
+            merged[position] = {**merged[position], **ref}
+    return merged
+
+
+@dataclass
+class DocumentStoreStats:
+    """How document text was resolved: from memory, fetched from the vectorstore, or lost."""
+
+    hits: int = 0
+    fetched: int = 0
+    missing: int = 0
+
+
+class DocumentStore:
+    """
+    Bounded in-memory map from document id to Document, least recently used evicted first.
+
+    Args:
+        max_entries: Documents kept; older ones are fetched from the vectorstore again when needed.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._documents: "OrderedDict[str, Document]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = DocumentStoreStats()
+
+    def put(self, document_id: str, document: Document) -> None:
+        with self._lock:
+            self._documents[document_id] = document
+            self._documents.move_to_end(document_id)
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+
+    def get_many(self, ids: Sequence[str]) -> Dict[str, Document]:
+        """The stored documents among ids; the ones not found are left out."""
+        found = {}
+        with self._lock:
+            for document_id in ids:
+                document = self._documents.get(document_id)
+                if document is not None:
+                    self._documents.move_to_end(document_id)
+                    found[document_id] = document
+            self._stats.hits += len(found)
+        return found
+
+    def record(self, fetched: int = 0, missing: int = 0) -> None:
+        with self._lock:
+            self._stats.fetched += fetched
+            self._stats.missing += missing
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**asdict(self._stats), "entries": len(self._documents)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+            self._stats = DocumentStoreStats()
+
+
+@lru_cache(maxsize=1)
+def get_document_store() -> DocumentStore:
+    """Return the document store shared by the nodes of this process."""
+    return DocumentStore(get_settings().document_store_max_entries)
+
+
+def to_refs(documents: Iterable[DocumentLike]) -> List[DocumentRef]:
+    """Refs of documents, keeping their text in the document store (refs are returned as they are)."""
+    store = get_document_store()
+    refs: List[DocumentRef] = []
+    for document in documents:
+        if not isinstance(document, Document):
+            refs.append(document)
+            continue
+        ref = DocumentRef(id=document_id(document), metadata=dict(document.metadata))
+        if not document.metadata.get("chunk_id"):
+            ref["text"] = document.page_content
+        store.put(ref["id"], document)
+        refs.append(ref)
+    return refs
+
+
+def _fetch(refs: List[DocumentRef]) -> Dict[str, Document]:
+    """Fetch chunks by chunk id from the collection of their shard (one call per shard)."""
+    from ingestion import COLLECTION_NAME, get_vectorstore
+
+    by_shard: Dict[str, List[str]] = {}
+    for ref in refs:
+        by_shard.setdefault(ref["metadata"].get(SHARD_KEY, COLLECTION_NAME), []).append(ref["id"])
+    fetched = {}
+    for shard, ids in by_shard.items():
+        stored = get_vectorstore(shard).get(ids=ids, include=["documents", "metadatas"])
+        fetched.update(
+            (chunk_id, Document(page_content=text, metadata=metadata or {}))
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        )
+    return fetched
+
+
+def resolve(documents: Iterable[DocumentLike]) -> List[Document]:
+    """
+    Documents of refs, in order, with their text (Documents are returned as they are).
+
+    Refs missing from the document store are fetched from the vectorstore in one call per shard; a chunk
+    deleted from the collection since is left out with a warning.
+    """
+    items = list(documents)
+    refs = [item for item in items if not isinstance(item, Document) and "text" not in item]
+    store = get_document_store()
+    found = store.get_many([ref["id"] for ref in refs])
+    missing = [ref for ref in refs if ref["id"] not in found]
+    if missing:
+        fetched = _fetch(missing)
+        for chunk_id, document in fetched.items():
+            store.put(chunk_id, document)
+        found.update(fetched)
+        lost = len(missing) - len(fetched)
+        store.record(fetched=len(fetched), missing=lost)
+        if lost:
+            log_warning(f"---{lost} documentos ya no están en el vectorstore, se omiten---")
+
+    resolved = []
+    for item in items:
+        if isinstance(item, Document):
+            resolved.append(item)
+        elif "text" in item:
+            resolved.append(Document(page_content=item["text"], metadata=item["metadata"]))
+        elif item["id"] in found:
+            # The ref's metadata carries the scores of this run; the stored copy may predate them
+            resolved.append(Document(page_content=found[item["id"]].page_content, metadata=item["metadata"]))
+    return resolved
+
+
+def is_relevant(document: DocumentLike) -> bool:
+    return isinstance(document, Document) or document.get("relevant", True)
+
+
+def relevant_documents(state: Mapping[str, Any]) -> List[Document]:
+    """The documents of state not judged irrelevant, with their text."""
+    return resolve(document for document in state.get("documents") or [] if is_relevant(document))
@@ -0,0 +1,232 @@
+"""
+Content-addressed embedding cache shared by ingestion and query-time retrieval.
+
+Embeddings are keyed by the SHA-256 of the embedding model and the text, and grouped into a
+"query" and a "document" namespace. Vectors are stored on disk as raw float32 arrays in SQLite,
+with an in-memory LRU tier in front. CachedEmbeddings wraps any LangChain Embeddings (the one
+given to Chroma) so repeated questions and unchanged chunks are never sent to the API twice;
+all misses of a batch are embedded with a single call.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from graph.cache import pack_embedding, unpack_embedding
+from graph.clients import openai_http_clients
+from graph.config import get_settings
+from graph.telemetry import record_cache
+
+QUERY_NAMESPACE = "query"
+DOCUMENT_NAMESPACE = "document"
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH_SIZE = 500
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingStats:
+    """Lookup counters for one embedding namespace."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+
+
+class EmbeddingStore:
+    """
+    SQLite store of float32 embeddings with an in-memory LRU tier.
+
+    Args:
+        path: SQLite database file; it is created on first use and survives restarts.
+        memory_entries: Number of vectors kept in memory (least recently used are dropped).
+    """
+
+    def __init__(self, path: str, memory_entries: int = 4096):
+        self.path = path
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._stats: Dict[str, EmbeddingStats] = defaultdict(EmbeddingStats)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._connection.commit()
+
+    def get_many(self, namespace: str, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return the vectors of keys (None for misses), reading every memory miss from disk at once."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            stats = self._stats[namespace]
+            for key in set(keys):
+                vector = self._memory.get((namespace, key))
+                if vector is not None:
+                    self._memory.move_to_end((namespace, key))
+                    found[key] = vector
+            stats.memory_hits += sum(1 for key in keys if key in found)
+
+            on_disk = self._load(namespace, [key for key in set(keys) if key not in found])
+            stats.disk_hits += sum(1 for key in keys if key in on_disk)
+            for key, vector in on_disk.items():
+                self._remember(namespace, key, vector)
+            found.update(on_disk)
+            misses = sum(1 for key in keys if key not in found)
+            stats.misses += misses
+        record_cache(f"embeddings_{namespace}", hits=len(keys) - misses, misses=misses)
+        return [found.get(key) for key in keys]
+
+    def set_many(self, namespace: str, items: Dict[str, List[float]]) -> None:
+        """Store vectors by key in both tiers."""
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, key, vector) VALUES (?, ?, ?)",
+                [(namespace, key, pack_embedding(vector)) for key, vector in items.items()],
+            )
+            self._connection.commit()
+            for key, vector in items.items():
+                self._remember(namespace, key, vector)
+            self._stats[namespace].writes += len(items)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Remove every vector, or only the vectors of one namespace."""
+        with self._lock:
+            if namespace is None:
+                self._connection.execute("DELETE FROM embeddings")
+                self._memory.clear()
+            else:
+                self._connection.execute("DELETE FROM embeddings WHERE namespace = ?", (namespace,))
+                for memory_key in [memory_key for memory_key in self._memory if memory_key[0] == namespace]:
+                    del self._memory[memory_key]
+            self._connection.commit()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the lookup counters of this process, per namespace."""
+        with self._lock:
+            return {namespace: asdict(stats) for namespace, stats in self._stats.items()}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _load(self, namespace: str, keys: List[str]) -> Dict[str, List[float]]:
+        vectors = {}
+        for start in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + _LOOKUP_BATCH_SIZE]
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE namespace = ? AND key IN ({', '.join('?' * len(batch))})",
+                (namespace, *batch),
+            ).fetchall()
+            vectors.update((key, unpack_embedding(blob).tolist()) for key, blob in rows)
+        return vectors
+
+    def _remember(self, namespace: str, key: str, vector: List[float]) -> None:
+        self._memory[(namespace, key)] = vector
+        self._memory.move_to_end((namespace, key))
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an EmbeddingStore.
+
+    Args:
+        embeddings: Embedding model called for cache misses.
+        store: Store shared by every wrapper (ingestion and retrieval use the same one).
+        model: Name mixed into the keys so vectors of different models never collide; defaults
+            to the model attribute of embeddings.
+    """
+
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(DOCUMENT_NAMESPACE, texts)
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self._fill(DOCUMENT_NAMESPACE, keys, vectors, missing, embedded)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, vectors, missing = self._lookup(QUERY_NAMESPACE, [text])
+        if missing:
+            self._fill(QUERY_NAMESPACE, keys, vectors, missing, [self.embeddings.embed_query(text)])
+        return vectors[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, DOCUMENT_NAMESPACE, texts)
+        if missing:
+            embedded = await self.embeddings.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._fill, DOCUMENT_NAMESPACE, keys, vectors, missing, embedded)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, QUERY_NAMESPACE, [text])
+        if missing:
+            embedded = [await self.embeddings.aembed_query(text)]
+            await asyncio.to_thread(self._fill, QUERY_NAMESPACE, keys, vectors, missing, embedded)
+        return vectors[0]
+
+    def _lookup(
+        self, namespace: str, texts: List[str]
+    ) -> Tuple[List[str], List[Optional[List[float]]], Dict[str, str]]:
+        """Return the keys, the cached vectors and the distinct missing texts by key."""
+        keys = [embedding_key(self.model, text) for text in texts]
+        vectors = self.store.get_many(namespace, keys)
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        return keys, vectors, missing
+
+    def _fill(
+        self,
+        namespace: str,
+        keys: List[str],
+        vectors: List[Optional[List[float]]],
+        missing: Dict[str, str],
+        embedded: List[List[float]],
+    ) -> None:
+        new_vectors = dict(zip(missing, embedded))
+        self.store.set_many(namespace, new_vectors)
+        for position, key in enumerate(keys):
+            if vectors[position] is None:
+                vectors[position] = new_vectors[key]
+
+
+@lru_cache(maxsize=1)
+def get_embedding_store() -> EmbeddingStore:
+    """Return the shared embedding store configured by the settings, opening it on first use."""
+    settings = get_settings()
+    return EmbeddingStore(settings.embedding_cache_path, settings.embedding_cache_memory_entries)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> Embeddings:
+    """Return the embedding model used by the vector store and the answer cache (built once)."""
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(**openai_http_clients())
+    if not get_settings().embedding_cache_enabled:
+        return embeddings
+    return CachedEmbeddings(embeddings, get_embedding_store())
@@ -1,12 +1,31 @@
+from typing import Optional
+
 from dotenv import load_dotenv
 
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 
-from graph.consts import RETRIEVE, GRADE_DOCUMENTS, GENERATE, WEBSEARCH
-from graph.nodes import web_search, retriever, grade_documents, generate
+from graph.cache import ROUTES_NAMESPACE, CachedGraph, get_question_cache
+from graph.checkpoint import get_checkpointer
+from graph.config import Settings, configure, get_settings
+from graph.embedding_cache import get_embeddings
+from graph.local_router import get_local_router, record_llm_route
+from graph.consts import RETRIEVE, GRADE_DOCUMENTS, GENERATE, GRADE_GENERATION, WEBSEARCH
+from graph.nodes import (
+    web_search,
+    aweb_search,
+    retriever,
+    aretriever,
+    grade_documents,
+    agrade_documents,
+    generate,
+    agenerate,
+    grade_generation,
+    agrade_generation,
+)
+from graph.sessions import SessionGraph
 from graph.state import GraphState
-from graph.chains.answer_grader import answer_grader_chain
-from graph.chains.hallucination_grader import hallucination_grader_chain
+from graph.telemetry import configure_telemetry, record_route
 from graph.chains.router import question_router, RouteQuery
 
 from logger import log_info, log_success, log_error, log_warning, log_header
@@ -29,103 +48,234 @@ def decide_to_generate(state: GraphState):
         log_info("--DECISIÓN: GENERAR RESPUESTA - TODOS LOS DOCUMENTOS SON RELEVANTES PARA LA PREGUNTA--")
         return GENERATE
 
+async def adecide_to_generate(state: GraphState):
+    """Async version of decide_to_generate."""
+    return decide_to_generate(state)
+
+def decide_to_grade(state: GraphState) -> str:
+    """
+    Grade the new answer, unless the request ran out of budget: a degraded run ends with the
+    answer it has (see graph/budget.py).
+    """
+    if state.get("degraded"):
+        log_warning(f"---🤖 DECISIÓN: PRESUPUESTO AGOTADO ({state.get('degraded_reason')}), SE TERMINA CON LA RESPUESTA ACTUAL---")
+        return END
+    return GRADE_GENERATION
+
+async def adecide_to_grade(state: GraphState) -> str:
+    """Async version of decide_to_grade."""
+    return decide_to_grade(state)
+
 def grade_generation_grounded_in_documents_and_question(state: GraphState) -> str:
     """
-    Grade whether the generated answer is grounded in the provided documents and addresses the question.
-    First, check for hallucination (is the answer grounded in the documents?).
-    If grounded, check if the answer addresses the question.
+    Route on the verdict recorded by the GRADE_GENERATION node.
     Returns:
         - "useful" if answer is grounded and addresses the question
         - "not useful" if answer is grounded but does not address the question
         - "not supported" if answer is not grounded (hallucinated)
+        - "degraded" if the request budget cannot pay for another round
     """
-    log_info("---🤖 REVISANDO ALUCINACIÓN EN LA GENERACION DE RESPUESTA---")
-    question = state["question"]
-    documents = state["documents"]
-    generation = state["generation"]
-
-    # Check if the generation is grounded in the documents
-    score = hallucination_grader_chain.invoke({"documents": documents, "generation": generation})
-    if hallucinations_grade := score.binary_score:
-        log_info("---🤖 EVALUAR QUE LA RESPUESTA CONTESTA LA PREGUNTA---")
-        # If grounded, check if the answer addresses the question
-        score = answer_grader_chain.invoke({"question": question, "generation": generation})
-        if answer_grade := score.binary_score:
-            log_info("---🤖 DECISIÓN: GENERACIÓN DE RESPUESTA ATIENDE LA PREGUNTA---")
-            return "useful"
-        else:
-            log_info("---🤖DECISIÓN: GENERACIÓN DE RESPUESTA NO ATIENDE LA PREGUNTA---")
-            return "not useful"
+    if state.get("degraded"):
+        return "degraded"
+    return state["generation_grade"]
+
+async def agrade_generation_grounded_in_documents_and_question(state: GraphState) -> str:
+    """Async version of grade_generation_grounded_in_documents_and_question."""
+    return grade_generation_grounded_in_documents_and_question(state)
+
+def _cached_route(question: str):
+    if not get_settings().cache_enabled:
+        return None
+    return get_question_cache().get(ROUTES_NAMESPACE, question)
+
+def _route_to(question: str, datasource: str, source: str) -> str:
+    """Follow the decision made by source ("cache", "local" or "llm"), caching it when it is new."""
+    record_route(datasource, source)
+    if get_settings().cache_enabled and source != "cache":
+        get_question_cache().set(ROUTES_NAMESPACE, question, datasource)
+    if datasource == WEBSEARCH:
+        log_info("---🤖 DECISIÓN: RUTEANDO A BÚSQUEDA WEB---")
+        return WEBSEARCH
     else:
-        log_info("---🤖DECISIÓN: GENERACIÓN DE RESPUESTA NO ESTA BASADA EN LOS DOCUMENTOS, REINTENTAR---")
-        return "not supported"
+        log_info("---🤖 DECISIÓN: RUTEANDO A RECUPERACIÓN DE DOCUMENTOS---")
+        return RETRIEVE
+
+def _reuse_documents() -> str:
+    record_route(GENERATE, "session")
+    log_info("---🤖 DECISIÓN: SEGUIMIENTO DE LA PREGUNTA ANTERIOR, SE REUTILIZAN SUS DOCUMENTOS---")
+    return GENERATE
 
 def route_question(state: GraphState) -> str:
     """
     Route the question to either websearch or vectorstore retrieval based on its content.
-    Uses the question_router chain to determine the appropriate datasource.
+    Uses the question_router chain to determine the appropriate datasource, reusing the
+    cached decision for a repeated question when the cache is enabled. With ROUTER_MODE=embedding
+    clear-cut questions are routed locally from the topic centroids and only the uncertain ones
+    reach the LLM router.
+    A follow-up flagged by SessionGraph to reuse the documents of its thread goes straight to
+    generation.
     Returns:
         - WEBSEARCH if the router decides to use web search
         - RETRIEVE if the router decides to use the vectorstore
+        - GENERATE if the question reuses the documents of the previous turn
     """
     log_info("---RUTANDO PREGUNTA---")
+    if state.get("reuse_documents"):
+        return _reuse_documents()
     question = state["question"]
+    datasource = _cached_route(question)
+    if datasource is not None:
+        return _route_to(question, datasource, "cache")
+    local_router = get_local_router()
+    if local_router is not None:
+        # The question embedding is cached, so retrieval reuses it
+        datasource = local_router.route(get_embeddings().embed_query(question))
+        if datasource is not None:
+            return _route_to(question, datasource, "local")
     result: RouteQuery = question_router.invoke({"question": question})
-    if result.datasource == WEBSEARCH:
-        log_info("---🤖 DECISIÓN: RUTEANDO A BÚSQUEDA WEB---")
-        return WEBSEARCH
-    else:
-        log_info("---🤖 DECISIÓN: RUTEANDO A RECUPERACIÓN DE DOCUMENTOS---")
-        return RETRIEVE
-    
-
-# Initialize the workflow graph with the custom state class
-workflow = StateGraph(GraphState)
-
-# Add nodes to the workflow graph
-workflow.add_node(RETRIEVE, retriever)
-workflow.add_node(GRADE_DOCUMENTS, grade_documents)
-workflow.add_node(GENERATE, generate)
-workflow.add_node(WEBSEARCH, web_search)
-
-# Set the conditional entry point based on the router's decision
-workflow.set_conditional_entry_point(
-    route_question,
-    {
-        WEBSEARCH: WEBSEARCH,
-        RETRIEVE: RETRIEVE,
-    },
-)
+    record_llm_route()
+    return _route_to(question, result.datasource, "llm")
 
-# Define the edges between nodes in the workflow
-workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
-workflow.add_conditional_edges(
-    GRADE_DOCUMENTS, decide_to_generate,
-    {
-        WEBSEARCH: WEBSEARCH,
-        GENERATE: GENERATE,
-    },
-)
+async def aroute_question(state: GraphState) -> str:
+    """Async version of route_question."""
+    log_info("---RUTANDO PREGUNTA---")
+    if state.get("reuse_documents"):
+        return _reuse_documents()
+    question = state["question"]
+    datasource = _cached_route(question)
+    if datasource is not None:
+        return _route_to(question, datasource, "cache")
+    local_router = get_local_router()
+    if local_router is not None:
+        datasource = local_router.route(await get_embeddings().aembed_query(question))
+        if datasource is not None:
+            return _route_to(question, datasource, "local")
+    result: RouteQuery = await question_router.ainvoke({"question": question})
+    record_llm_route()
+    return _route_to(question, result.datasource, "llm")
+
+
+def build_workflow() -> StateGraph:
+    """Define the workflow graph; building it creates no clients."""
+    # Initialize the workflow graph with the custom state class
+    workflow = StateGraph(GraphState)
+
+    # Add nodes to the workflow graph; each one pairs the sync function used by app.invoke
+    # with the async variant used by app.ainvoke / app.astream
+    workflow.add_node(RETRIEVE, RunnableLambda(retriever, afunc=aretriever))
+    workflow.add_node(GRADE_DOCUMENTS, RunnableLambda(grade_documents, afunc=agrade_documents))
+    workflow.add_node(GENERATE, RunnableLambda(generate, afunc=agenerate))
+    workflow.add_node(GRADE_GENERATION, RunnableLambda(grade_generation, afunc=agrade_generation))
+    workflow.add_node(WEBSEARCH, RunnableLambda(web_search, afunc=aweb_search))
+
+    # Set the conditional entry point based on the router's decision
+    workflow.set_conditional_entry_point(
+        RunnableLambda(route_question, afunc=aroute_question),
+        {
+            WEBSEARCH: WEBSEARCH,
+            RETRIEVE: RETRIEVE,
+            GENERATE: GENERATE,
+        },
+    )
+
+    # Define the edges between nodes in the workflow
+    workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
+    workflow.add_conditional_edges(
+        GRADE_DOCUMENTS, RunnableLambda(decide_to_generate, afunc=adecide_to_generate),
+        {
+            WEBSEARCH: WEBSEARCH,
+            GENERATE: GENERATE,
+        },
+    )
+
+    # Grade every generation (unless the request budget ran out), then route based on the grading results
+    workflow.add_conditional_edges(
+        GENERATE, RunnableLambda(decide_to_grade, afunc=adecide_to_grade),
+        {
+            GRADE_GENERATION: GRADE_GENERATION,
+            END: END,
+        },
+    )
+    workflow.add_conditional_edges(
+        GRADE_GENERATION,
+        RunnableLambda(
+            grade_generation_grounded_in_documents_and_question,
+            afunc=agrade_generation_grounded_in_documents_and_question,
+        ),
+        path_map={
+            "useful": END,           # End if answer is useful
+            "not useful": WEBSEARCH,  # Route to websearch if not grounded
+            "not supported": END, # Retry generation if not supported
+            "degraded": END,         # End with the best answer so far when the budget ran out
+        },
+    )
+
+    # Add direct edge for websearch completion
+    workflow.add_edge(WEBSEARCH, GENERATE)
+
+    return workflow
+
+
+def draw_graph(compiled_app, output_file_path: str = "graph.png") -> None:
+    """Draw the workflow graph as a PNG image (renders through the mermaid.ink API)."""
+    compiled_app.get_graph().draw_mermaid_png(output_file_path=output_file_path)
+    # Uncomment the following line to print the Mermaid diagram to stdout
+    #print(compiled_app.get_graph().draw_mermaid())
+
+
+def build_app(config: Optional[Settings] = None):
+    """
+    Build the application described by config (the environment settings by default).
+
+    Chains, vectorstore and search clients are created lazily on first use. Runs are capped at
+    config.graph_recursion_limit steps (the request budget of graph/budget.py normally ends them
+    well before). The workflow diagram is rendered only when config.render_graph_diagram is set,
+    the telemetry callbacks are attached when config.telemetry_enabled is set, runs are
+    checkpointed per thread (SessionGraph, graph/sessions.py) when config.checkpoint_enabled is
+    set, and the persistent answer cache is put in front of the graph when config.cache_enabled
+    is set.
+
+    Returns:
+        The compiled graph, or a SessionGraph / CachedGraph with the same interface.
+    """
+    if config is not None:
+        configure(config)
+    settings = get_settings()
+
+    checkpointer = get_checkpointer() if settings.checkpoint_enabled else None
+    compiled_app = build_workflow().compile(checkpointer=checkpointer)
+    if settings.render_graph_diagram:
+        draw_graph(compiled_app, settings.graph_diagram_path)
+    run_config = {"recursion_limit": settings.graph_recursion_limit}
+    telemetry = configure_telemetry(settings)
+    if telemetry is not None:
+        run_config["callbacks"] = [telemetry.handler]
+    compiled_app = compiled_app.with_config(run_config)
+    if settings.checkpoint_enabled:
+        embed_query = get_embeddings().embed_query if settings.session_reuse_threshold > 0 else None
+        compiled_app = SessionGraph(compiled_app, embed_query, settings.session_reuse_threshold)
+    if not settings.cache_enabled:
+        return compiled_app
+
+    embed_query = None
+    if settings.cache_similarity_threshold > 0:
+        embed_query = get_embeddings().embed_query
+    return CachedGraph(
+        compiled_app,
+        get_question_cache,
+        ttl=settings.cache_ttl,
+        web_search_ttl=settings.cache_web_search_ttl,
+        embed_query=embed_query,
+        similarity_threshold=settings.cache_similarity_threshold,
+    )
 
-# Add conditional edges for the GENERATE node based on grading results
-workflow.add_conditional_edges(
-    GENERATE, 
-    grade_generation_grounded_in_documents_and_question,
-    path_map={
-        "useful": END,           # End if answer is useful
-        "not useful": WEBSEARCH,  # Route to websearch if not grounded
-        "not supported": END, # Retry generation if not supported
-    },
-)
 
-# Add direct edges for websearch and generation completion
-workflow.add_edge(WEBSEARCH, GENERATE)
-workflow.add_edge(GENERATE, END)
+# Compile the workflow into an executable app; compiling is cheap because every client is lazy.
+# Like build_app(), runs are capped at GRAPH_RECURSION_LIMIT steps; build_app() adds telemetry,
+# sessions and the answer cache on top
+workflow = build_workflow()
+app = workflow.compile().with_config(recursion_limit=get_settings().graph_recursion_limit)
 
-# Compile the workflow into an executable app
-app = workflow.compile()
 
-# Draw the workflow graph as a PNG image
-app.get_graph().draw_mermaid_png(output_file_path="graph.png")
-# Uncomment the following line to print the Mermaid diagram to stdout
-#print(app.get_graph().draw_mermaid())
+if __name__ == "__main__":
+    draw_graph(app, get_settings().graph_diagram_path)
@@ -0,0 +1,71 @@
+"""
+Deferred construction of chains and clients.
+
+Building a chat model, a vectorstore or a search client reads credentials, opens files and may
+reach the network. LazyRunnable keeps the module-level names the rest of the code imports while
+postponing that work until the first call, so importing the graph stays cheap and offline.
+Heavy client libraries (langchain_openai, the Chroma vectorstore) are likewise imported inside the
+factories rather than at module level, since importing them alone takes over a second.
+"""
+import threading
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ensure_config, patch_config
+
+
+class LazyRunnable(Runnable):
+    """
+    Runnable that builds the wrapped runnable with factory() on first use.
+
+    Calls (invoke, batch, stream and their async versions) are delegated to the built runnable,
+    as is any other attribute access. Runs are named after name, so callbacks and traces show
+    "generation_chain" rather than the class of the wrapped runnable.
+    """
+
+    def __init__(self, factory: Callable[[], Runnable], name: Optional[str] = None):
+        self._factory = factory
+        self._runnable: Optional[Runnable] = None
+        self._lock = threading.Lock()
+        self.name = name
+
+    @property
+    def built(self) -> bool:
+        return self._runnable is not None
+
+    def get(self) -> Runnable:
+        """Return the wrapped runnable, building it if this is the first use."""
+        if self._runnable is None:
+            with self._lock:
+                if self._runnable is None:
+                    self._runnable = self._factory()
+        return self._runnable
+
+    def _named(self, config: Optional[RunnableConfig]) -> Optional[RunnableConfig]:
+        if self.name is None or (config or {}).get("run_name"):
+            return config
+        return patch_config(ensure_config(config), run_name=self.name)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.get().invoke(input, self._named(config), **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.get().ainvoke(input, self._named(config), **kwargs)
+
+    def batch(self, inputs: List[Any], config: Any = None, **kwargs: Any) -> List[Any]:
+        return self.get().batch(inputs, config, **kwargs)
+
+    async def abatch(self, inputs: List[Any], config: Any = None, **kwargs: Any) -> List[Any]:
+        return await self.get().abatch(inputs, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self.get().stream(input, self._named(config), **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async for chunk in self.get().astream(input, self._named(config), **kwargs):
+            yield chunk
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
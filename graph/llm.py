@@ -0,0 +1,71 @@
+"""
+Registry of the chat models the chains in graph/chains are built with.
+
+Every chain asks get_chat_model(chain) for its model instead of configuring ChatOpenAI itself:
+the model name and completion token cap come from the settings (LLM_MODEL, LLM_MAX_TOKENS and
+the per-chain LLM_CHAIN_MODELS), and all models share the rate limited HTTP clients of
+graph/clients.py, so the request and token limits, the adaptive concurrency and the retries of
+graph/rate_limit.py apply to the chains together.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from graph.clients import llm_http_clients
+from graph.config import Settings, get_settings
+
+CHAINS = ("router", "retrieval_grader", "generation", "hallucination_grader", "answer_grader")
+
+
+@dataclass(frozen=True)
+class ChainModel:
+    """Model name and completion token cap (None: uncapped) of a chain."""
+
+    model: str
+    max_tokens: Optional[int]
+
+
+def parse_chain_models(spec: str) -> Dict[str, Dict[str, Any]]:
+    """Parse "chain=model:max_tokens,..." into the overrides per chain ("model" and/or "max_tokens")."""
+    overrides: Dict[str, Dict[str, Any]] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        chain, _, value = entry.partition("=")
+        chain = chain.strip()
+        if chain not in CHAINS:
+            raise ValueError(f"Unknown chain {chain!r} in LLM_CHAIN_MODELS, expected one of {', '.join(CHAINS)}")
+        model, _, max_tokens = value.strip().rpartition(":")
+        if not max_tokens.isdigit():
+            # No cap given; the colons belong to the model name (e.g. fine-tuned "ft:..." models)
+            model, max_tokens = value.strip(), ""
+        override: Dict[str, Any] = {}
+        if model.strip():
+            override["model"] = model.strip()
+        if max_tokens:
+            override["max_tokens"] = int(max_tokens)
+        overrides[chain] = override
+    return overrides
+
+
+def chain_model(chain: str, settings: Optional[Settings] = None, max_tokens: Optional[int] = None) -> ChainModel:
+    """
+    The model and token cap chain runs with under settings (the active ones by default).
+
+    max_tokens is the chain's own cap (the graders pass theirs in lean mode), used instead of
+    LLM_MAX_TOKENS; a cap for the chain in LLM_CHAIN_MODELS overrides both.
+    """
+    settings = settings or get_settings()
+    override = parse_chain_models(settings.llm_chain_models).get(chain, {})
+    default = max_tokens if max_tokens is not None else settings.llm_max_tokens
+    return ChainModel(model=override.get("model", settings.llm_model), max_tokens=override.get("max_tokens", default) or None)
+
+
+def get_chat_model(chain: str, max_tokens: Optional[int] = None, **kwargs: Any):
+    """Build the ChatOpenAI model of chain; max_tokens is as in chain_model(), kwargs (e.g. stream_usage) are passed through."""
+    from langchain_openai import ChatOpenAI
+
+    if chain not in CHAINS:
+        raise ValueError(f"Unknown chain {chain!r}, expected one of {', '.join(CHAINS)}")
+    spec = chain_model(chain, max_tokens=max_tokens)
+    if spec.max_tokens is not None:
+        kwargs["max_tokens"] = spec.max_tokens
+    # Retries happen in the rate limited transport, where they are paced with the other requests
+    return ChatOpenAI(model=spec.model, temperature=0, max_retries=0, **llm_http_clients(), **kwargs)
@@ -0,0 +1,176 @@
+"""
+Embedding-based question router that avoids the LLM routing call when the answer is clear.
+
+The vectorstore topics are fixed by the ingested corpus, so ingestion stores one centroid per
+source of each shard (graph/shards.py). A question whose embedding is close to some centroid is
+routed to the vectorstore, one that is far from all of them to web search, and only questions in
+the band between the two thresholds are sent to the LLM router.
+"""
+import json
+import math
+import os
+import threading
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.vectorstores import VectorStore
+
+from graph.config import get_settings
+from logger import log_warning
+
+VECTORSTORE = "vectorstore"
+WEBSEARCH = "websearch"
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+def compute_topic_centroids(vectorstore: VectorStore, page_size: int = 1000) -> Dict[str, List[float]]:
+    """
+    Return the normalized mean embedding of the chunks of each source in the collection.
+
+    The collection is read page_size chunks at a time into a running sum per source, so only one
+    page of embeddings is in memory at once.
+    """
+    import numpy as np
+
+    sums: Dict[str, "np.ndarray"] = {}
+    counts: Dict[str, int] = {}
+    offset = 0
+    while True:
+        stored = vectorstore.get(limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+        if not len(stored["ids"]):
+            break
+        offset += len(stored["ids"])
+        for embedding, metadata in zip(stored["embeddings"], stored["metadatas"]):
+            source = (metadata or {}).get("source", "unknown")
+            vector = np.asarray(embedding, dtype=np.float64)
+            if source in sums:
+                sums[source] += vector
+            else:
+                sums[source] = vector.copy()
+            counts[source] = counts.get(source, 0) + 1
+    return {source: _normalize((total / counts[source]).tolist()) for source, total in sums.items()}
+
+
+def save_topic_centroids(path: str, centroids: Dict[str, List[float]]) -> None:
+    """Write the centroids atomically next to the collection."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as centroids_file:
+        json.dump({"version": 1, "topics": centroids}, centroids_file)
+    os.replace(temporary_path, path)
+
+
+@dataclass
+class RoutingStats:
+    """How routing decisions were made in this process."""
+
+    local_vectorstore: int = 0
+    local_websearch: int = 0
+    llm: int = 0
+
+
+_stats = RoutingStats()
+_stats_lock = threading.Lock()
+
+
+def record_llm_route() -> None:
+    with _stats_lock:
+        _stats.llm += 1
+
+
+def routing_stats() -> Dict[str, int]:
+    """Return the routing counters of this process (local decisions skipped the LLM call)."""
+    with _stats_lock:
+        return asdict(_stats)
+
+
+def reset_routing_stats() -> None:
+    global _stats
+    with _stats_lock:
+        _stats = RoutingStats()
+
+
+class LocalRouter:
+    """
+    Route by the cosine similarity between the question and the closest topic centroid.
+
+    Args:
+        centroids: Normalized centroid per topic (source of the collection).
+        vectorstore_threshold: Similarity at or above which the question goes to the vectorstore.
+        websearch_threshold: Similarity below which the question goes to web search.
+    """
+
+    def __init__(self, centroids: Dict[str, List[float]], vectorstore_threshold: float, websearch_threshold: float):
+        self.centroids = {topic: _normalize(centroid) for topic, centroid in centroids.items()}
+        self.vectorstore_threshold = vectorstore_threshold
+        self.websearch_threshold = websearch_threshold
+
+    def similarity(self, embedding: Sequence[float]) -> float:
+        """Cosine similarity between the embedding and the closest centroid."""
+        query = _normalize(embedding)
+        return max((sum(a * b for a, b in zip(query, centroid)) for centroid in self.centroids.values()), default=0.0)
+
+    def route(self, embedding: Sequence[float]) -> Optional[str]:
+        """Return "vectorstore" or "websearch" when the margin is clear, None when the LLM should decide."""
+        similarity = self.similarity(embedding)
+        if similarity >= self.vectorstore_threshold:
+            datasource = VECTORSTORE
+        elif similarity < self.websearch_threshold:
+            datasource = WEBSEARCH
+        else:
+            return None
+        with _stats_lock:
+            if datasource == VECTORSTORE:
+                _stats.local_vectorstore += 1
+            else:
+                _stats.local_websearch += 1
+        return datasource
+
+
+def load_topic_centroids(path: str) -> Optional[Dict[str, List[float]]]:
+    """Centroids saved by save_topic_centroids(), or None when the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as centroids_file:
+        return json.load(centroids_file)["topics"]
+
+
+@lru_cache(maxsize=4)
+def _load_local_router(
+    paths: Tuple[str, ...], vectorstore_threshold: float, websearch_threshold: float
+) -> Optional[LocalRouter]:
+    centroids: Dict[str, List[float]] = {}
+    for path in paths:
+        topics = load_topic_centroids(path)
+        if topics is None:
+            log_warning(f"---No hay centroides de temas en {path}; ejecuta ingestion.py---")
+            continue
+        centroids.update(topics)
+    if not centroids:
+        log_warning("---Sin centroides de temas se usa el router LLM---")
+        return None
+    return LocalRouter(centroids, vectorstore_threshold, websearch_threshold)
+
+
+def get_local_router() -> Optional[LocalRouter]:
+    """
+    Return the embedding router when ROUTER_MODE=embedding and the centroids exist, else None.
+
+    The topics are the sources of every shard, so a question about any shard goes to the vectorstore.
+    """
+    from graph.shards import centroids_path, get_shards
+
+    settings = get_settings()
+    if settings.router_mode != "embedding":
+        return None
+    return _load_local_router(
+        tuple(centroids_path(shard.name) for shard in get_shards()),
+        settings.router_vectorstore_threshold,
+        settings.router_websearch_threshold,
+    )
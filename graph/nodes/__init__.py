@@ -1,6 +1,18 @@
-from graph.nodes.web_search import web_search
-from graph.nodes.generate import generate
-from graph.nodes.retrieve import retriever
-from graph.nodes.grade_documents import grade_documents
+from graph.nodes.web_search import web_search, aweb_search
+from graph.nodes.generate import generate, agenerate
+from graph.nodes.retrieve import retriever, aretriever
+from graph.nodes.grade_documents import grade_documents, agrade_documents
+from graph.nodes.grade_generation import grade_generation, agrade_generation
 
-__all__ = ["web_search", "generate", "retrieve", "grade_documents"]
\ No newline at end of file
+__all__ = [
+    "web_search",
+    "aweb_search",
+    "generate",
+    "agenerate",
+    "retriever",
+    "aretriever",
+    "grade_documents",
+    "agrade_documents",
+    "grade_generation",
+    "agrade_generation",
+]
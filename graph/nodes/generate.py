@@ -1,28 +1,94 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 
+from graph.budget import GENERATION_CALLS, GENERATION_GRADING_CALLS, degrade, exceeded, spent
 from graph.chains.generation import generation_chain
+from graph.context import PromptContext, prompt_context
+from graph.document_refs import relevant_documents
 from graph.state import GraphState
+from graph.streaming import emit, generation_end_event, token_event
 
 from logger import log_info
 
+
+def _context(documents: List[Any]) -> PromptContext:
+    context = prompt_context(documents)
+    if context.report:
+        log_info(f"---🤖 CONTEXTO: {context.report['raw']} -> {context.report['packed']} TOKENS---")
+    return context
+
+
+def _result(state: GraphState, attempt: int, pieces: List[str], context: PromptContext) -> Dict[str, Any]:
+    generation = "".join(pieces)
+    emit(generation_end_event(attempt, generation))
+    result = {
+        "question": state["question"],
+        "generation": generation,
+        "generation_attempt": attempt,
+        "context_tokens": context.report,
+        **spent(state, llm_calls=GENERATION_CALLS),
+    }
+    if not state.get("degraded"):
+        # Without budget for the graders the run ends here with this (ungraded) answer
+        reason = exceeded(state, llm_calls=GENERATION_CALLS + GENERATION_GRADING_CALLS)
+        if reason:
+            result.update(degrade(reason, "generate"))
+    return result
+
+
+def _skip(state: GraphState, reason: str) -> Dict[str, Any]:
+    # The previous answer, if any, is the best one the run has
+    return {"generation": state.get("generation", ""), **degrade(reason, "generate")}
+
+
 def generate(state: GraphState) -> Dict[str, Any]:
     """
     Generate an answer to the given question using the provided documents as context.
 
+    The documents reach the prompt through the context builder (graph/context.py), which merges
+    overlapping chunks, drops near-duplicates and packs them into CONTEXT_TOKEN_BUDGET tokens.
+    The answer is streamed: every token is emitted as a "token" event (see graph/streaming.py)
+    as soon as the model produces it, so callers of app.stream can show it before grading ends.
+    When the request budget (graph/budget.py) cannot pay for the call, the previous answer is
+    kept; when it cannot pay for grading the new one, the run is flagged as degraded and ends.
+
     Args:
         state (GraphState): The current graph state containing the question and documents.
 
     Returns:
-        Dict[str, Any]: Updated state with the generated answer included.
+        Dict[str, Any]: Updated state with the generated answer, its attempt number, the raw and
+            packed context token counts and the LLM calls made.
     """
     log_info("---🤖 GENERANDO RESPUESTA---")
     question = state["question"]
-    documents = state["documents"]
+    documents = relevant_documents(state)
+    attempt = state.get("generation_attempt", 0) + 1
+    reason = exceeded(state, llm_calls=GENERATION_CALLS)
+    if reason:
+        return _skip(state, reason)
 
-    result = generation_chain.invoke({"context": documents, "question": question})
+    context = _context(documents)
+    pieces = []
+    for piece in generation_chain.stream({"context": context.value, "question": question}):
+        pieces.append(piece)
+        emit(token_event(attempt, piece))
 
-    return {
-        "documents": documents,
-        "question": question,
-        "generation": result,
-    }
+    return _result(state, attempt, pieces, context)
+
+
+async def agenerate(state: GraphState) -> Dict[str, Any]:
+    """Async version of generate used by app.ainvoke / app.astream."""
+    log_info("---🤖 GENERANDO RESPUESTA---")
+    question = state["question"]
+    documents = relevant_documents(state)
+    attempt = state.get("generation_attempt", 0) + 1
+    reason = exceeded(state, llm_calls=GENERATION_CALLS)
+    if reason:
+        return _skip(state, reason)
+
+    context = _context(documents)
+    pieces = []
+    async for piece in generation_chain.astream({"context": context.value, "question": question}):
+        pieces.append(piece)
+        emit(token_event(attempt, piece))
+
+    return _result(state, attempt, pieces, context)
@@ -1,38 +1,410 @@
-from typing import Any, Dict
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from graph.chains.retrieval_grader import retrieval_grader_chain
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.retrieval_grader import (
+    DocumentVerdict,
+    GradeDocument,
+    GradeDocumentWithReason,
+    GradeDocuments,
+    batch_retrieval_grader_chain,
+    format_numbered_documents,
+    retrieval_grader_chain,
+)
+from graph.budget import GENERATION_CALLS, degrade, exceeded, spent
+from graph.config import Settings, get_settings
+from graph.document_refs import DocumentRef, document_id, is_relevant, resolve
+from graph.retrieval import RELEVANCE_SCORE_KEY
 from graph.state import GraphState
+from graph.telemetry import record_retry
+
+from logger import log_info, log_warning
+
+Score = Union[GradeDocument, DocumentVerdict, None]
+
+
+@dataclass
+class GradingStats:
+    """
+    How documents were graded: settled by their retrieval score or sent to the LLM grader.
+
+    timed_out counts grades the grader did not answer within GRADER_TIMEOUT; expired_in_queue
+    counts grades that waited as long for a free worker of the shared pool and never ran.
+    """
+
+    auto_accepted: int = 0
+    auto_rejected: int = 0
+    llm_graded: int = 0
+    timed_out: int = 0
+    expired_in_queue: int = 0
+
+
+_stats = GradingStats()
+_stats_lock = threading.Lock()
+
+
+def grading_stats() -> Dict[str, int]:
+    """Return the grading counters of this process; auto_accepted + auto_rejected LLM calls were skipped."""
+    with _stats_lock:
+        return asdict(_stats)
+
+
+def reset_grading_stats() -> None:
+    global _stats
+    with _stats_lock:
+        _stats = GradingStats()
+
+
+def _grader_inputs(question: str, documents: List[Document]) -> List[Dict[str, Any]]:
+    return [{"document": document.page_content, "question": question} for document in documents]
+
+
+@lru_cache(maxsize=1)
+def _grading_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide pool the synchronous path grades documents on.
+
+    It has a worker for every grade of GRADER_PARALLEL_REQUESTS questions graded at once, so a grade
+    only waits for a worker when more questions than that are being graded.
+    """
+    settings = get_settings()
+    workers = max(settings.grader_max_concurrency, 1) * max(settings.grader_parallel_requests, 1)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grade-document")
+
+
+def _log_timeout(timeout: float) -> None:
+    with _stats_lock:
+        _stats.timed_out += 1
+    log_warning(f"---Document grading timed out after {timeout}s, treating it as not relevant")
+
+
+def _log_expired_in_queue(timeout: float) -> None:
+    with _stats_lock:
+        _stats.expired_in_queue += 1
+    log_warning(f"---Document grade waited {timeout}s for a free grading worker, treating it as not relevant")
+
+
+class _PooledGrade:
+    """A document grade submitted to the shared pool; started is set when a worker picks it up."""
+
+    def __init__(self, position: int, grader_input: Dict[str, Any]):
+        self.position = position
+        self.grader_input = grader_input
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+
+    def run(self) -> GradeDocument:
+        self.started = time.monotonic()
+        return retrieval_grader_chain.invoke(self.grader_input)
+
+    def deadline(self, timeout: float) -> float:
+        # The timeout runs from the start of the grade; before that it bounds the wait for a worker
+        return (self.submitted if self.started is None else self.started) + timeout
+
+
+def grade_documents_concurrently(
+    question: str,
+    documents: List[Document],
+    max_concurrency: int,
+    timeout: float,
+) -> List[Optional[GradeDocument]]:
+    """
+    Grade all documents in parallel with at most max_concurrency calls in flight.
+
+    The result list is aligned with documents; a None entry means the grade timed out. Grades run
+    on the shared pool of _grading_executor(), in a copy of the caller's context so they stay part
+    of the node's run (callbacks, tracing). Each one has timeout seconds from the moment a worker
+    starts it; one still waiting for a worker after timeout seconds is cancelled before it reaches
+    the grader, and one already sent to the grader is left to finish in the background.
+    """
+    executor = _grading_executor()
+    grades: List[Optional[GradeDocument]] = [None] * len(documents)
+    pending = deque(enumerate(_grader_inputs(question, documents)))
+    running: Dict[Future, _PooledGrade] = {}
+    while pending or running:
+        while pending and len(running) < max(1, max_concurrency):
+            grade = _PooledGrade(*pending.popleft())
+            running[executor.submit(contextvars.copy_context().run, grade.run)] = grade
+        next_deadline = min(grade.deadline(timeout) for grade in running.values())
+        done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            grades[running.pop(future).position] = future.result()
+        now = time.monotonic()
+        for future, grade in list(running.items()):
+            if future.done() or grade.deadline(timeout) > now:
+                continue
+            if future.cancel():
+                _log_expired_in_queue(timeout)
+            elif grade.started is not None and grade.started + timeout <= now:
+                # Otherwise the grade started since the first check and has time left
+                _log_timeout(timeout)
+            else:
+                continue
+            del running[future]
+    return grades
+
+
+async def agrade_documents_concurrently(
+    question: str,
+    documents: List[Document],
+    max_concurrency: int,
+    timeout: float,
+) -> List[Optional[GradeDocument]]:
+    """Async version of grade_documents_concurrently built on abatch; a grade that times out is cancelled."""
+
+    async def grade(grader_input: Dict[str, Any]) -> Optional[GradeDocument]:
+        # Unlike a thread, the slow call is cancelled, so it stops spending tokens
+        try:
+            return await asyncio.wait_for(retrieval_grader_chain.ainvoke(grader_input), timeout)
+        except asyncio.TimeoutError:
+            _log_timeout(timeout)
+            return None
+
+    grader = RunnableLambda(grade)
+    return await grader.abatch(_grader_inputs(question, documents), config={"max_concurrency": max_concurrency})
+
+
+def _batched_inputs(question: str, documents: List[Document]) -> Dict[str, Any]:
+    return {
+        "documents": format_numbered_documents([document.page_content for document in documents]),
+        "question": question,
+    }
+
+
+def _ordered_verdicts(result: GradeDocuments, count: int) -> Optional[List[DocumentVerdict]]:
+    """Order the batched verdicts by index, or return None if they do not cover every document exactly once."""
+    verdicts = {}
+    for verdict in result.verdicts:
+        if verdict.index in verdicts or verdict.binary_score.lower() not in ("yes", "no"):
+            return None
+        verdicts[verdict.index] = verdict
+    if sorted(verdicts) != list(range(count)):
+        return None
+    return [verdicts[index] for index in range(count)]
+
+
+def grade_documents_batched(question: str, documents: List[Document]) -> Optional[List[DocumentVerdict]]:
+    """
+    Grade all documents with a single batched grader call.
+
+    Returns the verdicts ordered like documents, or None if the grader output is malformed
+    (missing, duplicated or out of range indices, or a score other than 'yes'/'no').
+    """
+    try:
+        result: GradeDocuments = batch_retrieval_grader_chain.invoke(_batched_inputs(question, documents))
+    except Exception as error:
+        log_warning(f"---Batched grading failed: {error}")
+        return None
+    return _ordered_verdicts(result, len(documents))
+
+
+async def agrade_documents_batched(question: str, documents: List[Document]) -> Optional[List[DocumentVerdict]]:
+    """Async version of grade_documents_batched."""
+    try:
+        result: GradeDocuments = await batch_retrieval_grader_chain.ainvoke(_batched_inputs(question, documents))
+    except Exception as error:
+        log_warning(f"---Batched grading failed: {error}")
+        return None
+    return _ordered_verdicts(result, len(documents))
+
+
+def _grade_per_document(
+    question: str, documents: List[Document], settings: Settings
+) -> List[Optional[GradeDocument]]:
+    if settings.grading_mode == "concurrent":
+        return grade_documents_concurrently(
+            question, documents, settings.grader_max_concurrency, settings.grader_timeout
+        )
+    return [retrieval_grader_chain.invoke(grader_input) for grader_input in _grader_inputs(question, documents)]
+
+
+async def _agrade_per_document(
+    question: str, documents: List[Document], settings: Settings
+) -> List[Optional[GradeDocument]]:
+    if settings.grading_mode == "concurrent":
+        return await agrade_documents_concurrently(
+            question, documents, settings.grader_max_concurrency, settings.grader_timeout
+        )
+    return [await retrieval_grader_chain.ainvoke(grader_input) for grader_input in _grader_inputs(question, documents)]
+
+
+def prescreen_documents(
+    documents: List[Document], accept_threshold: float, reject_threshold: float
+) -> List[Optional[GradeDocument]]:
+    """
+    Settle the documents whose retrieval relevance score is clear-cut.
+
+    Documents scoring at least accept_threshold are relevant and documents scoring below
+    reject_threshold are not; the result is aligned with documents and None marks the ambiguous
+    ones (including documents without a score) that still need the LLM grader.
+    """
+    grades: List[Optional[GradeDocument]] = []
+    for document in documents:
+        score = document.metadata.get(RELEVANCE_SCORE_KEY)
+        if score is not None and score >= accept_threshold:
+            grades.append(GradeDocumentWithReason(binary_score="yes", reason=f"Relevance score {score:.3f} above threshold"))
+        elif score is not None and score < reject_threshold:
+            grades.append(GradeDocumentWithReason(binary_score="no", reason=f"Relevance score {score:.3f} below threshold"))
+        else:
+            grades.append(None)
+    return grades
+
+
+def _record_prescreen(prescreened: List[Optional[GradeDocument]]) -> List[int]:
+    """Update the counters and return the positions of the documents left for the LLM grader."""
+    ambiguous = [position for position, grade in enumerate(prescreened) if grade is None]
+    accepted = sum(1 for grade in prescreened if grade is not None and grade.binary_score == "yes")
+    rejected = len(prescreened) - len(ambiguous) - accepted
+    with _stats_lock:
+        _stats.auto_accepted += accepted
+        _stats.auto_rejected += rejected
+        _stats.llm_graded += len(ambiguous)
+    if accepted or rejected:
+        log_info(
+            f"---{accepted} documents accepted and {rejected} rejected by relevance score, "
+            f"{len(ambiguous)} sent to the grader"
+        )
+    return ambiguous
+
+
+def _merge_grades(prescreened: List[Optional[GradeDocument]], llm_scores: List[Score]) -> List[Score]:
+    llm_iter = iter(llm_scores)
+    return [grade if grade is not None else next(llm_iter) for grade in prescreened]
+
+
+def _planned_calls(documents: List[Document], settings: Settings) -> int:
+    """LLM calls grading documents takes when the batched grader (if used) answers well-formed output."""
+    if settings.grading_strategy == "batched":
+        return 1 if documents else 0
+    return len(documents)
+
+
+def _grade_with_llm(question: str, documents: List[Document], settings: Settings) -> Tuple[List[Score], int]:
+    """Grade documents with the LLM grader; returns the scores and the LLM calls made."""
+    scores: Optional[List[Score]] = None
+    calls = 0
+    if settings.grading_strategy == "batched" and documents:
+        scores = grade_documents_batched(question, documents)
+        calls += 1
+        if scores is None:
+            log_warning("---Batched grading output is malformed, falling back to per-document grading")
+            record_retry("batch_grading_fallback")
+    if scores is None:
+        scores = _grade_per_document(question, documents, settings)
+        calls += len(documents)
+    return scores, calls
+
+
+async def _agrade_with_llm(question: str, documents: List[Document], settings: Settings) -> Tuple[List[Score], int]:
+    scores: Optional[List[Score]] = None
+    calls = 0
+    if settings.grading_strategy == "batched" and documents:
+        scores = await agrade_documents_batched(question, documents)
+        calls += 1
+        if scores is None:
+            log_warning("---Batched grading output is malformed, falling back to per-document grading")
+            record_retry("batch_grading_fallback")
+    if scores is None:
+        scores = await _agrade_per_document(question, documents, settings)
+        calls += len(documents)
+    return scores, calls
+
+
+def _ungraded(count: int) -> List[Score]:
+    # Without budget for the grader the ambiguous documents are kept: they are the best context left
+    return [GradeDocumentWithReason(binary_score="yes", reason="Kept ungraded: request budget exhausted")] * count
+
+
+def _within_budget(state: GraphState, result: Dict[str, Any], calls: int) -> Dict[str, Any]:
+    """Add the grading calls to result and drop the web search when the budget cannot pay for it."""
+    result.update(spent(state, llm_calls=calls))
+    if result["web_search"]:
+        reason = exceeded(state, llm_calls=calls + GENERATION_CALLS, web_searches=1)
+        if reason:
+            result.update(web_search=False, **degrade(reason, "grade_documents"))
+    return result
+
+
+def _filter_documents(question: str, documents: List[Document], scores: List[Score]) -> Dict[str, Any]:
+    rejected: List[DocumentRef] = []
+    web_search_required = False
+
+    for document, score in zip(documents, scores):
+        if score is not None and score.binary_score.lower() == "yes":
+            log_info(f"---Document {document.metadata['source']} is relevant to the question")
+        else:
+            log_info(f"---Document {document.metadata['source']} is not relevant to the question")
+            # The documents channel merges the flag into the ref already in the state
+            rejected.append(DocumentRef(id=document_id(document), metadata=document.metadata, relevant=False))
+            web_search_required = True
+
+    return {"documents": rejected, "question": question, "web_search": web_search_required}
+
+
+def _graded_documents(state: GraphState) -> List[Document]:
+    return resolve(document for document in state["documents"] if is_relevant(document))
 
-from logger import log_info
 
 def grade_documents(state: GraphState) -> Dict[str, Any]:
     """
     Determines whether the retrieved documents are relevant to the question
     If any document is not relevant, we will set a flag to run web search
 
+    When the request budget cannot pay for the grading calls the documents are kept ungraded, and
+    when it cannot pay for the web search the flag stays off; either way the run is flagged as
+    degraded (see graph/budget.py).
+
     Args:
         state (dict): The current graph state
 
     Returns:
-        state (dict): Filtered out irrelevant documents and updated web_search state
+        state (dict): The irrelevant documents, flagged relevant=False, updated web_search state and
+            the LLM calls made
     """
 
     log_info("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
 
     question = state["question"]
-    documents = state["documents"]
+    documents = _graded_documents(state)
+    settings = get_settings()
 
-    filtered_documents = []
-    web_search_required = False
+    prescreened = prescreen_documents(documents, settings.score_accept_threshold, settings.score_reject_threshold)
+    ambiguous = [documents[position] for position in _record_prescreen(prescreened)]
+    reason = exceeded(state, llm_calls=_planned_calls(ambiguous, settings))
+    if reason:
+        result = _filter_documents(question, documents, _merge_grades(prescreened, _ungraded(len(ambiguous))))
+        return {**result, **degrade(reason, "grade_documents")}
+    llm_scores, calls = _grade_with_llm(question, ambiguous, settings)
+    scores = _merge_grades(prescreened, llm_scores)
 
-    for document in documents:
-        score = retrieval_grader_chain.invoke({"document": document.page_content, "question": question})
-        if score.binary_score.lower() == "yes":
-            log_info(f"---Document {document.metadata['source']} is relevant to the question")
-            filtered_documents.append(document)
-        else:
-            log_info(f"---Document {document.metadata['source']} is not relevant to the question")
-            web_search_required = True
-            continue
+    return _within_budget(state, _filter_documents(question, documents, scores), calls)
+
+
+async def agrade_documents(state: GraphState) -> Dict[str, Any]:
+    """Async version of grade_documents used by app.ainvoke / app.astream."""
+
+    log_info("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+
+    question = state["question"]
+    documents = _graded_documents(state)
+    settings = get_settings()
+
+    prescreened = prescreen_documents(documents, settings.score_accept_threshold, settings.score_reject_threshold)
+    ambiguous = [documents[position] for position in _record_prescreen(prescreened)]
+    reason = exceeded(state, llm_calls=_planned_calls(ambiguous, settings))
+    if reason:
+        result = _filter_documents(question, documents, _merge_grades(prescreened, _ungraded(len(ambiguous))))
+        return {**result, **degrade(reason, "grade_documents")}
+    llm_scores, calls = await _agrade_with_llm(question, ambiguous, settings)
+    scores = _merge_grades(prescreened, llm_scores)
 
-    return {"documents": filtered_documents, "question": question, "web_search": web_search_required}
+    return _within_budget(state, _filter_documents(question, documents, scores), calls)
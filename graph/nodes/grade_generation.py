@@ -0,0 +1,183 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+from graph.budget import GENERATION_CALLS, degrade, exceeded, spent
+from graph.chains.answer_grader import answer_grader_chain
+from graph.chains.hallucination_grader import hallucination_grader_chain
+from graph.config import get_settings
+from graph.context import prompt_context
+from graph.document_refs import relevant_documents
+from graph.state import GraphState
+from graph.streaming import emit, verdict_event
+
+from logger import log_info
+
+T = TypeVar("T")
+
+HALLUCINATION_STAGE = "grade_generation.hallucination"
+ANSWER_STAGE = "grade_generation.answer"
+TOTAL_STAGE = "grade_generation"
+
+
+def _hallucination_verdict(grounded: bool) -> None:
+    if grounded:
+        log_info("---🤖 EVALUAR QUE LA RESPUESTA CONTESTA LA PREGUNTA---")
+    else:
+        log_info("---🤖DECISIÓN: GENERACIÓN DE RESPUESTA NO ESTA BASADA EN LOS DOCUMENTOS, REINTENTAR---")
+
+
+def _answer_verdict(addresses_question: bool) -> str:
+    if addresses_question:
+        log_info("---🤖 DECISIÓN: GENERACIÓN DE RESPUESTA ATIENDE LA PREGUNTA---")
+        return "useful"
+    log_info("---🤖DECISIÓN: GENERACIÓN DE RESPUESTA NO ATIENDE LA PREGUNTA---")
+    return "not useful"
+
+
+@lru_cache(maxsize=1)
+def _grading_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool of the concurrent synchronous path, two workers per GRADER_PARALLEL_REQUESTS question."""
+    return ThreadPoolExecutor(
+        max_workers=2 * max(get_settings().grader_parallel_requests, 1), thread_name_prefix="grade-generation"
+    )
+
+
+def _timed(func: Callable[[], T]) -> Tuple[T, float]:
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+async def _atimed(awaitable: Awaitable[T]) -> Tuple[T, float]:
+    started = time.perf_counter()
+    result = await awaitable
+    return result, time.perf_counter() - started
+
+
+def _result(
+    state: GraphState, generation_grade: str, timings: Dict[str, float], started: float, calls: int
+) -> Dict[str, Any]:
+    timings[TOTAL_STAGE] = time.perf_counter() - started
+    # Tell streaming callers whether the answer they already showed stands
+    emit(verdict_event(state.get("generation_attempt", 1), generation_grade))
+    result = {"generation_grade": generation_grade, "timings": timings, **spent(state, llm_calls=calls)}
+    if generation_grade == "not useful":
+        # Another round needs a web search and a new answer; without budget for them this answer is the best one
+        reason = exceeded(state, llm_calls=calls + GENERATION_CALLS, web_searches=1)
+        if reason:
+            result.update(degrade(reason, "grade_generation"))
+    return result
+
+
+def grade_generation(state: GraphState) -> Dict[str, Any]:
+    """
+    Grade whether the generated answer is grounded in the provided documents and addresses the question.
+    First, check for hallucination (is the answer grounded in the documents?).
+    If grounded, check if the answer addresses the question.
+
+    With GENERATION_GRADING_MODE=concurrent both graders start together and the answer grade is
+    abandoned as soon as the hallucination check fails, so a grounded answer costs one round-trip
+    instead of two. The verdicts are the same in both modes.
+
+    Args:
+        state (GraphState): The current graph state containing the question, documents and generation.
+
+    Returns:
+        Dict[str, Any]: Updated state with generation_grade set to
+            - "useful" if answer is grounded and addresses the question
+            - "not useful" if answer is grounded but does not address the question
+            - "not supported" if answer is not grounded (hallucinated)
+            and the seconds spent per grading stage in timings. A "not useful" answer is kept as
+            the final one, flagged as degraded, when the request budget cannot pay for another
+            web search and generation.
+    """
+    log_info("---🤖 REVISANDO ALUCINACIÓN EN LA GENERACION DE RESPUESTA---")
+    started = time.perf_counter()
+    question = state["question"]
+    # Same context builder as the generate node, so the grader sees the facts the answer was built from
+    documents = prompt_context(relevant_documents(state)).value
+    generation = state["generation"]
+    timings: Dict[str, float] = {}
+
+    def check_hallucination() -> Any:
+        return hallucination_grader_chain.invoke({"documents": documents, "generation": generation})
+
+    def check_answer() -> Any:
+        return answer_grader_chain.invoke({"question": question, "generation": generation})
+
+    if get_settings().generation_grading_mode != "concurrent":
+        # Check if the generation is grounded in the documents
+        score, timings[HALLUCINATION_STAGE] = _timed(check_hallucination)
+        _hallucination_verdict(score.binary_score)
+        if not score.binary_score:
+            return _result(state, "not supported", timings, started, calls=1)
+
+        # If grounded, check if the answer addresses the question
+        score, timings[ANSWER_STAGE] = _timed(check_answer)
+        return _result(state, _answer_verdict(score.binary_score), timings, started, calls=2)
+
+    executor = _grading_executor()
+    # Each grader runs in a copy of the node's context so its calls stay part of the node's run; the hallucination
+    # check goes first so that on a busy pool it is the answer grade that waits and can still be cancelled
+    hallucination_future = executor.submit(contextvars.copy_context().run, _timed, check_hallucination)
+    answer_future = executor.submit(contextvars.copy_context().run, _timed, check_answer)
+    try:
+        score, timings[HALLUCINATION_STAGE] = hallucination_future.result()
+    except BaseException:
+        answer_future.cancel()
+        raise
+    _hallucination_verdict(score.binary_score)
+    if not score.binary_score:
+        # The answer grade no longer matters; do not wait for it, and only count it if it was sent
+        calls = 1 if answer_future.cancel() else 2
+        return _result(state, "not supported", timings, started, calls=calls)
+    score, timings[ANSWER_STAGE] = answer_future.result()
+    return _result(state, _answer_verdict(score.binary_score), timings, started, calls=2)
+
+
+async def agrade_generation(state: GraphState) -> Dict[str, Any]:
+    """Async version of grade_generation used by app.ainvoke / app.astream; the answer grade is cancelled when unused."""
+    log_info("---🤖 REVISANDO ALUCINACIÓN EN LA GENERACION DE RESPUESTA---")
+    started = time.perf_counter()
+    question = state["question"]
+    documents = prompt_context(relevant_documents(state)).value
+    generation = state["generation"]
+    timings: Dict[str, float] = {}
+
+    def check_hallucination() -> Awaitable[Any]:
+        return hallucination_grader_chain.ainvoke({"documents": documents, "generation": generation})
+
+    def check_answer() -> Awaitable[Any]:
+        return answer_grader_chain.ainvoke({"question": question, "generation": generation})
+
+    if get_settings().generation_grading_mode != "concurrent":
+        score, timings[HALLUCINATION_STAGE] = await _atimed(check_hallucination())
+        _hallucination_verdict(score.binary_score)
+        if not score.binary_score:
+            return _result(state, "not supported", timings, started, calls=1)
+
+        score, timings[ANSWER_STAGE] = await _atimed(check_answer())
+        return _result(state, _answer_verdict(score.binary_score), timings, started, calls=2)
+
+    answer_started = []
+
+    async def answer() -> Tuple[Any, float]:
+        answer_started.append(True)
+        return await _atimed(check_answer())
+
+    answer_task = asyncio.ensure_future(answer())
+    try:
+        score, timings[HALLUCINATION_STAGE] = await _atimed(check_hallucination())
+        _hallucination_verdict(score.binary_score)
+        if not score.binary_score:
+            # A task cancelled before its first step never sent the answer grade
+            return _result(state, "not supported", timings, started, calls=2 if answer_started else 1)
+        score, timings[ANSWER_STAGE] = await answer_task
+        return _result(state, _answer_verdict(score.binary_score), timings, started, calls=2)
+    finally:
+        if not answer_task.done():
+            answer_task.cancel()
@@ -1,12 +1,95 @@
-from typing import Any, Dict
+import asyncio
+import time
+from typing import Any, Dict, List, Sequence, Tuple
 
+from langchain_core.documents import Document
+
+from graph.budget import request_budget
+from graph.config import get_settings
+from graph.document_refs import to_refs
+from graph.retrieval import SHARD_KEY, reciprocal_rank_fusion
+from graph.shards import (
+    ShardResult,
+    aselect_shards,
+    get_shard_executor,
+    merge_shard_results,
+    record_shard_results,
+    select_shards,
+)
 from graph.state import GraphState
-from ingestion import retriever_vector
+from ingestion import get_lexical_index, shard_retriever
 from logger import log_info
 
+
+def _fuse(vector_documents: List[Document], lexical_documents: List[Document]) -> List[Document]:
+    settings = get_settings()
+    if settings.retrieval_mode != "hybrid":
+        return vector_documents[:settings.retrieval_k]
+    fused = reciprocal_rank_fusion(
+        [vector_documents, lexical_documents],
+        weights=[settings.rrf_vector_weight, settings.rrf_bm25_weight],
+        k=settings.rrf_k,
+    )
+    return fused[:settings.retrieval_k]
+
+
+def _lexical_search(shard: str, question: str) -> List[Tuple[Document, float]]:
+    settings = get_settings()
+    if settings.retrieval_mode != "hybrid":
+        return []
+    return [
+        (Document(page_content=document.page_content, metadata={**document.metadata, SHARD_KEY: shard}), score)
+        for document, score in get_lexical_index(shard).search(question, settings.retrieval_candidates)
+    ]
+
+
+def _search_shard(shard: str, question: str) -> ShardResult:
+    started = time.perf_counter()
+    vector_documents = shard_retriever(shard).invoke(question)
+    lexical_results = _lexical_search(shard, question)
+    return ShardResult(shard, vector_documents, lexical_results, time.perf_counter() - started)
+
+
+async def _asearch_shard(shard: str, question: str) -> ShardResult:
+    started = time.perf_counter()
+    vector_documents, lexical_results = await asyncio.gather(
+        shard_retriever(shard).ainvoke(question), asyncio.to_thread(_lexical_search, shard, question)
+    )
+    return ShardResult(shard, vector_documents, lexical_results, time.perf_counter() - started)
+
+
+def _retrieved(state: GraphState, results: Sequence[ShardResult]) -> Dict[str, Any]:
+    question = state["question"]
+    documents = _fuse(*merge_shard_results(results))
+    record_shard_results(results, documents)
+    # First node of the vectorstore route: fix the request budget for the rest of the run
+    return {
+        "documents": to_refs(documents),
+        "question": question,
+        "context_question": question,
+        "budget": request_budget(state),
+    }
+
+
 def retriever(state: GraphState) -> Dict[str, Any]:
     log_info("---RECUPERANDO INFORMACIÓN---")
     question = state["question"]
 
-    documents = retriever_vector.invoke(question)
-    return {"documents": documents, "question": question}
+    shards = select_shards(question)
+    if len(shards) == 1:
+        results = [_search_shard(shards[0], question)]
+    else:
+        log_info(f"---Consultando {len(shards)} shards: {', '.join(shards)}")
+        results = list(get_shard_executor().map(lambda shard: _search_shard(shard, question), shards))
+    return _retrieved(state, results)
+
+
+async def aretriever(state: GraphState) -> Dict[str, Any]:
+    log_info("---RECUPERANDO INFORMACIÓN---")
+    question = state["question"]
+
+    shards = await aselect_shards(question)
+    if len(shards) > 1:
+        log_info(f"---Consultando {len(shards)} shards: {', '.join(shards)}")
+    results = await asyncio.gather(*(_asearch_shard(shard, question) for shard in shards))
+    return _retrieved(state, results)
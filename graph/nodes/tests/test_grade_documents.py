@@ -0,0 +1,182 @@
+import asyncio
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.retrieval_grader import DocumentVerdict, GradeDocument, GradeDocuments
+from graph.config import Settings
+from graph.document_refs import add_documents, relevant_documents, to_refs
+from graph.nodes.grade_documents import grade_documents_concurrently
+
+# graph.nodes re-exports the node function under the module's name, so fetch the module itself
+grade_documents_module = importlib.import_module("graph.nodes.grade_documents")
+
+
+def _stub_grader(delays: dict) -> RunnableLambda:
+    def grade(inputs: dict) -> GradeDocument:
+        time.sleep(delays.get(inputs["document"], 0.0))
+        verdict = "yes" if "agent" in inputs["document"] else "no"
+        return GradeDocument(binary_score=verdict)
+
+    return RunnableLambda(grade)
+
+
+def _documents(*texts: str) -> list:
+    return [Document(page_content=text, metadata={"source": f"doc-{i}"}) for i, text in enumerate(texts)]
+
+
+def _kept(documents: list, result: dict) -> list:
+    """Texts of the documents left relevant once the node's update is merged into the state."""
+    state = {"documents": add_documents(to_refs(documents), result["documents"])}
+    return [document.page_content for document in relevant_documents(state)]
+
+
+def test_concurrent_grading_keeps_document_order(monkeypatch) -> None:
+    documents = _documents("agent memory", "pizza dough", "agent planning", "tomato sauce")
+    # Make the first documents the slowest so they finish last
+    delays = {"agent memory": 0.2, "pizza dough": 0.1}
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", _stub_grader(delays))
+
+    scores = grade_documents_concurrently("agent", documents, max_concurrency=4, timeout=5.0)
+
+    assert [score.binary_score for score in scores] == ["yes", "no", "yes", "no"]
+
+
+def test_slow_grade_is_treated_as_not_relevant(monkeypatch) -> None:
+    documents = _documents("agent memory", "agent tools")
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", _stub_grader({"agent tools": 2.0}))
+
+    started = time.perf_counter()
+    scores = grade_documents_concurrently("agent", documents, max_concurrency=2, timeout=0.2)
+
+    assert time.perf_counter() - started < 1.0
+    assert scores[0].binary_score == "yes"
+    assert scores[1] is None
+
+
+def test_grades_still_queued_at_their_timeout_never_reach_the_grader(monkeypatch) -> None:
+    documents = _documents("agent tools", "agent memory")
+    graded = []
+
+    def grade(inputs: dict) -> GradeDocument:
+        graded.append(inputs["document"])
+        time.sleep(0.5)
+        return GradeDocument(binary_score="yes")
+
+    # A saturated shared pool: the second grade waits behind the first
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(grade_documents_module, "_grading_executor", lambda: executor)
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", RunnableLambda(grade))
+    grade_documents_module.reset_grading_stats()
+
+    scores = grade_documents_concurrently("agent", documents, max_concurrency=2, timeout=0.1)
+    executor.shutdown(wait=True)
+
+    assert scores == [None, None]
+    assert graded == ["agent tools"]
+    stats = grade_documents_module.grading_stats()
+    assert (stats["timed_out"], stats["expired_in_queue"]) == (1, 1)
+
+
+def test_the_timeout_of_a_grade_starts_when_a_worker_picks_it_up(monkeypatch) -> None:
+    documents = _documents("agent tools", "agent memory")
+
+    def grade(inputs: dict) -> GradeDocument:
+        time.sleep(0.2)
+        return GradeDocument(binary_score="yes")
+
+    # The second grade waits 0.2s for the only worker, then runs 0.2s: within 0.3s of its start
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(grade_documents_module, "_grading_executor", lambda: executor)
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", RunnableLambda(grade))
+
+    scores = grade_documents_concurrently("agent", documents, max_concurrency=2, timeout=0.3)
+    executor.shutdown(wait=True)
+
+    assert [score.binary_score for score in scores] == ["yes", "yes"]
+
+
+def _stub_batch_grader(verdicts: list) -> RunnableLambda:
+    return RunnableLambda(lambda inputs: GradeDocuments(verdicts=[DocumentVerdict(**v) for v in verdicts]))
+
+
+def test_batched_grading_orders_verdicts_by_index(monkeypatch) -> None:
+    documents = _documents("agent memory", "pizza dough")
+    verdicts = [{"index": 1, "binary_score": "no"}, {"index": 0, "binary_score": "yes"}]
+    monkeypatch.setattr(grade_documents_module, "batch_retrieval_grader_chain", _stub_batch_grader(verdicts))
+
+    scores = grade_documents_module.grade_documents_batched("agent", documents)
+
+    assert [score.binary_score for score in scores] == ["yes", "no"]
+
+
+def test_malformed_batched_output_falls_back_to_per_document(monkeypatch) -> None:
+    documents = _documents("agent memory", "pizza dough")
+    # Index 1 is missing, so the batched output cannot be trusted
+    monkeypatch.setattr(
+        grade_documents_module, "batch_retrieval_grader_chain", _stub_batch_grader([{"index": 0, "binary_score": "yes"}])
+    )
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", _stub_grader({}))
+    monkeypatch.setattr(grade_documents_module, "get_settings", lambda: Settings(grading_strategy="batched"))
+
+    result = grade_documents_module.grade_documents({"question": "agent", "documents": documents})
+
+    assert _kept(documents, result) == ["agent memory"]
+    assert [ref["relevant"] for ref in result["documents"]] == [False]
+    assert result["web_search"]
+
+
+def test_async_concurrent_grading_times_out_slow_documents(monkeypatch) -> None:
+    async def grade(inputs: dict) -> GradeDocument:
+        await asyncio.sleep(2.0 if inputs["document"] == "agent tools" else 0.0)
+        return GradeDocument(binary_score="yes")
+
+    documents = _documents("agent memory", "agent tools")
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", RunnableLambda(grade))
+
+    scores = asyncio.run(
+        grade_documents_module.agrade_documents_concurrently("agent", documents, max_concurrency=2, timeout=0.2)
+    )
+
+    assert scores[0].binary_score == "yes"
+    assert scores[1] is None
+
+
+def test_clear_cut_relevance_scores_skip_the_llm_grader(monkeypatch) -> None:
+    documents = _documents("agent memory", "agent planning", "pizza dough", "agent tools")
+    for document, score in zip(documents, [0.92, 0.55, 0.05, None]):
+        if score is not None:
+            document.metadata["relevance_score"] = score
+    graded = []
+
+    def grade(inputs: dict) -> GradeDocument:
+        graded.append(inputs["document"])
+        return GradeDocument(binary_score="yes")
+
+    monkeypatch.setattr(grade_documents_module, "retrieval_grader_chain", RunnableLambda(grade))
+    monkeypatch.setattr(
+        grade_documents_module,
+        "get_settings",
+        lambda: Settings(score_accept_threshold=0.8, score_reject_threshold=0.2),
+    )
+    grade_documents_module.reset_grading_stats()
+
+    result = grade_documents_module.grade_documents({"question": "agent", "documents": documents})
+
+    assert sorted(graded) == ["agent planning", "agent tools"]
+    assert _kept(documents, result) == [
+        "agent memory",
+        "agent planning",
+        "agent tools",
+    ]
+    assert result["web_search"]
+    assert grade_documents_module.grading_stats() == {
+        "auto_accepted": 1,
+        "auto_rejected": 1,
+        "llm_graded": 2,
+        "timed_out": 0,
+        "expired_in_queue": 0,
+    }
@@ -0,0 +1,124 @@
+import asyncio
+import importlib
+import time
+from concurrent.futures import Future
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.answer_grader import GradeAnswer
+from graph.chains.hallucination_grader import GradeHallucination
+from graph.config import Settings
+
+# graph.nodes re-exports the node function under the module's name, so fetch the module itself
+grade_generation_module = importlib.import_module("graph.nodes.grade_generation")
+
+STATE = {"question": "What is agent memory?", "documents": [], "generation": "Agents store memories."}
+
+
+def _stub(verdict: object, delay: float = 0.0) -> RunnableLambda:
+    def grade(inputs: dict) -> object:
+        time.sleep(delay)
+        return verdict
+
+    async def agrade(inputs: dict) -> object:
+        await asyncio.sleep(delay)
+        return verdict
+
+    return RunnableLambda(grade, afunc=agrade)
+
+
+
+class _OneWorkerBusyExecutor:
+    """Runs the first submission at once and leaves the rest queued."""
+
+    def __init__(self) -> None:
+        self.submitted = 0
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        self.submitted += 1
+        if self.submitted == 1:
+            future.set_result(fn(*args))
+        return future
+
+
+@pytest.mark.parametrize("mode", ["sequential", "concurrent"])
+@pytest.mark.parametrize(
+    "grounded, addresses, expected",
+    [(True, True, "useful"), (True, False, "not useful"), (False, True, "not supported")],
+)
+def test_both_modes_give_the_same_verdicts(monkeypatch, mode, grounded, addresses, expected) -> None:
+    monkeypatch.setattr(grade_generation_module, "get_settings", lambda: Settings(generation_grading_mode=mode))
+    monkeypatch.setattr(grade_generation_module, "hallucination_grader_chain", _stub(GradeHallucination(binary_score=grounded)))
+    monkeypatch.setattr(grade_generation_module, "answer_grader_chain", _stub(GradeAnswer(binary_score=addresses)))
+
+    assert grade_generation_module.grade_generation(STATE)["generation_grade"] == expected
+    assert asyncio.run(grade_generation_module.agrade_generation(STATE))["generation_grade"] == expected
+
+
+def test_concurrent_mode_overlaps_the_graders_and_records_stage_timings(monkeypatch) -> None:
+    monkeypatch.setattr(
+        grade_generation_module, "get_settings", lambda: Settings(generation_grading_mode="concurrent")
+    )
+    monkeypatch.setattr(
+        grade_generation_module, "hallucination_grader_chain", _stub(GradeHallucination(binary_score=True), 0.2)
+    )
+    monkeypatch.setattr(grade_generation_module, "answer_grader_chain", _stub(GradeAnswer(binary_score=True), 0.2))
+
+    timings = grade_generation_module.grade_generation(STATE)["timings"]
+
+    assert timings["grade_generation.hallucination"] >= 0.2
+    assert timings["grade_generation.answer"] >= 0.2
+    assert timings["grade_generation"] < 0.35
+
+
+def test_failed_hallucination_check_does_not_wait_for_the_answer_grade(monkeypatch) -> None:
+    monkeypatch.setattr(
+        grade_generation_module, "get_settings", lambda: Settings(generation_grading_mode="concurrent")
+    )
+    monkeypatch.setattr(
+        grade_generation_module, "hallucination_grader_chain", _stub(GradeHallucination(binary_score=False))
+    )
+    monkeypatch.setattr(grade_generation_module, "answer_grader_chain", _stub(GradeAnswer(binary_score=True), 1.0))
+
+    started = time.perf_counter()
+    result = asyncio.run(grade_generation_module.agrade_generation(STATE))
+
+    assert time.perf_counter() - started < 0.5
+    assert result["generation_grade"] == "not supported"
+    assert "grade_generation.answer" not in result["timings"]
+
+
+def test_an_answer_grade_cancelled_before_it_started_is_not_counted(monkeypatch) -> None:
+    monkeypatch.setattr(
+        grade_generation_module, "get_settings", lambda: Settings(generation_grading_mode="concurrent")
+    )
+    monkeypatch.setattr(
+        grade_generation_module, "hallucination_grader_chain", _stub(GradeHallucination(binary_score=False))
+    )
+    monkeypatch.setattr(grade_generation_module, "answer_grader_chain", _stub(GradeAnswer(binary_score=True)))
+    # The hallucination check runs, while the answer grade stays queued behind busy workers
+    monkeypatch.setattr(grade_generation_module, "_grading_executor", lambda: _OneWorkerBusyExecutor())
+
+    result = grade_generation_module.grade_generation(STATE)
+
+    assert result["generation_grade"] == "not supported"
+    assert result["llm_calls"] == 1
+
+
+def test_concurrent_grades_share_one_process_wide_pool(monkeypatch) -> None:
+    monkeypatch.setattr(
+        grade_generation_module, "get_settings", lambda: Settings(generation_grading_mode="concurrent")
+    )
+    monkeypatch.setattr(
+        grade_generation_module, "hallucination_grader_chain", _stub(GradeHallucination(binary_score=True))
+    )
+    monkeypatch.setattr(grade_generation_module, "answer_grader_chain", _stub(GradeAnswer(binary_score=True)))
+
+    grade_generation_module.grade_generation(STATE)
+    executor = grade_generation_module._grading_executor()
+    result = grade_generation_module.grade_generation(STATE)
+
+    assert grade_generation_module._grading_executor() is executor
+    assert result["llm_calls"] == 2
@@ -0,0 +1,88 @@
+import asyncio
+import importlib
+import json
+
+from langchain_core.documents import Document
+
+from graph.cache import QuestionCache
+from graph.config import Settings
+from graph.search import FakeSearchBackend, SearchResult
+
+# graph.nodes re-exports the node function under the module's name, so fetch the module itself
+web_search_module = importlib.import_module("graph.nodes.web_search")
+
+RESULTS = {
+    "agent memory": [
+        SearchResult(url="https://a.example/memory", title="Memory", content="Agents keep a memory stream."),
+        SearchResult(url="https://b.example/memory", title="Memory 2", content="Long-term memory uses a vector store."),
+        SearchResult(url="https://c.example/copy", title="Copy", content="Agents keep a memory stream."),
+    ]
+}
+
+
+def _install(monkeypatch, tmp_path, **settings) -> FakeSearchBackend:
+    backend = FakeSearchBackend(RESULTS)
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(web_search_module, "get_search_backend", lambda: backend)
+    monkeypatch.setattr(web_search_module, "get_question_cache", lambda: cache)
+    monkeypatch.setattr(web_search_module, "get_settings", lambda: Settings(**settings))
+    return backend
+
+
+def test_each_result_becomes_a_document_deduplicated_against_state(monkeypatch, tmp_path) -> None:
+    _install(monkeypatch, tmp_path)
+    existing = Document(page_content="Long-term memory uses a vector store.", metadata={"source": "https://docs"})
+
+    result = web_search_module.web_search({"question": "Agent memory?", "documents": [existing]})
+
+    # Only the new result is returned, as a ref carrying its text: it is not in the vectorstore
+    (ref,) = result["documents"]
+    assert ref["metadata"]["source"] == "https://a.example/memory"
+    assert ref["metadata"]["origin"] == "web_search"
+    assert ref["text"] == "Agents keep a memory stream."
+
+
+def test_repeated_queries_are_served_from_the_cache(monkeypatch, tmp_path) -> None:
+    backend = _install(monkeypatch, tmp_path)
+
+    first = web_search_module.web_search({"question": "agent memory"})
+    second = asyncio.run(web_search_module.aweb_search({"question": "Agent   memory?"}))
+
+    assert backend.queries == ["agent memory"]
+    assert second["documents"] == first["documents"]
+
+
+def test_cache_can_be_disabled(monkeypatch, tmp_path) -> None:
+    backend = _install(monkeypatch, tmp_path, web_search_cache_enabled=False)
+
+    web_search_module.web_search({"question": "agent memory"})
+    web_search_module.web_search({"question": "agent memory"})
+
+    assert backend.queries == ["agent memory", "agent memory"]
+
+
+def test_tavily_backend_posts_through_the_shared_pools(monkeypatch) -> None:
+    import httpx
+
+    import graph.tavily as tavily
+
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"results": [{"url": "https://a.example", "title": "A", "content": "text", "score": 0.9}]})
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(tavily, "get_http_client", lambda: httpx.Client(transport=transport))
+    monkeypatch.setattr(tavily, "get_async_http_client", lambda: httpx.AsyncClient(transport=transport))
+    monkeypatch.setenv("TAVILY_API_KEY", "tvly-test")
+    from graph.search import TavilySearchBackend
+
+    backend = TavilySearchBackend(max_results=2, timeout=5)
+    expected = [SearchResult(url="https://a.example", title="A", content="text", score=0.9)]
+    assert backend.search("agent memory") == expected
+    assert asyncio.run(backend.asearch("agent memory")) == expected
+    assert str(requests[0].url) == "https://api.tavily.com/search"
+    assert requests[0].headers["Authorization"] == "Bearer tvly-test"
+    assert "X-Client-Source" not in requests[0].headers
+    assert json.loads(requests[0].content) == {"query": "agent memory", "max_results": 2}
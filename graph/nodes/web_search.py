@@ -1,9 +1,9 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 import sys
+from dataclasses import asdict
 from pathlib import Path
 
 from langchain.schema import Document
-from langchain_tavily import TavilySearch
 
 if __name__ == "__main__":
     # Get the project root (3 levels up from this file)
@@ -16,65 +16,123 @@ except ImportError:
 
 from dotenv import load_dotenv
 
+from graph.budget import degrade, exceeded, request_budget, spent
+from graph.cache import WEB_SEARCH_NAMESPACE, get_question_cache
+from graph.config import get_settings
+from graph.document_refs import document_id, to_refs
+from graph.search import SearchResult, get_search_backend
 from logger import log_info
 
 load_dotenv()
 
+# metadata["origin"] of the Documents built from web search results
+WEB_SEARCH_ORIGIN = "web_search"
+
+
+def _cached_results(query: str) -> Optional[List[SearchResult]]:
+    if not get_settings().web_search_cache_enabled:
+        return None
+    cached = get_question_cache().get(WEB_SEARCH_NAMESPACE, query)
+    if cached is None:
+        return None
+    log_info("---RESULTADOS DE BÚSQUEDA WEB RECUPERADOS DE CACHE---")
+    return [SearchResult(**result) for result in cached]
+
+
+def _store_results(query: str, results: List[SearchResult]) -> None:
+    settings = get_settings()
+    if settings.web_search_cache_enabled and results:
+        get_question_cache().set(
+            WEB_SEARCH_NAMESPACE, query, [asdict(result) for result in results], ttl=settings.web_search_cache_ttl
+        )
 
-web_search_tool = TavilySearch(max_results=3)
 
 def web_search(state: GraphState) -> Dict[str, Any]:
     """
-    Perform a web search for the given question and append the results as a Document to the documents list.
+    Perform a web search for the given question and add one document per result to the documents.
+
+    Results of a repeated question are served from the cache for WEB_SEARCH_CACHE_TTL seconds.
+    When the request budget has no search left (see graph/budget.py) the search is skipped, the
+    documents are kept as they are and the run is flagged as degraded.
 
     Args:
         state (GraphState): The current graph state containing the question and documents.
 
     Returns:
-        Dict[str, Any]: Updated state with the new web search Document appended to documents.
+        Dict[str, Any]: Updated state with refs to the new web search Documents (appended to
+            documents, text included) and the number of searches made.
     """
     log_info("---REALIZANDO BUSQUEDA WEB---")
-    
     question = state["question"]
-    if "documents" in state: # if the route to web search in first time then give error
-        documents = state["documents"]
-    else:
-        #log_info("No documents found, creating new list with web results for first time")
-        documents = None
 
+    results = _cached_results(question)
+    if results is not None:
+        return _append_web_results(state, results)
+    reason = exceeded(state, web_searches=1)
+    if reason:
+        return _skip_search(state, reason)
+    results = get_search_backend().search(question)
+    _store_results(question, results)
+    return {**_append_web_results(state, results), **spent(state, web_searches=1)}
 
-    # Invoke TavilySearch to get web search results for the question
-    tavily_results = web_search_tool.invoke({"query": question})
 
+async def aweb_search(state: GraphState) -> Dict[str, Any]:
+    """Async version of web_search used by app.ainvoke / app.astream."""
+    log_info("---REALIZANDO BUSQUEDA WEB---")
+    question = state["question"]
 
-    # OJO --> Al hacer esta concatenación se mezclan resultados regresados por la busqueda lo que nos lleva
-    # a qu  el LLM pueda considerar que el unico documenta habla de todo lo concatenado y que las validaciones
-    # de relevancia de documentos puedan fallar
+    results = _cached_results(question)
+    if results is not None:
+        return _append_web_results(state, results)
+    reason = exceeded(state, web_searches=1)
+    if reason:
+        return _skip_search(state, reason)
+    results = await get_search_backend().asearch(question)
+    _store_results(question, results)
+    return {**_append_web_results(state, results), **spent(state, web_searches=1)}
 
-    # Join the content from all search results into a single string
-    joined_tavily_result = "\n\n".join(
-        [result["content"] for result in tavily_results["results"]]
-    )
 
-    # Create a new Document with the joined web search results
-    web_results = Document(
-        page_content=joined_tavily_result,
-        metadata={"source": "web_search"}
-    )
+def _skip_search(state: GraphState, reason: str) -> Dict[str, Any]:
+    return {
+        "question": state["question"],
+        "context_question": state["question"],
+        "budget": request_budget(state),
+        **degrade(reason, "websearch"),
+    }
 
-    # Ensure documents is a list and append the new web search Document
-    if documents is not None:
-        #print(f"Documents length: {len(documents)}")
-        #print("Appending web results to documents")
-        documents.append(web_results)
-        #print(f"Documents length: {len(documents)}")
-    else:
-        #print("No documents found, creating new list with web results")
-        documents = [web_results]
 
-    # Return the updated state with the new documents list
-    return {"documents": documents, "question": question}
+def _append_web_results(state: GraphState, results: List[SearchResult]) -> Dict[str, Any]:
+    """Add each search result as its own Document, skipping results already in the documents."""
+    question = state["question"]
+    # Web search may be the first node of the run, with no documents yet
+    refs = to_refs(state.get("documents") or [])
+
+    # Keeping every result in its own Document lets the graders judge them one by one
+    seen = {ref["metadata"].get("source") for ref in refs} | {ref["id"] for ref in refs}
+    documents = []
+    for result in results:
+        document = Document(
+            page_content=result.content,
+            metadata={
+                "source": result.url,
+                "title": result.title,
+                "search_score": result.score,
+                "origin": WEB_SEARCH_ORIGIN,
+            },
+        )
+        if not result.content or result.url in seen or document_id(document) in seen:
+            continue
+        seen.update((result.url, document_id(document)))
+        documents.append(document)
+
+    # Only the new documents are returned: the documents channel appends them. Web search may be
+    # the first node of the run, so the request budget is fixed here too
+    return {
+        "documents": to_refs(documents),
+        "question": question,
+        "context_question": question,
+        "budget": request_budget(state),
+    }
 
 if __name__ == "__main__":
     web_search(state={"question": "agent memory?", "documents": None})
-    
@@ -0,0 +1,398 @@
+"""
+Client-side rate limiting for the chat completion requests of every chain.
+
+The chains share one LLMLimiter (get_llm_limiter()), installed as the transport of the dedicated
+LLM HTTP clients of graph/clients.py, so the limits hold across chains, threads and event loops:
+
+- Two token buckets pace requests and tokens per minute. A request reserves its estimated tokens
+  (prompt characters / 4 plus its max_tokens, as the provider counts them) before it is sent; a
+  bucket in debt makes the next requests wait instead of letting them fail with a 429.
+- AdaptiveConcurrency caps the requests in flight with AIMD: every fast success raises the limit
+  by 1/limit (about one per round trip), a 429 or a response slower than the latency target
+  halves it (at most once per cooldown).
+- Rate limits, server errors and connection errors are retried with full-jitter exponential
+  backoff, honouring Retry-After. The OpenAI clients are built with max_retries=0 so their own
+  retries do not compound with these.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Deque, Optional, Tuple, Union
+
+import httpx
+
+from graph.config import Settings, get_settings
+from graph.telemetry import RETRYABLE_STATUS, record_http_response
+
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate per second up to capacity, thread safe.
+
+    reserve() always takes the amount, possibly leaving the bucket in debt, and returns the
+    seconds until the debt is paid back: callers wait that long, so they are served in the order
+    they reserved and a large request cannot be starved by small ones. A rate of 0 disables it.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+_Waiter = Union[threading.Event, Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]]
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit adjusted with additive increase / multiplicative decrease.
+
+    Slots are handed to waiters in arrival order, whether they wait in a thread (acquire) or in
+    any event loop (aacquire).
+    """
+
+    def __init__(self, minimum: int, maximum: int, latency_target: float, cooldown: float = 1.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._decreased = -float("inf")
+        self._lock = threading.Lock()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+                continue
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The waiter's loop is closed: nobody will use the slot
+                self.in_flight -= 1
+
+    def acquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed over as the task was cancelled: pass it on
+            self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.latency_target:
+            self.on_overload()
+            return
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_overload(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._decreased >= self.cooldown:
+                self._decreased = now
+                self.limit = max(self.minimum, self.limit / 2)
+
+
+@dataclass
+class LimiterStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    waited_seconds: float = 0.0
+
+
+class LLMLimiter:
+    """The request and token buckets, the adaptive concurrency and the retry policy of the LLM clients."""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        min_concurrency: int,
+        max_concurrency: int,
+        latency_target: float,
+        max_retries: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+        burst_seconds: float = 1.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute / 60 * burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * burst_seconds)
+        self.concurrency = AdaptiveConcurrency(min_concurrency, max_concurrency, latency_target)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._stats = LimiterStats()
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "LLMLimiter":
+        return cls(
+            requests_per_minute=settings.llm_requests_per_minute,
+            tokens_per_minute=settings.llm_tokens_per_minute,
+            min_concurrency=settings.llm_min_concurrency,
+            max_concurrency=settings.llm_max_concurrency,
+            latency_target=settings.llm_latency_target,
+            max_retries=settings.llm_max_retries,
+            retry_base_delay=settings.llm_retry_base_delay,
+            retry_max_delay=settings.llm_retry_max_delay,
+        )
+
+    def reserve(self, tokens: int) -> float:
+        """Take one request and tokens from the buckets; returns the seconds to wait before sending."""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        self._count(requests=1, waited_seconds=wait)
+        return wait
+
+    def retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        return max(delay, _retry_after(response))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(vars(self._stats))
+        stats["concurrency_limit"] = self.concurrency.limit
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats = LimiterStats()
+
+    def _count(self, **increments: float) -> None:
+        with self._stats_lock:
+            for name, increment in increments.items():
+                setattr(self._stats, name, getattr(self._stats, name) + increment)
+
+
+def _retry_after(response: Optional[httpx.Response]) -> float:
+    if response is None:
+        return 0.0
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        try:
+            return float(value) / scale if value else 0.0
+        except ValueError:
+            continue
+    return 0.0
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Tokens a chat completion request counts against the limit: prompt estimate plus max_tokens."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return 0
+    if not isinstance(body, dict):
+        return 0
+    prompt = sum(len(str(message.get("content") or "")) for message in body.get("messages", []) if isinstance(message, dict))
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or 0
+    return prompt // CHARS_PER_TOKEN + int(completion)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives the concurrency slot back once it is read or closed."""
+
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(function: Callable[[], None]) -> Callable[[], None]:
+    lock, called = threading.Lock(), []
+
+    def wrapper() -> None:
+        with lock:
+            if called:
+                return
+            called.append(True)
+        function()
+
+    return wrapper
+
+
+def _with_stream(response: httpx.Response, stream: Any) -> httpx.Response:
+    return httpx.Response(response.status_code, headers=response.headers, stream=stream, extensions=response.extensions)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Transport that paces, caps and retries the requests of a synchronous client through limiter."""
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: LLMLimiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limiter
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            time.sleep(limiter.reserve(tokens))
+            limiter.concurrency.acquire()
+            release = _once(limiter.concurrency.release)
+            started = time.perf_counter()
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError:
+                release()
+                limiter.concurrency.on_overload()
+                if attempt >= limiter.max_retries:
+                    limiter._count(failures=1)
+                    raise
+                response = None
+            except BaseException:
+                release()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or attempt >= limiter.max_retries:
+                    if response.status_code in RETRYABLE_STATUS:
+                        limiter._count(failures=1)
+                        limiter.concurrency.on_overload()
+                    else:
+                        limiter.concurrency.on_success(time.perf_counter() - started)
+                    return _with_stream(response, _ReleasingStream(response.stream, release))
+                response.close()
+                release()
+                record_http_response(response.status_code)
+                limiter.concurrency.on_overload()
+            limiter._count(retries=1)
+            time.sleep(limiter.retry_delay(attempt, response))
+            attempt += 1
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Asynchronous counterpart of RateLimitedTransport, sharing the same limiter."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: LLMLimiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limiter
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            await asyncio.sleep(limiter.reserve(tokens))
+            await limiter.concurrency.aacquire()
+            release = _once(limiter.concurrency.release)
+            started = time.perf_counter()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                release()
+                limiter.concurrency.on_overload()
+                if attempt >= limiter.max_retries:
+                    limiter._count(failures=1)
+                    raise
+                response = None
+            except BaseException:
+                release()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or attempt >= limiter.max_retries:
+                    if response.status_code in RETRYABLE_STATUS:
+                        limiter._count(failures=1)
+                        limiter.concurrency.on_overload()
+                    else:
+                        limiter.concurrency.on_success(time.perf_counter() - started)
+                    return _with_stream(response, _AsyncReleasingStream(response.stream, release))
+                await response.aclose()
+                release()
+                record_http_response(response.status_code)
+                limiter.concurrency.on_overload()
+            limiter._count(retries=1)
+            await asyncio.sleep(limiter.retry_delay(attempt, response))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+@lru_cache(maxsize=1)
+def get_llm_limiter() -> LLMLimiter:
+    """Return the process-wide limiter of the chat completion requests, built from the settings."""
+    return LLMLimiter.from_settings(get_settings())
@@ -0,0 +1,46 @@
+"""
+Rank fusion of the dense (Chroma) and lexical (BM25) retrieval results.
+
+Dense results carry their relevance score in metadata[RELEVANCE_SCORE_KEY]; fusion keeps the
+first copy of each chunk, so chunks found by the dense retriever keep their score.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+RELEVANCE_SCORE_KEY = "relevance_score"
+# Collection (shard) a retrieved chunk comes from
+SHARD_KEY = "shard"
+
+
+def document_key(document: Document) -> str:
+    """Identity of a chunk across retrievers: its ingestion chunk id, or its text for older chunks."""
+    return document.metadata.get("chunk_id") or document.page_content
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+) -> List[Document]:
+    """
+    Merge ranked lists with weighted reciprocal rank fusion.
+
+    Each document scores sum(weight / (k + rank)) over the lists it appears in (rank starts at 1);
+    documents returned by several retrievers rise to the top. Ties keep first-seen order.
+
+    Args:
+        rankings: Ranked document lists, best first.
+        weights: Weight of each list; defaults to 1 for every list.
+        k: Smoothing constant; larger values flatten the contribution of the top ranks.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, document in enumerate(ranking, start=1):
+            key = document_key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    ordered = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [documents[key] for key in ordered]
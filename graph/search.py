@@ -0,0 +1,133 @@
+"""
+Web search backends used by the web_search node.
+
+A backend turns a query into a list of SearchResult. TavilySearchBackend is the production one;
+FakeSearchBackend answers deterministically from memory so tests and benchmarks run offline. The
+backend is selected with WEB_SEARCH_BACKEND and built once per process by get_search_backend().
+"""
+import asyncio
+import re
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from graph.cache import normalize_question
+from graph.config import get_settings
+
+
+@dataclass
+class SearchResult:
+    url: str
+    title: str
+    content: str
+    score: Optional[float] = None
+
+
+class SearchBackend(ABC):
+    """Interface of the web search providers; asearch defaults to running search on a thread."""
+
+    @abstractmethod
+    def search(self, query: str) -> List[SearchResult]:
+        """Return the results for query, best first."""
+
+    async def asearch(self, query: str) -> List[SearchResult]:
+        return await asyncio.to_thread(self.search, query)
+
+
+def _tavily_results(response: Dict[str, Any]) -> List[SearchResult]:
+    return [
+        SearchResult(
+            url=result.get("url", ""),
+            title=result.get("title", ""),
+            content=result.get("content", ""),
+            score=result.get("score"),
+        )
+        for result in response.get("results", [])
+    ]
+
+
+class TavilySearchBackend(SearchBackend):
+    """
+    Tavily search through the TavilyClient of graph/tavily.py, which reuses the shared HTTP pools.
+
+    Args:
+        max_results: Results requested per query.
+        timeout: Seconds allowed per search request.
+    """
+
+    def __init__(self, max_results: int = 3, timeout: Optional[float] = None):
+        from graph.tavily import TavilyClient
+
+        self.client = TavilyClient(timeout=timeout)
+        self.max_results = max_results
+
+    def search(self, query: str) -> List[SearchResult]:
+        return _tavily_results(self.client.search(query, max_results=self.max_results))
+
+    async def asearch(self, query: str) -> List[SearchResult]:
+        return _tavily_results(await self.client.asearch(query, max_results=self.max_results))
+
+
+class FakeSearchBackend(SearchBackend):
+    """
+    Offline backend for tests and benchmarks.
+
+    Args:
+        results: Canned results by query (matched after normalize_question); other queries get
+            max_results generated results with stable example.com URLs.
+        max_results: Number of generated results.
+        latency: Seconds to wait before answering, to simulate the network.
+    """
+
+    def __init__(
+        self,
+        results: Optional[Dict[str, List[SearchResult]]] = None,
+        max_results: int = 3,
+        latency: float = 0.0,
+    ):
+        self.results = {normalize_question(query): items for query, items in (results or {}).items()}
+        self.max_results = max_results
+        self.latency = latency
+        self.queries: List[str] = []
+
+    def _answer(self, query: str) -> List[SearchResult]:
+        self.queries.append(query)
+        key = normalize_question(query)
+        if key in self.results:
+            return list(self.results[key])
+        slug = re.sub(r"\W+", "-", key).strip("-")
+        return [
+            SearchResult(
+                url=f"https://example.com/{slug}/{index}",
+                title=f"Result {index} for {query}",
+                content=f"Web result {index} for {query}",
+                score=1.0 - index / 10,
+            )
+            for index in range(self.max_results)
+        ]
+
+    def search(self, query: str) -> List[SearchResult]:
+        time.sleep(self.latency)
+        return self._answer(query)
+
+    async def asearch(self, query: str) -> List[SearchResult]:
+        await asyncio.sleep(self.latency)
+        return self._answer(query)
+
+
+SEARCH_BACKENDS: Dict[str, Callable[..., SearchBackend]] = {
+    "tavily": TavilySearchBackend,
+    "fake": FakeSearchBackend,
+}
+
+
+@lru_cache(maxsize=1)
+def get_search_backend() -> SearchBackend:
+    """Return the backend named by WEB_SEARCH_BACKEND, building it on first use."""
+    settings = get_settings()
+    backend = SEARCH_BACKENDS[settings.web_search_backend]
+    if backend is TavilySearchBackend:
+        return TavilySearchBackend(max_results=settings.web_search_max_results, timeout=settings.web_search_timeout)
+    return backend(max_results=settings.web_search_max_results)
@@ -0,0 +1,136 @@
+"""
+Conversation sessions on top of the checkpointed graph.
+
+With CHECKPOINT_ENABLED, build_app() compiles the graph with the SQLite checkpointer of
+graph/checkpoint.py and wraps it in a SessionGraph. Every run then belongs to a thread, named by
+config["configurable"]["thread_id"] (a new uuid when the caller gives none), and starts from the
+state the previous question of the thread left:
+
+- a follow-up whose question is close to the one the thread's documents were gathered for
+  (same normalized text, or embedding cosine >= SESSION_REUSE_THRESHOLD) and whose previous
+  answer was graded useful reuses those documents: route_question sends it straight to GENERATE,
+  skipping routing, retrieval and document grading,
+- any other question starts a new turn that gathers its own documents,
+- asking again the question of a run that failed (a node raised) resumes it from its last
+  completed node instead of starting over; its budget restarts.
+
+Every turn gets a new budget and fresh counters (new_turn()).
+"""
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from graph.budget import new_budget
+from graph.cache import _cosine_similarity, normalize_question
+from logger import log_info
+
+
+def new_turn(question: str, reuse_documents: bool = False) -> Dict[str, Any]:
+    """
+    Input of a new question in a thread: resets what belongs to one run and keeps the thread's
+    documents only when reuse_documents is set.
+    """
+    turn: Dict[str, Any] = {
+        "question": question,
+        "reuse_documents": reuse_documents,
+        "generation": "",
+        "generation_grade": "",
+        "generation_attempt": 0,
+        "web_search": False,
+        "budget": new_budget(),
+        "llm_calls": 0,
+        "web_searches": 0,
+        "degraded": False,
+        "degraded_reason": "",
+    }
+    if not reuse_documents:
+        # None clears the append-only documents channel
+        turn.update(documents=None, context_question="")
+    return turn
+
+
+def with_thread(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """config with a thread_id, adding a new one when it has none."""
+    config = dict(config or {})
+    configurable = dict(config.get("configurable") or {})
+    configurable.setdefault("thread_id", uuid.uuid4().hex)
+    config["configurable"] = configurable
+    return config
+
+
+class SessionGraph:
+    """
+    Thread-aware front of a graph compiled with a checkpointer (see the module docstring).
+
+    invoke, ainvoke, stream and astream take the usual {"question": ...} input and turn it into a
+    resume (None) or a new turn of the thread; any other attribute is delegated to the wrapped graph.
+
+    Args:
+        app: Graph compiled with a checkpointer.
+        embed_query: Optional embedding function for similarity matches of follow-up questions.
+        reuse_threshold: Minimum cosine similarity to reuse the thread's documents; 0 disables
+            similarity matches (only the same normalized question reuses them).
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+        reuse_threshold: float = 0.9,
+    ):
+        self.app = app
+        self.embed_query = embed_query
+        self.reuse_threshold = reuse_threshold
+
+    def _similar(self, question: str, previous: str) -> bool:
+        if normalize_question(question) == normalize_question(previous):
+            return True
+        if self.embed_query is None or self.reuse_threshold <= 0:
+            return False
+        similarity = _cosine_similarity(self.embed_query(question), self.embed_query(previous))
+        return similarity >= self.reuse_threshold
+
+    def _prepare(self, input: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The input of this run in the thread of config: None resumes the interrupted run."""
+        if input is None or "question" not in input:
+            return input
+        question = input["question"]
+        snapshot = self.app.get_state(config)
+        previous = snapshot.values or {}
+        if snapshot.next and normalize_question(previous.get("question", "")) == normalize_question(question):
+            log_info(f"---REANUDANDO LA EJECUCIÓN INTERRUMPIDA EN {', '.join(snapshot.next).upper()}---")
+            self.app.update_state(config, {"budget": new_budget(), "llm_calls": 0, "web_searches": 0})
+            return None
+        reuse = bool(
+            previous.get("documents")
+            and previous.get("generation_grade") == "useful"
+            and previous.get("context_question")
+            and self._similar(question, previous["context_question"])
+        )
+        return {**new_turn(question, reuse), **{key: value for key, value in input.items() if key != "question"}}
+
+    def invoke(self, input: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        config = with_thread(config)
+        return self.app.invoke(self._prepare(input, config), config, **kwargs)
+
+    async def ainvoke(
+        self, input: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        config = with_thread(config)
+        prepared = await asyncio.to_thread(self._prepare, input, config)
+        return await self.app.ainvoke(prepared, config, **kwargs)
+
+    def stream(self, input: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Iterator[Any]:
+        config = with_thread(config)
+        yield from self.app.stream(self._prepare(input, config), config, **kwargs)
+
+    async def astream(
+        self, input: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        config = with_thread(config)
+        prepared = await asyncio.to_thread(self._prepare, input, config)
+        async for chunk in self.app.astream(prepared, config, **kwargs):
+            yield chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.app, name)
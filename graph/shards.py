@@ -0,0 +1,258 @@
+"""
+Sharded retrieval: the corpus split into named collections, each with a topic descriptor.
+
+Shards are declared in SHARDS_PATH (see shards_example.json):
+
+    {"shards": [{"name": "rag-chroma", "description": "agents, prompt engineering, and adversarial attacks",
+                 "sources": ["https://lilianweng.github.io/posts/2023-06-23-agent/", ...]}, ...]}
+
+Without that file there is a single shard, the rag-chroma collection with the urls of
+ingestion.py, and retrieval works as it did before shards existed. `python ingestion.py` writes the
+sources of each shard into its own collection, with its own manifest, BM25 index and topic
+centroids (ingestion.shard_directory()).
+
+The router prompt lists the shard descriptors as the vectorstore topics. For each question the
+retrieve node asks select_shards() which shards it concerns: the question embedding is compared
+with the topic centroids of each shard (or the embedding of its descriptor before it has been
+ingested), shards below SHARD_MIN_SIMILARITY are skipped and at most SHARD_MAX_FANOUT are
+queried, so adding a corpus costs nothing to the questions that do not touch it. The selected
+shards are searched in parallel (a thread pool, or asyncio.gather on the async path) and
+merge_shard_results() builds the global rankings the retrieve node fuses and cuts to the global
+top-k: dense results by relevance score, which is comparable across shards since they share the
+embedding model, and BM25 results by score.
+
+shard_stats() reports, per shard, the questions it was queried or skipped for, its search time,
+the chunks it returned and the hits (chunks that made the global top-k); with telemetry enabled
+the same numbers go to the Prometheus metrics.
+"""
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from graph.config import get_settings
+from graph.embedding_cache import get_embeddings
+from graph.local_router import load_topic_centroids
+from graph.retrieval import RELEVANCE_SCORE_KEY, SHARD_KEY
+from graph.telemetry import record_shard_query, record_shard_skipped
+
+# Topics of the rag-chroma collection, as the router prompt described them before shards existed
+DEFAULT_DESCRIPTION = "agents, prompt engineering, and adversarial attacks"
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    A named collection of the corpus.
+
+    Attributes:
+        name: Name of the Chroma collection (and of the NumPy index directory).
+        description: Topics of the shard; shown to the LLM router and, until the shard has topic
+            centroids, embedded to decide which questions concern it.
+        sources: Sources ingested into the shard: URLs, sitemaps, directories or HTML dumps
+            (see ingestion.expand_sources()).
+    """
+
+    name: str
+    description: str
+    sources: Tuple[str, ...] = ()
+
+
+def load_shards(path: str) -> List[Shard]:
+    """Shards declared in path, or the single rag-chroma shard when the file does not exist."""
+    from ingestion import COLLECTION_NAME, urls
+
+    if not os.path.exists(path):
+        return [Shard(COLLECTION_NAME, DEFAULT_DESCRIPTION, tuple(urls))]
+    with open(path, encoding="utf-8") as shards_file:
+        entries = json.load(shards_file)["shards"]
+    shards = [Shard(entry["name"], entry["description"], tuple(entry.get("sources", []))) for entry in entries]
+    names = [shard.name for shard in shards]
+    if not shards or len(set(names)) != len(names):
+        raise ValueError(f"{path} must declare at least one shard, with unique names")
+    return shards
+
+
+@lru_cache(maxsize=4)
+def _load_shards(path: str) -> Tuple[Shard, ...]:
+    return tuple(load_shards(path))
+
+
+def get_shards() -> Tuple[Shard, ...]:
+    """The shards of SHARDS_PATH (read once per process)."""
+    return _load_shards(get_settings().shards_path)
+
+
+def vectorstore_topics() -> str:
+    """Topics of the vectorstore for the router prompt: the descriptors of every shard."""
+    return "; ".join(shard.description for shard in get_shards())
+
+
+def centroids_path(name: str) -> str:
+    """File of the topic centroids of a shard, written by ingestion.py."""
+    from ingestion import PERSIST_DIRECTORY, TOPIC_CENTROIDS_FILE, shard_directory
+
+    return os.path.join(shard_directory(PERSIST_DIRECTORY, name), TOPIC_CENTROIDS_FILE)
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norms = sum(x * x for x in a) ** 0.5 * sum(y * y for y in b) ** 0.5
+    return dot / norms if norms else 0.0
+
+
+class ShardSelector:
+    """
+    Pick the shards a question concerns by the similarity of its embedding to each shard's topics.
+
+    Args:
+        topics: Topic vectors per shard (its source centroids, or its descriptor embedding).
+        max_fanout: Shards queried at most per question.
+        min_similarity: Shards whose closest topic is less similar than this are skipped; the most
+            similar shard is always queried.
+    """
+
+    def __init__(self, topics: Dict[str, List[Sequence[float]]], max_fanout: int, min_similarity: float):
+        self.topics = topics
+        self.max_fanout = max(max_fanout, 1)
+        self.min_similarity = min_similarity
+
+    def similarities(self, embedding: Sequence[float]) -> Dict[str, float]:
+        return {
+            name: max((_cosine(embedding, vector) for vector in vectors), default=0.0)
+            for name, vectors in self.topics.items()
+        }
+
+    def select(self, embedding: Sequence[float]) -> List[str]:
+        """Names of the shards to query, most similar first."""
+        ranked = sorted(self.similarities(embedding).items(), key=lambda item: item[1], reverse=True)
+        selected = [name for name, similarity in ranked if similarity >= self.min_similarity]
+        return selected[:self.max_fanout] or [ranked[0][0]]
+
+
+@lru_cache(maxsize=4)
+def _shard_selector(shards: Tuple[Shard, ...], max_fanout: int, min_similarity: float) -> ShardSelector:
+    topics: Dict[str, List[Sequence[float]]] = {}
+    for shard in shards:
+        centroids = load_topic_centroids(centroids_path(shard.name))
+        topics[shard.name] = list(centroids.values()) if centroids else [get_embeddings().embed_query(shard.description)]
+    return ShardSelector(topics, max_fanout, min_similarity)
+
+
+def get_shard_selector() -> ShardSelector:
+    settings = get_settings()
+    return _shard_selector(get_shards(), settings.shard_max_fanout, settings.shard_min_similarity)
+
+
+def _selected(shards: Tuple[Shard, ...], selected: List[str]) -> List[str]:
+    for shard in shards:
+        if shard.name not in selected:
+            _record_skipped(shard.name)
+    return selected
+
+
+def select_shards(question: str) -> List[str]:
+    """Names of the shards to search for question; a single shard is always searched."""
+    shards = get_shards()
+    if len(shards) == 1:
+        return [shards[0].name]
+    # The question embedding is cached, so the dense retrievers reuse it
+    return _selected(shards, get_shard_selector().select(get_embeddings().embed_query(question)))
+
+
+async def aselect_shards(question: str) -> List[str]:
+    """Async version of select_shards."""
+    shards = get_shards()
+    if len(shards) == 1:
+        return [shards[0].name]
+    return _selected(shards, get_shard_selector().select(await get_embeddings().aembed_query(question)))
+
+
+@lru_cache(maxsize=1)
+def get_shard_executor() -> ContextThreadPoolExecutor:
+    """Thread pool of the sync fan-out; it copies the caller's context so spans nest under the node."""
+    return ContextThreadPoolExecutor(max_workers=max(get_settings().shard_max_fanout, 1), thread_name_prefix="shard")
+
+
+@dataclass
+class ShardResult:
+    """What one shard returned for a question: ranked dense and BM25 results, and the search time."""
+
+    shard: str
+    vector: List[Document]
+    lexical: List[Tuple[Document, float]] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def merge_shard_results(results: Sequence[ShardResult]) -> Tuple[List[Document], List[Document]]:
+    """
+    Global dense and lexical rankings of the results of every shard.
+
+    Dense results are ordered by relevance score. BM25 scores depend on the term statistics of each
+    shard, so ordering them by score is an approximation; the fusion with the dense ranking (by
+    rank, not score) limits its effect.
+    """
+    vector = sorted(
+        (document for result in results for document in result.vector),
+        key=lambda document: document.metadata.get(RELEVANCE_SCORE_KEY, 0.0),
+        reverse=True,
+    )
+    lexical = sorted((pair for result in results for pair in result.lexical), key=lambda pair: pair[1], reverse=True)
+    return vector, [document for document, _ in lexical]
+
+
+@dataclass
+class ShardStats:
+    """Per shard: questions it was queried and skipped for, search seconds, chunks returned and kept."""
+
+    queries: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    candidates: int = 0
+    hits: int = 0
+
+
+_stats: Dict[str, ShardStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record_skipped(shard: str) -> None:
+    with _stats_lock:
+        _stats.setdefault(shard, ShardStats()).skipped += 1
+    record_shard_skipped(shard)
+
+
+def record_shard_results(results: Sequence[ShardResult], documents: Sequence[Document]) -> None:
+    """Record the search time, candidates and hits (chunks among documents, the global top-k) of each shard."""
+    hits: Dict[str, int] = {}
+    for document in documents:
+        shard = document.metadata.get(SHARD_KEY)
+        hits[shard] = hits.get(shard, 0) + 1
+    for result in results:
+        candidates = len(result.vector) + len(result.lexical)
+        with _stats_lock:
+            stats = _stats.setdefault(result.shard, ShardStats())
+            stats.queries += 1
+            stats.seconds += result.seconds
+            stats.candidates += candidates
+            stats.hits += hits.get(result.shard, 0)
+        record_shard_query(result.shard, result.seconds, candidates, hits.get(result.shard, 0))
+
+
+def shard_stats() -> Dict[str, Dict[str, float]]:
+    """Counters of each shard in this process, with its mean search latency in seconds."""
+    with _stats_lock:
+        return {
+            shard: {**asdict(stats), "mean_seconds": stats.seconds / stats.queries if stats.queries else 0.0}
+            for shard, stats in _stats.items()
+        }
+
+
+def reset_shard_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
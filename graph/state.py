@@ -1,4 +1,12 @@
-from typing import Annotated, List, TypedDict, operator
+from typing import Annotated, Dict, List, TypedDict, operator
+
+from graph.budget import RequestBudget
+from graph.document_refs import DocumentRef, add_documents
+
+
+def merge_timings(current: Dict[str, float], update: Dict[str, float]) -> Dict[str, float]:
+    """Reducer for GraphState.timings: later measurements of a stage replace earlier ones."""
+    return {**(current or {}), **(update or {})}
 
 
 class GraphState(TypedDict):
@@ -9,9 +17,32 @@ class GraphState(TypedDict):
         question: question
         generation: LLM generation
         web_search: wheter to add search
-        documents: list of documents
+        documents: refs (id, metadata, relevance) of the documents gathered for the question; their
+            text is resolved on demand (see graph/document_refs.py). Nodes append refs, None clears them
+        generation_grade: verdict on the generation ("useful", "not useful" or "not supported")
+        generation_attempt: number of answers generated so far in this run (1 for the first)
+        context_tokens: tokens of the last generation context, raw document list vs packed ("raw", "packed")
+        timings: seconds spent per stage, e.g. "grade_generation.hallucination"
+        budget: deadline and LLM call / web search caps of the request (see graph/budget.py)
+        llm_calls: LLM calls made by the nodes so far in this run
+        web_searches: web searches made so far in this run, cached results excluded
+        degraded: the run was cut short by its budget; generation is the best answer so far
+        degraded_reason: the limit that ran out ("deadline", "llm_calls" or "web_searches")
+        context_question: question the documents were gathered for (retrieval or web search)
+        reuse_documents: answer from the documents of the thread's previous turn (see graph/sessions.py)
     """
     question: str
     generation: str
     web_search: bool
-    documents: List[str]
+    documents: Annotated[List[DocumentRef], add_documents]
+    generation_grade: str
+    generation_attempt: int
+    context_tokens: Dict[str, int]
+    timings: Annotated[Dict[str, float], merge_timings]
+    budget: RequestBudget
+    llm_calls: int
+    web_searches: int
+    degraded: bool
+    degraded_reason: str
+    context_question: str
+    reuse_documents: bool
@@ -0,0 +1,73 @@
+"""
+Streaming protocol between the graph and its callers.
+
+The generate node emits the answer token by token and the grade_generation node emits the
+verdict on that answer, both through LangGraph's custom stream mode:
+
+    for mode, event in app.stream({"question": q}, stream_mode=["custom", "values"]): ...
+
+Events are dicts with an "event" key:
+
+- {"event": "token", "attempt": n, "text": "..."}: a piece of the answer of generation attempt n.
+- {"event": "generation_end", "attempt": n, "text": "..."}: attempt n is complete.
+- {"event": "verdict", "attempt": n, "grade": ..., "action": ...}: the graders' decision on
+  attempt n. action tells the caller what to do with the text it already showed:
+    - "confirm" (grade "useful"): the answer stands.
+    - "retract" (grade "not useful"): discard it; a web search and a new attempt follow.
+    - "annotate" (grade "not supported"): the run ends with this answer, but it is not grounded in
+      the sources and must be flagged as such.
+
+stream_answer() / astream_answer() wrap app.stream / app.astream and yield these events followed
+by {"event": "final", "state": ...}, the last state of the run.
+"""
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from langgraph.config import get_stream_writer
+
+VERDICT_ACTIONS = {"useful": "confirm", "not useful": "retract", "not supported": "annotate"}
+
+
+def emit(event: Dict[str, Any]) -> None:
+    """Send an event to the caller when the graph runs in custom stream mode; a no-op otherwise."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Called outside of a graph run (e.g. a node invoked directly)
+        return
+    writer(event)
+
+
+def token_event(attempt: int, text: str) -> Dict[str, Any]:
+    return {"event": "token", "attempt": attempt, "text": text}
+
+
+def generation_end_event(attempt: int, text: str) -> Dict[str, Any]:
+    return {"event": "generation_end", "attempt": attempt, "text": text}
+
+
+def verdict_event(attempt: int, grade: str) -> Dict[str, Any]:
+    return {"event": "verdict", "attempt": attempt, "grade": grade, "action": VERDICT_ACTIONS[grade]}
+
+
+def stream_answer(app: Any, question: str, config: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Run the graph for question, yielding the protocol events and then the final state."""
+    state: Dict[str, Any] = {}
+    for mode, chunk in app.stream({"question": question}, config, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            yield chunk
+        else:
+            state = chunk
+    yield {"event": "final", "state": state}
+
+
+async def astream_answer(
+    app: Any, question: str, config: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async version of stream_answer built on app.astream."""
+    state: Dict[str, Any] = {}
+    async for mode, chunk in app.astream({"question": question}, config, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            yield chunk
+        else:
+            state = chunk
+    yield {"event": "final", "state": state}
@@ -0,0 +1,57 @@
+"""
+Client of the Tavily search REST API that reuses the shared HTTP connection pools from graph.clients.
+
+langchain_tavily opens a new connection (requests) or aiohttp session for every search, and the
+wrapper that sends its requests is private (langchain_tavily._utilities), so it cannot be reused
+safely across versions. This client sends the documented POST /search request itself, through
+the process-wide httpx clients.
+"""
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+from graph.clients import get_async_http_client, get_http_client
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+
+class TavilyClient:
+    """
+    Tavily /search requests over the shared HTTP pools.
+
+    Args:
+        api_key: Tavily API key; TAVILY_API_KEY by default.
+        api_base_url: Base URL of the API.
+        timeout: Seconds allowed per search; None keeps the timeout of the shared pools.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, api_base_url: str = TAVILY_API_URL, timeout: Optional[float] = None):
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        if not self.api_key:
+            raise ValueError("TAVILY_API_KEY is not set")
+        self.api_base_url = api_base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        request: Dict[str, Any] = {
+            "url": f"{self.api_base_url}/search",
+            "json": {"query": query, **{key: value for key, value in params.items() if value is not None}},
+            "headers": {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+        }
+        if self.timeout is not None:
+            request["timeout"] = self.timeout
+        return request
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            raise ValueError(f"Error {response.status_code}: {response.text}")
+        return response.json()
+
+    def search(self, query: str, **params: Any) -> Dict[str, Any]:
+        """The raw /search response for query; params are the optional request fields (max_results, ...)."""
+        return self._parse(get_http_client().post(**self._request(query, params)))
+
+    async def asearch(self, query: str, **params: Any) -> Dict[str, Any]:
+        return self._parse(await get_async_http_client().post(**self._request(query, params)))
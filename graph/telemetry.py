@@ -0,0 +1,664 @@
+"""
+Telemetry for the graph: spans for every node, chain and LLM call, plus Prometheus metrics.
+
+Disabled by default (TELEMETRY_ENABLED=false). In that case build_app() attaches nothing to the
+graph and the record_* helpers return after a single check, so the cost is one global lookup.
+
+When enabled, build_app() attaches a TelemetryCallbackHandler to the compiled graph. LangChain
+callbacks reach every node (LangGraph runs each one as a chain named after the node) and every
+chain in graph/chains (LazyRunnable names their runs), so the nodes need no timing code. Each
+finished span carries OpenTelemetry field names (trace_id, span_id, parent_span_id, kind,
+start/end time in nanoseconds, attributes, events, status). The root span of a run also records
+the path taken: rag.route (vectorstore / websearch / session), rag.grade (useful / not useful / not
+supported), rag.path (the nodes in order), LLM calls and tokens.
+
+Code outside the callbacks reports what they cannot see: cache lookups (record_cache), routing
+decisions and their source (record_route), per-shard searches and skips (record_shard_query,
+record_shard_skipped), retries (record_retry, including retryable HTTP
+responses seen by the shared clients), requests cut short by their budget
+(record_budget_exhausted), calls of the graders per output mode (record_grader_call, reported
+by graph/chains/grading.py) and log messages (record_log, used by logger.py).
+
+Exporters, selected with TELEMETRY_EXPORTERS (comma separated):
+- "jsonl": finished spans appended to TELEMETRY_SPANS_PATH, one JSON object per line.
+- "otel": spans re-emitted through the OpenTelemetry tracer (needs opentelemetry-api; configure
+  the SDK and its exporter in the host process).
+- "prometheus": metrics in the Prometheus text format rewritten to TELEMETRY_METRICS_PATH after
+  each run; TELEMETRY_METRICS_PORT > 0 also serves them on http://0.0.0.0:<port>/metrics.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from graph.config import Settings, get_settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+HIDDEN_TAG = "langsmith:hidden"
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in the Prometheus text exposition format."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def inc(self, metric: str, help: str, value: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._help.setdefault(metric, ("counter", help))
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, metric: str, help: str, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._help.setdefault(metric, ("histogram", help))
+            # Per-bucket counts, then sum and count
+            series = self._histograms.setdefault(metric, {}).setdefault(key, [0.0] * (len(self._buckets) + 2))
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def value(self, metric: str, **labels: Any) -> float:
+        """Current value of a counter (or observation count of a histogram) for labels."""
+        key = _labels(labels)
+        with self._lock:
+            if metric in self._histograms:
+                return self._histograms[metric].get(key, [0.0])[-1]
+            return self._counters.get(metric, {}).get(key, 0.0)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._help):
+                kind, help = self._help[name]
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for labels, value in sorted(self._counters[name].items()):
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for labels, series in sorted(self._histograms[name].items()):
+                    for bound, count in zip(self._buckets, series):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {_format_value(count)}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {_format_value(series[-1])}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]!r}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(series[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{label}="{value}"'.replace("\n", "\\n") for label, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+@dataclass
+class Span:
+    """A finished or running operation, with OpenTelemetry field names."""
+
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_time_unix_nano: int
+    end_time_unix_nano: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    status: str = "OK"
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_time_unix_nano or time.time_ns()) - self.start_time_unix_nano) / 1e9
+
+
+@dataclass
+class _Trace:
+    """What a run accumulates until its root span ends."""
+
+    root: Span
+    nodes: List[str] = field(default_factory=list)
+    grade: Optional[str] = None
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+# The innermost span of the running node or chain, so log messages can be attached to it
+_active_span: ContextVar[Optional[Span]] = ContextVar("rag_active_span", default=None)
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain run callbacks of the graph into spans and metrics."""
+
+    # Called in the caller's context so the active span is visible to the code it runs
+    run_inline = True
+
+    def __init__(self, telemetry: "Telemetry"):
+        self._telemetry = telemetry
+        self._lock = threading.Lock()
+        self._spans: Dict[UUID, Span] = {}
+        # Runs that get no span of their own map to the closest ancestor that has one
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._open: Dict[str, Span] = {}
+        self._traces: Dict[str, _Trace] = {}
+
+    # Chains and nodes
+
+    def on_chain_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        metadata = metadata or {}
+        if parent_run_id is None or parent_run_id not in self._parents:
+            # The graph run, possibly nested in a run this handler does not follow
+            kind = "graph"
+        elif HIDDEN_TAG in (tags or []) or name.startswith("__"):
+            kind = None
+        elif metadata.get("langgraph_node") == name:
+            kind = "node"
+        elif name in self._telemetry.chain_names:
+            kind = "chain"
+        else:
+            kind = None
+        self._start(run_id, parent_run_id, name, kind)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None and span.kind == "node" and isinstance(outputs, dict) and outputs.get("generation_grade"):
+            trace = self._traces.get(span.trace_id)
+            if trace is not None:
+                trace.grade = outputs["generation_grade"]
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    # LLM calls
+
+    def on_chat_model_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        span = self._start(run_id, parent_run_id, "llm", "llm")
+        if span is not None:
+            span.attributes["gen_ai.request.model"] = (metadata or {}).get("ls_model_name", "")
+
+    def on_llm_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, parent_run_id=parent_run_id, metadata=metadata)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None:
+            prompt_tokens, completion_tokens = token_usage(response)
+            span.attributes["gen_ai.usage.input_tokens"] = prompt_tokens
+            span.attributes["gen_ai.usage.output_tokens"] = completion_tokens
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._telemetry.record_retry("runnable_retry")
+
+    # Span bookkeeping
+
+    def _owner(self, run_id: Optional[UUID]) -> Optional[Span]:
+        """The span of run_id, or of its closest ancestor that has one."""
+        while run_id is not None:
+            span = self._spans.get(run_id)
+            if span is not None:
+                return span
+            run_id = self._parents.get(run_id)
+        return None
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: Optional[str]) -> Optional[Span]:
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            parent = self._owner(parent_run_id) if kind != "graph" else None
+            if kind == "node" and parent is not None and parent.kind == "node" and parent.name == name:
+                # The node function inside the node's runnable sequence carries the same name
+                kind = None
+            if kind is None or (parent is None and kind != "graph"):
+                return None
+            span = Span(
+                name=name,
+                kind=kind,
+                trace_id=parent.trace_id if parent else secrets.token_hex(16),
+                span_id=secrets.token_hex(8),
+                parent_span_id=parent.span_id if parent else None,
+                start_time_unix_nano=time.time_ns(),
+            )
+            self._spans[run_id] = span
+            self._open[span.span_id] = span
+            if kind == "llm":
+                span.attributes["rag.component"] = self._component(parent_run_id)
+            if kind == "graph":
+                self._traces[span.trace_id] = _Trace(root=span)
+            trace = self._traces.get(span.trace_id)
+            if kind == "node" and trace is not None:
+                if name in trace.nodes:
+                    self._telemetry.record_retry(f"repeat_{name}")
+                trace.nodes.append(name)
+        if kind != "llm":
+            _active_span.set(span)
+        self._telemetry.start_otel_span(span, parent)
+        return span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._parents.pop(run_id, None)
+            span = self._spans.pop(run_id, None)
+            if span is None:
+                return
+            self._open.pop(span.span_id, None)
+            span.end_time_unix_nano = time.time_ns()
+            if error is not None:
+                span.status = "ERROR"
+                span.attributes["exception.type"] = type(error).__name__
+            trace = self._traces.get(span.trace_id)
+            if trace is None:
+                return
+            if span.kind == "llm":
+                trace.llm_calls += 1
+                trace.prompt_tokens += span.attributes.get("gen_ai.usage.input_tokens", 0)
+                trace.completion_tokens += span.attributes.get("gen_ai.usage.output_tokens", 0)
+            if span.kind == "graph":
+                self._traces.pop(span.trace_id, None)
+                _summarize(trace)
+        self._telemetry.finish(span, trace if span.kind == "graph" else None)
+
+    def open_span(self, span_id: Optional[str]) -> Optional[Span]:
+        """The running span with span_id, if any."""
+        return self._open.get(span_id) if span_id else None
+
+    def _component(self, parent_run_id: Optional[UUID]) -> str:
+        """Name of the chain (or else the node) an LLM call belongs to."""
+        node = None
+        run_id = parent_run_id
+        while run_id is not None:
+            span = self._spans.get(run_id)
+            if span is not None and span.kind == "chain":
+                return span.name
+            if span is not None and span.kind == "node" and node is None:
+                node = span.name
+            run_id = self._parents.get(run_id)
+        return node or "unknown"
+
+
+def token_usage(response: Any) -> Tuple[int, int]:
+    """Prompt and completion tokens of an LLMResult, from llm_output or the message usage metadata."""
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if usage:
+        return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+    prompt_tokens = completion_tokens = 0
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += int(metadata.get("input_tokens") or 0)
+            completion_tokens += int(metadata.get("output_tokens") or 0)
+    return prompt_tokens, completion_tokens
+
+
+# First node of a run -> route it took; "session" runs reuse the documents of their thread
+_ROUTES = {"retrieve": "vectorstore", "websearch": "websearch", "generate": "session"}
+
+
+def _summarize(trace: _Trace) -> None:
+    root = trace.root
+    nodes = trace.nodes
+    root.attributes.update(
+        {
+            "rag.route": _ROUTES.get(nodes[0], "none") if nodes else "none",
+            "rag.grade": trace.grade or "none",
+            "rag.path": ">".join(nodes),
+            "rag.llm_calls": trace.llm_calls,
+            "gen_ai.usage.input_tokens": trace.prompt_tokens,
+            "gen_ai.usage.output_tokens": trace.completion_tokens,
+        }
+    )
+
+
+class Telemetry:
+    """Collects spans and metrics and hands them to the configured exporters."""
+
+    def __init__(
+        self,
+        exporters: Iterable[str] = ("jsonl", "prometheus"),
+        spans_path: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        chain_names: Iterable[str] = (),
+        on_request: Optional[Callable[[Span], None]] = None,
+    ):
+        self.exporters = {exporter.strip() for exporter in exporters if exporter.strip()}
+        self.spans_path = spans_path
+        self.metrics_path = metrics_path
+        self.chain_names = set(chain_names)
+        # Called with the root span of every finished run (e.g. by the benchmark suite)
+        self.on_request = on_request
+        self.metrics = MetricsRegistry()
+        self.handler = TelemetryCallbackHandler(self)
+        self._file_lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._tracer = self._otel_tracer() if "otel" in self.exporters else None
+        self._otel_spans: Dict[str, Any] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # Spans
+
+    def finish(self, span: Span, trace: Optional[_Trace]) -> None:
+        labels = {"node": span.name} if span.kind == "node" else {"chain": span.name}
+        if span.kind == "node":
+            self.metrics.observe("rag_node_duration_seconds", "Wall-clock time per graph node", span.duration, **labels)
+        elif span.kind == "chain":
+            self.metrics.observe("rag_chain_duration_seconds", "Wall-clock time per chain", span.duration, **labels)
+        elif span.kind == "llm":
+            component = span.attributes.get("rag.component", "unknown")
+            self.metrics.inc("rag_llm_calls_total", "LLM calls per chain", chain=component)
+            self.metrics.observe("rag_llm_duration_seconds", "Latency of LLM calls", span.duration, chain=component)
+            for kind, key in (("prompt", "gen_ai.usage.input_tokens"), ("completion", "gen_ai.usage.output_tokens")):
+                tokens = span.attributes.get(key, 0)
+                if tokens:
+                    self.metrics.inc("rag_llm_tokens_total", "LLM tokens per chain", tokens, chain=component, type=kind)
+        if span.status == "ERROR":
+            self.metrics.inc("rag_errors_total", "Failed nodes, chains and LLM calls", kind=span.kind, name=span.name)
+        self._end_otel_span(span)
+
+        if "jsonl" in self.exporters and self.spans_path:
+            with self._file_lock:
+                self._pending.append(asdict(span))
+        if trace is None:
+            return
+        attributes = span.attributes
+        self.metrics.observe(
+            "rag_request_duration_seconds", "Wall-clock time per question", span.duration,
+            route=attributes["rag.route"], grade=attributes["rag.grade"],
+        )
+        self.metrics.inc("rag_requests_total", "Questions answered per path", route=attributes["rag.route"], grade=attributes["rag.grade"])
+        if self.on_request is not None:
+            self.on_request(span)
+        self.flush()
+
+    def flush(self) -> None:
+        """Write pending spans and the current metrics to their files."""
+        with self._file_lock:
+            pending, self._pending = self._pending, []
+            if pending and self.spans_path:
+                _ensure_parent(self.spans_path)
+                with open(self.spans_path, "a", encoding="utf-8") as handle:
+                    handle.writelines(json.dumps(span, default=str) + "\n" for span in pending)
+            if "prometheus" in self.exporters and self.metrics_path:
+                _ensure_parent(self.metrics_path)
+                partial = f"{self.metrics_path}.tmp"
+                with open(partial, "w", encoding="utf-8") as handle:
+                    handle.write(self.metrics.render())
+                os.replace(partial, self.metrics_path)
+
+    @staticmethod
+    def _otel_tracer() -> Any:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            return None
+        return trace.get_tracer("langgraph-agentic-rag")
+
+    def start_otel_span(self, span: Span, parent: Optional[Span]) -> None:
+        if self._tracer is None:
+            return
+        from opentelemetry import trace
+
+        parent_otel = self._otel_spans.get(parent.span_id) if parent else None
+        context = trace.set_span_in_context(parent_otel) if parent_otel is not None else None
+        self._otel_spans[span.span_id] = self._tracer.start_span(
+            span.name, context=context, start_time=span.start_time_unix_nano, attributes={"rag.kind": span.kind}
+        )
+
+    def _end_otel_span(self, span: Span) -> None:
+        otel_span = self._otel_spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        from opentelemetry.trace import Status, StatusCode
+
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value)
+        for event in span.events:
+            otel_span.add_event(event["name"], attributes=event["attributes"], timestamp=event["time_unix_nano"])
+        if span.status == "ERROR":
+            otel_span.set_status(Status(StatusCode.ERROR))
+        otel_span.end(end_time=span.end_time_unix_nano)
+
+    # Events reported by code outside the callbacks
+
+    def record_cache(self, cache: str, hits: int, misses: int) -> None:
+        if hits:
+            self.metrics.inc("rag_cache_requests_total", "Cache lookups per cache and result", hits, cache=cache, result="hit")
+        if misses:
+            self.metrics.inc("rag_cache_requests_total", "Cache lookups per cache and result", misses, cache=cache, result="miss")
+
+    def record_route(self, datasource: str, source: str) -> None:
+        self.metrics.inc("rag_routes_total", "Routing decisions per datasource and deciding component", datasource=datasource, source=source)
+
+    def record_retry(self, reason: str) -> None:
+        self.metrics.inc("rag_retries_total", "Retries per reason", reason=reason)
+
+    def record_shard_query(self, shard: str, seconds: float, candidates: int, hits: int) -> None:
+        self.metrics.inc("rag_shard_queries_total", "Questions per shard, searched or skipped", shard=shard, result="searched")
+        self.metrics.observe("rag_shard_search_duration_seconds", "Search time per shard", seconds, shard=shard)
+        documents_help = "Chunks returned per shard, and kept in the global top-k"
+        self.metrics.inc("rag_shard_documents_total", documents_help, candidates, shard=shard, kind="candidate")
+        if hits:
+            self.metrics.inc("rag_shard_documents_total", documents_help, hits, shard=shard, kind="hit")
+
+    def record_shard_skipped(self, shard: str) -> None:
+        self.metrics.inc("rag_shard_queries_total", "Questions per shard, searched or skipped", shard=shard, result="skipped")
+
+    def record_budget_exhausted(self, reason: str, stage: str) -> None:
+        self.metrics.inc(
+            "rag_budget_exhausted_total", "Requests cut short by their budget per exhausted limit and node",
+            reason=reason, stage=stage,
+        )
+
+    def record_grader_call(self, grader: str, mode: str, seconds: float, completion_tokens: int) -> None:
+        self.metrics.inc("rag_grader_calls_total", "LLM calls per grader and output mode", grader=grader, mode=mode)
+        self.metrics.observe(
+            "rag_grader_duration_seconds", "Latency of grader LLM calls per output mode", seconds, grader=grader, mode=mode
+        )
+        if completion_tokens:
+            self.metrics.inc(
+                "rag_grader_completion_tokens_total", "Completion tokens per grader and output mode",
+                completion_tokens, grader=grader, mode=mode,
+            )
+
+    def record_log(self, level: str, message: str) -> None:
+        self.metrics.inc("rag_log_messages_total", "Log messages per level", level=level)
+        span = _active_span.get()
+        while span is not None and span.end_time_unix_nano is not None:
+            # The innermost span already ended; attach to its closest running ancestor
+            span = self.handler.open_span(span.parent_span_id)
+        if span is not None:
+            span.events.append({"name": "log", "time_unix_nano": time.time_ns(), "attributes": {"level": level, "message": message}})
+
+    # Prometheus endpoint
+
+    def serve_metrics(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve the metrics on http://host:port/metrics from a daemon thread."""
+        metrics = self.metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self._server
+
+    def close(self) -> None:
+        self.flush()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _ensure_parent(path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def chain_names() -> List[str]:
+    """Run names of the chains in graph/chains and the vector retriever, which get their own spans."""
+    return [
+        "question_router",
+        "retriever_vector",
+        "retrieval_grader_chain",
+        "batch_retrieval_grader_chain",
+        "generation_chain",
+        "hallucination_grader_chain",
+        "answer_grader_chain",
+    ]
+
+
+def configure_telemetry(settings: Optional[Settings] = None) -> Optional[Telemetry]:
+    """Create (or drop, when disabled) the process-wide telemetry from settings."""
+    global _telemetry
+    settings = settings or get_settings()
+    with _telemetry_lock:
+        if _telemetry is not None:
+            _telemetry.close()
+            _telemetry = None
+        if not settings.telemetry_enabled:
+            return None
+        _telemetry = Telemetry(
+            exporters=settings.telemetry_exporters.split(","),
+            spans_path=settings.telemetry_spans_path,
+            metrics_path=settings.telemetry_metrics_path,
+            chain_names=chain_names(),
+        )
+        if settings.telemetry_metrics_port > 0:
+            _telemetry.serve_metrics(settings.telemetry_metrics_port)
+        return _telemetry
+
+
+def get_telemetry() -> Optional[Telemetry]:
+    """The process-wide telemetry, or None when it is disabled."""
+    return _telemetry
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """Count cache lookups; a no-op when telemetry is disabled."""
+    if _telemetry is not None:
+        _telemetry.record_cache(cache, hits, misses)
+
+
+def record_route(datasource: str, source: str) -> None:
+    """Count a routing decision made by source ("cache", "local", "llm" or "session")."""
+    if _telemetry is not None:
+        _telemetry.record_route(datasource, source)
+
+
+def record_retry(reason: str) -> None:
+    if _telemetry is not None:
+        _telemetry.record_retry(reason)
+
+
+def record_shard_query(shard: str, seconds: float, candidates: int, hits: int) -> None:
+    """Record the search of one shard: its duration, chunks returned and chunks kept in the global top-k."""
+    if _telemetry is not None:
+        _telemetry.record_shard_query(shard, seconds, candidates, hits)
+
+
+def record_shard_skipped(shard: str) -> None:
+    """Count a question the shard selection did not send to shard."""
+    if _telemetry is not None:
+        _telemetry.record_shard_skipped(shard)
+
+
+def record_budget_exhausted(reason: str, stage: str) -> None:
+    """Count a request cut short at stage because its budget limit reason ran out."""
+    if _telemetry is not None:
+        _telemetry.record_budget_exhausted(reason, stage)
+
+
+def record_grader_call(grader: str, mode: str, seconds: float, completion_tokens: int) -> None:
+    """Record one LLM call of grader in output mode ("lean" or "explain"): its latency and completion tokens."""
+    if _telemetry is not None:
+        _telemetry.record_grader_call(grader, mode, seconds, completion_tokens)
+
+
+def record_log(level: str, message: str) -> None:
+    """Attach a log message to the running span; called by the logger.py helpers."""
+    if _telemetry is not None:
+        _telemetry.record_log(level, message)
+
+
+def record_http_response(status_code: int) -> None:
+    """Count responses the OpenAI and Tavily clients retry (rate limits and server errors)."""
+    if _telemetry is not None and status_code in RETRYABLE_STATUS:
+        _telemetry.record_retry(f"http_{status_code}")
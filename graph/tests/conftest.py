@@ -0,0 +1,25 @@
+import importlib
+
+import pytest
+
+from benchmarks.fakes import install_fakes
+
+FAKED_MODULES = [
+    "graph.graph",
+    "graph.nodes.retrieve",
+    "graph.nodes.grade_documents",
+    "graph.nodes.generate",
+    "graph.nodes.grade_generation",
+    "graph.nodes.web_search",
+]
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    """Install the offline stand-ins of benchmarks/fakes.py for one test, restoring the modules afterwards."""
+    for name in FAKED_MODULES:
+        module = importlib.import_module(name)
+        for attribute in list(vars(module)):
+            monkeypatch.setattr(module, attribute, getattr(module, attribute))
+    install_fakes(latency=0)
+    return {name.rsplit(".", 1)[-1]: importlib.import_module(name) for name in FAKED_MODULES}
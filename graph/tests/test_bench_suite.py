@@ -0,0 +1,20 @@
+from benchmarks.bench_suite import QUESTIONS, percentile, run_suite
+
+
+def test_percentile_uses_nearest_rank():
+    values = [0.4, 0.1, 0.3, 0.2]
+    assert percentile(values, 50) == 0.2
+    assert percentile(values, 95) == 0.4
+    assert percentile([], 99) == 0.0
+
+
+def test_every_question_takes_its_expected_path():
+    results = run_suite("zero", concurrency=[2], rounds=1, mode="async")
+
+    for question in results["questions"]:
+        assert question["expected"], question
+        assert question["llm_calls"] > 0 and question["prompt_tokens"] > 0
+    level = results["levels"][0]
+    assert level["questions"] == len(QUESTIONS)
+    assert level["unexpected_paths"] == 0
+    assert level["latency_s"]["p50"] <= level["latency_s"]["p99"]
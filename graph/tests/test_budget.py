@@ -0,0 +1,74 @@
+import contextlib
+import io
+import time
+from dataclasses import replace
+
+import pytest
+
+from benchmarks.fakes import LATENCY_PROFILES, model_fakes
+from graph.budget import budget_stats, new_budget, reset_budget_stats
+from graph.config import get_settings
+
+LATEST = "How does the latest agent store its memory?"
+
+
+@pytest.fixture
+def run():
+    """Answer a question with the fake models under a budget built from the given settings."""
+    reset_budget_stats()
+    with model_fakes(LATENCY_PROFILES["zero"]):
+        from graph.graph import build_workflow
+
+        app = build_workflow().compile()
+
+        def answer(question, started=None, **limits):
+            budget = new_budget(replace(get_settings(), **limits), started=started)
+            with contextlib.redirect_stdout(io.StringIO()):
+                return app.invoke({"question": question, "budget": budget})
+
+        yield answer
+
+
+def test_counts_llm_calls_and_searches_within_budget(run):
+    result = run(LATEST)
+
+    # Four document grades, then two rounds of generation and both graders
+    assert result["llm_calls"] == 4 + 3 + 3
+    assert result["web_searches"] == 1
+    assert result["generation_grade"] == "useful"
+    assert not result.get("degraded")
+
+
+def test_no_search_left_ends_with_the_first_answer(run):
+    result = run(LATEST, budget_max_web_searches=0)
+
+    assert result["generation_grade"] == "not useful"
+    assert result["generation"]
+    assert (result["degraded"], result["degraded_reason"]) == (True, "web_searches")
+    assert result.get("web_searches", 0) == 0
+    assert budget_stats()["web_searches"] == 1
+
+
+def test_no_calls_left_for_grading_returns_the_ungraded_answer(run):
+    result = run("What is agent memory?", budget_max_llm_calls=6)
+
+    assert result["llm_calls"] == 5
+    assert result["generation"] and "generation_grade" not in result
+    assert result["degraded_reason"] == "llm_calls"
+
+
+def test_expired_deadline_skips_every_model_call(run):
+    result = run("What is agent memory?", started=time.time() - 10, budget_deadline=1.0)
+
+    assert result.get("llm_calls", 0) == 0
+    assert result["generation"] == ""
+    assert result["degraded_reason"] == "deadline"
+    # Kept ungraded rather than dropped
+    assert len(result["documents"]) == get_settings().retrieval_k
+
+
+
+def test_module_level_app_is_capped_at_the_recursion_limit():
+    from graph.graph import app
+
+    assert app.config["recursion_limit"] == get_settings().graph_recursion_limit
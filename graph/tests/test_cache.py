@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+from langchain_core.documents import Document
+
+from graph.cache import ANSWERS_NAMESPACE, CachedGraph, QuestionCache, normalize_question
+from graph.document_refs import relevant_documents
+from graph.streaming import astream_answer, stream_answer
+
+
+class _FakeApp:
+    def __init__(self, result: dict):
+        self.result = result
+        self.calls = 0
+
+    def invoke(self, input: dict, config=None, **kwargs) -> dict:
+        self.calls += 1
+        return {**self.result, "question": input["question"]}
+
+    def _chunks(self, input: dict, stream_mode: list) -> list:
+        self.calls += 1
+        state = {**self.result, "question": input["question"]}
+        chunks = [("custom", {"event": "token", "attempt": 1, "text": state["generation"]}), ("values", state)]
+        return [(mode, chunk) for mode, chunk in chunks if mode in stream_mode]
+
+    def stream(self, input: dict, config=None, stream_mode=None, **kwargs):
+        yield from self._chunks(input, stream_mode)
+
+    async def astream(self, input: dict, config=None, stream_mode=None, **kwargs):
+        for chunk in self._chunks(input, stream_mode):
+            yield chunk
+
+
+def test_normalize_question_ignores_case_punctuation_and_spacing() -> None:
+    assert normalize_question("  ¿Qué es la MEMORIA   de un agente? ") == normalize_question("qué es la memoria de un agente")
+
+
+def test_entries_survive_reopening_the_database(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    cache = QuestionCache(path)
+    cache.set("routes", "What is agent memory?", "vectorstore")
+    cache.close()
+
+    reopened = QuestionCache(path)
+    assert reopened.get("routes", "what is agent memory") == "vectorstore"
+    assert reopened.stats()["routes"]["hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("routes", "agent memory", "vectorstore", ttl=0.05)
+    time.sleep(0.1)
+
+    assert cache.get("routes", "agent memory") is None
+    assert cache.stats()["routes"]["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.set("routes", "first", 1)
+    cache.set("routes", "second", 2)
+    cache.get("routes", "first")
+    cache.set("routes", "third", 3)
+
+    assert cache.get("routes", "second") is None
+    assert cache.get("routes", "first") == 1
+    assert cache.get("routes", "third") == 3
+
+
+def test_similar_question_hits_above_threshold(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("answers", "agent memory", "cached", embedding=[1.0, 0.0])
+
+    assert cache.get_similar("answers", [0.99, 0.05], threshold=0.95) == "cached"
+    assert cache.get_similar("answers", [0.0, 1.0], threshold=0.95) is None
+
+
+def test_similar_lookup_picks_the_closest_of_many_and_skips_other_dimensions(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    for number in range(200):
+        angle = number / 400
+        cache.set("answers", f"question {number}", number, embedding=[1.0 - angle, angle, 0.0])
+    cache.set("answers", "older model", "stale", embedding=[0.0, 1.0])
+    cache.set("answers", "no embedding", "exact only")
+
+    assert cache.get_similar("answers", [0.6, 0.4, 0.0], threshold=0.9) == 160
+    assert cache.get_similar("answers", [0.0, 0.0, 1.0], threshold=0.5) is None
+    assert cache.stats()["answers"] == {"hits": 0, "similar_hits": 1, "misses": 1, "writes": 202, "evictions": 0}
+
+
+def test_cached_graph_only_stores_useful_answers(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    app = _FakeApp({"generation": "no idea", "generation_grade": "not supported", "documents": []})
+    cached_app = CachedGraph(app, lambda: cache, ttl=60, web_search_ttl=10)
+
+    cached_app.invoke({"question": "agent memory"})
+    cached_app.invoke({"question": "agent memory"})
+
+    assert app.calls == 2
+
+
+def test_cached_graph_serves_repeated_questions(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    documents = [Document(page_content="Memory is...", metadata={"source": "web_search"})]
+    app = _FakeApp({"generation": "Memory is...", "generation_grade": "useful", "documents": documents})
+    cached_app = CachedGraph(app, lambda: cache, ttl=60, web_search_ttl=0.05)
+
+    first = cached_app.invoke({"question": "What is agent memory?"})
+    second = cached_app.invoke({"question": "what is agent memory"})
+
+    assert app.calls == 1
+    assert second["generation"] == first["generation"]
+    assert relevant_documents(second) == documents
+
+    # Web search answers use the shorter TTL
+    time.sleep(0.1)
+    cached_app.invoke({"question": "What is agent memory?"})
+    assert app.calls == 2
+    assert cache.get(ANSWERS_NAMESPACE, "unknown") is None
+
+
+def test_streamed_runs_fill_and_hit_the_answer_cache(tmp_path) -> None:
+    cache = QuestionCache(str(tmp_path / "cache.sqlite3"))
+    documents = [Document(page_content="Memory is...", metadata={"source": "https://example.com"})]
+    app = _FakeApp({"generation": "Memory is...", "generation_grade": "useful", "documents": documents})
+    cached_app = CachedGraph(app, lambda: cache, ttl=60, web_search_ttl=60)
+
+    first = list(stream_answer(cached_app, "What is agent memory?"))
+    second = list(stream_answer(cached_app, "what is agent memory"))
+
+    async def collect() -> list:
+        return [event async for event in astream_answer(cached_app, "What is agent memory")]
+
+    third = asyncio.run(collect())
+
+    assert app.calls == 1
+    assert [event["event"] for event in first] == ["token", "final"]
+    # A hit has no answer being generated: only the final state, with the cached answer
+    for events in (second, third):
+        assert [event["event"] for event in events] == ["final"]
+        assert events[0]["state"]["generation"] == "Memory is..."
+        assert relevant_documents(events[0]["state"]) == documents
+    # The mode added to read the final state is not passed on
+    assert list(cached_app.stream({"question": "agent planning"}, stream_mode="custom")) == [
+        {"event": "token", "attempt": 1, "text": "Memory is..."}
+    ]
@@ -0,0 +1,33 @@
+import json
+import math
+
+from graph.calibration import fit_thresholds, load_samples
+
+
+def test_thresholds_leave_only_the_overlapping_band_to_the_grader() -> None:
+    samples = [(0.9, True), (0.85, True), (0.8, True), (0.7, True), (0.65, False), (0.6, True), (0.4, False), (0.3, False)]
+
+    thresholds = fit_thresholds(samples, precision=1.0)
+
+    assert (thresholds.accept, thresholds.reject) == (0.7, 0.6)
+    assert thresholds.skipped == 6 / 8
+    assert thresholds.accuracy == 1.0
+
+
+def test_unreachable_precision_disables_the_thresholds() -> None:
+    thresholds = fit_thresholds([(0.9, False), (0.1, True)], precision=0.95)
+
+    assert (thresholds.accept, thresholds.reject) == (math.inf, -math.inf)
+    assert thresholds.skipped == 0.0
+
+
+def test_precomputed_scores_are_read_without_embedding(tmp_path) -> None:
+    path = tmp_path / "labeled.jsonl"
+    path.write_text(
+        "\n".join(json.dumps(item) for item in [
+            {"question": "q", "chunk": "a", "relevant": True, "score": 0.9},
+            {"question": "q", "chunk": "b", "relevant": False, "score": 0.2},
+        ])
+    )
+
+    assert load_samples(str(path)) == [(0.9, True), (0.2, False)]
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from graph import clients
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    clients.get_async_http_client.cache_clear()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+    clients.get_async_http_client.cache_clear()
+
+
+async def _get(url: str, times: int) -> list:
+    return [(await clients.get_async_http_client().get(url)).status_code for _ in range(times)]
+
+
+def test_the_async_client_survives_consecutive_event_loops(url) -> None:
+    # Each asyncio.run() closes its loop; the keep-alive connections of the first must not be reused
+    assert asyncio.run(_get(url, 3)) == [200] * 3
+    assert asyncio.run(_get(url, 3)) == [200] * 3
+
+
+def test_the_async_client_serves_two_running_loops_at_once(url) -> None:
+    background = asyncio.new_event_loop()
+    thread = threading.Thread(target=background.run_forever, daemon=True)
+    thread.start()
+
+    async def both() -> tuple:
+        other = asyncio.run_coroutine_threadsafe(_get(url, 5), background)
+        return await _get(url, 5), await asyncio.wrap_future(other)
+
+    try:
+        assert asyncio.run(both()) == ([200] * 5, [200] * 5)
+    finally:
+        background.call_soon_threadsafe(background.stop)
+        thread.join()
+        background.close()
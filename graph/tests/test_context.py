@@ -0,0 +1,69 @@
+from langchain_core.documents import Document
+
+from graph.context import build_context, compact_source, count_tokens, merge_chunks, overlap
+
+SOURCE = "https://lilianweng.github.io/posts/2023-06-23-agent/"
+TEXT = (
+    "Memory can be defined as the processes used to acquire, store, retain, and later retrieve information. "
+    "There are several types of memory in human brains. Sensory memory is the earliest stage of memory, "
+    "providing the ability to retain impressions of sensory information after the original stimuli have ended."
+)
+
+
+def _chunk(start: int, end: int, source: str = SOURCE) -> Document:
+    return Document(page_content=TEXT[start:end], metadata={"source": source, "relevance_score": 0.8})
+
+
+def test_overlap_finds_the_shared_suffix_and_prefix() -> None:
+    assert overlap("the quick brown fox jumps over", "brown fox jumps over the lazy dog", min_chars=10) == 20
+    assert overlap("abc", "xyz") == 0
+
+
+def test_overlapping_chunks_of_a_source_merge_into_one_passage() -> None:
+    passages = merge_chunks([_chunk(120, len(TEXT)), _chunk(0, 160), _chunk(20, 80)])
+
+    assert len(passages) == 1
+    assert passages[0].text == TEXT
+    assert passages[0].chunks == 3
+
+
+def test_chunks_of_other_sources_are_not_merged() -> None:
+    passages = merge_chunks([_chunk(0, 160), _chunk(120, len(TEXT), source="https://other.example")])
+
+    assert [passage.source for passage in passages] == [SOURCE, "https://other.example"]
+
+
+def test_near_duplicates_are_dropped_and_sources_compacted() -> None:
+    copy = Document(page_content=TEXT.replace("several", "many"), metadata={"source": "https://mirror.example"})
+
+    context = build_context([_chunk(0, len(TEXT)), copy], token_budget=1_000, duplicate_threshold=0.8)
+
+    assert context.duplicates == 1
+    assert context.text == f"[1] {compact_source(SOURCE)}\n{TEXT}"
+    assert "relevance_score" not in context.text
+    assert context.tokens < context.raw_tokens
+
+
+def test_passages_are_packed_into_the_budget_by_relevance() -> None:
+    documents = [
+        Document(page_content=f"{word} " * 40, metadata={"source": f"https://{word}.example"})
+        for word in ("alpha", "beta", "gamma")
+    ]
+    budget = count_tokens("[1] alpha.example\n" + "alpha " * 40) * 2 + 10
+
+    context = build_context(documents, token_budget=budget)
+
+    assert context.tokens <= budget
+    assert (context.passages, context.dropped) == (2, 1)
+    assert context.text.index("alpha") < context.text.index("beta")
+
+
+def test_a_passage_larger_than_the_budget_is_truncated() -> None:
+    context = build_context([_chunk(0, len(TEXT))], token_budget=10)
+
+    assert 0 < context.tokens <= 10
+    assert context.passages == 1
+
+
+def test_compact_source() -> None:
+    assert compact_source("https://www.example.com/a/b/") == "example.com/a/b"
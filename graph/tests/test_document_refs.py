@@ -0,0 +1,47 @@
+import contextlib
+import io
+
+from langchain_core.documents import Document
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from benchmarks.fakes import LATENCY_PROFILES, model_fakes
+from graph.document_refs import (
+    add_documents,
+    get_document_store,
+    relevant_documents,
+    resolve,
+    to_refs,
+)
+
+
+def test_documents_channel_appends_merges_and_clears():
+    first = to_refs([Document(page_content="agent memory", metadata={"source": "a"})])
+    second = to_refs([Document(page_content="agent tools", metadata={"source": "b", "chunk_id": "chunk-b"})])
+
+    state = add_documents(add_documents([], first), second + first)
+    assert [ref["id"] for ref in state] == [first[0]["id"], "chunk-b"]
+
+    state = add_documents(state, [{"id": "chunk-b", "metadata": {"source": "b"}, "relevant": False}])
+    assert [document.page_content for document in relevant_documents({"documents": state})] == ["agent memory"]
+    assert add_documents(state, None) == []
+
+
+def test_state_keeps_refs_and_resolves_text_from_the_vectorstore():
+    with model_fakes(LATENCY_PROFILES["zero"]):
+        from graph.graph import build_workflow
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = build_workflow().compile().invoke({"question": "What is agent memory?"})
+        refs = result["documents"]
+        documents = relevant_documents(result)
+
+        # Vectorstore chunks are referenced by chunk id, without their text
+        assert refs and all("text" not in ref and ref["id"].startswith("chunk-") for ref in refs)
+        assert all(document.page_content for document in documents)
+        serde = JsonPlusSerializer()
+        assert len(serde.dumps_typed(result)[1]) < len(serde.dumps_typed({**result, "documents": documents})[1])
+
+        # After a restart the store is empty and the chunks come back from the collection
+        get_document_store().clear()
+        assert resolve(refs) == documents
+        assert get_document_store().stats()["fetched"] == len(refs)
@@ -0,0 +1,68 @@
+import asyncio
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from graph.embedding_cache import DOCUMENT_NAMESPACE, QUERY_NAMESPACE, CachedEmbeddings, EmbeddingStore
+
+
+class _CountingEmbeddings(Embeddings):
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.document_calls: List[List[str]] = []
+        self.query_calls: List[str] = []
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        return [float(len(text)), 0.5, -1.0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.document_calls.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.query_calls.append(text)
+        return self._vector(text)
+
+
+def test_misses_are_embedded_in_one_batch_and_reused_from_disk(tmp_path) -> None:
+    path = str(tmp_path / "embeddings.sqlite3")
+    fake = _CountingEmbeddings()
+    embeddings = CachedEmbeddings(fake, EmbeddingStore(path))
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    second = embeddings.embed_documents(["beta", "gamma"])
+
+    assert fake.document_calls == [["alpha", "beta"], ["gamma"]]
+    assert first == [[5.0, 0.5, -1.0], [4.0, 0.5, -1.0], [5.0, 0.5, -1.0]]
+    assert second[0] == first[1]
+
+    reopened = CachedEmbeddings(_CountingEmbeddings(), EmbeddingStore(path, memory_entries=1))
+    assert reopened.embed_documents(["alpha", "beta", "gamma"]) == [first[0], first[1], second[1]]
+    assert reopened.embeddings.document_calls == []
+    assert reopened.store.stats()[DOCUMENT_NAMESPACE]["disk_hits"] == 3
+
+
+def test_queries_and_documents_are_namespaced(tmp_path) -> None:
+    fake = _CountingEmbeddings()
+    embeddings = CachedEmbeddings(fake, EmbeddingStore(str(tmp_path / "embeddings.sqlite3")))
+
+    embeddings.embed_documents(["agent memory"])
+    embeddings.embed_query("agent memory")
+    embeddings.embed_query("agent memory")
+    asyncio.run(embeddings.aembed_query("agent memory"))
+
+    assert fake.query_calls == ["agent memory"]
+    stats = embeddings.store.stats()
+    assert stats[QUERY_NAMESPACE] == {"memory_hits": 2, "disk_hits": 0, "misses": 1, "writes": 1}
+    assert stats[DOCUMENT_NAMESPACE]["writes"] == 1
+
+
+def test_different_models_do_not_share_vectors(tmp_path) -> None:
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    small, large = _CountingEmbeddings(), _CountingEmbeddings()
+    CachedEmbeddings(small, store, model="small").embed_query("agent memory")
+    CachedEmbeddings(large, store, model="large").embed_query("agent memory")
+
+    assert small.query_calls == large.query_calls == ["agent memory"]
@@ -0,0 +1,64 @@
+import asyncio
+from dataclasses import replace
+from unittest.mock import patch
+
+import langchain_openai
+
+from benchmarks.fakes import CORPUS, LatencyProfile, model_fakes
+from graph.chains.answer_grader import build_answer_grader_chain
+from graph.chains.grading import grader_llm, grader_stats, reset_grader_stats
+from graph.chains.hallucination_grader import build_hallucination_grader_chain
+from graph.chains.retrieval_grader import build_batch_retrieval_grader_chain, build_retrieval_grader_chain, format_numbered_documents
+from graph.config import configure, get_settings
+
+QUESTION = "What is agent memory?"
+GENERATION = "Agent memory is kept in an external vector store."
+
+
+def _grade_everything(mode: str) -> list:
+    """Run every grader over the corpus in mode; returns the verdicts."""
+    configure(replace(get_settings(), grader_output=mode))
+    retrieval_grader, batch_grader = build_retrieval_grader_chain(), build_batch_retrieval_grader_chain()
+    hallucination_grader, answer_grader = build_hallucination_grader_chain(), build_answer_grader_chain()
+    texts = [text for _, text in CORPUS]
+    verdicts = [retrieval_grader.invoke({"document": text, "question": QUESTION}).binary_score for text in texts]
+    batch = batch_grader.invoke({"documents": format_numbered_documents(texts), "question": QUESTION})
+    verdicts += [verdict.binary_score for verdict in batch.verdicts]
+    verdicts.append(hallucination_grader.invoke({"documents": texts[0], "generation": GENERATION}).binary_score)
+    grade = asyncio.run(answer_grader.ainvoke({"question": QUESTION, "generation": GENERATION}))
+    return verdicts + [grade.binary_score]
+
+
+def test_lean_graders_return_the_same_verdicts_with_fewer_tokens():
+    with model_fakes(LatencyProfile(chat=0.0, chat_per_token=0.002, embedding=0.0, search=0.0)):
+        reset_grader_stats()
+        lean_verdicts = _grade_everything("lean")
+        explain_verdicts = _grade_everything("explain")
+        stats = grader_stats()
+
+    assert lean_verdicts == explain_verdicts
+    assert stats["retrieval_grader"]["lean"]["calls"] == len(CORPUS)
+    for grader in ("retrieval_grader", "batch_retrieval_grader", "hallucination_grader", "answer_grader"):
+        lean, explain = stats[grader]["lean"], stats[grader]["explain"]
+        assert lean["calls"] == explain["calls"]
+        assert lean["prompt_tokens"] == explain["prompt_tokens"]
+        assert 3 * lean["completion_tokens"] < explain["completion_tokens"]
+        assert lean["seconds"] < explain["seconds"]
+
+
+def test_lean_mode_caps_completions_per_verdict():
+    settings = get_settings()
+    with patch.object(langchain_openai, "ChatOpenAI") as chat_openai:
+        try:
+            configure(replace(settings, grader_output="lean", grader_max_tokens=32, llm_chain_models="answer_grader=:8"))
+            grader_llm("retrieval_grader", verdicts=4)
+            assert chat_openai.call_args.kwargs["max_tokens"] == 128
+            # A cap set for the chain itself wins
+            grader_llm("answer_grader")
+            assert chat_openai.call_args.kwargs["max_tokens"] == 8
+
+            configure(replace(settings, grader_output="explain", llm_max_tokens=0))
+            grader_llm("retrieval_grader", verdicts=4)
+            assert "max_tokens" not in chat_openai.call_args.kwargs
+        finally:
+            configure(settings)
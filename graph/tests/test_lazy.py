@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from langchain_core.runnables import RunnableLambda
+
+from graph.lazy import LazyRunnable
+
+
+def test_lazy_runnable_builds_once_on_first_use() -> None:
+    builds = []
+
+    def factory() -> RunnableLambda:
+        builds.append(1)
+        return RunnableLambda(lambda value: value * 2)
+
+    lazy = LazyRunnable(factory)
+    assert not lazy.built
+
+    assert lazy.invoke(2) == 4
+    assert lazy.batch([1, 3]) == [2, 6]
+    assert list(lazy.stream(5)) == [10]
+    assert len(builds) == 1
+
+
+def test_importing_the_graph_builds_no_clients() -> None:
+    # Run in a fresh interpreter without credentials: any eager client would fail to build
+    code = (
+        "import graph.graph\n"
+        "from graph.chains.router import question_router\n"
+        "from graph.chains.generation import generation_chain\n"
+        "from ingestion import retriever_vector\n"
+        "assert not question_router.built and not generation_chain.built and not retriever_vector.built\n"
+        "assert 'langchain_openai' not in __import__('sys').modules\n"
+    )
+    env = {"PATH": "", "PYTHONPATH": "."}
+    project_root = Path(__file__).parents[2]
+    result = subprocess.run([sys.executable, "-c", code], cwd=project_root, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,67 @@
+import importlib
+
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.router import RouteQuery
+from graph.config import Settings
+from graph.consts import RETRIEVE, WEBSEARCH
+from graph.local_router import LocalRouter, compute_topic_centroids, reset_routing_stats, routing_stats
+
+graph_module = importlib.import_module("graph.graph")
+
+
+class _StoredCollection:
+    embeddings = [[1.0, 0.0, 0.0], [0.8, 0.6, 0.0], [0.0, 0.0, 2.0]]
+    metadatas = [{"source": "agents"}, {"source": "agents"}, {"source": "prompts"}]
+
+    def get(self, limit=None, offset=0, include=None) -> dict:
+        page = slice(offset, None if limit is None else offset + limit)
+        return {
+            "ids": [f"chunk-{number}" for number in range(len(self.embeddings))][page],
+            "embeddings": self.embeddings[page],
+            "metadatas": self.metadatas[page],
+        }
+
+
+class _Embeddings:
+    vectors = {
+        "agent memory": [1.0, 0.2, 0.0],
+        "football scores": [0.0, -1.0, 0.0],
+        "agent prompts": [0.6, 0.0, 0.5],
+    }
+
+    def embed_query(self, text: str) -> list:
+        return self.vectors[text]
+
+
+def test_centroids_are_normalized_means_per_source() -> None:
+    centroids = compute_topic_centroids(_StoredCollection())
+
+    assert centroids["prompts"] == [0.0, 0.0, 1.0]
+    assert round(centroids["agents"][0], 3) == 0.949
+    # Sums carried across pages give the same means
+    assert compute_topic_centroids(_StoredCollection(), page_size=1) == centroids
+
+
+def test_only_uncertain_questions_reach_the_llm_router(monkeypatch) -> None:
+    router = LocalRouter(compute_topic_centroids(_StoredCollection()), vectorstore_threshold=0.9, websearch_threshold=0.2)
+    llm_questions = []
+
+    def llm_route(inputs: dict) -> RouteQuery:
+        llm_questions.append(inputs["question"])
+        return RouteQuery(datasource="vectorstore")
+
+    monkeypatch.setattr(graph_module, "get_settings", lambda: Settings())
+    monkeypatch.setattr(graph_module, "get_local_router", lambda: router)
+    monkeypatch.setattr(graph_module, "get_embeddings", _Embeddings)
+    monkeypatch.setattr(graph_module, "question_router", RunnableLambda(llm_route))
+    reset_routing_stats()
+
+    routes = [
+        graph_module.route_question({"question": question})
+        for question in ("agent memory", "football scores", "agent prompts")
+    ]
+
+    assert routes == [RETRIEVE, WEBSEARCH, RETRIEVE]
+    assert llm_questions == ["agent prompts"]
+    assert routing_stats() == {"local_vectorstore": 1, "local_websearch": 1, "llm": 1}
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from graph import clients
+from graph.config import configure, get_settings
+from graph.llm import ChainModel, chain_model, get_chat_model, parse_chain_models
+from graph.rate_limit import TokenBucket, get_llm_limiter
+
+
+class MockCompletions(ThreadingHTTPServer):
+    """Local /chat/completions endpoint that allows rate requests per second and answers the rest with 429."""
+
+    daemon_threads = True
+
+    def __init__(self, rate: float, latency: float):
+        self.bucket = TokenBucket(rate, rate)
+        self.latency = latency
+        self.statuses = []
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), CompletionHandler)
+
+    def count(self, status: int) -> None:
+        with self.lock:
+            self.statuses.append((time.monotonic(), status))
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.bucket.reserve(1) > 0:
+            # Refused requests are not served, so they do not use up the allowance
+            self.server.bucket.reserve(-1)
+            self.server.count(429)
+            self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"retry-after-ms": "20"})
+            return
+        time.sleep(self.server.latency)
+        self.server.count(200)
+        message = {"role": "assistant", "content": "ok"}
+        self._reply(200, {
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+        })
+
+    def _reply(self, status: int, body: dict, headers: dict = {}) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+def _reset_clients() -> None:
+    for cached in (get_llm_limiter, clients.get_llm_http_client, clients.get_llm_async_http_client):
+        cached.cache_clear()
+
+
+@pytest.fixture
+def endpoint():
+    """Start a mock endpoint with the given server-side limit, and the chat model of the router against it."""
+    settings, servers = get_settings(), []
+
+    def start(server_rate: float, **limits):
+        server = MockCompletions(server_rate, latency=0.01)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        configure(replace(settings, **limits))
+        _reset_clients()
+        model = get_chat_model("router", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test")
+        return server, model
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    configure(settings)
+    _reset_clients()
+
+
+def test_chain_models_fall_back_to_the_default_model_and_cap():
+    settings = replace(get_settings(), llm_model="gpt-4o-mini", llm_max_tokens=0, llm_chain_models="")
+    assert chain_model("answer_grader", settings).model == "gpt-4o-mini"
+
+    spec = "generation=gpt-4o:512, retrieval_grader=:16, router=ft:gpt-4o-mini:org::abc"
+    assert parse_chain_models(spec) == {
+        "generation": {"model": "gpt-4o", "max_tokens": 512},
+        "retrieval_grader": {"max_tokens": 16},
+        "router": {"model": "ft:gpt-4o-mini:org::abc"},
+    }
+    settings = replace(settings, llm_max_tokens=256, llm_chain_models=spec)
+    assert chain_model("retrieval_grader", settings) == ChainModel("gpt-4o-mini", 16)
+    assert chain_model("answer_grader", settings).max_tokens == 256
+    with pytest.raises(ValueError):
+        parse_chain_models("grader=gpt-4o")
+
+
+def test_sustained_throughput_stays_close_to_the_limit_without_429_bursts(endpoint):
+    # The client is allowed 90% of what the endpoint serves: 36 requests/s against 40
+    server, model = endpoint(40, llm_requests_per_minute=36 * 60, llm_max_concurrency=16)
+    duration, failures = 2.0, []
+
+    def worker() -> int:
+        calls, deadline = 0, time.monotonic() + duration
+        while time.monotonic() < deadline:
+            try:
+                model.invoke("ping")
+                calls += 1
+            except Exception as error:
+                failures.append(error)
+        return calls
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(16) as pool:
+        calls = sum(pool.map(lambda _: worker(), range(16)))
+    elapsed = time.monotonic() - started
+
+    assert not failures
+    # A burst of one second's allowance, then the configured rate
+    assert 0.9 * 36 <= (calls - 36) / elapsed <= 36 * 1.05
+    assert sum(status == 429 for _, status in server.statuses) <= 0.02 * calls
+    assert get_llm_limiter().stats()["failures"] == 0
+
+
+def test_429s_are_retried_with_backoff_and_shrink_the_concurrency(endpoint):
+    # Misconfigured client: twice what the endpoint serves, so the retries have to absorb the excess
+    server, model = endpoint(
+        20, llm_requests_per_minute=40 * 60, llm_max_concurrency=16, llm_retry_base_delay=0.05, llm_max_retries=8,
+    )
+
+    async def burst():
+        return await asyncio.gather(*(model.ainvoke("ping") for _ in range(60)))
+
+    answers = asyncio.run(burst())
+    stats = get_llm_limiter().stats()
+
+    assert [answer.content for answer in answers] == ["ok"] * 60
+    assert stats["retries"] == sum(status == 429 for _, status in server.statuses) > 0
+    assert stats["failures"] == 0
+    assert stats["concurrency_limit"] < 16
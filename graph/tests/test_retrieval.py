@@ -0,0 +1,46 @@
+from langchain_core.documents import Document
+
+from graph.bm25 import BM25Index
+from graph.retrieval import reciprocal_rank_fusion
+
+
+def _chunk(chunk_id: str, text: str) -> Document:
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, "source": "https://example.com"})
+
+
+def test_bm25_ranks_exact_term_matches_first_and_persists(tmp_path) -> None:
+    path = str(tmp_path / "bm25.sqlite3")
+    index = BM25Index(path)
+    index.add(
+        ["a", "b", "c"],
+        [
+            _chunk("a", "Agents use short-term and long-term memory."),
+            _chunk("b", "Prompt engineering steers the model without training."),
+            _chunk("c", "Memory, memory and more memory: the agent memory stream."),
+        ],
+    )
+    index.close()
+
+    reopened = BM25Index(path)
+    results = reopened.search("agent memory", k=2)
+    assert [document.metadata["chunk_id"] for document, _ in results] == ["c", "a"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_bm25_add_replaces_and_delete_removes(tmp_path) -> None:
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    index.add(["a", "b"], [_chunk("a", "adversarial attacks"), _chunk("b", "prompt injection")])
+    index.add(["a"], [_chunk("a", "jailbreak prompts")])
+    index.delete(["b"])
+
+    assert index.ids() == {"a"}
+    assert index.search("adversarial") == []
+    assert [document.page_content for document, _ in index.search("prompt injection")] == []
+    assert [document.page_content for document, _ in index.search("jailbreak")] == ["jailbreak prompts"]
+
+
+def test_reciprocal_rank_fusion_promotes_documents_found_by_both_retrievers() -> None:
+    a, b, c, d = (_chunk(chunk_id, chunk_id) for chunk_id in "abcd")
+
+    assert reciprocal_rank_fusion([[a, b, c], [c, d]]) == [c, a, b, d]
+    assert reciprocal_rank_fusion([[a, b, c], [c, d]], weights=[1.0, 0.0])[:3] == [a, b, c]
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.fakes import LATENCY_PROFILES, model_fakes
+from graph.checkpoint import SqliteCheckpointSaver
+from graph.sessions import SessionGraph
+
+QUESTION = "What is agent memory?"
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A SessionGraph over the fake models, checkpointed in a temporary SQLite file."""
+    with model_fakes(LATENCY_PROFILES["zero"]):
+        from graph.graph import build_workflow
+
+        saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite3"), keep_per_thread=3)
+        app = SessionGraph(build_workflow().compile(checkpointer=saver))
+        yield app, saver
+        saver.close()
+
+
+def ask(app, question, thread_id="thread-1"):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.invoke({"question": question}, {"configurable": {"thread_id": thread_id}})
+
+
+def test_follow_up_reuses_the_thread_documents(session):
+    app, _ = session
+    first = ask(app, QUESTION)
+    follow_up = ask(app, "what is agent memory")
+
+    assert first["generation_grade"] == follow_up["generation_grade"] == "useful"
+    # No routing, retrieval or document grading: one generation and both graders
+    assert follow_up["llm_calls"] == 3
+    assert follow_up["documents"] == first["documents"]
+    assert follow_up["context_question"] == QUESTION
+
+
+def test_unrelated_question_gathers_its_own_documents(session):
+    app, _ = session
+    first = ask(app, QUESTION)
+    other = ask(app, "How does the latest agent store its memory?")
+
+    assert other["llm_calls"] > 3
+    assert other["context_question"] == "How does the latest agent store its memory?"
+    assert other["documents"] != first["documents"]
+    # Another thread starts empty
+    assert ask(app, "what is agent memory", thread_id="thread-2")["llm_calls"] > 3
+
+
+def test_failed_run_resumes_from_its_last_completed_node(session):
+    app, _ = session
+    module = sys.modules["graph.nodes.grade_generation"]
+
+    def unavailable(_):
+        raise RuntimeError("grader unavailable")
+
+    with patch.object(module, "hallucination_grader_chain", RunnableLambda(unavailable)):
+        with pytest.raises(RuntimeError):
+            ask(app, QUESTION)
+    assert app.get_state({"configurable": {"thread_id": "thread-1"}}).next == ("grade_generation",)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = asyncio.run(app.ainvoke({"question": QUESTION}, {"configurable": {"thread_id": "thread-1"}}))
+
+    # Only the graders run again; retrieval, document grading and generation are not repeated
+    assert result["generation_grade"] == "useful"
+    assert result["llm_calls"] == 2
+
+
+def test_retention_keeps_recent_checkpoints_and_drops_idle_threads(session, tmp_path):
+    app, saver = session
+    ask(app, QUESTION)
+    ask(app, QUESTION, thread_id="thread-2")
+
+    assert saver.stats()["threads"] == 2
+    assert len(list(saver.list({"configurable": {"thread_id": "thread-1"}}))) == 3
+
+    # Checkpoints survive reopening the database
+    reopened = SqliteCheckpointSaver(saver.path, ttl=60)
+    assert reopened.get_tuple({"configurable": {"thread_id": "thread-1"}}).checkpoint["channel_values"]["generation"]
+    assert reopened.prune(now=time.time() + 120) == 2
+    assert reopened.compact() == {"threads": 0, "checkpoints": 0, "writes": 0, "bytes": reopened.stats()["bytes"]}
+    reopened.close()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+from contextlib import ExitStack
+from dataclasses import replace
+from unittest.mock import patch
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from benchmarks.fakes import CORPUS, LATENCY_PROFILES, FakeOpenAIEmbeddings, model_fakes
+from graph.bm25 import BM25Index
+from graph.config import configure, get_settings
+from graph.document_refs import get_document_store, resolve
+from graph.retrieval import SHARD_KEY
+from graph.shards import ShardSelector, reset_shard_stats, shard_stats, vectorstore_topics
+
+SHARDS = [
+    {"name": "agents", "description": "agent memory, planning and tool use"},
+    {"name": "adversarial-attacks", "description": "adversarial attacks and jailbreaks on language models"},
+    {"name": "prompt-engineering", "description": "prompt engineering and few-shot prompting"},
+]
+
+
+def _shard_of(index: int) -> str:
+    # CORPUS holds the agent chunks first, then the adversarial attack ones, then the prompting ones
+    return SHARDS[0 if index < 5 else 1 if index < 9 else 2]["name"]
+
+
+def _shard_services(stack: ExitStack) -> tuple:
+    stores, indexes = {}, {}
+    for shard in SHARDS:
+        documents = [
+            Document(page_content=text, metadata={"source": source, "chunk_id": f"chunk-{index}"})
+            for index, (source, text) in enumerate(CORPUS)
+            if _shard_of(index) == shard["name"]
+        ]
+        ids = [document.metadata["chunk_id"] for document in documents]
+        store = Chroma(
+            collection_name=f"{shard['name']}-{time.time_ns()}",
+            embedding_function=FakeOpenAIEmbeddings(profile=LATENCY_PROFILES["zero"]),
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+        store.add_documents(documents, ids=ids)
+        stack.callback(store.delete_collection)
+        stores[shard["name"]] = store
+        indexes[shard["name"]] = BM25Index(":memory:")
+        indexes[shard["name"]].add(ids, documents)
+    return stores, indexes
+
+
+def test_selector_queries_the_closest_shards_up_to_the_fanout():
+    selector = ShardSelector({"a": [[1.0, 0.0, 0.0]], "b": [[0.0, 1.0, 0.0], [0.6, 0.8, 0.0]], "c": [[0.0, 0.0, 1.0]]}, 2, 0.5)
+
+    assert selector.select([1.0, 0.0, 0.0]) == ["a", "b"]
+    assert selector.select([0.0, 0.0, 1.0]) == ["c"]
+    # Nothing similar enough: the closest shard is still searched
+    assert selector.select([0.3, 0.0, -1.0]) == ["a"]
+
+
+def test_retrieve_searches_only_the_shards_a_question_concerns(tmp_path):
+    import graph.nodes.retrieve as retrieve_module
+    import ingestion
+
+    shards_path = tmp_path / "shards.json"
+    shards_path.write_text(json.dumps({"shards": SHARDS}), encoding="utf-8")
+    with model_fakes(LATENCY_PROFILES["zero"]), ExitStack() as stack:
+        configure(replace(get_settings(), shards_path=str(shards_path), shard_min_similarity=0.2))
+        stores, indexes = _shard_services(stack)
+        stack.enter_context(patch.object(ingestion, "get_vectorstore", lambda collection=None: stores[collection]))
+        stack.enter_context(patch.object(retrieve_module, "get_lexical_index", lambda collection=None: indexes[collection]))
+        reset_shard_stats()
+
+        assert vectorstore_topics() == "; ".join(shard["description"] for shard in SHARDS)
+
+        refs = retrieve_module.retriever({"question": "What is agent memory?"})["documents"]
+        assert len(refs) == get_settings().retrieval_k
+        assert {ref["metadata"][SHARD_KEY] for ref in refs} == {"agents"}
+        stats = shard_stats()
+        assert stats["agents"]["queries"] == 1 and stats["agents"]["hits"] == len(refs)
+        assert stats["adversarial-attacks"]["skipped"] == stats["prompt-engineering"]["skipped"] == 1
+
+        # Two shards searched in parallel, cut to one global top-k
+        question = "agent memory and adversarial attacks"
+        refs = retrieve_module.retriever({"question": question})["documents"]
+        assert len(refs) == get_settings().retrieval_k
+        assert {ref["metadata"][SHARD_KEY] for ref in refs} == {"agents", "adversarial-attacks"}
+        async_refs = asyncio.run(retrieve_module.aretriever({"question": question}))["documents"]
+        assert [ref["id"] for ref in async_refs] == [ref["id"] for ref in refs]
+        stats = shard_stats()
+        assert stats["adversarial-attacks"]["queries"] == 2 and stats["prompt-engineering"]["skipped"] == 3
+        assert sum(shard["hits"] for shard in stats.values()) == 3 * len(refs)
+
+        # Each ref is fetched back from the collection of its shard
+        get_document_store().clear()
+        assert [document.page_content for document in resolve(refs)] == [
+            CORPUS[int(ref["id"].split("-")[1])][1] for ref in refs
+        ]
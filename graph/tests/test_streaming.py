@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.runnables import RunnableGenerator
+
+from benchmarks.fakes import stand_in
+from graph.chains.answer_grader import GradeAnswer
+from graph.graph import build_workflow
+from graph.streaming import astream_answer, stream_answer
+
+TOKENS = ["Agents ", "keep ", "memory."]
+
+
+def _generate(inputs: Iterator[Any]) -> Iterator[str]:
+    for _ in inputs:
+        yield from TOKENS
+
+
+async def _agenerate(inputs: AsyncIterator[Any]) -> AsyncIterator[str]:
+    async for _ in inputs:
+        for token in TOKENS:
+            yield token
+
+
+def _install(fakes, verdicts=(True,)) -> None:
+    fakes["generate"].generation_chain = RunnableGenerator(_generate, _agenerate)
+    # The answer grader gives the verdicts in order, then keeps the last one
+    remaining = list(verdicts)
+
+    def grade_answer(inputs: Any) -> GradeAnswer:
+        return GradeAnswer(binary_score=remaining.pop(0) if len(remaining) > 1 else remaining[0])
+
+    fakes["grade_generation"].answer_grader_chain = stand_in(grade_answer, 0)
+
+
+def test_tokens_are_streamed_before_the_verdict(fakes) -> None:
+    _install(fakes)
+
+    events = list(stream_answer(build_workflow().compile(), "What is agent memory?"))
+
+    assert [event["event"] for event in events] == ["token"] * 3 + ["generation_end", "verdict", "final"]
+    assert events[3]["text"] == "".join(TOKENS)
+    assert events[4]["action"] == "confirm"
+    assert events[-1]["state"]["generation"] == "".join(TOKENS)
+
+
+def test_an_answer_that_misses_the_question_is_retracted_and_replaced(fakes) -> None:
+    _install(fakes, verdicts=(False, True))
+    app = build_workflow().compile()
+
+    async def collect():
+        return [event async for event in astream_answer(app, "What is agent memory?")]
+
+    events = asyncio.run(collect())
+
+    verdicts = [(event["attempt"], event["action"]) for event in events if event["event"] == "verdict"]
+    assert verdicts == [(1, "retract"), (2, "confirm")]
+    assert [event["attempt"] for event in events if event["event"] == "token"] == [1] * 3 + [2] * 3
+    assert events[-1]["state"]["generation_attempt"] == 2
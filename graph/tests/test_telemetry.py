@@ -0,0 +1,99 @@
+import asyncio
+import json
+import urllib.request
+from typing import Any, Iterator
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGenerationChunk
+
+from graph.chains.generation import RAG_PROMPT
+from graph.graph import build_workflow
+from graph.lazy import LazyRunnable
+from graph.telemetry import MetricsRegistry, Telemetry, chain_names
+
+
+class UsageReportingChatModel(GenericFakeChatModel):
+    """Streams its answer and then a usage chunk, like ChatOpenAI with stream_usage=True."""
+
+    def _stream(self, *args: Any, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        yield from super()._stream(*args, **kwargs)
+        usage = {"input_tokens": 120, "output_tokens": 5, "total_tokens": 125}
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+
+def _generation_chain() -> LazyRunnable:
+    model = UsageReportingChatModel(messages=iter([AIMessage(content="Agents keep memory.")] * 10))
+    return LazyRunnable(lambda: RAG_PROMPT | model | StrOutputParser(), name="generation_chain")
+
+
+def _telemetry(tmp_path) -> Telemetry:
+    return Telemetry(
+        spans_path=str(tmp_path / "spans.jsonl"),
+        metrics_path=str(tmp_path / "metrics.prom"),
+        chain_names=chain_names(),
+    )
+
+
+def test_a_run_records_node_chain_and_llm_spans_with_its_path(fakes, tmp_path) -> None:
+    fakes["generate"].generation_chain = _generation_chain()
+    telemetry = _telemetry(tmp_path)
+    app = build_workflow().compile().with_config(callbacks=[telemetry.handler])
+
+    app.invoke({"question": "What is agent memory?"})
+
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    by_kind = {}
+    for span in spans:
+        by_kind.setdefault(span["kind"], []).append(span["name"])
+    assert by_kind["node"] == ["retrieve", "grade_documents", "generate", "grade_generation"]
+    assert "generation_chain" in by_kind["chain"]
+    assert len(by_kind["llm"]) == 1
+    root = next(span for span in spans if span["kind"] == "graph")
+    assert {span["trace_id"] for span in spans} == {root["trace_id"]}
+    assert root["attributes"]["rag.route"] == "vectorstore"
+    assert root["attributes"]["rag.grade"] == "useful"
+    assert root["attributes"]["rag.path"] == "retrieve>grade_documents>generate>grade_generation"
+    assert root["attributes"]["gen_ai.usage.input_tokens"] == 120
+
+    metrics = (tmp_path / "metrics.prom").read_text()
+    assert 'rag_llm_calls_total{chain="generation_chain"} 1' in metrics
+    assert 'rag_llm_tokens_total{chain="generation_chain",type="completion"} 5' in metrics
+    assert 'rag_requests_total{grade="useful",route="vectorstore"} 1' in metrics
+    assert 'rag_node_duration_seconds_count{node="grade_documents"} 1' in metrics
+
+
+def test_async_runs_and_log_messages_are_recorded(fakes, tmp_path) -> None:
+    telemetry = _telemetry(tmp_path)
+    app = build_workflow().compile().with_config(callbacks=[telemetry.handler])
+
+    asyncio.run(app.ainvoke({"question": "Weather in Mexico City today?"}))
+    telemetry.record_log("info", "outside of any run")
+
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    root = next(span for span in spans if span["kind"] == "graph")
+    assert root["attributes"]["rag.route"] == "websearch"
+    assert telemetry.metrics.value("rag_requests_total", route="websearch", grade="useful") == 1
+
+
+def test_metrics_render_in_prometheus_format_and_are_served(tmp_path) -> None:
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    metrics.inc("rag_cache_requests_total", "Cache lookups", cache="answers", result="hit")
+    metrics.observe("rag_node_duration_seconds", "Node time", 0.5, node="generate")
+
+    rendered = metrics.render()
+    assert 'rag_cache_requests_total{cache="answers",result="hit"} 1' in rendered
+    assert 'rag_node_duration_seconds_bucket{node="generate",le="0.1"} 0' in rendered
+    assert 'rag_node_duration_seconds_bucket{node="generate",le="1.0"} 1' in rendered
+    assert 'rag_node_duration_seconds_count{node="generate"} 1' in rendered
+
+    telemetry = _telemetry(tmp_path)
+    telemetry.record_retry("http_429")
+    server = telemetry.serve_metrics(0, host="127.0.0.1")
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        telemetry.close()
+    assert 'rag_retries_total{reason="http_429"} 1' in body
@@ -0,0 +1,102 @@
+import time
+from dataclasses import replace
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from benchmarks.fakes import CORPUS, LATENCY_PROFILES, FakeOpenAIEmbeddings
+from graph.config import configure, get_settings
+from graph.local_router import compute_topic_centroids
+from graph.vector_index import NumpyVectorStore, export_chroma
+
+QUESTIONS = ["What is agent memory?", "How do adversarial attacks work?", "few-shot prompting"]
+
+
+def _corpus() -> list:
+    return [
+        Document(page_content=text, metadata={"source": source, "chunk_id": f"chunk-{index}", "position": index})
+        for index, (source, text) in enumerate(CORPUS)
+    ]
+
+
+def _chroma(embeddings) -> Chroma:
+    documents = _corpus()
+    # Default (l2) space, like the rag-chroma collection of ingestion.py
+    chroma = Chroma(collection_name=f"test-{time.time_ns()}", embedding_function=embeddings)
+    chroma.add_documents(documents, ids=[document.metadata["chunk_id"] for document in documents])
+    return chroma
+
+
+def test_exported_index_answers_like_chroma(tmp_path):
+    embeddings = FakeOpenAIEmbeddings(profile=LATENCY_PROFILES["zero"])
+    chroma = _chroma(embeddings)
+    store = NumpyVectorStore(str(tmp_path / "index"), embeddings)
+    try:
+        assert export_chroma(chroma, store, batch_size=4) == len(CORPUS)
+
+        for question in QUESTIONS:
+            expected = chroma.similarity_search_with_relevance_scores(question, k=4)
+            found = store.similarity_search_with_relevance_scores(question, k=4)
+            assert np.allclose([score for _, score in found], [score for _, score in expected], atol=1e-5)
+            assert {document.page_content for document, _ in found} == {document.page_content for document, _ in expected}
+
+        source = CORPUS[0][0]
+        assert store.get(where={"source": source}, include=[])["ids"] == chroma.get(where={"source": source}, include=[])["ids"]
+        assert store.get(where={"position": {"$in": [9, 10]}})["documents"] == [text for _, text in CORPUS[9:]]
+        assert compute_topic_centroids(store).keys() == compute_topic_centroids(chroma).keys()
+        filtered = store.similarity_search("agent memory", k=3, filter={"source": CORPUS[-1][0]})
+        assert [document.metadata["chunk_id"] for document in filtered] == ["chunk-9", "chunk-10"]
+    finally:
+        chroma.delete_collection()
+        store.close()
+
+
+def test_writes_swap_generations_that_other_readers_pick_up(tmp_path):
+    embeddings = FakeOpenAIEmbeddings(profile=LATENCY_PROFILES["zero"])
+    path = str(tmp_path / "index")
+    documents = _corpus()
+    writer = NumpyVectorStore(path, embeddings, lists=3, probes=1, int8=True)
+    # A second instance on the same directory stands for another worker process
+    reader = NumpyVectorStore(path, embeddings, probes=3)
+    try:
+        writer.add_documents(documents[:5], ids=[document.metadata["chunk_id"] for document in documents[:5]])
+        assert [document.metadata["chunk_id"] for document in reader.similarity_search("agent memory stream", k=1)] == ["chunk-3"]
+
+        writer.add_documents(documents[5:], ids=[document.metadata["chunk_id"] for document in documents[5:]])
+        writer.delete(ids=["chunk-3"])
+        assert reader.count() == len(CORPUS) - 1
+        assert reader.stats()["lists"] == 3 and reader.stats()["int8"]
+        assert "chunk-3" not in [document.metadata["chunk_id"] for document in reader.similarity_search("agent memory stream", k=4)]
+        # A filter matching chunks outside the probed lists still returns them
+        filtered = writer.similarity_search("agent memory", k=2, filter={"position": {"$gte": 9}})
+        assert {document.metadata["chunk_id"] for document in filtered} == {"chunk-9", "chunk-10"}
+        assert len([name for name in (tmp_path / "index").iterdir() if name.name.startswith("gen-")]) == 2
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_retriever_uses_the_configured_backend(tmp_path, monkeypatch):
+    import ingestion
+
+    embeddings = FakeOpenAIEmbeddings(profile=LATENCY_PROFILES["zero"])
+    monkeypatch.setattr(ingestion, "get_embeddings", lambda: embeddings)
+    previous = get_settings()
+    configure(
+        replace(previous, vector_store_backend="numpy", vector_index_path=str(tmp_path / "index"), retrieval_mode="vector")
+    )
+    ingestion.get_vectorstore.cache_clear()
+    try:
+        store = ingestion.get_vectorstore()
+        assert isinstance(store, NumpyVectorStore)
+        documents = _corpus()
+        store.add_documents(documents, ids=[document.metadata["chunk_id"] for document in documents])
+
+        retrieved = ingestion.build_retriever().invoke("What is agent memory?")
+        assert len(retrieved) == previous.retrieval_k
+        scores = [document.metadata["relevance_score"] for document in retrieved]
+        assert scores == sorted(scores, reverse=True) and scores[0] <= 1
+    finally:
+        configure(previous)
+        ingestion.get_vectorstore.cache_clear()
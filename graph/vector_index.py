@@ -0,0 +1,712 @@
+"""
+In-process vector index with memory-mapped storage, an alternative backend to the Chroma collection.
+
+NumpyVectorStore is a LangChain VectorStore whose vectors live in .npy files opened with
+np.load(mmap_mode="r"): their pages belong to the OS page cache, so several worker processes
+serving the same index share one copy of it instead of each loading the collection, and opening
+the index reads a few headers instead of the whole collection. Chunk text and metadata live in a
+SQLite table next to the vectors. get() takes Chroma's arguments (ids, where, limit, offset,
+include), so ingestion, the BM25 sync, the topic centroids and the document refs work unchanged
+whichever backend VECTOR_STORE_BACKEND selects (ingestion.get_vectorstore()).
+
+Layout of the index directory:
+
+    CURRENT               name of the live generation
+    documents.sqlite3     id, text and metadata of each chunk, under an integer row key
+    gen-000007/
+        meta.json         dimension, rows, quantization and IVF lists
+        keys.npy          row key of each vector
+        vectors.npy       float32 vectors, or int8 ones with one scale per row in scales.npy
+        sq_norms.npy      squared norm of each (dequantized) vector
+        centroids.npy     IVF only: list centroids; the rows of list i are offsets[i]:offsets[i + 1]
+        offsets.npy
+
+A generation is never modified: a write builds the next one beside it and swaps CURRENT with
+os.replace, so readers never see a half written index and pick up the new generation on their
+next query. Only the last two generations are kept; a process still mapping an older one keeps
+reading it until it reopens. Writes rebuild the whole generation, which suits batch ingestion;
+one process writes at a time.
+
+Searches are exact (flat) or scan only the `probes` inverted lists (IVF) whose centroids are
+closest to the query. Distances are squared L2, Chroma's default space, and relevance scores use
+the same conversion, so the calibrated score thresholds (graph/calibration.py) carry over. int8
+quantization stores a quarter of the bytes at a small recall cost. Metadata filters take Chroma's
+where syntax ($eq, $ne, $gt, $gte, $lt, $lte, $in, $nin, $and, $or).
+
+    python -m graph.vector_index export     # copy the Chroma collection of every shard into VECTOR_INDEX_PATH
+    python -m graph.vector_index info
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.vectorstores import VectorStore
+from numpy.lib.format import open_memmap
+
+CURRENT_FILE = "CURRENT"
+DOCUMENTS_FILE = "documents.sqlite3"
+# Rows per matrix product, so scanning a large index never materializes it in memory
+_BLOCK_ROWS = 8_192
+# SQLite limits the number of bound parameters per statement
+_BATCH_SIZE = 500
+_GENERATIONS_KEPT = 2
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 256
+
+# (ids, texts, metadatas, vectors) of chunks to upsert
+VectorBatch = Tuple[Sequence[str], Sequence[str], Sequence[Dict[str, Any]], np.ndarray]
+
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _batches(items: Sequence[Any]) -> List[Sequence[Any]]:
+    return [items[start:start + _BATCH_SIZE] for start in range(0, len(items), _BATCH_SIZE)]
+
+
+def _placeholders(items: Sequence[Any]) -> str:
+    return ", ".join("?" * len(items))
+
+
+def _json_field(field: str) -> str:
+    """SQL expression of a metadata field; the path is inlined so it can match an expression index."""
+    path = '$."' + field.replace('"', '\\"') + '"'
+    return "json_extract(metadata, '" + path.replace("'", "''") + "')"
+
+
+def where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """SQL condition on the metadata column equivalent to a Chroma where filter."""
+    clauses, params = [], []
+    for field, condition in where.items():
+        if field in ("$and", "$or"):
+            parts = [where_sql(part) for part in condition]
+            joiner = " AND " if field == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+        column = _json_field(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in _COMPARISONS:
+                clauses.append(f"{column} {_COMPARISONS[operator]} ?")
+                params.append(value)
+            elif operator in ("$in", "$nin"):
+                negation = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{column} {negation}IN ({_placeholders(value)})")
+                params.extend(value)
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+def _top_k(rows: np.ndarray, distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The k rows with the smallest distances, closest first."""
+    if len(distances) > k:
+        nearest = np.argpartition(distances, k - 1)[:k]
+        rows, distances = rows[nearest], distances[nearest]
+    order = np.argsort(distances, kind="stable")
+    return rows[order], distances[order]
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """k-means centroids of the IVF lists, trained on a sample of up to 256 vectors per list."""
+    rng = np.random.default_rng(seed)
+    count = len(vectors)
+    sample_rows = np.sort(rng.choice(count, size=min(count, lists * _KMEANS_SAMPLE_PER_LIST), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        assignments = _nearest_centroid(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        members, starts, sizes = np.unique(assignments[order], return_index=True, return_counts=True)
+        # Lists left empty keep their previous centroid
+        centroids[members] = np.add.reduceat(sample[order], starts, axis=0) / sizes[:, None]
+    return centroids
+
+
+def write_generation(directory: str, keys: np.ndarray, vectors: np.ndarray, lists: int = 0, int8: bool = False) -> None:
+    """
+    Write an index generation for vectors (any array-like of shape (rows, dimension), e.g. a memmap).
+
+    Args:
+        directory: New directory to create.
+        keys: Row key of each vector.
+        vectors: float32 vectors, read in blocks.
+        lists: IVF lists to partition the vectors into; 0 writes a flat index.
+        int8: Store the vectors quantized to int8 with one scale per row.
+    """
+    count, dimension = vectors.shape
+    lists = min(lists, count)
+    os.makedirs(directory)
+    order = None
+    if lists:
+        centroids = train_centroids(vectors, lists)
+        assignments = _nearest_centroid(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=lists))])
+        np.save(os.path.join(directory, "centroids.npy"), centroids)
+        np.save(os.path.join(directory, "offsets.npy"), offsets.astype(np.int64))
+        keys = keys[order]
+
+    stored = open_memmap(
+        os.path.join(directory, "vectors.npy"), mode="w+", dtype=np.int8 if int8 else np.float32, shape=(count, dimension)
+    )
+    sq_norms = np.empty(count, dtype=np.float32)
+    scales = np.empty(count, dtype=np.float32)
+    for start in range(0, count, _BLOCK_ROWS):
+        stop = min(start + _BLOCK_ROWS, count)
+        rows = order[start:stop] if order is not None else slice(start, stop)
+        block = np.asarray(vectors[rows], dtype=np.float32)
+        if int8:
+            scale = np.abs(block).max(axis=1) / 127
+            scale[scale == 0] = 1.0
+            quantized = np.rint(block / scale[:, None]).astype(np.int8)
+            stored[start:stop] = quantized
+            scales[start:stop] = scale
+            block = quantized * scale[:, None]
+        else:
+            stored[start:stop] = block
+        sq_norms[start:stop] = np.einsum("ij,ij->i", block, block)
+    stored.flush()
+    del stored
+
+    np.save(os.path.join(directory, "keys.npy"), np.asarray(keys, dtype=np.int64))
+    np.save(os.path.join(directory, "sq_norms.npy"), sq_norms)
+    if int8:
+        np.save(os.path.join(directory, "scales.npy"), scales)
+    # meta.json is written last: a generation without it was interrupted
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as meta_file:
+        json.dump({"version": 1, "dimension": dimension, "rows": count, "int8": int8, "lists": lists}, meta_file)
+
+
+class VectorIndex:
+    """
+    One generation of the index, memory-mapped read-only.
+
+    Args:
+        directory: Generation directory written by write_generation().
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        self.dimension: int = meta["dimension"]
+        self.int8: bool = meta["int8"]
+        self.lists: int = meta["lists"]
+        self.keys = self._load("keys.npy")
+        self.vectors = self._load("vectors.npy")
+        self.sq_norms = self._load("sq_norms.npy")
+        self.scales = self._load("scales.npy") if self.int8 else None
+        self.centroids = np.asarray(self._load("centroids.npy")) if self.lists else None
+        self.offsets = np.asarray(self._load("offsets.npy")) if self.lists else None
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.directory, name), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def rows_of(self, keys: Sequence[int]) -> np.ndarray:
+        """Rows holding keys, -1 for keys not in this generation."""
+        if self._sorted is None:
+            positions = np.argsort(self.keys, kind="stable")
+            self._sorted = (positions, np.asarray(self.keys)[positions])
+        positions, sorted_keys = self._sorted
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(sorted_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return np.where(sorted_keys[found] == keys, positions[found], -1)
+
+    def vectors_at(self, rows: np.ndarray) -> np.ndarray:
+        """float32 (dequantized) vectors of rows."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def _distances(self, query: np.ndarray, rows: Any) -> np.ndarray:
+        """Squared L2 distances minus |query|^2 of rows (a slice or an array of rows)."""
+        block = self.vectors[rows]
+        products = (block if block.dtype == np.float32 else block.astype(np.float32)) @ query
+        if self.scales is not None:
+            products *= self.scales[rows]
+        return self.sq_norms[rows] - 2 * products
+
+    def _segments(self, query: np.ndarray, probes: int) -> List[Tuple[int, int]]:
+        if not self.lists:
+            return [(0, len(self))]
+        centroid_distances = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2 * self.centroids @ query
+        lists = np.argsort(centroid_distances)[:max(probes, 1)]
+        return sorted((int(self.offsets[i]), int(self.offsets[i + 1])) for i in lists)
+
+    def search(
+        self, query: Sequence[float], k: int, allowed: Optional[np.ndarray] = None, probes: int = 8
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Keys and squared L2 distances of the k nearest vectors, closest first.
+
+        Args:
+            query: Query vector.
+            k: Results to return.
+            allowed: Sorted keys the results are restricted to (a metadata filter); None allows all.
+            probes: IVF lists scanned; ignored by flat indexes.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query has dimension {query.shape[-1]}, the index {self.dimension}")
+        rows_found, distances_found = [], []
+        for start, stop in self._segments(query, probes):
+            for block_start in range(start, stop, _BLOCK_ROWS):
+                block_stop = min(block_start + _BLOCK_ROWS, stop)
+                rows = np.arange(block_start, block_stop)
+                distances = self._distances(query, slice(block_start, block_stop))
+                if allowed is not None:
+                    mask = np.isin(self.keys[block_start:block_stop], allowed)
+                    rows, distances = rows[mask], distances[mask]
+                rows, distances = _top_k(rows, distances, k)
+                rows_found.append(rows)
+                distances_found.append(distances)
+        rows = np.concatenate(rows_found) if rows_found else np.empty(0, dtype=np.int64)
+        distances = np.concatenate(distances_found) if distances_found else np.empty(0, dtype=np.float32)
+
+        if self.lists and allowed is not None and len(rows) < k:
+            # The probed lists hold too few matches of the filter: scan every matching row
+            rows = np.flatnonzero(np.isin(self.keys, allowed))
+            distances = self._distances(query, rows)
+        rows, distances = _top_k(rows, distances, k)
+        return np.asarray(self.keys[rows]), np.maximum(distances + query @ query, 0.0)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    VectorStore over a memory-mapped NumPy index (flat or IVF, float32 or int8).
+
+    Args:
+        path: Index directory; it is created on first write.
+        embedding_function: Embeddings used for texts and queries.
+        lists: IVF lists written by the next write; 0 writes a flat (exact) index.
+        probes: IVF lists scanned per query.
+        int8: Quantize the vectors written by the next write to int8.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Optional[Embeddings] = None,
+        lists: int = 0,
+        probes: int = 8,
+        int8: bool = False,
+    ):
+        self.path = path
+        self._embedding_function = embedding_function
+        self.lists = lists
+        self.probes = probes
+        self.int8 = int8
+        self._lock = threading.RLock()
+        self._index: Optional[VectorIndex] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        Path(path).mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(path, DOCUMENTS_FILE), check_same_thread=False)
+        self._connection.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                key INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT UNIQUE NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            """
+        )
+        # Chunks are looked up by source (incremental ingestion, source filters)
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS documents_source ON documents ({_json_field('source')})")
+        self._connection.commit()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding_function
+
+    def index(self) -> Optional[VectorIndex]:
+        """The live generation, reopened when another process (or a write) swapped CURRENT."""
+        current_path = os.path.join(self.path, CURRENT_FILE)
+        try:
+            stat = os.stat(current_path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        if signature != self._signature:
+            with self._lock:
+                with open(current_path, encoding="utf-8") as current_file:
+                    name = current_file.read().strip()
+                self._index = VectorIndex(os.path.join(self.path, name))
+                self._signature = signature
+        return self._index
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    # Writes
+
+    def _upsert_rows(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> np.ndarray:
+        self._connection.executemany(
+            "INSERT INTO documents (id, text, metadata) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET text = excluded.text, metadata = excluded.metadata",
+            [(chunk_id, text, json.dumps(metadata or {})) for chunk_id, text, metadata in zip(ids, texts, metadatas)],
+        )
+        return self._keys_of(ids)
+
+    def _keys_of(self, ids: Sequence[str]) -> np.ndarray:
+        """Row keys of ids, in the order of ids (ids not stored are left out)."""
+        keys: Dict[str, int] = {}
+        for batch in _batches(list(ids)):
+            keys.update(
+                self._connection.execute(
+                    f"SELECT id, key FROM documents WHERE id IN ({_placeholders(batch)})", batch
+                ).fetchall()
+            )
+        return np.asarray([keys[chunk_id] for chunk_id in ids if chunk_id in keys], dtype=np.int64)
+
+    def _next_generation(self) -> str:
+        numbers = [int(name[4:]) for name in os.listdir(self.path) if name.startswith("gen-") and name[4:].isdigit()]
+        return f"gen-{max(numbers, default=0) + 1:06d}"
+
+    def _write(self, batches: Iterable[VectorBatch], delete_ids: Sequence[str] = ()) -> int:
+        """
+        Upsert the chunks of batches and delete delete_ids, as one new generation.
+
+        The vectors of batches and the kept rows of the live generation are staged in a raw
+        float32 file, so only one batch and one block are in memory at a time.
+        """
+        with self._lock:
+            current = self.index()
+            name = self._next_generation()
+            staging_path = os.path.join(self.path, f"{name}.staging")
+            written, seen = [], set()
+            dimension = current.dimension if current is not None else None
+            try:
+                with open(staging_path, "wb") as staging:
+                    for ids, texts, metadatas, vectors in batches:
+                        vectors = np.asarray(vectors, dtype=np.float32)
+                        if len(ids) == 0:
+                            continue
+                        dimension = dimension or vectors.shape[1]
+                        if vectors.shape != (len(ids), dimension):
+                            raise ValueError(f"Expected {len(ids)} vectors of dimension {dimension}, got {vectors.shape}")
+                        if seen.intersection(ids) or len(set(ids)) != len(ids):
+                            raise ValueError("Duplicate ids in one write")
+                        seen.update(ids)
+                        written.append(self._upsert_rows(ids, texts, metadatas))
+                        staging.write(vectors.tobytes())
+
+                    new_keys = np.concatenate(written) if written else np.empty(0, dtype=np.int64)
+                    delete_keys = self._keys_of(delete_ids)
+                    kept_rows = np.empty(0, dtype=np.int64)
+                    if current is not None:
+                        replaced = np.concatenate([new_keys, delete_keys])
+                        kept_rows = np.flatnonzero(~np.isin(current.keys, replaced))
+                        for start in range(0, len(kept_rows), _BLOCK_ROWS):
+                            staging.write(current.vectors_at(kept_rows[start:start + _BLOCK_ROWS]).tobytes())
+                if dimension is None:
+                    self._connection.commit()
+                    return 0
+
+                rows = len(new_keys) + len(kept_rows)
+                vectors = (
+                    np.memmap(staging_path, dtype=np.float32, mode="r", shape=(rows, dimension))
+                    if rows
+                    else np.empty((0, dimension), dtype=np.float32)
+                )
+                kept_keys = np.asarray(current.keys[kept_rows]) if current is not None else np.empty(0, dtype=np.int64)
+                keys = np.concatenate([new_keys, kept_keys])
+                write_generation(os.path.join(self.path, name), keys, vectors, self.lists, self.int8)
+                del vectors
+                # Rows must exist before the generation that references them goes live
+                self._connection.commit()
+                current_path = os.path.join(self.path, CURRENT_FILE)
+                with open(f"{current_path}.tmp", "w", encoding="utf-8") as current_file:
+                    current_file.write(name)
+                os.replace(f"{current_path}.tmp", current_path)
+            except BaseException:
+                self._connection.rollback()
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                raise
+            finally:
+                if os.path.exists(staging_path):
+                    os.remove(staging_path)
+
+            for batch in _batches([int(key) for key in delete_keys]):
+                self._connection.execute(f"DELETE FROM documents WHERE key IN ({_placeholders(batch)})", batch)
+            self._connection.commit()
+            self._remove_old_generations(name)
+            return len(new_keys)
+
+    def _remove_old_generations(self, live: str) -> None:
+        generations = sorted(name for name in os.listdir(self.path) if name.startswith("gen-") and name != live)
+        for name in generations[: max(len(generations) - (_GENERATIONS_KEPT - 1), 0)]:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def add_batches(self, batches: Iterable[VectorBatch], delete_ids: Sequence[str] = ()) -> int:
+        """
+        Upsert already embedded chunks, batch by batch, and delete delete_ids, as one generation
+        (see export_chroma() and ingestion.ingest()); returns how many chunks were written.
+
+        delete_ids is only read once batches is exhausted, so a streaming writer can fill it while
+        it produces the batches.
+        """
+        return self._write(batches, delete_ids)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Embed texts and upsert them under ids (random ids when None)."""
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        if self._embedding_function is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to add texts")
+        vectors = np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32)
+        self._write([(ids, texts, metadatas, vectors)])
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids:
+            self._write([], delete_ids=ids)
+        return True
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: str = "./.vector_index",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    # Reads
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, Any]:
+        """Stored chunks, in the shape of Chroma's get(): ids plus the fields in include."""
+        condition, params = where_sql(where) if where else ("1", [])
+        query = f"SELECT key, id, text, metadata FROM documents WHERE {condition}"
+        with self._lock:
+            if ids is None:
+                rows = self._connection.execute(
+                    f"{query} ORDER BY key LIMIT ? OFFSET ?", [*params, -1 if limit is None else limit, offset or 0]
+                ).fetchall()
+            else:
+                rows = []
+                for batch in _batches(list(ids)):
+                    rows += self._connection.execute(
+                        f"{query} AND id IN ({_placeholders(batch)})", [*params, *batch]
+                    ).fetchall()
+                rows.sort()
+                rows = rows[offset or 0:][:limit]
+
+        result: Dict[str, Any] = {"ids": [row[1] for row in rows], "embeddings": None, "documents": None, "metadatas": None}
+        if "documents" in include:
+            result["documents"] = [row[2] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[3]) for row in rows]
+        if "embeddings" in include:
+            index = self.index()
+            if index is None:
+                result["embeddings"] = np.empty((len(rows), 0), dtype=np.float32)
+            else:
+                positions = index.rows_of([row[0] for row in rows])
+                if (positions < 0).any():
+                    # Rows written after this generation went live (a concurrent write) have no vector yet
+                    keep = positions >= 0
+                    positions = positions[keep]
+                    for field in ("ids", "documents", "metadatas"):
+                        if result[field] is not None:
+                            result[field] = [value for value, kept in zip(result[field], keep) if kept]
+                result["embeddings"] = index.vectors_at(positions)
+        return result
+
+    def _allowed_keys(self, where: Dict[str, Any]) -> np.ndarray:
+        condition, params = where_sql(where)
+        with self._lock:
+            keys = self._connection.execute(f"SELECT key FROM documents WHERE {condition}", params).fetchall()
+        return np.sort(np.asarray([key for (key,) in keys], dtype=np.int64))
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: Sequence[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Documents nearest to embedding with their squared L2 distance, closest first."""
+        index = self.index()
+        if index is None or not len(index):
+            return []
+        allowed = self._allowed_keys(filter) if filter else None
+        keys, distances = index.search(embedding, k, allowed=allowed, probes=self.probes)
+        if not len(keys):
+            return []
+        with self._lock:
+            stored = {}
+            for batch in _batches([int(key) for key in keys]):
+                stored.update(
+                    (key, (text, metadata))
+                    for key, text, metadata in self._connection.execute(
+                        f"SELECT key, text, metadata FROM documents WHERE key IN ({_placeholders(batch)})", batch
+                    )
+                )
+        # Keys deleted since this generation was opened are skipped
+        return [
+            (Document(page_content=stored[key][0], metadata=json.loads(stored[key][1])), float(distance))
+            for key, distance in zip(keys.tolist(), distances.tolist())
+            if key in stored
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embed_query(query), k, filter=filter)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = await self._require_embeddings().aembed_query(query)
+        return await run_in_executor(None, self.similarity_search_by_vector_with_score, embedding, k, filter)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter=filter)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k, filter=filter)]
+
+    def _require_embeddings(self) -> Embeddings:
+        if self._embedding_function is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to search by text")
+        return self._embedding_function
+
+    def _embed_query(self, query: str) -> List[float]:
+        return self._require_embeddings().embed_query(query)
+
+    def _select_relevance_score_fn(self):
+        # Same conversion as Chroma's default l2 space, so relevance scores are comparable
+        return self._euclidean_relevance_score_fn
+
+    def stats(self) -> Dict[str, Any]:
+        index = self.index()
+        if index is None:
+            return {"chunks": self.count(), "vectors": 0}
+        files = [os.path.join(index.directory, name) for name in os.listdir(index.directory)]
+        return {
+            "chunks": self.count(),
+            "vectors": len(index),
+            "dimension": index.dimension,
+            "int8": index.int8,
+            "lists": index.lists,
+            "generation": os.path.basename(index.directory),
+            "bytes": sum(os.path.getsize(path) for path in files),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def export_chroma(collection: Any, target: NumpyVectorStore, batch_size: int = 5_000) -> int:
+    """
+    Copy every chunk of a Chroma collection into target, embeddings included (nothing is re-embedded).
+
+    Args:
+        collection: chromadb Collection, or the LangChain Chroma store wrapping it.
+        target: Store to upsert the chunks into.
+        batch_size: Chunks read from Chroma per call.
+    """
+    collection = getattr(collection, "_collection", collection)
+    total = collection.count()
+
+    def batches() -> Iterable[VectorBatch]:
+        for offset in range(0, total, batch_size):
+            stored = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            yield (
+                stored["ids"],
+                stored["documents"],
+                [metadata or {} for metadata in stored["metadatas"]],
+                np.asarray(stored["embeddings"], dtype=np.float32),
+            )
+
+    return target.add_batches(batches())
+
+
+def main() -> None:
+    from graph.config import get_settings
+    from graph.shards import get_shards
+    from ingestion import PERSIST_DIRECTORY, shard_directory
+    from logger import log_info, log_success, log_warning
+
+    parser = argparse.ArgumentParser(description="Índice vectorial NumPy (memoria mapeada)")
+    parser.add_argument("command", choices=["export", "info"], help="export: migrar las colecciones de Chroma; info: estado de los índices")
+    parser.add_argument("--batch-size", type=int, default=5_000, help="Fragmentos leídos de Chroma por llamada")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    for shard in get_shards():
+        path = shard_directory(settings.vector_index_path, shard.name)
+        store = NumpyVectorStore(
+            path, lists=settings.vector_index_lists, probes=settings.vector_index_probes, int8=settings.vector_index_int8
+        )
+        if args.command == "info":
+            print(json.dumps({"shard": shard.name, "path": path, **store.stats()}, indent=2))
+            continue
+        import chromadb
+        from chromadb.errors import NotFoundError
+
+        try:
+            collection = chromadb.PersistentClient(path=PERSIST_DIRECTORY).get_collection(shard.name)
+        except NotFoundError:
+            log_warning(f"---La colección {shard.name} no existe en {PERSIST_DIRECTORY}, se omite---")
+            continue
+        log_info(f"---Exportando {collection.count()} fragmentos de {shard.name} a {path}")
+        exported = export_chroma(collection, store, batch_size=args.batch_size)
+        log_success(f"Exportados {exported} fragmentos: {store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,77 @@
 """
 This module handles the ingestion and preprocessing of web documents for use in a retrieval-augmented generation (RAG) pipeline.
-It loads documents from specified URLs, splits them into manageable chunks, and prepares a retriever using a persistent Chroma vector store.
+It loads documents from specified URLs, splits them into manageable chunks, and prepares a retriever using a persistent Chroma vector store
+(or the memory-mapped NumPy index of graph/vector_index.py).
+
+Ingestion is incremental: a manifest stored next to the Chroma collection remembers, for every
+source, its HTTP validators (ETag / Last-Modified), the hash of its body and the ids of its chunks.
+Unchanged sources are skipped, and for changed ones only new chunks are embedded and chunks that
+disappeared are deleted. Chunk ids are derived from the source and the chunk content, so they are
+stable across runs. The BM25 index used by hybrid retrieval receives the same additions and
+deletions, and the topic centroids used by the embedding router are recomputed when the collection
+changed. Run `python ingestion.py` to refresh the collection.
+
+Sources are URLs, sitemaps (the pages they list), local directories and HTML dumps (the documents
+under them), see expand_sources(). ingest() streams them through a pipeline of fetch, parse and
+split workers, batched embedding workers and bulk upserts joined by bounded queues, so memory stays
+bounded however large the corpus is, and logs its progress and throughput.
+
+Sources can be split into shards, named collections with their own topic descriptor (see
+graph/shards.py); each shard has its own manifest, BM25 index and topic centroids under
+shard_directory(). Without a shards file there is one shard, rag-chroma, holding the urls below.
+
+Importing this module does no work: the documents are only downloaded when the module is run as a
+script, and the vector store and retriever are opened on first use.
 """
 
+import argparse
+import hashlib
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+
 from dotenv import load_dotenv
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.vectorstores import VectorStore
 
-from logger import log_info
+from graph.bm25 import BM25Index
+from graph.clients import get_http_client
+from graph.config import get_settings
+from graph.embedding_cache import get_embeddings
+from graph.lazy import LazyRunnable
+from graph.local_router import compute_topic_centroids, save_topic_centroids
+from graph.retrieval import RELEVANCE_SCORE_KEY, SHARD_KEY
+from logger import log_info, log_success, log_warning
 
 # Load environment variables (e.g., API keys)
 load_dotenv()
 
+COLLECTION_NAME = "rag-chroma"
+PERSIST_DIRECTORY = "./.chroma"
+MANIFEST_FILE = "ingestion_manifest.sqlite3"
+# JSON manifest written before the manifest moved to SQLite; imported on the first run
+LEGACY_MANIFEST_FILE = "ingestion_manifest.json"
+BM25_INDEX_FILE = "bm25_index.sqlite3"
+TOPIC_CENTROIDS_FILE = "topic_centroids.json"
+MANIFEST_PATH = os.path.join(PERSIST_DIRECTORY, MANIFEST_FILE)
+BM25_INDEX_PATH = os.path.join(PERSIST_DIRECTORY, BM25_INDEX_FILE)
+TOPIC_CENTROIDS_PATH = os.path.join(PERSIST_DIRECTORY, TOPIC_CENTROIDS_FILE)
+
+# Files of a local directory or HTML dump that are ingested
+DOCUMENT_SUFFIXES = (".html", ".htm", ".md", ".txt")
+
 # List of URLs to ingest
 urls = [
     "https://lilianweng.github.io/posts/2023-06-23-agent/",
@@ -22,30 +79,898 @@ urls = [
     "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
 ]
 
-# Load documents from each URL using WebBaseLoader
-docs = [WebBaseLoader(url).load() for url in urls]
-# Flatten the list of lists into a single list of documents
-docs_list = [item for sublist in docs for item in sublist]
-
-# Initialize a text splitter to chunk documents for embedding
-text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-    chunk_size=250,
-    chunk_overlap=50
-)
-
-# Split documents into smaller chunks
-doc_splits = text_splitter.split_documents(docs_list)
-
-#vectorstore = Chroma.from_documents(
-#    documents=doc_splits,
-#    collection_name="rag-chroma",
-#    embedding=OpenAIEmbeddings(),
-#    persist_directory="./.chroma",
-#)
-
-# Prepare a retriever using a persistent Chroma vector store
-retriever_vector = Chroma(
-    collection_name="rag-chroma",
-    embedding_function=OpenAIEmbeddings(),
-    persist_directory="./.chroma",
-).as_retriever()
\ No newline at end of file
+
+def load_documents(urls: List[str]) -> List[Document]:
+    from langchain_community.document_loaders import WebBaseLoader
+
+    # Load documents from each URL using WebBaseLoader
+    docs = [WebBaseLoader(url).load() for url in urls]
+    # Flatten the list of lists into a single list of documents
+    return [item for sublist in docs for item in sublist]
+
+
+def split_documents(docs_list: List[Document]) -> List[Document]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    # Initialize a text splitter to chunk documents for embedding
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=250,
+        chunk_overlap=50
+    )
+
+    # Split documents into smaller chunks
+    return text_splitter.split_documents(docs_list)
+
+
+def shard_directory(root: str, collection: str = COLLECTION_NAME) -> str:
+    """
+    Directory of the files of a collection under root (PERSIST_DIRECTORY or VECTOR_INDEX_PATH):
+    root itself for rag-chroma, as before shards existed, and root/shards/<collection> otherwise.
+    """
+    return root if collection == COLLECTION_NAME else os.path.join(root, "shards", collection)
+
+
+@lru_cache(maxsize=None)
+def get_vectorstore(collection: str = COLLECTION_NAME) -> VectorStore:
+    """
+    Open the vector store of a collection (once per process) with the cached embeddings: the
+    persistent Chroma collection, or the memory-mapped NumPy index when VECTOR_STORE_BACKEND is "numpy".
+    """
+    settings = get_settings()
+    if settings.vector_store_backend == "numpy":
+        from graph.vector_index import NumpyVectorStore
+
+        return NumpyVectorStore(
+            shard_directory(settings.vector_index_path, collection),
+            get_embeddings(),
+            lists=settings.vector_index_lists,
+            probes=settings.vector_index_probes,
+            int8=settings.vector_index_int8,
+        )
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        collection_name=collection,
+        embedding_function=get_embeddings(),
+        persist_directory=PERSIST_DIRECTORY,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_lexical_index(collection: str = COLLECTION_NAME) -> BM25Index:
+    """Open the BM25 index stored next to the Chroma collection (once per process)."""
+    return BM25Index(os.path.join(shard_directory(PERSIST_DIRECTORY, collection), BM25_INDEX_FILE))
+
+
+def _with_relevance_scores(results: List[Tuple[Document, float]], collection: str) -> List[Document]:
+    return [
+        Document(
+            page_content=document.page_content,
+            metadata={**document.metadata, RELEVANCE_SCORE_KEY: score, SHARD_KEY: collection},
+        )
+        for document, score in results
+    ]
+
+
+def build_retriever(collection: str = COLLECTION_NAME) -> Runnable:
+    """
+    Prepare a retriever over the vector store (Chroma or the NumPy index, see get_vectorstore()).
+
+    Each returned document carries its relevance score (0 to 1, higher is closer) in
+    metadata["relevance_score"] so grading can skip the LLM for clear-cut chunks, and the name of
+    its collection in metadata["shard"]. Hybrid retrieval fetches more candidates so the fusion with
+    BM25 has something to re-rank.
+    """
+    settings = get_settings()
+    k = settings.retrieval_candidates if settings.retrieval_mode == "hybrid" else settings.retrieval_k
+    vectorstore = get_vectorstore(collection)
+
+    def search(query: str) -> List[Document]:
+        return _with_relevance_scores(vectorstore.similarity_search_with_relevance_scores(query, k=k), collection)
+
+    async def asearch(query: str) -> List[Document]:
+        return _with_relevance_scores(await vectorstore.asimilarity_search_with_relevance_scores(query, k=k), collection)
+
+    return RunnableLambda(search, afunc=asearch, name="retriever_vector")
+
+
+retriever_vector = LazyRunnable(build_retriever, name="retriever_vector")
+
+
+@lru_cache(maxsize=None)
+def shard_retriever(collection: str = COLLECTION_NAME) -> Runnable:
+    """Dense retriever of one shard, built on first use; the rag-chroma one is retriever_vector."""
+    if collection == COLLECTION_NAME:
+        return retriever_vector
+    return LazyRunnable(partial(build_retriever, collection), name="retriever_vector")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(source: str, chunks: List[Document]) -> List[str]:
+    """
+    Stable ids for the chunks of one source, derived from the source and the chunk text.
+
+    Repeated identical chunks within a source are told apart by their occurrence number.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        digest = content_hash(chunk.page_content)
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(content_hash(f"{source}\n{digest}\n{occurrence}"))
+    return ids
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a source; document is None when it did not change (HTTP 304, same file)."""
+
+    document: Optional[Document]
+    body_hash: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def _parse_html(html: str, source: str) -> Document:
+    """The text of an HTML page, with the metadata WebBaseLoader gives it."""
+    from bs4 import BeautifulSoup
+    from langchain_community.document_loaders.web_base import _build_metadata
+
+    soup = BeautifulSoup(html, "html.parser")
+    return Document(page_content=soup.get_text(), metadata=_build_metadata(soup, source))
+
+
+def fetch_source(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+    """Fetch a URL with a conditional GET and parse it the way WebBaseLoader does."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = get_http_client().get(url, headers=headers, follow_redirects=True)
+    if response.status_code == 304:
+        return FetchResult(document=None, etag=etag, last_modified=last_modified)
+    response.raise_for_status()
+
+    return FetchResult(
+        document=_parse_html(response.text, url),
+        body_hash=content_hash(response.text),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+def fetch_file(path: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+    """
+    Read a local document: HTML pages are parsed like fetched ones, other files are taken as text.
+
+    The size and modification time of the file play the role of the ETag, so unchanged files are
+    not even read.
+    """
+    status = os.stat(path)
+    version = f"{status.st_size}-{status.st_mtime_ns}"
+    if etag == version:
+        return FetchResult(document=None, etag=etag)
+    with open(path, encoding="utf-8", errors="replace") as document_file:
+        text = document_file.read()
+    if path.lower().endswith((".html", ".htm")):
+        document = _parse_html(text, path)
+    else:
+        document = Document(page_content=text, metadata={"source": path, "title": os.path.basename(path)})
+    return FetchResult(document=document, body_hash=content_hash(text), etag=version)
+
+
+def is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def fetch_document(source: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+    """Fetch a source of expand_sources(): a URL with a conditional GET, a file from disk."""
+    if is_url(source):
+        return fetch_source(source, etag=etag, last_modified=last_modified)
+    return fetch_file(source, etag=etag, last_modified=last_modified)
+
+
+def _sitemap_entries(data: bytes) -> Iterator[Tuple[str, str]]:
+    """(kind, location) of the entries of a sitemap: kind is "sitemap" in a sitemap index, "url" otherwise."""
+    for _, element in ElementTree.iterparse(io.BytesIO(data)):
+        kind = element.tag.rsplit("}", 1)[-1]
+        if kind not in ("url", "sitemap"):
+            continue
+        for child in element:
+            if child.tag.rsplit("}", 1)[-1] == "loc" and child.text and child.text.strip():
+                yield kind, child.text.strip()
+        # Parsed entries are dropped, so a large sitemap is not kept as a tree
+        element.clear()
+
+
+def iter_sitemap(location: str) -> Iterator[str]:
+    """Pages listed by a sitemap (a URL or a local file), following sitemap indexes."""
+    if is_url(location):
+        response = get_http_client().get(location, follow_redirects=True)
+        response.raise_for_status()
+        data = response.content
+    else:
+        data = Path(location).read_bytes()
+    for kind, entry in _sitemap_entries(data):
+        if kind == "sitemap":
+            yield from iter_sitemap(entry)
+        else:
+            yield entry
+
+
+def iter_directory(directory: str) -> Iterator[str]:
+    """Documents under a directory (an HTML dump such as a wget mirror, or Markdown and text files), in a stable order."""
+    for root, directories, names in os.walk(directory):
+        directories.sort()
+        for name in sorted(names):
+            if name.lower().endswith(DOCUMENT_SUFFIXES):
+                yield os.path.join(root, name)
+
+
+def expand_sources(specs: Iterable[str]) -> Iterator[str]:
+    """
+    The sources listed by specs (the sources of a shard), produced lazily:
+
+    - a URL or a file ending in .xml is a sitemap and stands for the pages it lists,
+    - a directory stands for the documents under it (DOCUMENT_SUFFIXES),
+    - any other URL or file is a source itself.
+    """
+    for spec in specs:
+        if spec.lower().endswith(".xml"):
+            yield from iter_sitemap(spec)
+        elif not is_url(spec) and os.path.isdir(spec):
+            yield from iter_directory(spec)
+        else:
+            yield spec
+
+
+class IngestionManifest:
+    """
+    JSON record of what has been ingested, per source.
+
+    Each source entry keeps the HTTP validators, the body hash and the ids of its chunks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sources: MutableMapping[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as manifest_file:
+                self.sources = json.load(manifest_file).get("sources", {})
+
+    def save(self) -> None:
+        """Write the manifest atomically so an interrupted run never leaves it half written."""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"version": 1, "sources": dict(self.sources)}, manifest_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+
+class _ManifestEntries(MutableMapping):
+    """Source entries of a SqliteIngestionManifest, read from and written to its database."""
+
+    def __init__(self, connection: sqlite3.Connection, lock: threading.Lock):
+        self._connection = connection
+        self._lock = lock
+
+    def __getitem__(self, source: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._connection.execute("SELECT entry FROM sources WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            raise KeyError(source)
+        return json.loads(row[0])
+
+    def __setitem__(self, source: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sources (source, entry) VALUES (?, ?)", (source, json.dumps(entry))
+            )
+
+    def __delitem__(self, source: str) -> None:
+        with self._lock:
+            deleted = self._connection.execute("DELETE FROM sources WHERE source = ?", (source,)).rowcount
+        if not deleted:
+            raise KeyError(source)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            sources = [row[0] for row in self._connection.execute("SELECT source FROM sources ORDER BY source")]
+        return iter(sources)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+
+
+class SqliteIngestionManifest(IngestionManifest):
+    """
+    IngestionManifest stored in SQLite, for corpora too large to hold the manifest in memory.
+
+    Entries are read and written one source at a time and save() commits the changes since the
+    previous save, instead of rewriting the whole file. A JSON manifest at legacy_path (written
+    before the manifest moved to SQLite) is imported when the database is created.
+    """
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        self._connection.commit()
+        self.sources = _ManifestEntries(self._connection, self._lock)
+        if created and legacy_path and os.path.exists(legacy_path):
+            self.sources.update(IngestionManifest(legacy_path).sources)
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+@dataclass
+class IngestionStats:
+    sources_skipped: int = 0
+    sources_updated: int = 0
+    sources_removed: int = 0
+    sources_failed: int = 0
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    chunks_unchanged: int = 0
+    updated_sources: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    peak_memory_mb: float = 0.0
+
+
+def _stored_chunk_ids(vectorstore: VectorStore, source: str) -> List[str]:
+    """Ids already stored for a source, including chunks written before the manifest existed."""
+    get = getattr(vectorstore, "get", None)
+    if get is None:
+        return []
+    return get(where={"source": source}, include=[])["ids"]
+
+
+def sync_lexical_index(vectorstore: VectorStore, lexical_index: BM25Index, page_size: int = 1000) -> int:
+    """
+    Make the BM25 index hold exactly the chunks of the collection.
+
+    Only the difference is applied, so this is cheap once the index exists; it fills the index the
+    first time and repairs it if a run was interrupted. Both sides are compared page_size ids at a
+    time, so memory stays bounded however large the collection is. Returns the number of chunks changed.
+    """
+    changed = 0
+    offset = 0
+    while True:
+        page = vectorstore.get(limit=page_size, offset=offset, include=[])["ids"]
+        if not page:
+            break
+        offset += len(page)
+        missing_ids = lexical_index.missing(page)
+        if missing_ids:
+            stored = vectorstore.get(ids=missing_ids, include=["documents", "metadatas"])
+            lexical_index.add(
+                stored["ids"],
+                [
+                    Document(page_content=text, metadata=metadata or {})
+                    for text, metadata in zip(stored["documents"], stored["metadatas"])
+                ],
+            )
+            changed += len(missing_ids)
+
+    after = ""
+    while True:
+        page = lexical_index.ids_after(after, page_size)
+        if not page:
+            break
+        after = page[-1]
+        stored_ids = set(vectorstore.get(ids=page, include=[])["ids"])
+        extra_ids = [chunk_id for chunk_id in page if chunk_id not in stored_ids]
+        if extra_ids:
+            lexical_index.delete(extra_ids)
+            changed += len(extra_ids)
+    return changed
+
+
+def _peak_memory_mb() -> float:
+    """Peak resident memory of the process in MB (0 where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Ends the output of a stage in the queue of the next one
+_DONE = object()
+# Seconds a blocked put or get waits before checking whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+
+class _Stopped(Exception):
+    """Raised in a stage when another one failed and the pipeline is shutting down."""
+
+
+@dataclass
+class _SourceWork:
+    """What the fetch stage found for one source; the writer records it once its new chunks are written."""
+
+    source: str
+    entry: Dict[str, Any]
+    changed: bool = False
+    new_entry: Optional[Dict[str, Any]] = None
+    ids: List[str] = field(default_factory=list)
+    new_chunks: List[Tuple[str, Document]] = field(default_factory=list)
+    added: int = 0
+    pending: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class _ChunkBatch:
+    """New chunks embedded and upserted together; vectors is None when the embed stage wrote them itself."""
+
+    ids: List[str] = field(default_factory=list)
+    chunks: List[Document] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    vectors: Optional[List[List[float]]] = None
+
+
+def _is_numpy_store(vectorstore: VectorStore) -> bool:
+    from graph.vector_index import NumpyVectorStore
+
+    return isinstance(vectorstore, NumpyVectorStore)
+
+
+def _is_chroma(vectorstore: VectorStore) -> bool:
+    from langchain_community.vectorstores import Chroma
+
+    return isinstance(vectorstore, Chroma)
+
+
+def _chroma_collection(vectorstore: VectorStore) -> Any:
+    """Return the chromadb Collection behind a LangChain Chroma store."""
+    if not _is_chroma(vectorstore):
+        raise TypeError(f"Expected a Chroma vectorstore, got {type(vectorstore).__name__}")
+    # The only access to the wrapper's private collection: Chroma.add_texts() is the public way to upsert,
+    # but it embeds the texts itself and cannot take the vectors the pipeline already computed
+    return vectorstore._collection
+
+
+class _Pipeline:
+    """
+    Threads and bounded queues of one ingest() run:
+
+        sources -> feeder -> fetch workers (fetch, parse, split) -> batcher -> embed workers -> writer
+
+    Every queue holds at most queue_size items, so a slow stage blocks the ones before it instead
+    of letting pages and chunks pile up in memory. The writer is the thread that called ingest();
+    it consumes written() and owns the manifest and the BM25 index updates.
+    """
+
+    def __init__(
+        self,
+        vectorstore: VectorStore,
+        manifest: IngestionManifest,
+        fetch: Callable[..., FetchResult],
+        split: Callable[[List[Document]], List[Document]],
+        force: bool,
+        lexical_index: Optional[BM25Index],
+        fetch_workers: int,
+        embed_workers: int,
+        batch_size: int,
+        queue_size: int,
+        progress_seconds: float,
+    ):
+        self.vectorstore = vectorstore
+        self.manifest = manifest
+        self.fetch = fetch
+        self.split = split
+        self.force = force
+        self.lexical_index = lexical_index
+        self.fetch_workers = max(fetch_workers, 1)
+        self.embed_workers = max(embed_workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.progress_seconds = progress_seconds
+        # Stores written by the writer get embeddings; the others embed in add_documents
+        bulk = _is_numpy_store(vectorstore) or _is_chroma(vectorstore)
+        self.embeddings = vectorstore.embeddings if bulk else None
+
+        self.sources_queue: queue.Queue = queue.Queue(max(queue_size, 1))
+        self.work_queue: queue.Queue = queue.Queue(max(queue_size, 1))
+        self.embed_queue: queue.Queue = queue.Queue(max(queue_size, 1))
+        self.write_queue: queue.Queue = queue.Queue(max(queue_size, 1))
+        self.stop = threading.Event()
+        self.errors: List[BaseException] = []
+        self.threads: List[threading.Thread] = []
+
+        self.stats = IngestionStats()
+        # Names of the listed sources, to delete the ones no longer listed
+        self.seen: Set[str] = set()
+        self.pending: Dict[str, _SourceWork] = {}
+        # Chunk ids to delete at the next flush()
+        self.deleted: List[str] = []
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def _put(self, target: queue.Queue, item: Any) -> None:
+        while True:
+            if self.stop.is_set():
+                raise _Stopped()
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, source: queue.Queue) -> Any:
+        while True:
+            if self.stop.is_set():
+                raise self.errors[0] if self.errors else _Stopped()
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                pass
+
+    def _thread(self, name: str, target: Callable[..., None], *args: Any) -> None:
+        def run() -> None:
+            try:
+                target(*args)
+            except _Stopped:
+                pass
+            except BaseException as error:
+                self.errors.append(error)
+                self.stop.set()
+
+        thread = threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def start(self, sources: Iterable[str]) -> None:
+        self._thread("feed", self._feed, sources)
+        for number in range(self.fetch_workers):
+            self._thread(f"fetch-{number}", self._fetch)
+        self._thread("batch", self._batch)
+        for number in range(self.embed_workers):
+            self._thread(f"embed-{number}", self._embed)
+
+    def close(self) -> None:
+        """Stop the stages still running (after a failure) and wait for them."""
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def _feed(self, sources: Iterable[str]) -> None:
+        # Sources are produced lazily (a sitemap is only read when the queue has room)
+        for source in sources:
+            if source not in self.seen:
+                self.seen.add(source)
+                self._put(self.sources_queue, source)
+        for _ in range(self.fetch_workers):
+            self._put(self.sources_queue, _DONE)
+
+    def _fetch(self) -> None:
+        while True:
+            source = self._get(self.sources_queue)
+            if source is _DONE:
+                self._put(self.work_queue, _DONE)
+                return
+            self._put(self.work_queue, self._fetch_source(source))
+
+    def _fetch_source(self, source: str) -> _SourceWork:
+        entry = self.manifest.sources.get(source, {})
+        work = _SourceWork(source, entry)
+        try:
+            result = self.fetch(
+                source,
+                etag=None if self.force else entry.get("etag"),
+                last_modified=None if self.force else entry.get("last_modified"),
+            )
+        except Exception as error:
+            # One unreachable page must not stop a crawl; its chunks stay as they were
+            work.error = f"{type(error).__name__}: {error}"
+            return work
+        if result.document is None or (not self.force and result.body_hash == entry.get("body_hash")):
+            if result.document is not None:
+                work.new_entry = {**entry, "etag": result.etag, "last_modified": result.last_modified}
+            return work
+
+        chunks = self.split([result.document])
+        work.changed = True
+        work.ids = chunk_ids(source, chunks)
+        for chunk, chunk_id in zip(chunks, work.ids):
+            chunk.metadata["chunk_id"] = chunk_id
+        known_ids = set(entry.get("chunk_ids", []))
+        work.new_chunks = [(chunk_id, chunk) for chunk_id, chunk in zip(work.ids, chunks) if chunk_id not in known_ids]
+        work.new_entry = {
+            "etag": result.etag,
+            "last_modified": result.last_modified,
+            "body_hash": result.body_hash,
+            "chunk_ids": work.ids,
+        }
+        return work
+
+    def _batch(self) -> None:
+        batch = _ChunkBatch()
+        running = self.fetch_workers
+        while running:
+            work = self._get(self.work_queue)
+            if work is _DONE:
+                running -= 1
+                continue
+            new_chunks, work.new_chunks = work.new_chunks, []
+            work.added = work.pending = len(new_chunks)
+            # The writer hears of a source before any of its chunks
+            self._put(self.write_queue, work)
+            for chunk_id, chunk in new_chunks:
+                batch.ids.append(chunk_id)
+                batch.chunks.append(chunk)
+                batch.sources.append(work.source)
+                if len(batch.ids) >= self.batch_size:
+                    self._put(self.embed_queue, batch)
+                    batch = _ChunkBatch()
+        if batch.ids:
+            self._put(self.embed_queue, batch)
+        for _ in range(self.embed_workers):
+            self._put(self.embed_queue, _DONE)
+
+    def _embed(self) -> None:
+        while True:
+            batch = self._get(self.embed_queue)
+            if batch is _DONE:
+                self._put(self.write_queue, _DONE)
+                return
+            if self.embeddings is not None:
+                batch.vectors = self.embeddings.embed_documents([chunk.page_content for chunk in batch.chunks])
+            else:
+                self.vectorstore.add_documents(batch.chunks, ids=batch.ids)
+            self._put(self.write_queue, batch)
+
+    def written(self) -> Iterator[_ChunkBatch]:
+        """
+        Embedded batches, in the writer thread, until every stage is done.
+
+        The consumer writes each batch before asking for the next one, so when the generator
+        resumes the sources whose chunks are all written can be recorded. Sources no longer
+        listed are removed at the end.
+        """
+        running = self.embed_workers
+        while running:
+            item = self._get(self.write_queue)
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, _SourceWork):
+                self._register(item)
+            else:
+                yield item
+                self._written(item)
+            self._report()
+        self._remove_unlisted()
+
+    def _register(self, work: _SourceWork) -> None:
+        if work.error is not None:
+            log_warning(f"---No se pudo obtener {work.source}: {work.error}")
+            self.stats.sources_failed += 1
+        elif not work.changed:
+            log_info(f"---Sin cambios: {work.source}")
+            self.stats.sources_skipped += 1
+            self.stats.chunks_unchanged += len(work.entry.get("chunk_ids", []))
+            if work.new_entry is not None:
+                self.manifest.sources[work.source] = work.new_entry
+        else:
+            self.pending[work.source] = work
+            if not work.pending:
+                self._record(work)
+
+    def _written(self, batch: _ChunkBatch) -> None:
+        if self.lexical_index is not None:
+            self.lexical_index.add(batch.ids, batch.chunks)
+        self.stats.chunks_added += len(batch.ids)
+        for source in batch.sources:
+            work = self.pending[source]
+            work.pending -= 1
+            if not work.pending:
+                self._record(work)
+
+    def _record(self, work: _SourceWork) -> None:
+        """Delete the stale chunks of a source whose new chunks are written, and update its manifest entry."""
+        del self.pending[work.source]
+        previous_ids = set(work.entry.get("chunk_ids", []))
+        if not work.entry:
+            # Only a source missing from the manifest can have chunks it does not list
+            previous_ids.update(_stored_chunk_ids(self.vectorstore, work.source))
+        stale_ids = sorted(previous_ids - set(work.ids))
+        self.deleted.extend(stale_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(stale_ids)
+        log_info(f"---Actualizado: {work.source} (+{work.added} / -{len(stale_ids)} fragmentos)")
+
+        self.stats.sources_updated += 1
+        self.stats.updated_sources.append(work.source)
+        self.stats.chunks_deleted += len(stale_ids)
+        self.stats.chunks_unchanged += len(work.ids) - work.added
+        self.manifest.sources[work.source] = work.new_entry
+
+    def _remove_unlisted(self) -> None:
+        for source in [source for source in self.manifest.sources if source not in self.seen]:
+            removed_ids = self.manifest.sources.pop(source).get("chunk_ids", [])
+            self.deleted.extend(removed_ids)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(removed_ids)
+            log_info(f"---Fuente eliminada: {source} (-{len(removed_ids)} fragmentos)")
+            self.stats.sources_removed += 1
+            self.stats.chunks_deleted += len(removed_ids)
+
+    def flush(self, delete: bool = True) -> None:
+        """Make what was written durable: delete the stale chunks collected so far, then save the manifest."""
+        if delete and self.deleted:
+            self.vectorstore.delete(ids=self.deleted)
+        self.deleted = []
+        self.manifest.save()
+
+    def _report(self) -> None:
+        now = time.perf_counter()
+        if now - self.reported < self.progress_seconds:
+            return
+        self.reported = now
+        elapsed = now - self.started
+        stats = self.stats
+        done = stats.sources_updated + stats.sources_skipped + stats.sources_failed
+        log_info(
+            f"---Progreso: {done} fuentes ({stats.sources_updated} actualizadas, {stats.sources_skipped} sin cambios, "
+            f"{stats.sources_failed} con error), {stats.chunks_added} fragmentos embebidos; "
+            f"{done / elapsed:.1f} fuentes/s, {stats.chunks_added / elapsed:.1f} fragmentos/s; "
+            f"colas {self.sources_queue.qsize()}/{self.work_queue.qsize()}/{self.embed_queue.qsize()}/"
+            f"{self.write_queue.qsize()}; memoria máx. {_peak_memory_mb():.0f} MB"
+        )
+
+    def finish(self) -> IngestionStats:
+        self.stats.seconds = time.perf_counter() - self.started
+        self.stats.peak_memory_mb = _peak_memory_mb()
+        return self.stats
+
+
+def _upsert_chroma(vectorstore: VectorStore, batch: _ChunkBatch) -> None:
+    """Write an embedded batch to Chroma in one call, without embedding it again."""
+    _chroma_collection(vectorstore).upsert(
+        ids=batch.ids,
+        embeddings=batch.vectors,
+        documents=[chunk.page_content for chunk in batch.chunks],
+        metadatas=[chunk.metadata for chunk in batch.chunks],
+    )
+
+
+def ingest(
+    sources: Iterable[str],
+    vectorstore: VectorStore,
+    manifest: IngestionManifest,
+    fetch: Callable[..., FetchResult] = fetch_document,
+    split: Callable[[List[Document]], List[Document]] = split_documents,
+    force: bool = False,
+    lexical_index: Optional[BM25Index] = None,
+    fetch_workers: Optional[int] = None,
+    embed_workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+) -> IngestionStats:
+    """
+    Bring the collection in line with sources, embedding only new or changed chunks.
+
+    Sources stream through a pipeline of threads joined by bounded queues: fetch_workers threads
+    fetch, parse and split them, new chunks are grouped into batches of batch_size that
+    embed_workers threads embed, and this thread upserts each batch in bulk. Only a few sources and
+    batches per stage are in memory at once, however many sources there are; a progress line with
+    the throughput is logged every INGEST_PROGRESS_SECONDS.
+
+    Args:
+        sources: Sources that should be in the collection (see expand_sources(); it may be a
+            generator); chunks of any other source are deleted.
+        vectorstore: Collection to update (chunks are upserted with stable ids). Chroma and the
+            NumPy index receive embedded batches; other stores embed in add_documents.
+        manifest: Record of previous runs; it is saved whenever the written chunks are durable
+            (after each batch, or at the end for the NumPy index, which writes one generation per run).
+        fetch: Function returning the FetchResult of a source given its stored validators; a source
+            whose fetch fails is counted in sources_failed and left as it was.
+        split: Function splitting the source documents into chunks.
+        force: Ignore the stored validators and body hashes and re-check every chunk.
+        lexical_index: BM25 index kept in sync with the collection.
+        fetch_workers, embed_workers, batch_size, queue_size: Override the INGEST_* settings.
+    """
+    settings = get_settings()
+    if lexical_index is not None and hasattr(vectorstore, "get"):
+        synced = sync_lexical_index(vectorstore, lexical_index)
+        if synced:
+            log_info(f"---Índice BM25 sincronizado ({synced} fragmentos)")
+
+    pipeline = _Pipeline(
+        vectorstore,
+        manifest,
+        fetch,
+        split,
+        force,
+        lexical_index,
+        fetch_workers=fetch_workers or settings.ingest_fetch_workers,
+        embed_workers=embed_workers or settings.ingest_embed_workers,
+        batch_size=batch_size or settings.ingest_batch_size,
+        queue_size=queue_size or settings.ingest_queue_size,
+        progress_seconds=settings.ingest_progress_seconds,
+    )
+    pipeline.start(sources)
+    try:
+        if _is_numpy_store(vectorstore):
+            import numpy as np
+
+            # One new generation for the whole run, with the deletions collected while writing it
+            vectorstore.add_batches(
+                (
+                    (
+                        batch.ids,
+                        [chunk.page_content for chunk in batch.chunks],
+                        [chunk.metadata for chunk in batch.chunks],
+                        np.asarray(batch.vectors, dtype=np.float32),
+                    )
+                    for batch in pipeline.written()
+                ),
+                pipeline.deleted,
+            )
+            pipeline.flush(delete=False)
+        else:
+            for batch in pipeline.written():
+                if batch.vectors is not None:
+                    _upsert_chroma(vectorstore, batch)
+                pipeline.flush()
+            pipeline.flush()
+    finally:
+        pipeline.close()
+    return pipeline.finish()
+
+
+if __name__ == "__main__":
+    from graph.shards import get_shards
+
+    parser = argparse.ArgumentParser(description="Ingesta incremental de las fuentes de cada shard en su colección")
+    parser.add_argument("--force", action="store_true", help="Ignorar ETag/Last-Modified y hashes guardados")
+    parser.add_argument("--shard", action="append", help="Ingerir sólo este shard (se puede repetir; por defecto todos)")
+    args = parser.parse_args()
+
+    for shard in get_shards():
+        if args.shard and shard.name not in args.shard:
+            continue
+        directory = shard_directory(PERSIST_DIRECTORY, shard.name)
+        centroids_path = os.path.join(directory, TOPIC_CENTROIDS_FILE)
+        vectorstore = get_vectorstore(shard.name)
+        manifest = SqliteIngestionManifest(
+            os.path.join(directory, MANIFEST_FILE), legacy_path=os.path.join(directory, LEGACY_MANIFEST_FILE)
+        )
+        log_info(f"---Shard {shard.name}: {len(shard.sources)} fuentes")
+        stats = ingest(
+            expand_sources(shard.sources),
+            vectorstore,
+            manifest,
+            force=args.force,
+            lexical_index=get_lexical_index(shard.name),
+        )
+        manifest.close()
+        if stats.sources_updated or stats.sources_removed or not os.path.exists(centroids_path):
+            centroids = compute_topic_centroids(vectorstore)
+            save_topic_centroids(centroids_path, centroids)
+            log_info(f"---Centroides de temas actualizados ({len(centroids)} fuentes)")
+        log_success(
+            f"Ingesta de {shard.name} completa: {stats.sources_updated} fuentes actualizadas, "
+            f"{stats.sources_skipped} sin cambios, {stats.sources_removed} eliminadas, "
+            f"{stats.sources_failed} con error; {stats.chunks_added} fragmentos embebidos, "
+            f"{stats.chunks_deleted} eliminados, {stats.chunks_unchanged} sin cambios; "
+            f"{stats.seconds:.1f} s ({stats.chunks_added / max(stats.seconds, 1e-9):.1f} fragmentos/s), "
+            f"memoria máx. {stats.peak_memory_mb:.0f} MB"
+        )
@@ -1,3 +1,12 @@
+"""
+Console logging helpers.
+
+Each helper also hands the message to the telemetry layer (graph/telemetry.py), which attaches it
+to the running node or chain span when TELEMETRY_ENABLED is set and ignores it otherwise.
+"""
+from graph.telemetry import record_log
+
+
 # Color codes for better logging
 class Colors:
     PURPLE = "\033[95m"
@@ -14,26 +23,31 @@ class Colors:
 
 def log_info(message: str, color: str = Colors.CYAN):
     """Log info message with color"""
+    record_log("info", message)
     print(f"{color}ℹ️  {message}{Colors.END}")
 
 
 def log_success(message: str):
     """Log success message in green"""
+    record_log("success", message)
     print(f"{Colors.GREEN}✅ {message}{Colors.END}")
 
 
 def log_error(message: str):
     """Log error message in red"""
+    record_log("error", message)
     print(f"{Colors.RED}❌ {message}{Colors.END}")
 
 
 def log_warning(message: str):
     """Log warning message in yellow"""
+    record_log("warning", message)
     print(f"{Colors.YELLOW}⚠️  {message}{Colors.END}")
 
 
 def log_header(message: str):
     """Log header message with emphasis"""
+    record_log("header", message)
     print(f"\n{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}")
     print(f"{Colors.BOLD}{Colors.PURPLE}🚀 {message}{Colors.END}")
     print(f"{Colors.BOLD}{Colors.PURPLE}{'='*60}{Colors.END}\n")
@@ -1,22 +1,86 @@
+import argparse
+import sys
+import time
+
 from dotenv import load_dotenv
 
-from graph.graph import app
+from batch import run_batch
+from graph.config import get_settings
+from graph.graph import build_app
+from graph.streaming import stream_answer
 
 from logger import log_info, log_success, log_error, log_warning, log_header
 
 load_dotenv()
 
 
+def warn_if_degraded(state) -> None:
+    if state.get("degraded"):
+        log_warning(f"---🤖 AVISO: PRESUPUESTO AGOTADO ({state.get('degraded_reason')}), SE ENTREGA LA MEJOR RESPUESTA HASTA AHORA---")
+
+
+def run_streaming(app, question: str, config=None) -> None:
+    """Print the answer as it is generated and report the time to first token."""
+    started = time.perf_counter()
+    first_token = None
+    for event in stream_answer(app, question, config):
+        if event["event"] == "token":
+            if first_token is None:
+                first_token = time.perf_counter() - started
+                print("\n---🤖 RESPUESTA: ", end="")
+            sys.stdout.write(event["text"])
+            sys.stdout.flush()
+        elif event["event"] == "generation_end":
+            print("\n")
+        elif event["event"] == "verdict" and event["action"] == "retract":
+            log_warning(f"---🤖 LA RESPUESTA {event['attempt']} NO ATIENDE LA PREGUNTA, SE DESCARTA Y SE BUSCA EN LA WEB---")
+        elif event["event"] == "verdict" and event["action"] == "annotate":
+            log_error(f"---🤖 AVISO: LA RESPUESTA {event['attempt']} NO ESTÁ FUNDAMENTADA EN LAS FUENTES---")
+        elif event["event"] == "final":
+            total = time.perf_counter() - started
+            warn_if_degraded(event["state"])
+            if first_token is None:
+                log_success(f"---🤖 RESPUESTA: {event['state'].get('generation', '')}\n")
+            else:
+                log_info(f"Tiempo al primer token: {first_token:.2f}s | tiempo total: {total:.2f}s")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agente RAG que contesta preguntas fundamentadas en fuentes")
+    parser.add_argument("question", nargs="?", default="What is agent memory?", help="Pregunta a contestar")
+    parser.add_argument("--stream", action="store_true", help="Mostrar la respuesta conforme se genera")
+    parser.add_argument("--thread", help="Conversación a continuar (requiere CHECKPOINT_ENABLED=true)")
+    parser.add_argument("--batch", metavar="ARCHIVO", help="Contestar las preguntas de un archivo JSONL/CSV ('-' para stdin)")
+    parser.add_argument("--output", default="answers.jsonl", help="Archivo JSONL de respuestas del modo batch (se reanuda si existe)")
+    parser.add_argument("--concurrency", type=int, help="Preguntas simultáneas en modo batch (BATCH_CONCURRENCY por defecto)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Formato de --batch (por defecto según la extensión)")
+    args = parser.parse_args()
+
     log_header("🤖 Sistema de Agentes IA que contesta preguntas \n fundamentadas en fuentes de información internas o externas...")
 
+    app = build_app()
+    config = {"configurable": {"thread_id": args.thread}} if args.thread else None
+
+    if args.stream:
+        run_streaming(app, args.question, config)
+        sys.exit(0)
+
+    if args.batch:
+        concurrency = args.concurrency or get_settings().batch_concurrency
+        report = run_batch(app, args.batch, args.output, concurrency, args.format)
+        log_info(
+            f"Preguntas: {report.read} | duplicadas: {report.duplicates} | ya contestadas: {report.skipped} | "
+            f"contestadas: {report.answered} | fallidas: {report.failed} | {report.throughput:.2f} preguntas/s"
+        )
+        log_success(f"---🤖 RESPUESTAS EN {args.output}---")
+        sys.exit(1 if report.failed else 0)
+
     # 0 - This question cause the stage of Happy Path and inhouse docs
-    result = app.invoke(input={"question": "What is agent memory?"})
+    result = app.invoke(input={"question": args.question}, config=config)
 
     # 1 - This question cause the stage of Happy Path and inhouse docs with spanish translation
     #result = app.invoke(input={"question": "Qué me puedes decir de los agentes de inteligencia artificial?"})
-    
+
     # 2 - This question cause the stage of "not supported"
     #result = app.invoke(input={"question": "La empresa Red Nacional Ultima Milla parte de América Movil de México tiene inciativas de inteligencia artificaial?"})
 
@@ -30,5 +94,6 @@ if __name__ == "__main__":
     #result = app.invoke(input={"question": "Cómo termino el IPC de bolsa mexicana de valores el día de hoy?"})
 
     print("\n")
+    warn_if_degraded(result)
     log_success(f"---🤖 RESPUESTA: {result['generation']}\n")
     #print(result[-1].tool_calls[0]["args"]["answer"])
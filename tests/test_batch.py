@@ -0,0 +1,118 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from batch import read_questions, run_batch
+
+
+class FakeApp:
+    """Answers every question; fails the ones listed in failing."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.asked: List[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, input: Dict[str, Any], config: Dict[str, Any] = None) -> Dict[str, Any]:
+        question = input["question"]
+        self.asked.append(question)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if question in self.failing:
+            raise RuntimeError("rate limited")
+        return {"question": question, "generation": f"answer to {question}", "generation_grade": "useful"}
+
+
+def read_output(path) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def read_records(path) -> List[Dict[str, Any]]:
+    """The complete records of path, skipping lines an interrupted run cut short."""
+    records = []
+    for line in path.read_bytes().decode("utf-8", errors="replace").splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return records
+
+
+def test_reads_jsonl_and_csv_and_drops_duplicates(tmp_path):
+    jsonl = tmp_path / "questions.jsonl"
+    jsonl.write_text(
+        '{"id": 1, "question": "What is agent memory?"}\n"what is agent  memory"\nHow do agents plan?\n\n',
+        encoding="utf-8",
+    )
+    questions, duplicates = read_questions(str(jsonl))
+    assert [(q.id, q.question) for q in questions] == [("1", "What is agent memory?"), (None, "How do agents plan?")]
+    assert duplicates == 1
+
+    table = tmp_path / "questions.csv"
+    table.write_text('id,question\na,"Is it safe, really?"\nb,How do agents plan?\n', encoding="utf-8")
+    questions, duplicates = read_questions(str(table))
+    assert [(q.id, q.question) for q in questions] == [("a", "Is it safe, really?"), ("b", "How do agents plan?")]
+    assert duplicates == 0
+
+
+def test_writes_each_answer_with_bounded_concurrency(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    source.write_text("\n".join(f"Question {i}?" for i in range(10)), encoding="utf-8")
+    output = tmp_path / "out" / "answers.jsonl"
+    app = FakeApp(failing={"Question 3?"})
+
+    report = run_batch(app, str(source), str(output), concurrency=3)
+
+    assert (report.answered, report.failed, report.skipped) == (9, 1, 0)
+    assert app.max_in_flight == 3
+    records = {record["question"]: record for record in read_output(output)}
+    assert len(records) == 10
+    assert records["Question 0?"]["status"] == "ok"
+    assert records["Question 0?"]["answer"] == "answer to Question 0?"
+    assert records["Question 3?"]["status"] == "error"
+    assert "rate limited" in records["Question 3?"]["error"]
+
+
+def test_rerun_resumes_after_an_interrupted_run(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    source.write_text("First?\nSecond?\nThird?\n", encoding="utf-8")
+    output = tmp_path / "answers.jsonl"
+    # A finished answer, a failed one and the line a killed run was writing
+    output.write_text(
+        json.dumps({"question": "First?", "status": "ok"}) + "\n"
+        + json.dumps({"question": "Second?", "status": "error"}) + "\n"
+        + '{"question": "Third?", "sta',
+        encoding="utf-8",
+    )
+    app = FakeApp()
+
+    report = run_batch(app, str(source), str(output), concurrency=2)
+
+    assert sorted(app.asked) == ["Second?", "Third?"]
+    assert (report.skipped, report.answered) == (1, 2)
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["status"] == "ok" and json.loads(lines[-2])["status"] == "ok"
+    assert run_batch(app, str(source), str(output), concurrency=2).skipped == 3
+
+
+def test_rerun_resumes_when_the_cut_falls_inside_a_multibyte_character(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    source.write_text("¿Qué es la memoria?\n¿Cómo planifican los agentes?\n", encoding="utf-8")
+    output = tmp_path / "answers.jsonl"
+    finished = json.dumps({"question": "¿Qué es la memoria?", "status": "ok"}, ensure_ascii=False) + "\n"
+    cut = json.dumps({"question": "¿Cómo planifican los agentes?", "answer": "Planificación"}, ensure_ascii=False)
+    # The killed run stopped after the first byte of "ó" (0xC3 0xB3)
+    cut = cut.encode("utf-8")
+    output.write_bytes(finished.encode("utf-8") + cut[: cut.index("ó".encode("utf-8")) + 1])
+    assert output.read_bytes().endswith(b"\xc3")
+    app = FakeApp()
+
+    report = run_batch(app, str(source), str(output), concurrency=2)
+
+    assert app.asked == ["¿Cómo planifican los agentes?"]
+    assert (report.skipped, report.answered) == (1, 1)
+    assert [record["status"] for record in read_records(output)] == ["ok", "ok"]
+    assert run_batch(app, str(source), str(output), concurrency=2).skipped == 2
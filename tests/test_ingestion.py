@@ -0,0 +1,296 @@
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+
+import pytest
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from graph.bm25 import BM25Index
+from graph.local_router import compute_topic_centroids
+from graph.vector_index import NumpyVectorStore
+from ingestion import (
+    FetchResult,
+    IngestionManifest,
+    content_hash,
+    expand_sources,
+    fetch_document,
+    ingest,
+    sync_lexical_index,
+)
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: int = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+class FakeWeb:
+    """Serves page bodies and answers 304 when the caller's ETag matches."""
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = pages
+
+    def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+        body = self.pages[url]
+        current_etag = content_hash(body)[:16]
+        if etag == current_etag:
+            return FetchResult(document=None, etag=etag)
+        return FetchResult(
+            document=Document(page_content=body, metadata={"source": url}),
+            body_hash=content_hash(body),
+            etag=current_etag,
+        )
+
+
+def split_paragraphs(documents: List[Document]) -> List[Document]:
+    return [
+        Document(page_content=paragraph, metadata=dict(document.metadata))
+        for document in documents
+        for paragraph in document.page_content.split("\n\n")
+    ]
+
+
+def _ingest(web: FakeWeb, store: InMemoryVectorStore, manifest: IngestionManifest, sources: List[str]):
+    return ingest(sources, store, manifest, fetch=web.fetch, split=split_paragraphs)
+
+
+def test_unchanged_corpus_costs_no_embedding_calls(tmp_path) -> None:
+    embeddings = CountingEmbedding(size=8)
+    store = InMemoryVectorStore(embeddings)
+    web = FakeWeb({"a": "agents\n\nmemory", "b": "prompts\n\nattacks"})
+    manifest_path = str(tmp_path / "manifest.json")
+
+    first = _ingest(web, store, IngestionManifest(manifest_path), ["a", "b"])
+    second = _ingest(web, store, IngestionManifest(manifest_path), ["a", "b"])
+
+    assert first.chunks_added == 4
+    assert embeddings.embedded == 4
+    assert second.sources_skipped == 2
+    assert second.chunks_added == 0
+
+
+def test_changed_source_only_embeds_new_chunks_and_deletes_stale_ones(tmp_path) -> None:
+    embeddings = CountingEmbedding(size=8)
+    store = InMemoryVectorStore(embeddings)
+    web = FakeWeb({"a": "agents\n\nmemory\n\nplanning"})
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    _ingest(web, store, manifest, ["a"])
+
+    web.pages["a"] = "agents\n\nmemory\n\ntool use"
+    stats = _ingest(web, store, manifest, ["a"])
+
+    assert (stats.chunks_added, stats.chunks_deleted, stats.chunks_unchanged) == (1, 1, 2)
+    assert embeddings.embedded == 4
+    assert sorted(item["text"] for item in store.store.values()) == ["agents", "memory", "tool use"]
+
+
+def test_removed_source_chunks_are_deleted(tmp_path) -> None:
+    store = InMemoryVectorStore(CountingEmbedding(size=8))
+    web = FakeWeb({"a": "agents", "b": "prompts"})
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    _ingest(web, store, manifest, ["a", "b"])
+
+    stats = _ingest(web, store, manifest, ["a"])
+
+    assert stats.sources_removed == 1
+    assert [item["text"] for item in store.store.values()] == ["agents"]
+    assert "b" not in IngestionManifest(manifest.path).sources
+
+
+def test_lexical_index_follows_added_and_deleted_chunks(tmp_path) -> None:
+    store = InMemoryVectorStore(CountingEmbedding(size=8))
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    web = FakeWeb({"a": "agents\n\nmemory\n\nplanning", "b": "prompts"})
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    ingest(["a", "b"], store, manifest, fetch=web.fetch, split=split_paragraphs, lexical_index=index)
+
+    web.pages["a"] = "agents\n\nmemory\n\ntool use"
+    ingest(["a"], store, manifest, fetch=web.fetch, split=split_paragraphs, lexical_index=index)
+
+    assert index.ids() == set(store.store)
+    assert [document.page_content for document, _ in index.search("tool use planning")] == ["tool use"]
+
+
+def test_directories_and_sitemaps_expand_to_their_documents(tmp_path) -> None:
+    dump = tmp_path / "dump"
+    (dump / "posts").mkdir(parents=True)
+    (dump / "index.html").write_text("<html><body><p>agents</p></body></html>")
+    (dump / "posts" / "memory.html").write_text("<html><body><p>memory</p></body></html>")
+    (dump / "notes.md").write_text("prompts\n\nattacks")
+    (dump / "logo.png").write_bytes(b"\x89PNG")
+    (tmp_path / "posts.xml").write_text(
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc>https://example.com/a</loc></url><url><loc> https://example.com/b </loc></url></urlset>"
+    )
+    (tmp_path / "sitemap.xml").write_text(
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f"<sitemap><loc>{tmp_path / 'posts.xml'}</loc></sitemap></sitemapindex>"
+    )
+
+    sources = list(expand_sources([str(dump), str(tmp_path / "sitemap.xml"), "https://example.com/c"]))
+    assert sources == [
+        str(dump / "index.html"),
+        str(dump / "notes.md"),
+        str(dump / "posts" / "memory.html"),
+        "https://example.com/a",
+        "https://example.com/b",
+        "https://example.com/c",
+    ]
+
+
+def test_local_documents_are_ingested_and_only_reread_when_they_change(tmp_path) -> None:
+    notes = tmp_path / "notes"
+    (notes / "agents").mkdir(parents=True)
+    (notes / "agents" / "memory.md").write_text("memory\n\nplanning")
+    (notes / "prompts.txt").write_text("prompts\n\nattacks")
+    embeddings = CountingEmbedding(size=8)
+    store = InMemoryVectorStore(embeddings)
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    first = ingest(expand_sources([str(notes)]), store, manifest, split=split_paragraphs)
+    assert (first.sources_updated, first.chunks_added) == (2, 4)
+    assert {item["metadata"]["source"] for item in store.store.values()} == {
+        str(notes / "agents" / "memory.md"),
+        str(notes / "prompts.txt"),
+    }
+
+    # Unchanged files are not even read; a rewritten one is split again
+    (notes / "prompts.txt").write_text("prompts\n\njailbreaks")
+    second = ingest(expand_sources([str(notes)]), store, manifest, split=split_paragraphs)
+    assert (second.sources_skipped, second.sources_updated, second.chunks_added, second.chunks_deleted) == (1, 1, 1, 1)
+    assert embeddings.embedded == 5
+
+
+def test_html_dump_pages_are_parsed_like_fetched_ones(tmp_path) -> None:
+    pytest.importorskip("bs4")
+    page = tmp_path / "dump" / "posts" / "memory.html"
+    page.parent.mkdir(parents=True)
+    page.write_text("<html><head><title>Memory</title></head><body><h1>memory</h1><p>planning</p></body></html>")
+
+    result = fetch_document(str(page))
+    assert "<" not in result.document.page_content and "planning" in result.document.page_content
+    assert result.document.metadata["source"] == str(page) and result.document.metadata["title"] == "Memory"
+    assert fetch_document(str(page), etag=result.etag).document is None
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_pipeline_upserts_embedded_batches_in_bulk(tmp_path, backend) -> None:
+    embeddings = CountingEmbedding(size=8)
+    if backend == "chroma":
+        store = Chroma(collection_name=f"ingest-{time.time_ns()}", embedding_function=embeddings)
+    else:
+        store = NumpyVectorStore(str(tmp_path / "index"), embeddings)
+    pages = {f"https://example.com/{page}": f"page {page} agents\n\npage {page} memory\n\npage {page} tools" for page in range(30)}
+    web = FakeWeb(pages)
+    index = BM25Index(":memory:")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    options = dict(fetch=web.fetch, split=split_paragraphs, lexical_index=index, fetch_workers=3, embed_workers=2, batch_size=4, queue_size=2)
+    try:
+        stats = ingest(list(pages), store, manifest, **options)
+        assert (stats.sources_updated, stats.chunks_added) == (30, 90)
+        assert embeddings.embedded == 90
+        assert set(store.get(include=[])["ids"]) == index.ids()
+        assert [document.page_content for document in store.similarity_search("page 7 memory", k=1)] == ["page 7 memory"]
+
+        # A page that fails to fetch keeps its chunks; a changed page and a removed one are applied
+        web.pages["https://example.com/1"] = "page 1 agents\n\npage 1 memory\n\npage 1 planning"
+        del web.pages["https://example.com/2"]
+        failing = dict(options, fetch=lambda source, **kwargs: web.fetch(source, **kwargs) if source != "https://example.com/3" else 1 / 0)
+        stats = ingest([page for page in pages if page != "https://example.com/2"], store, manifest, **failing)
+        assert (stats.sources_failed, stats.sources_updated, stats.sources_removed) == (1, 1, 1)
+        assert (stats.chunks_added, stats.chunks_deleted) == (1, 4)
+        assert embeddings.embedded == 91
+        stored = store.get(include=[])["ids"]
+        assert len(stored) == 87 and set(stored) == index.ids()
+        assert manifest.sources["https://example.com/3"]["chunk_ids"][0] in stored
+    finally:
+        if backend == "chroma":
+            store.delete_collection()
+        else:
+            store.close()
+
+
+def test_pipeline_backpressure_bounds_the_sources_in_flight(tmp_path) -> None:
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    in_flight = []
+
+    def sources():
+        for page in range(300):
+            # Sources listed but not yet recorded in the manifest are somewhere in the pipeline
+            in_flight.append(page - len(manifest.sources))
+            yield f"https://example.com/{page}"
+
+    class SlowEmbedding(CountingEmbedding):
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            time.sleep(0.001)
+            return super().embed_documents(texts)
+
+    web = FakeWeb({f"https://example.com/{page}": f"page {page}" for page in range(300)})
+    store = InMemoryVectorStore(SlowEmbedding(size=8))
+    stats = ingest(
+        sources(), store, manifest, fetch=web.fetch, split=split_paragraphs,
+        fetch_workers=2, embed_workers=1, batch_size=1, queue_size=2,
+    )
+
+    assert stats.chunks_added == 300 and len(manifest.sources) == 300
+    # Queues of 2 items between five stages, plus what each worker holds
+    assert max(in_flight) <= 16
+
+
+class SyntheticStore:
+    """Collection of size chunks over 10 sources, generated page by page like Chroma's get()."""
+
+    def __init__(self, size: int, dimensions: int = 256):
+        self.size = size
+        self.dimensions = dimensions
+
+    def _row(self, number: int) -> Dict[str, Any]:
+        return {
+            "id": f"chunk-{number:08d}",
+            "embedding": [float(number % 7 + 1)] * self.dimensions,
+            "document": f"agents memory planning {number}",
+            "metadata": {"source": f"https://example.com/{number % 10}"},
+        }
+
+    def get(self, ids: Optional[Sequence[str]] = None, limit: Optional[int] = None, offset: Optional[int] = None, include: Sequence[str] = ()) -> Dict[str, Any]:
+        if ids is None:
+            start = offset or 0
+            numbers = range(start, self.size if limit is None else min(self.size, start + limit))
+        else:
+            numbers = [int(chunk_id.split("-")[1]) for chunk_id in ids]
+        rows = [self._row(number) for number in numbers if number < self.size]
+        result: Dict[str, Any] = {"ids": [row["id"] for row in rows]}
+        for field in ("embeddings", "documents", "metadatas"):
+            result[field] = [row[field[:-1]] for row in rows] if field in include else None
+        return result
+
+
+def _peak_bytes(function, *args) -> int:
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_centroids_and_lexical_sync_memory_stays_flat_as_the_corpus_grows(tmp_path) -> None:
+    small, large = SyntheticStore(2_000), SyntheticStore(8_000)
+
+    centroids_small = _peak_bytes(compute_topic_centroids, small, 200)
+    centroids_large = _peak_bytes(compute_topic_centroids, large, 200)
+    sync_small = _peak_bytes(sync_lexical_index, small, BM25Index(str(tmp_path / "small.sqlite3")), 200)
+    index = BM25Index(str(tmp_path / "large.sqlite3"))
+    sync_large = _peak_bytes(sync_lexical_index, large, index, 200)
+
+    # Four times the chunks, about the same peak: only a page is held at a time
+    assert centroids_large < 1.5 * centroids_small
+    assert sync_large < 1.5 * sync_small
+    assert len(compute_topic_centroids(large, 200)) == 10
+    assert len(index.ids()) == 8_000